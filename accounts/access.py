@@ -0,0 +1,128 @@
+"""
+So'rov doirasidagi ruxsat konteksti (request.access)
+Rol, filial doirasi (sotuvchi profili orqali), mentor va o'quvchi guruhlari bir marta aniqlanadi
+va so'rov davomida qayta ishlatiladi. Ma'lumotlar kerak bo'lganda yuklanadi: sotuvchilar uchun
+profil+filial (bitta select_related so'rov), mentor yoki o'quvchi uchun guruh ID lari (bitta so'rov).
+View lar doira filtrlarini shu kontekstdan quradi.
+"""
+from django.utils.functional import cached_property
+
+
+class AccessContext:
+    """
+    Foydalanuvchining ruxsat konteksti
+    group_ids: mentor - o'z guruhlari, o'quvchi - o'qiyotgan guruhlari, boshqalar - None (cheklovsiz)
+    branch_id: sotuvchilar menejeri uchun filial (boshqalar - None, cheklovsiz)
+    """
+    def __init__(self, user):
+        self.user = user
+        self.is_authenticated = bool(user and user.is_authenticated)
+        self.user_id = user.pk if self.is_authenticated else None
+        self.role = getattr(user, 'role', None) if self.is_authenticated else None
+        self.is_superuser = self.is_authenticated and user.is_superuser
+
+    @property
+    def is_admin(self):
+        return self.role == 'admin' or self.is_superuser
+
+    @property
+    def is_manager(self):
+        return self.role == 'manager'
+
+    @property
+    def is_mentor(self):
+        return self.role == 'mentor'
+
+    @property
+    def is_student(self):
+        return self.role == 'student'
+
+    @property
+    def is_accountant(self):
+        return self.role == 'accountant'
+
+    @property
+    def is_sales(self):
+        return self.role == 'sales'
+
+    @property
+    def is_sales_manager(self):
+        return self.role == 'sales_manager'
+
+    def has_role(self, roles):
+        """Superuser yoki roli roles ichida"""
+        return self.is_superuser or self.role in roles
+
+    @cached_property
+    def sales_profile(self):
+        """Sotuvchi profili (filiali bilan), yo'q bo'lsa None"""
+        if not (self.is_sales or self.is_sales_manager):
+            return None
+        from accounts.models import User
+        from crm.models import SalesProfile
+        profile = SalesProfile.objects.select_related('branch').filter(user_id=self.user_id).first()
+        # request.user.sales_profile ham qayta so'rov qilmaydi
+        User.sales_profile.related.set_cached_value(self.user, profile)
+        return profile
+
+    @property
+    def branch(self):
+        return self.sales_profile.branch if self.sales_profile else None
+
+    @property
+    def branch_id(self):
+        """Sotuvchilar menejeri faqat o'z filiali lidlarini ko'radi"""
+        if not self.is_sales_manager or not self.sales_profile:
+            return None
+        return self.sales_profile.branch_id
+
+    @cached_property
+    def mentored_group_ids(self):
+        if not self.is_mentor:
+            return []
+        from courses.models import Group
+        return list(Group.objects.filter(mentor_id=self.user_id).values_list('pk', flat=True))
+
+    @cached_property
+    def student_group_ids(self):
+        if not self.is_student:
+            return []
+        from courses.models import Group
+        return list(Group.objects.filter(students=self.user_id).values_list('pk', flat=True))
+
+    @property
+    def group_ids(self):
+        if self.is_mentor:
+            return self.mentored_group_ids
+        if self.is_student:
+            return self.student_group_ids
+        return None
+
+    def can_manage_group(self, group_id):
+        """Admin, manager yoki guruh mentori"""
+        return self.is_admin or self.is_manager or group_id in self.mentored_group_ids
+
+    def scope_groups(self, queryset, field='group'):
+        """
+        queryset ni foydalanuvchi guruhlari bilan cheklash (mentor/o'quvchi).
+        field - guruhga yo'l ('group', 'lesson__group'; Group uchun 'pk')
+        """
+        group_ids = self.group_ids
+        if group_ids is None:
+            return queryset
+        return queryset.filter(**{f'{field}__in': group_ids})
+
+    def scope_branch(self, queryset, field='branch'):
+        """queryset ni sotuvchilar menejeri filiali bilan cheklash"""
+        if self.branch_id is None:
+            return queryset
+        return queryset.filter(**{f'{field}_id': self.branch_id})
+
+
+def get_access(request):
+    """request.access (middleware bo'lmasa shu yerda yaratiladi)"""
+    access = getattr(request, 'access', None)
+    if access is None or access.user is not request.user:
+        access = AccessContext(request.user)
+        request.access = access
+    return access
@@ -4,16 +4,17 @@ Role-based dashboard views
 from django.shortcuts import redirect
 from django.views.generic import TemplateView
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import Count, Avg, Sum, Q
+from django.db.models import Sum
 from django.utils import timezone
 from datetime import timedelta
 
+from . import student_summary
 from .models import User
-from courses.models import Group, Lesson, StudentProgress
-from attendance.models import Attendance
+from courses.models import Lesson, StudentProgress
 from homework.models import Homework
 from exams.models import Exam, ExamResult
 from gamification.models import StudentPoints, StudentBadge, GroupRanking
+from mentors.workload import mentor_workload
 from parents.models import MonthlyParentReport
 
 
@@ -63,68 +64,58 @@ class StudentDashboardView(LoginRequiredMixin, TemplateView):
         now = timezone.now()
         this_week_start = now - timedelta(days=now.weekday())
         
+        # Hisoblagichlar oldindan hisoblangan (accounts.student_summary)
+        summary = student_summary.get_summary(student, now)
+        context['my_summary'] = summary
+        
         # My Groups
-        context['my_groups'] = student.student_groups.filter(is_active=True)
+        context['my_groups'] = student.student_groups.filter(is_active=True).select_related('course')
         
         # My Progress
-        progress_list = StudentProgress.objects.filter(
+        context['my_progress'] = StudentProgress.objects.filter(
             student=student
         ).select_related('course')
-        context['my_progress'] = progress_list
-        context['avg_progress'] = progress_list.aggregate(avg=Avg('progress_percentage'))['avg'] or 0
+        context['avg_progress'] = summary.avg_progress
         
         # Recent Lessons (this week)
         context['recent_lessons'] = Lesson.objects.filter(
             group__in=context['my_groups'],
             date__gte=this_week_start.date()
-        ).order_by('-date', '-start_time')[:5]
+        ).select_related('group').order_by('-date', '-start_time')[:5]
         
         # My Attendance Stats (this month)
-        this_month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        my_attendances = Attendance.objects.filter(
-            student=student,
-            lesson__date__gte=this_month_start.date()
-        )
-        total_att = my_attendances.count()
-        present_att = my_attendances.filter(status__in=['present', 'late']).count()
-        context['my_attendance_count'] = total_att
-        context['my_attendance_percentage'] = (present_att / total_att * 100) if total_att > 0 else 0
-        context['my_present_count'] = my_attendances.filter(status='present').count()
-        context['my_late_count'] = my_attendances.filter(status='late').count()
-        context['my_absent_count'] = my_attendances.filter(status='absent').count()
+        context['my_attendance_count'] = summary.month_attendance_count
+        context['my_attendance_percentage'] = summary.month_attendance_percentage
+        context['my_present_count'] = summary.month_present
+        context['my_late_count'] = summary.month_late
+        context['my_absent_count'] = summary.month_absent
         
         # Pending Homework
         context['pending_homeworks'] = Homework.objects.filter(
             student=student,
             is_submitted=False,
-            deadline__gte=now.date()
-        ).order_by('deadline')[:5]
-        
-        context['overdue_homeworks'] = Homework.objects.filter(
-            student=student,
-            is_submitted=False,
-            deadline__lt=now.date()
-        ).count()
+            deadline__gte=student_summary.day_start(now)
+        ).select_related('lesson__group').order_by('deadline')[:5]
+        context['pending_homeworks_count'] = summary.pending_homeworks
+        context['overdue_homeworks'] = summary.overdue_homeworks
         
         # Upcoming Exams
         context['upcoming_exams'] = Exam.objects.filter(
             group__in=context['my_groups'],
             date__gte=now.date(),
             is_active=True
-        ).order_by('date')[:5]
+        ).select_related('group').order_by('date')[:5]
         
         # My Points and Ranking (sum across all groups)
-        from gamification.models import StudentPoints
-        student_points_list = StudentPoints.objects.filter(student=student)
-        total_points = sum(sp.total_points for sp in student_points_list)
-        context['my_points'] = total_points
-        # Level calculation (you may want to adjust this logic)
-        context['my_level'] = min(total_points // 100 + 1, 10)  # Example: 100 points per level, max level 10
+        context['my_points'] = summary.total_points
+        context['my_level'] = summary.level
+        context['my_best_rank'] = summary.best_rank
         
         # My Badges
         context['my_badges'] = StudentBadge.objects.filter(
             student=student
         ).select_related('badge').order_by('-earned_at')[:6]
+        context['my_badge_count'] = summary.badge_count
         
         # My Group Rankings
         context['my_rankings'] = GroupRanking.objects.filter(
@@ -151,21 +142,12 @@ class MentorDashboardView(LoginRequiredMixin, TemplateView):
         now = timezone.now()
         today = now.date()
         this_week_start = now - timedelta(days=now.weekday())
-        this_month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
         
-        # My Groups
-        context['my_groups'] = Group.objects.filter(
-            mentor=mentor,
-            is_active=True
-        ).annotate(
-            students_count=Count('students', filter=Q(students__role='student'))
-        )
-        
-        # Total Students
-        total_students = 0
-        for group in context['my_groups']:
-            total_students += group.students_count
-        context['total_students'] = total_students
+        # Guruhlar, o'quvchilar, baholanmagan vazifalar, davomat va KPI - keshlangan ish yuklamasi
+        workload = mentor_workload(mentor, today)
+        context['workload'] = workload
+        context['my_groups'] = workload['groups']
+        context['total_students'] = workload['students_count']
         
         # Today's Lessons
         context['todays_lessons'] = Lesson.objects.filter(
@@ -186,34 +168,16 @@ class MentorDashboardView(LoginRequiredMixin, TemplateView):
             is_submitted=True,
             grade__isnull=True
         ).select_related('student', 'lesson').order_by('submitted_at')[:10]
-        
-        context['homeworks_to_grade_count'] = Homework.objects.filter(
-            lesson__group__mentor=mentor,
-            is_submitted=True,
-            grade__isnull=True
-        ).count()
+        context['homeworks_to_grade_count'] = workload['ungraded_homeworks']
         
         # Attendance Stats (this month)
-        attendances = Attendance.objects.filter(
-            lesson__group__mentor=mentor,
-            lesson__date__gte=this_month_start.date()
-        )
-        total_att = attendances.count()
-        present_att = attendances.filter(status__in=['present', 'late']).count()
-        context['attendance_count'] = total_att
-        context['attendance_percentage'] = (present_att / total_att * 100) if total_att > 0 else 0
+        context['attendance_count'] = workload['attendance_total']
+        context['attendance_percentage'] = workload['attendance_percentage']
+        context['attendance_completeness'] = workload['attendance_completeness']
         
         # My KPI
-        from mentors.models import MentorKPI
-        try:
-            latest_kpi = MentorKPI.objects.filter(mentor=mentor).order_by('-month', '-year').first()
-            if latest_kpi:
-                context['my_kpi'] = latest_kpi.total_kpi_score
-                context['my_kpi_month'] = f"{latest_kpi.year}-{latest_kpi.month:02d}"
-            else:
-                context['my_kpi'] = None
-        except:
-            context['my_kpi'] = None
+        context['my_kpi'] = workload['kpi_score']
+        context['my_kpi_month'] = workload['kpi_month']
         
         # Recent Exams
         context['recent_exams'] = Exam.objects.filter(
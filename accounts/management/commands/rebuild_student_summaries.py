@@ -0,0 +1,22 @@
+"""
+Django management command: o'quvchi dashboard ko'rsatkichlarini qayta hisoblash
+Usage: python manage.py rebuild_student_summaries [--student ID ...]
+Signal lar o'tkazib yuborgan o'zgarishlar (bulk amallar, qo'lda SQL) yoki ma'lumot ko'chirishdan keyin.
+"""
+from django.core.management.base import BaseCommand
+
+from accounts import student_summary
+
+
+class Command(BaseCommand):
+    help = "O'quvchi dashboard ko'rsatkichlarini (StudentSummary) bazadan qayta hisoblash"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--student', type=int, nargs='+', help="Faqat shu o'quvchilar (ID)")
+
+    def handle(self, *args, **options):
+        if options['student']:
+            count = len(student_summary.refresh(options['student']))
+        else:
+            count = student_summary.rebuild_all()
+        self.stdout.write(self.style.SUCCESS(f"{count} ta o'quvchi ko'rsatkichlari qayta hisoblandi"))
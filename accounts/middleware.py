@@ -0,0 +1,19 @@
+"""
+Middleware classes for accounts app
+"""
+from django.utils.functional import SimpleLazyObject
+
+from .access import AccessContext
+
+
+class AccessContextMiddleware:
+    """
+    request.access - so'rov doirasidagi ruxsat konteksti (accounts.access.AccessContext)
+    AuthenticationMiddleware dan keyin turishi kerak
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.access = SimpleLazyObject(lambda: AccessContext(request.user))
+        return self.get_response(request)
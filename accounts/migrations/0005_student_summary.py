@@ -0,0 +1,39 @@
+# Generated by Django 5.0.1 on 2026-10-19 17:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_remove_parent_profile_add_telegram_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(blank=True, null=True, verbose_name='Davomat oyi')),
+                ('month_present', models.PositiveIntegerField(default=0, verbose_name='Keldi')),
+                ('month_late', models.PositiveIntegerField(default=0, verbose_name='Kech qoldi')),
+                ('month_absent', models.PositiveIntegerField(default=0, verbose_name='Kelmadi')),
+                ('pending_homeworks', models.PositiveIntegerField(default=0, verbose_name='Kutilayotgan uy vazifalari')),
+                ('overdue_homeworks', models.PositiveIntegerField(default=0, verbose_name="Muddati o'tgan uy vazifalari")),
+                ('next_deadline', models.DateTimeField(blank=True, null=True, verbose_name='Eng yaqin muddat')),
+                ('total_points', models.IntegerField(default=0, verbose_name='Jami ball')),
+                ('level', models.PositiveSmallIntegerField(default=1, verbose_name='Daraja')),
+                ('best_rank', models.PositiveIntegerField(blank=True, null=True, verbose_name="Guruhdagi eng yaxshi o'rin")),
+                ('avg_progress', models.FloatField(default=0.0, verbose_name="O'rtacha progress")),
+                ('badge_count', models.PositiveIntegerField(default=0, verbose_name='Badge lar soni')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Yangilangan sana')),
+                ('student', models.OneToOneField(limit_choices_to={'role': 'student'}, on_delete=django.db.models.deletion.CASCADE, related_name='dashboard_summary', to=settings.AUTH_USER_MODEL, verbose_name="O'quvchi")),
+            ],
+            options={
+                'verbose_name': "O'quvchi dashboard ko'rsatkichlari",
+                'verbose_name_plural': "O'quvchi dashboard ko'rsatkichlari",
+            },
+        ),
+    ]
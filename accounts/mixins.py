@@ -3,8 +3,12 @@ Mixin classes for role-based access control
 """
 from django.core.exceptions import PermissionDenied
 from django.contrib import messages
+from django.http import Http404
 from django.shortcuts import redirect
 
+from .access import get_access
+from .pagination import AFTER_PARAM, BEFORE_PARAM, InvalidCursor, KeysetPaginator
+
 
 class RoleRequiredMixin:
     """
@@ -15,11 +19,12 @@ class RoleRequiredMixin:
     allowed_roles = []
     
     def dispatch(self, request, *args, **kwargs):
-        if not request.user.is_authenticated:
+        access = get_access(request)
+        if not access.is_authenticated:
             messages.error(request, 'Iltimos, avval tizimga kiring.')
             return redirect('accounts:login')
         
-        if not request.user.is_superuser and request.user.role not in self.allowed_roles:
+        if not access.has_role(self.allowed_roles):
             messages.error(request, 'Sizda bu sahifaga kirish huquqi yo\'q.')
             return redirect('accounts:login')
         
@@ -31,11 +36,12 @@ class AdminRequiredMixin:
     Mixin to check if user is admin
     """
     def dispatch(self, request, *args, **kwargs):
-        if not request.user.is_authenticated:
+        access = get_access(request)
+        if not access.is_authenticated:
             messages.error(request, 'Iltimos, avval tizimga kiring.')
             return redirect('accounts:login')
         
-        if not request.user.is_superuser and not request.user.is_admin:
+        if not access.is_admin:
             messages.error(request, 'Sizda bu sahifaga kirish huquqi yo\'q.')
             return redirect('accounts:login')
         
@@ -47,11 +53,12 @@ class MentorRequiredMixin:
     Mixin to check if user is mentor
     """
     def dispatch(self, request, *args, **kwargs):
-        if not request.user.is_authenticated:
+        access = get_access(request)
+        if not access.is_authenticated:
             messages.error(request, 'Iltimos, avval tizimga kiring.')
             return redirect('accounts:login')
         
-        if not request.user.is_superuser and not request.user.is_admin and not request.user.is_mentor:
+        if not access.is_admin and not access.is_mentor:
             messages.error(request, 'Sizda bu sahifaga kirish huquqi yo\'q.')
             return redirect('accounts:login')
         
@@ -109,6 +116,46 @@ class CrudListViewMixin:
         return context
 
 
+class KeysetPaginationMixin:
+    """
+    ListView uchun keyset (kursor) sahifalash: ?after=<kursor> / ?before=<kursor>
+    Usage: class MyListView(KeysetPaginationMixin, ListView):
+              paginate_by = 50
+              keyset_ordering = ['-created_at', '-id']
+    keyset_ordering oxirgi maydoni yagona bo'lishi kerak (odatda id).
+    Shablonda: {% include 'components/keyset_pagination.html' %}
+    """
+    keyset_ordering = ['-created_at', '-id']
+    exact_count_limit = 1000
+
+    def get_keyset_ordering(self):
+        return self.keyset_ordering
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(
+            queryset, page_size, self.get_keyset_ordering(), exact_count_limit=self.exact_count_limit,
+        )
+        try:
+            page = paginator.page(
+                after=self.request.GET.get(AFTER_PARAM), before=self.request.GET.get(BEFORE_PARAM),
+            )
+        except InvalidCursor:
+            raise Http404("Noto'g'ri sahifa")
+        page.next_url = self._cursor_url(AFTER_PARAM, page.next_cursor)
+        page.previous_url = self._cursor_url(BEFORE_PARAM, page.previous_cursor)
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def _cursor_url(self, param, cursor):
+        """Joriy filtrlar saqlangan holda sahifa havolasi"""
+        if cursor is None:
+            return None
+        params = self.request.GET.copy()
+        for name in (AFTER_PARAM, BEFORE_PARAM, 'page'):
+            params.pop(name, None)
+        params[param] = cursor
+        return f'?{params.urlencode()}'
+
+
 class CrudFormViewMixin(TailwindFormMixin):
     """
     Enhanced form mixin with better styling and validation
@@ -113,3 +113,43 @@ class StudentProfile(models.Model):
     
     def __str__(self):
         return f"{self.user.get_full_name() or self.user.username} - O'quvchi"
+
+
+class StudentSummary(models.Model):
+    """
+    O'quvchi dashboard i uchun oldindan hisoblangan ko'rsatkichlar
+    (accounts.student_summary signal lar orqali bo'lim-bo'lim yangilaydi)
+    """
+    student = models.OneToOneField(User, on_delete=models.CASCADE, related_name='dashboard_summary',
+                                   limit_choices_to={'role': 'student'}, verbose_name="O'quvchi")
+    month = models.DateField(blank=True, null=True, verbose_name='Davomat oyi')  # Hisoblagichlar shu oy uchun
+    month_present = models.PositiveIntegerField(default=0, verbose_name='Keldi')
+    month_late = models.PositiveIntegerField(default=0, verbose_name='Kech qoldi')
+    month_absent = models.PositiveIntegerField(default=0, verbose_name='Kelmadi')
+    pending_homeworks = models.PositiveIntegerField(default=0, verbose_name='Kutilayotgan uy vazifalari')
+    overdue_homeworks = models.PositiveIntegerField(default=0, verbose_name="Muddati o'tgan uy vazifalari")
+    # Eng yaqin topshirilmagan muddat - o'tib ketsa uy vazifa hisoblagichlari qayta hisoblanadi
+    next_deadline = models.DateTimeField(blank=True, null=True, verbose_name='Eng yaqin muddat')
+    total_points = models.IntegerField(default=0, verbose_name='Jami ball')
+    level = models.PositiveSmallIntegerField(default=1, verbose_name='Daraja')
+    best_rank = models.PositiveIntegerField(blank=True, null=True, verbose_name="Guruhdagi eng yaxshi o'rin")
+    avg_progress = models.FloatField(default=0.0, verbose_name="O'rtacha progress")
+    badge_count = models.PositiveIntegerField(default=0, verbose_name='Badge lar soni')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Yangilangan sana')
+    
+    class Meta:
+        verbose_name = "O'quvchi dashboard ko'rsatkichlari"
+        verbose_name_plural = "O'quvchi dashboard ko'rsatkichlari"
+    
+    def __str__(self):
+        return f"{self.student.username} - dashboard"
+    
+    @property
+    def month_attendance_count(self):
+        return self.month_present + self.month_late + self.month_absent
+    
+    @property
+    def month_attendance_percentage(self):
+        """Keldi va kech qoldi hisobga olinadi"""
+        total = self.month_attendance_count
+        return (self.month_present + self.month_late) / total * 100 if total else 0
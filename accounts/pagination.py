@@ -0,0 +1,263 @@
+"""
+Keyset (cursor) sahifalash
+OFFSET o'rniga oxirgi ko'rsatilgan yozuvning tartib maydonlari qiymatlari (kursor) bo'yicha
+filtrlanadi: "created_at < X yoki (created_at = X va id < Y)". Chuqur sahifalar ham birinchi
+sahifa kabi tez - baza oldingi qatorlarni sanab o'tkazib yubormaydi.
+
+Umumiy son: exact_count_limit gacha aniq (LIMIT bilan cheklangan COUNT), undan ko'p bo'lsa
+taxminiy - PostgreSQL da rejalashtiruvchi bahosi, boshqa bazalarda keshlangan COUNT.
+"""
+import base64
+import binascii
+import hashlib
+import json
+import logging
+
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import connections
+from django.db.models import F, Q
+from django.utils.functional import cached_property
+
+logger = logging.getLogger(__name__)
+
+
+AFTER_PARAM = 'after'
+BEFORE_PARAM = 'before'
+COUNT_CACHE_PREFIX = 'keyset_count'
+COUNT_CACHE_TIMEOUT = 300
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class KeysetField:
+    """Tartib maydoni: '-created_at' -> name='created_at', descending=True"""
+    def __init__(self, model, spec):
+        self.descending = spec.startswith('-')
+        self.name = spec.lstrip('-')
+        self.field = _resolve_field(model, self.name)
+        self.nullable = self.field.null
+
+    def value(self, obj):
+        for attr in self.name.split('__'):
+            obj = getattr(obj, attr) if obj is not None else None
+        return obj
+
+    def parse(self, raw):
+        if raw is None:
+            if not self.nullable:
+                raise InvalidCursor(self.name)
+            return None
+        try:
+            return self.field.to_python(raw)
+        except ValidationError:
+            raise InvalidCursor(self.name)
+
+    def order(self, reverse=False):
+        """NULL lar har doim oldinga yurishda oxirida (bazadan qat'i nazar bir xil tartib)"""
+        descending = self.descending != reverse
+        if not self.nullable:
+            return f"{'-' if descending else ''}{self.name}"
+        nulls = {'nulls_first': True} if reverse else {'nulls_last': True}
+        return F(self.name).desc(**nulls) if descending else F(self.name).asc(**nulls)
+
+    def beyond(self, value, reverse=False):
+        """Tartibda value dan keyingi (reverse=True - oldingi) qiymatlar sharti, bo'lmasa None"""
+        if value is None:
+            # NULL lar oxirida: oldinga - ulardan keyin hech narsa yo'q, orqaga - barcha qiymatlar
+            return Q(**{f'{self.name}__isnull': False}) if reverse else None
+        lookup = 'lt' if self.descending != reverse else 'gt'
+        condition = Q(**{f'{self.name}__{lookup}': value})
+        if self.nullable and not reverse:
+            condition |= Q(**{f'{self.name}__isnull': True})
+        return condition
+
+    def equal(self, value):
+        if value is None:
+            return Q(**{f'{self.name}__isnull': True})
+        return Q(**{self.name: value})
+
+
+def _resolve_field(model, path):
+    """'lesson__date' -> Lesson.date maydoni"""
+    field = None
+    for name in path.split('__'):
+        if field is not None:
+            model = field.related_model
+        if name == 'pk':
+            field = model._meta.pk
+            continue
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            raise ValueError(f"Keyset field '{path}' not found on {model.__name__}")
+    return field
+
+
+def encode_cursor(values):
+    data = json.dumps(values, separators=(',', ':'), default=str).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def decode_cursor(token, fields):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        raise InvalidCursor(token)
+    if not isinstance(values, list) or len(values) != len(fields):
+        raise InvalidCursor(token)
+    return [field.parse(value) for field, value in zip(fields, values)]
+
+
+def keyset_filter(fields, values, reverse=False):
+    """
+    (f1, f2, ...) > (v1, v2, ...) sharti (tartib yo'nalishini hisobga olib):
+    f1 > v1 yoki (f1 = v1 va f2 > v2) yoki ...
+    Oldiga qo'shimcha "f1 >= v1" sharti qo'shiladi: OR bo'lsa ham baza f1 indeksini
+    tartib bo'yicha oraliq sifatida o'qiydi (aks holda qolgan qatorlarni saralaydi).
+    """
+    condition = None
+    prefix = Q()
+    for field, value in zip(fields, values):
+        step = field.beyond(value, reverse)
+        if step is not None:
+            step = prefix & step
+            condition = step if condition is None else condition | step
+        prefix &= field.equal(value)
+    first, value = fields[0], values[0]
+    if condition is not None and value is not None and not first.nullable:
+        lookup = 'lte' if first.descending != reverse else 'gte'
+        condition = Q(**{f'{first.name}__{lookup}': value}) & condition
+    return condition
+
+
+def planner_estimate(queryset):
+    """PostgreSQL rejalashtiruvchisining qatorlar bahosi (boshqa bazalarda None)"""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def cached_count(queryset, timeout=COUNT_CACHE_TIMEOUT):
+    """Bir xil filtrli queryset uchun COUNT natijasi timeout soniya keshlanadi"""
+    sql, params = queryset.order_by().query.sql_with_params()
+    digest = hashlib.md5(f'{queryset.db}:{sql}:{params!r}'.encode()).hexdigest()
+    key = f'{COUNT_CACHE_PREFIX}:{digest}'
+    try:
+        count = cache.get(key)
+    except Exception as e:
+        logger.warning(f"Error reading pagination count cache: {e}")
+        return queryset.count()
+    if count is None:
+        count = queryset.count()
+        try:
+            cache.set(key, count, timeout)
+        except Exception as e:
+            logger.warning(f"Error writing pagination count cache: {e}")
+    return count
+
+
+class KeysetPaginator:
+    """
+    count - umumiy son (count_is_estimate=True bo'lsa taxminiy)
+    Sahifalar raqamlanmaydi: faqat oldingi/keyingi kursorlar
+    """
+    def __init__(self, queryset, per_page, ordering, exact_count_limit=1000):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.fields = [KeysetField(queryset.model, spec) for spec in ordering]
+        self.exact_count_limit = exact_count_limit
+
+    @cached_property
+    def _count(self):
+        """(son, taxminiymi)"""
+        queryset = self.queryset.order_by()
+        bounded = queryset[:self.exact_count_limit + 1].count()
+        if bounded <= self.exact_count_limit:
+            return bounded, False
+        try:
+            estimate = planner_estimate(queryset)
+        except Exception as e:
+            logger.warning(f"Error estimating pagination count: {e}")
+            estimate = None
+        if estimate is None:
+            return cached_count(queryset), True
+        return max(estimate, bounded), True
+
+    @property
+    def count(self):
+        return self._count[0]
+
+    @property
+    def count_is_estimate(self):
+        return self._count[1]
+
+    def ordered(self, reverse=False):
+        return self.queryset.order_by(*(field.order(reverse) for field in self.fields))
+
+    def cursor(self, obj):
+        return encode_cursor([field.value(obj) for field in self.fields])
+
+    def page(self, after=None, before=None):
+        """after/before - kursor tokeni (ikkalasi bo'lmasa birinchi sahifa)"""
+        if before:
+            values = decode_cursor(before, self.fields)
+            condition = keyset_filter(self.fields, values, reverse=True)
+            rows = list(self.ordered(reverse=True).filter(condition)[:self.per_page + 1])
+            if len(rows) > self.per_page:
+                return KeysetPage(self, rows[:self.per_page][::-1], has_previous=True, has_next=True)
+            # Boshiga yetib kelindi - to'liq birinchi sahifa
+            return self.page()
+
+        queryset = self.ordered()
+        if after:
+            values = decode_cursor(after, self.fields)
+            condition = keyset_filter(self.fields, values)
+            queryset = queryset.filter(condition) if condition is not None else queryset.none()
+        rows = list(queryset[:self.per_page + 1])
+        return KeysetPage(self, rows[:self.per_page], has_previous=bool(after),
+                          has_next=len(rows) > self.per_page)
+
+
+class KeysetPage:
+    """Django Page ga o'xshash interfeys (shablonlar uchun)"""
+    def __init__(self, paginator, object_list, has_previous, has_next):
+        self.paginator = paginator
+        self.object_list = object_list
+        self._has_previous = has_previous
+        self._has_next = has_next
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        return self.paginator.cursor(self.object_list[-1]) if self._has_next else None
+
+    @property
+    def previous_cursor(self):
+        return self.paginator.cursor(self.object_list[0]) if self._has_previous else None
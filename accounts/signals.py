@@ -0,0 +1,48 @@
+"""
+Django signals for accounts app
+O'quvchi dashboard ko'rsatkichlarini (StudentSummary) manba modellar o'zgarganda yangilash
+"""
+from collections import defaultdict
+
+from django.db.models.signals import post_delete, post_save
+
+from geeks_crm import side_effects
+from . import student_summary
+
+
+# Manba model -> StudentSummary bo'limi (modellar ilovalar yuklanganda ulanadi)
+SUMMARY_SOURCES = {
+    'attendance.Attendance': 'attendance',
+    'homework.Homework': 'homework',
+    'gamification.StudentPoints': 'points',
+    'gamification.GroupRanking': 'rank',
+    'courses.StudentProgress': 'progress',
+    'gamification.StudentBadge': 'badges',
+}
+
+
+def summary_receiver(section):
+    def mark_summary(sender, instance, **kwargs):
+        """O'quvchi ko'rsatkichlari bo'limini iflos deb belgilash (commit dan keyin qayta hisoblanadi)"""
+        if instance.student_id:
+            side_effects.mark('student_summary', (instance.student_id, section))
+    return mark_summary
+
+
+for sender, section in SUMMARY_SOURCES.items():
+    receiver = summary_receiver(section)
+    post_save.connect(receiver, sender=sender, weak=False, dispatch_uid=f'student_summary_save_{sender}')
+    post_delete.connect(receiver, sender=sender, weak=False, dispatch_uid=f'student_summary_delete_{sender}')
+
+
+@side_effects.handler('student_summary', order=30)
+def refresh_student_summaries(keys):
+    """
+    (student_id, bo'lim) kalitlari bo'yicha faqat o'zgargan bo'limlarni qayta hisoblash
+    (davomat statistikasi, ballar va badge lardan keyin ishlaydi)
+    """
+    by_section = defaultdict(set)
+    for student_id, section in keys:
+        by_section[section].add(student_id)
+    for section, student_ids in by_section.items():
+        student_summary.refresh(student_ids, [section])
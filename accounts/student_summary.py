@@ -0,0 +1,222 @@
+"""
+O'quvchi dashboard ko'rsatkichlari (StudentSummary)
+
+Har bir bo'lim o'z manbasidan guruhlangan so'rov bilan hisoblanadi:
+    attendance - joriy oy davomati (keldi / kech qoldi / kelmadi)
+    homework   - kutilayotgan va muddati o'tgan uy vazifalari
+    points     - barcha guruhlardagi jami ball va daraja
+    rank       - guruh reytinglaridagi eng yaxshi o'rin
+    progress   - kurslar bo'yicha o'rtacha progress
+    badges     - badge lar soni
+Manba modellari o'zgarganda (accounts.signals) faqat tegishli bo'lim, tranzaksiya oxirida
+bir marta, o'zgargan o'quvchilar uchun qayta hisoblanadi.
+
+Vaqtga bog'liq bo'limlar o'qishda tekshiriladi: oy almashsa davomat, eng yaqin muddat
+o'tib ketsa uy vazifa hisoblagichlari qayta hisoblanadi (get_summary).
+"""
+from collections import namedtuple
+from datetime import datetime, time
+
+from django.db.models import Avg, Count, Min, Q, Sum
+from django.utils import timezone
+
+from .models import StudentSummary, User
+
+
+MAX_LEVEL = 10
+POINTS_PER_LEVEL = 100
+REBUILD_CHUNK_SIZE = 500
+
+Section = namedtuple('Section', ['fields', 'load'])
+
+
+def level_for(points):
+    """Daraja: har 100 ball - bitta daraja (1..10)"""
+    return min(max(points, 0) // POINTS_PER_LEVEL + 1, MAX_LEVEL)
+
+
+def month_start(now):
+    return timezone.localtime(now).date().replace(day=1)
+
+
+def day_start(now):
+    return timezone.make_aware(datetime.combine(timezone.localtime(now).date(), time.min))
+
+
+def _attendance(student_ids, now):
+    from attendance.models import Attendance
+
+    month = month_start(now)
+    rows = {
+        row['student_id']: row
+        for row in Attendance.objects.filter(
+            student_id__in=student_ids, lesson__date__gte=month
+        ).values('student_id').annotate(
+            present=Count('id', filter=Q(status='present')),
+            late=Count('id', filter=Q(status='late')),
+            absent=Count('id', filter=Q(status='absent')),
+        ).order_by()
+    }
+    return {
+        student_id: {
+            'month': month,
+            'month_present': rows.get(student_id, {}).get('present', 0),
+            'month_late': rows.get(student_id, {}).get('late', 0),
+            'month_absent': rows.get(student_id, {}).get('absent', 0),
+        }
+        for student_id in student_ids
+    }
+
+
+def _homework(student_ids, now):
+    from homework.models import Homework
+
+    today = day_start(now)
+    rows = {
+        row['student_id']: row
+        for row in Homework.objects.filter(
+            student_id__in=student_ids, is_submitted=False
+        ).values('student_id').annotate(
+            pending=Count('id', filter=Q(deadline__gte=today)),
+            overdue=Count('id', filter=Q(deadline__lt=today)),
+            next_deadline=Min('deadline', filter=Q(deadline__gte=today)),
+        ).order_by()
+    }
+    return {
+        student_id: {
+            'pending_homeworks': rows.get(student_id, {}).get('pending', 0),
+            'overdue_homeworks': rows.get(student_id, {}).get('overdue', 0),
+            'next_deadline': rows.get(student_id, {}).get('next_deadline'),
+        }
+        for student_id in student_ids
+    }
+
+
+def _points(student_ids, now):
+    from gamification.models import StudentPoints
+
+    totals = dict(
+        StudentPoints.objects.filter(student_id__in=student_ids)
+        .values('student_id').annotate(total=Sum('total_points'))
+        .values_list('student_id', 'total').order_by()
+    )
+    return {
+        student_id: {'total_points': totals.get(student_id, 0), 'level': level_for(totals.get(student_id, 0))}
+        for student_id in student_ids
+    }
+
+
+def _rank(student_ids, now):
+    from gamification.models import GroupRanking
+
+    ranks = dict(
+        GroupRanking.objects.filter(student_id__in=student_ids)
+        .values('student_id').annotate(best=Min('rank'))
+        .values_list('student_id', 'best').order_by()
+    )
+    return {student_id: {'best_rank': ranks.get(student_id)} for student_id in student_ids}
+
+
+def _progress(student_ids, now):
+    from courses.models import StudentProgress
+
+    averages = dict(
+        StudentProgress.objects.filter(student_id__in=student_ids)
+        .values('student_id').annotate(avg=Avg('progress_percentage'))
+        .values_list('student_id', 'avg').order_by()
+    )
+    return {student_id: {'avg_progress': averages.get(student_id) or 0.0} for student_id in student_ids}
+
+
+def _badges(student_ids, now):
+    from gamification.models import StudentBadge
+
+    counts = dict(
+        StudentBadge.objects.filter(student_id__in=student_ids)
+        .values('student_id').annotate(count=Count('id'))
+        .values_list('student_id', 'count').order_by()
+    )
+    return {student_id: {'badge_count': counts.get(student_id, 0)} for student_id in student_ids}
+
+
+SECTIONS = {
+    'attendance': Section(['month', 'month_present', 'month_late', 'month_absent'], _attendance),
+    'homework': Section(['pending_homeworks', 'overdue_homeworks', 'next_deadline'], _homework),
+    'points': Section(['total_points', 'level'], _points),
+    'rank': Section(['best_rank'], _rank),
+    'progress': Section(['avg_progress'], _progress),
+    'badges': Section(['badge_count'], _badges),
+}
+
+
+def refresh(student_ids, sections=None, now=None, summaries=None):
+    """
+    Berilgan bo'limlarni (None - hammasi) o'quvchilar uchun qayta hisoblab saqlash.
+    {student_id: StudentSummary} qaytaradi (o'chirilgan o'quvchilar tashlab ketiladi)
+    """
+    student_ids = set(student_ids)
+    sections = list(SECTIONS) if sections is None else list(sections)
+    now = now or timezone.now()
+    if summaries is None:
+        summaries = {
+            summary.student_id: summary
+            for summary in StudentSummary.objects.filter(student_id__in=student_ids)
+        }
+    missing = student_ids - set(summaries)
+    if missing:
+        # Yangi yozuv uchun barcha bo'limlar hisoblanadi
+        sections = list(SECTIONS)
+        missing &= set(User.objects.filter(pk__in=missing).values_list('pk', flat=True))
+        student_ids = set(summaries) | missing
+
+    fields = ['updated_at']
+    values = {}
+    for name in sections:
+        section = SECTIONS[name]
+        fields.extend(section.fields)
+        for student_id, row in section.load(student_ids, now).items():
+            values.setdefault(student_id, {}).update(row)
+
+    result, to_create, to_update = {}, [], []
+    for student_id in student_ids:
+        summary = summaries.get(student_id) or StudentSummary(student_id=student_id)
+        for field, value in values.get(student_id, {}).items():
+            setattr(summary, field, value)
+        summary.updated_at = now
+        (to_update if summary.pk else to_create).append(summary)
+        result[student_id] = summary
+
+    StudentSummary.objects.bulk_create(to_create, ignore_conflicts=True)
+    StudentSummary.objects.bulk_update(to_update, fields)
+    return result
+
+
+def stale_sections(summary, now):
+    """Vaqt o'tgani sababli eskirgan bo'limlar"""
+    sections = []
+    if summary.month != month_start(now):
+        sections.append('attendance')
+    if summary.next_deadline and summary.next_deadline < day_start(now):
+        sections.append('homework')
+    return sections
+
+
+def get_summary(student, now=None):
+    """O'quvchi ko'rsatkichlari (yo'q yoki eskirgan bo'lsa shu yerda hisoblanadi)"""
+    now = now or timezone.now()
+    summary = StudentSummary.objects.filter(student=student).first()
+    if summary is None:
+        return refresh([student.pk], now=now)[student.pk]
+    sections = stale_sections(summary, now)
+    if sections:
+        summary = refresh([student.pk], sections, now, summaries={student.pk: summary})[student.pk]
+    return summary
+
+
+def rebuild_all(now=None):
+    """Barcha o'quvchilar ko'rsatkichlarini qayta hisoblash; o'quvchilar sonini qaytaradi"""
+    now = now or timezone.now()
+    student_ids = list(User.objects.filter(role='student').order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(student_ids), REBUILD_CHUNK_SIZE):
+        refresh(student_ids[start:start + REBUILD_CHUNK_SIZE], now=now)
+    return len(student_ids)
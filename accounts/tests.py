@@ -1,3 +1,254 @@
-from django.test import TestCase
+from datetime import date, datetime, time, timedelta
+from io import StringIO
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext
+from django.test import TestCase, RequestFactory, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import student_summary
+from .access import AccessContext, get_access
+from .pagination import KeysetPaginator
+from .models import User, Branch, StudentSummary
+from attendance.models import Attendance
+from courses.models import Course, Group, Lesson
+from crm.models import Lead, SalesProfile
+from gamification.models import Badge, StudentBadge, StudentPoints
+from homework.models import Homework
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+UNREACHABLE_REDIS_URL = 'redis://127.0.0.1:1/0'
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class AccessContextTestCase(TestCase):
+    """Test the request-scoped access context"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.branch = Branch.objects.create(name='Branch 1')
+        self.other_branch = Branch.objects.create(name='Branch 2')
+        course = Course.objects.create(name='Course', branch=self.branch)
+        self.mentor = User.objects.create_user(username='mentor', password='mentor123', role='mentor')
+        self.student = User.objects.create_user(username='student', password='student123', role='student')
+        self.groups = [
+            Group.objects.create(course=course, name=f'G{i}', mentor=self.mentor if i else None,
+                                 start_time=time(10, 0), end_time=time(12, 0))
+            for i in range(3)
+        ]
+        self.groups[0].students.add(self.student)
+
+        self.sales_manager = User.objects.create_user(username='salesmanager', password='sales123',
+                                                      role='sales_manager')
+        SalesProfile.objects.bulk_create([SalesProfile(user=self.sales_manager, branch=self.branch)])
+        Lead.objects.bulk_create([
+            Lead(name='Lead 1', phone='+998900000001', branch=self.branch),
+            Lead(name='Lead 2', phone='+998900000002', branch=self.other_branch),
+        ])
+
+    def test_group_ids_loaded_once(self):
+        """Group IDs are resolved with one query and reused"""
+        access = AccessContext(self.mentor)
+        with self.assertNumQueries(1):
+            self.assertEqual(sorted(access.group_ids), [self.groups[1].pk, self.groups[2].pk])
+            access.scope_groups(Group.objects.all(), 'pk')
+            self.assertTrue(access.can_manage_group(self.groups[1].pk))
+            self.assertFalse(access.can_manage_group(self.groups[0].pk))
+
+        access = AccessContext(self.student)
+        self.assertEqual(list(access.scope_groups(Group.objects.all(), 'pk')), [self.groups[0]])
+        self.assertIsNone(AccessContext(self.sales_manager).group_ids)
+
+    def test_branch_scope(self):
+        """Sales managers are scoped to their profile's branch with one query"""
+        access = AccessContext(self.sales_manager)
+        with self.assertNumQueries(1):
+            self.assertEqual(access.branch_id, self.branch.pk)
+            self.assertEqual(access.branch, self.branch)
+            self.assertEqual(self.sales_manager.sales_profile.branch, self.branch)
+        self.assertEqual(list(access.scope_branch(Lead.objects.all()).values_list('name', flat=True)), ['Lead 1'])
+        self.assertIsNone(AccessContext(self.mentor).branch_id)
+
+    def test_get_access_without_middleware(self):
+        """get_access builds the context when middleware did not run"""
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        access = get_access(request)
+        self.assertFalse(access.is_authenticated)
+        self.assertIs(get_access(request), access)
+
+        request.user = self.student
+        self.assertTrue(get_access(request).is_student)
+
+    def test_lead_list_uses_branch_scope(self):
+        """Lead list for a sales manager only shows the branch's leads"""
+        self.client.login(username='salesmanager', password='sales123')
+        response = self.client.get(reverse('crm:lead_list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([lead.name for lead in response.context['leads']], ['Lead 1'])
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class KeysetPaginationTestCase(TestCase):
+    """Test cursor pagination against plain ORM ordering"""
+
+    def setUp(self):
+        """Set up test data"""
+        Lead.objects.bulk_create([Lead(name=f'Lead {i}', phone=f'+9989000{i:05d}') for i in range(23)])
+        base = timezone.make_aware(datetime(2026, 1, 1, 9, 0))
+        for i, lead in enumerate(Lead.objects.order_by('pk')):
+            # Vaqt bo'yicha tenglar ham bo'lsin - id ularni ajratadi
+            Lead.objects.filter(pk=lead.pk).update(
+                created_at=base + timedelta(minutes=i // 3),
+                trial_date=date(2026, 2, 1) + timedelta(days=i % 4) if i % 5 else None,
+            )
+
+    def walk(self, paginator):
+        """Follow next cursors, then previous cursors back to the start"""
+        pages = [paginator.page()]
+        while pages[-1].has_next():
+            pages.append(paginator.page(after=pages[-1].next_cursor))
+        backwards = [pages[-1]]
+        while backwards[-1].has_previous():
+            backwards.append(paginator.page(before=backwards[-1].previous_cursor))
+        return pages, backwards[::-1]
+
+    def assert_matches_orm(self, ordering):
+        expected = list(Lead.objects.order_by(*ordering).values_list('pk', flat=True))
+        pages, backwards = self.walk(KeysetPaginator(Lead.objects.all(), 5, ordering + ['-id']))
+        self.assertEqual([lead.pk for page in pages for lead in page], expected)
+        self.assertEqual([[lead.pk for lead in page] for page in backwards],
+                         [[lead.pk for lead in page] for page in pages])
+        self.assertFalse(pages[0].has_previous())
+
+    def test_pages_follow_orm_ordering(self):
+        """Forward and backward walks see every row once, ties broken by id"""
+        self.assert_matches_orm(['-created_at'])
+
+    def test_nullable_field_sorts_last(self):
+        """Rows with an empty ordering field come after all others"""
+        ordering = [F('trial_date').desc(nulls_last=True), '-id']
+        expected = list(Lead.objects.order_by(*ordering).values_list('pk', flat=True))
+        pages, backwards = self.walk(KeysetPaginator(Lead.objects.all(), 4, ['-trial_date', '-id']))
+        self.assertEqual([lead.pk for page in pages for lead in page], expected)
+        self.assertEqual([[lead.pk for lead in page] for page in backwards],
+                         [[lead.pk for lead in page] for page in pages])
+
+    def test_count_is_estimated_above_limit(self):
+        """Large results report a cached count instead of counting on every request"""
+        self.assertEqual(KeysetPaginator(Lead.objects.all(), 5, ['-created_at', '-id']).count, 23)
+        paginator = KeysetPaginator(Lead.objects.all(), 5, ['-created_at', '-id'], exact_count_limit=10)
+        self.assertEqual(paginator.count, 23)
+        self.assertTrue(paginator.count_is_estimate)
+
+        Lead.objects.bulk_create([Lead(name='New lead', phone='+998901111111')])
+        cached = KeysetPaginator(Lead.objects.all(), 5, ['-created_at', '-id'], exact_count_limit=10)
+        self.assertEqual(cached.count, 23)
+
+    def test_lead_table_links_keep_filters(self):
+        """Next links carry the cursor and the active filters; bad cursors are 404"""
+        admin = User.objects.create_user(username='admin', password='admin123', role='admin')
+        self.client.force_login(admin)
+        url = reverse('crm:lead_table')
+        response = self.client.get(url, {'source': ''})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['leads']), 23)
+
+        Lead.objects.bulk_create([Lead(name=f'Extra {i}', phone=f'+9989100{i:05d}') for i in range(40)])
+        response = self.client.get(url, {'source': ''})
+        page = response.context['page_obj']
+        self.assertTrue(page.has_next())
+        params = parse_qs(urlparse(page.next_url).query, keep_blank_values=True)
+        self.assertEqual(params['source'], [''])
+
+        response = self.client.get(url, {'source': '', 'after': params['after'][0]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['leads']), 13)
+        self.assertFalse(response.context['page_obj'].has_next())
+        self.assertEqual(self.client.get(url, {'after': 'not-a-cursor'}).status_code, 404)
+
+
+@override_settings(CACHES=LOCMEM_CACHE, LEADERBOARD_REDIS_URL=UNREACHABLE_REDIS_URL)
+class StudentSummaryTestCase(TestCase):
+    """Test the precomputed student dashboard summary"""
+
+    def setUp(self):
+        """Set up test data"""
+        branch = Branch.objects.create(name='Branch 1')
+        course = Course.objects.create(name='Course', branch=branch)
+        self.group = Group.objects.create(course=course, name='G1', start_time=time(10, 0), end_time=time(12, 0))
+        self.student = User.objects.create_user(username='student', password='student123', role='student')
+        self.group.students.add(self.student)
+
+    def lesson(self, day):
+        return Lesson.objects.create(group=self.group, date=day, start_time=time(10, 0), end_time=time(12, 0))
+
+    def homeworks(self, lesson, deadlines):
+        Homework.objects.bulk_create([
+            Homework(lesson=lesson, student=self.student, deadline=deadline) for deadline in deadlines
+        ])
+
+    def test_signals_update_sections(self):
+        """Attendance and points changes refresh the summary after commit"""
+        with self.captureOnCommitCallbacks(execute=True):
+            lesson = self.lesson(timezone.localdate())
+        summary = StudentSummary.objects.get(student=self.student)
+        self.assertEqual((summary.month_present, summary.month_absent), (0, 1))
+        self.assertEqual(summary.total_points, -5)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            attendance = Attendance.objects.get(lesson=lesson, student=self.student)
+            attendance.status = 'present'
+            attendance.save(update_fields=['status'])
+        summary.refresh_from_db()
+        self.assertEqual((summary.month_present, summary.month_absent), (1, 0))
+        self.assertEqual(summary.month_attendance_percentage, 100)
+        self.assertEqual((summary.total_points, summary.level), (5, 1))
+
+    def test_time_based_sections_refresh_on_read(self):
+        """A new month or a passed deadline recomputes the affected counters"""
+        now = timezone.now()
+        lesson = self.lesson(timezone.localdate())
+        self.homeworks(lesson, [now + timedelta(days=1), now + timedelta(days=10)])
+        month_ago = now - timedelta(days=40)
+        summary = student_summary.refresh([self.student.pk], now=now)[self.student.pk]
+        self.assertEqual((summary.pending_homeworks, summary.overdue_homeworks), (2, 0))
+        StudentSummary.objects.filter(student=self.student).update(month=month_ago.date().replace(day=1))
+
+        later = now + timedelta(days=3)
+        with self.assertNumQueries(4):
+            summary = student_summary.get_summary(self.student, later)
+        self.assertEqual((summary.pending_homeworks, summary.overdue_homeworks), (1, 1))
+        self.assertEqual(summary.month, student_summary.month_start(later))
+        self.assertEqual(student_summary.stale_sections(summary, later), [])
+
+    def test_dashboard_query_count(self):
+        """The dashboard reads counters from the summary and does not grow with data"""
+        self.client.force_login(self.student)
+        url = reverse('accounts:student_dashboard')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        baseline = len(queries)
+
+        now = timezone.now()
+        badge = Badge.objects.create(name='Top', badge_type='top_student')
+        StudentBadge.objects.create(student=self.student, badge=badge, group=self.group)
+        StudentPoints.objects.create(student=self.student, group=self.group, total_points=250)
+        for i in range(3):
+            self.homeworks(self.lesson(timezone.localdate() - timedelta(days=i)), [now + timedelta(days=i + 1)])
+        call_command('rebuild_student_summaries', stdout=StringIO())
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(len(queries), baseline)
+        self.assertEqual(response.context['my_points'], 250)
+        self.assertEqual(response.context['my_level'], 3)
+        self.assertEqual(response.context['pending_homeworks_count'], 3)
+        self.assertEqual(response.context['my_badge_count'], 1)
+        self.assertEqual(response.context['my_attendance_count'], 3)
@@ -6,3 +6,5 @@ class AnalyticsConfig(AppConfig):
     name = 'analytics'
     verbose_name = 'Analytics'
 
+    def ready(self):
+        import analytics.signals  # noqa
@@ -0,0 +1,24 @@
+"""
+Kesh hit/miss hisoblanadigan Redis kesh backend (analytics.metrics so'rov o'lchovi uchun)
+"""
+from django.core.cache.backends.redis import RedisCache
+
+from . import metrics
+
+_MISSING = object()
+
+
+class InstrumentedRedisCache(RedisCache):
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version)
+        if value is _MISSING:
+            metrics.record_cache(misses=1)
+            return default
+        metrics.record_cache(hits=1)
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        values = super().get_many(keys, version)
+        metrics.record_cache(hits=len(values), misses=len(keys) - len(values))
+        return values
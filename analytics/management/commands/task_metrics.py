@@ -0,0 +1,46 @@
+"""
+Django management command: Celery vazifalari o'lchovi
+Usage: python manage.py task_metrics [--failing]
+Har bir vazifa uchun oxirgi ishga tushishlar bo'yicha davomiylik, so'rovlar, o'zgargan qatorlar,
+xatolar va ustma-ust ishlashlar (ma'lumot analytics.signals orqali Redis da yig'iladi).
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from analytics import task_metrics
+
+
+class Command(BaseCommand):
+    help = "Celery vazifalari: davomiylik, SQL so'rovlar, o'zgargan qatorlar, xatolar va ustma-ust ishlashlar"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--failing', action='store_true', help="Faqat xato yoki ustma-ust ishlagan vazifalar")
+
+    def handle(self, *args, **options):
+        try:
+            rows = task_metrics.summary()
+        except Exception as e:
+            raise CommandError(f"O'lchov ma'lumotlari mavjud emas: {e}")
+        if options['failing']:
+            rows = [row for row in rows if row['recent_failures'] or row['recent_overlaps']]
+        if not rows:
+            self.stdout.write("Ma'lumot yo'q")
+            return
+
+        self.stdout.write(
+            f"{'vazifa':<55} {'oraliq':>7} {'soni':>5} {'p50':>8} {'p95':>8} {'max':>8} "
+            f"{'sql p95':>7} {'qatorlar':>8} {'xato':>5} {'ustma-ust':>9} {'birlashdi':>9} {'band':>5}"
+        )
+        for row in rows:
+            interval = f"{row['interval']:.0f}s" if row['interval'] else '-'
+            lock = row['lock'] or {'coalesced': '-', 'skipped': '-'}
+            line = (
+                f"{row['task']:<55} {interval:>7} {row['recent']:>5} "
+                f"{row['p50_duration']:>7.2f}s {row['p95_duration']:>7.2f}s {row['max_duration']:>7.2f}s "
+                f"{row['p95_queries']:>7} {row['avg_rows']:>8.0f} "
+                f"{row['recent_failures']:>5} {row['recent_overlaps']:>9} {lock['coalesced']:>9} {lock['skipped']:>5}"
+            )
+            if row['last_failed'] or row['running'] > 1:
+                line = self.style.ERROR(line)
+            elif row['recent_failures'] or row['recent_overlaps']:
+                line = self.style.WARNING(line)
+            self.stdout.write(line)
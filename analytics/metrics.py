@@ -0,0 +1,178 @@
+"""
+So'rovlar o'lchovi: har bir view (URL nomi) uchun SQL so'rovlar soni, baza vaqti, kesh
+hit/miss va umumiy vaqt. Yig'ish - analytics.middleware.RequestMetricsMiddleware, kesh
+hisoblari - analytics.cache.InstrumentedRedisCache.
+
+Namunalar Redis da daqiqalik ro'yxatlarda saqlanadi (reqmetrics:<view>:<daqiqa>), WINDOW_MINUTES
+dan eskilari o'z-o'zidan o'chadi; p50/p95 shu oyna bo'yicha o'qishda hisoblanadi.
+
+View so'rovlar chegarasini e'lon qilishi mumkin:
+    class GroupListView(LoginRequiredMixin, ListView):
+        query_budget = 6
+Chegaradan oshsa ogohlantirish yoziladi, QUERY_BUDGET_STRICT=True bo'lsa (testlarda) xato.
+"""
+import contextvars
+import logging
+import math
+import time
+
+from django.conf import settings
+
+from geeks_crm.redis_clients import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+KEY_PREFIX = 'reqmetrics'
+VIEWS_KEY = f'{KEY_PREFIX}:views'
+BUCKET_SECONDS = 60
+WINDOW_MINUTES = 60
+SAMPLES_PER_BUCKET = 500
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class RequestMetrics:
+    """Bitta so'rov davomida yig'iladigan ko'rsatkichlar"""
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    @property
+    def total_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    @property
+    def db_ms(self):
+        return self.db_time * 1000
+
+    def record_query(self, execute, sql, params, many, context):
+        """connection.execute_wrapper uchun"""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - started
+
+
+def start():
+    """Joriy kontekst uchun yangi o'lchov (token - finish() ga)"""
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def finish(token):
+    _current.reset(token)
+
+
+def record_cache(hits=0, misses=0):
+    """Kesh o'qishlari (o'lchov bo'lmasa - masalan Celery da - hech narsa qilmaydi)"""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.cache_hits += hits
+        metrics.cache_misses += misses
+
+
+def check_budget(view_name, budget, queries):
+    if budget is None or queries <= budget:
+        return
+    message = f"Query budget exceeded for {view_name}: {queries} queries (budget {budget})"
+    if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+def _bucket_key(view_name, bucket):
+    return f'{KEY_PREFIX}:{view_name}:{bucket}'
+
+
+def record(view_name, metrics, status_code, budget=None):
+    """Namunani Redis ga yozish (bitta pipeline). Xato bo'lsa faqat log"""
+    now = time.time()
+    sample = (
+        f'{metrics.total_ms:.2f},{metrics.queries},{metrics.db_ms:.2f},'
+        f'{metrics.cache_hits},{metrics.cache_misses},{status_code},{"" if budget is None else budget}'
+    )
+    key = _bucket_key(view_name, int(now // BUCKET_SECONDS))
+    try:
+        pipe = get_redis('metrics').pipeline(transaction=False)
+        pipe.rpush(key, sample)
+        pipe.ltrim(key, -SAMPLES_PER_BUCKET, -1)
+        pipe.expire(key, (WINDOW_MINUTES + 1) * BUCKET_SECONDS)
+        pipe.zadd(VIEWS_KEY, {view_name: now})
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Error recording request metrics: {e}")
+
+
+def percentile(values, fraction):
+    """Tartiblangan ro'yxatdan nearest-rank persentil"""
+    if not values:
+        return 0
+    return values[max(math.ceil(len(values) * fraction) - 1, 0)]
+
+
+def _parse(sample):
+    total_ms, queries, db_ms, hits, misses, status, budget = sample.decode().split(',')
+    return float(total_ms), int(queries), float(db_ms), int(hits), int(misses), int(status), budget
+
+
+def summary(window_minutes=WINDOW_MINUTES):
+    """
+    Oxirgi window_minutes daqiqa bo'yicha har bir view ko'rsatkichlari (p95 vaqt bo'yicha kamayish)
+    Qaytaradi: [{'view', 'count', 'p50_ms', 'p95_ms', 'p50_queries', 'p95_queries', 'max_queries',
+                 'p50_db_ms', 'p95_db_ms', 'cache_hit_rate', 'errors', 'budget', 'over_budget'}]
+    """
+    window_minutes = min(window_minutes, WINDOW_MINUTES)
+    now = time.time()
+    client = get_redis('metrics')
+    client.zremrangebyscore(VIEWS_KEY, '-inf', now - WINDOW_MINUTES * BUCKET_SECONDS)
+    views = [view.decode() for view in client.zrangebyscore(VIEWS_KEY, now - window_minutes * BUCKET_SECONDS, '+inf')]
+    if not views:
+        return []
+
+    last_bucket = int(now // BUCKET_SECONDS)
+    buckets = range(last_bucket - window_minutes + 1, last_bucket + 1)
+    pipe = client.pipeline(transaction=False)
+    for view in views:
+        for bucket in buckets:
+            pipe.lrange(_bucket_key(view, bucket), 0, -1)
+    results = iter(pipe.execute())
+
+    rows = []
+    for view in views:
+        samples = [_parse(sample) for _ in buckets for sample in next(results)]
+        if not samples:
+            continue
+        times = sorted(sample[0] for sample in samples)
+        queries = sorted(sample[1] for sample in samples)
+        db_times = sorted(sample[2] for sample in samples)
+        hits = sum(sample[3] for sample in samples)
+        reads = hits + sum(sample[4] for sample in samples)
+        budget = samples[-1][6]
+        budget = int(budget) if budget else None
+        rows.append({
+            'view': view,
+            'count': len(samples),
+            'p50_ms': percentile(times, 0.5),
+            'p95_ms': percentile(times, 0.95),
+            'p50_queries': percentile(queries, 0.5),
+            'p95_queries': percentile(queries, 0.95),
+            'max_queries': queries[-1],
+            'p50_db_ms': percentile(db_times, 0.5),
+            'p95_db_ms': percentile(db_times, 0.95),
+            'cache_hit_rate': hits / reads * 100 if reads else None,
+            'errors': sum(1 for sample in samples if sample[5] >= 500),
+            'budget': budget,
+            'over_budget': budget is not None and queries[-1] > budget,
+        })
+    rows.sort(key=lambda row: -row['p95_ms'])
+    return rows
@@ -0,0 +1,47 @@
+"""
+So'rovlar o'lchovi middleware (analytics.metrics)
+"""
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+
+
+class RequestMetricsMiddleware:
+    """
+    Har bir so'rov uchun SQL so'rovlar soni, baza vaqti, kesh hit/miss va umumiy vaqtni o'lchaydi,
+    view ning query_budget chegarasini tekshiradi va namunani URL nomi bo'yicha Redis ga yozadi.
+    Javobga Server-Timing sarlavhasi qo'shiladi (brauzer DevTools da ko'rinadi).
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.query_budget = None
+        current, token = metrics.start()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(current.record_query))
+                response = self.get_response(request)
+        finally:
+            metrics.finish(token)
+
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return response
+
+        response['Server-Timing'] = (
+            f'db;dur={current.db_ms:.1f};desc="{current.queries} queries", total;dur={current.total_ms:.1f}'
+        )
+        if getattr(settings, 'REQUEST_METRICS_RECORD', False):
+            metrics.record(match.view_name, current, response.status_code, request.query_budget)
+        metrics.check_budget(match.view_name, request.query_budget, current.queries)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view = getattr(view_func, 'view_class', view_func)
+        request.query_budget = getattr(view, 'query_budget', None)
+        return None
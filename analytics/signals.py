@@ -0,0 +1,19 @@
+"""
+Celery vazifalari o'lchovi signallari (analytics.task_metrics)
+"""
+from celery.signals import task_postrun, task_prerun
+from django.conf import settings
+
+from . import task_metrics
+
+
+@task_prerun.connect
+def start_task_metrics(sender=None, task_id=None, task=None, **kwargs):
+    if getattr(settings, 'TASK_METRICS_RECORD', False):
+        task_metrics.start(task_id, task.name)
+
+
+@task_postrun.connect
+def finish_task_metrics(sender=None, task_id=None, task=None, state=None, **kwargs):
+    # IGNORED - SingletonTask qulf band bo'lgani uchun ishlamagan (geeks_crm.task_locks)
+    task_metrics.finish(task_id, failed=state == 'FAILURE', skipped=state == 'IGNORED')
@@ -0,0 +1,276 @@
+"""
+Celery vazifalari o'lchovi
+Har bir ishga tushish uchun: davomiyligi, SQL so'rovlar soni va vaqti, o'zgargan qatorlar
+(INSERT/UPDATE/DELETE rowcount), xatolar (ko'tarilgan istisno yoki vazifa ichida yozilgan
+ERROR loglar - vazifalar istisnolarni ushlab faqat log yozadi) va ustma-ust ishlash:
+- shu vazifaning boshqa nusxasi hali ishlayotgan bo'lsa
+- davomiyligi beat jadvalidagi oraliqdan uzun bo'lsa
+
+Yig'ish - task_prerun/task_postrun signallari (analytics.signals), saqlash - Redis
+(geeks_crm.redis_clients.get_redis('metrics')): har bir vazifaning oxirgi RECENT_RUNS ta ishga tushishi va
+umumiy hisoblagichlar. Ko'rish: /analytics/tasks/ yoki python manage.py task_metrics
+"""
+import copy
+import json
+import logging
+import threading
+import time
+from contextlib import ExitStack
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from geeks_crm import task_locks
+from geeks_crm.redis_clients import get_redis
+
+from .metrics import percentile
+
+logger = logging.getLogger(__name__)
+
+
+KEY_PREFIX = 'taskmetrics'
+TASKS_KEY = f'{KEY_PREFIX}:tasks'
+RECENT_RUNS = 100
+RUNNING_TTL = 24 * 3600
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE')
+
+_runs = {}
+_intervals = None
+
+
+class TaskRun:
+    """Bitta vazifa ishga tushishi davomida yig'iladigan ko'rsatkichlar"""
+    def __init__(self, task_id, name):
+        self.task_id = task_id
+        self.name = name
+        self.started_at = timezone.now()
+        self.started = time.perf_counter()
+        self.thread_id = threading.get_ident()
+        self.queries = 0
+        self.db_time = 0.0
+        self.rows = 0
+        self.errors = 0
+        self.concurrent = False
+        self.counted = False
+        self._stack = ExitStack()
+        self._error_counter = _ErrorCounter(self)
+
+    def record_query(self, execute, sql, params, many, context):
+        """connection.execute_wrapper uchun"""
+        started = time.perf_counter()
+        try:
+            result = execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - started
+        statement = sql.lstrip()[:6].upper()
+        if statement in WRITE_STATEMENTS:
+            rowcount = getattr(context['cursor'], 'rowcount', -1)
+            if rowcount is not None and rowcount > 0:
+                self.rows += rowcount
+            elif statement == 'INSERT':
+                # SQLite da INSERT ... RETURNING qatorlari o'qilmaguncha rowcount noma'lum
+                self.rows += len(params) if many else 1
+        return result
+
+    def open(self):
+        """So'rovlar va ERROR loglarni sanashni boshlash"""
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self.record_query))
+        logging.getLogger().addHandler(self._error_counter)
+
+    def close(self):
+        logging.getLogger().removeHandler(self._error_counter)
+        self._stack.close()
+
+    @property
+    def duration(self):
+        return time.perf_counter() - self.started
+
+
+class _ErrorCounter(logging.Handler):
+    """Vazifa oqimida yozilgan ERROR va undan yuqori loglarni sanaydi"""
+    def __init__(self, run):
+        super().__init__(logging.ERROR)
+        self.run = run
+
+    def emit(self, record):
+        if record.thread == self.run.thread_id:
+            self.run.errors += 1
+
+
+def schedule_interval(schedule):
+    """Beat jadvalida ketma-ket ikki ishga tushish orasidagi vaqt (soniya), aniqlab bo'lmasa None"""
+    run_every = getattr(schedule, 'run_every', None)
+    if run_every is not None:
+        return run_every.total_seconds()
+    if not hasattr(schedule, 'remaining_estimate'):
+        return None
+    now = timezone.now()
+    first = now + schedule.remaining_estimate(now)
+    # Birinchi ishga tushish vaqtidan qaralganda keyingisi
+    following = copy.copy(schedule)
+    following.nowfun = lambda: first
+    return round(following.remaining_estimate(first + timedelta(minutes=1)).total_seconds())
+
+
+def task_intervals():
+    """{vazifa nomi: oraliq soniyada} (CELERY_BEAT_SCHEDULE dan, jarayon bo'yicha bir marta)"""
+    global _intervals
+    if _intervals is None:
+        intervals = {}
+        for entry in getattr(settings, 'CELERY_BEAT_SCHEDULE', {}).values():
+            try:
+                interval = schedule_interval(entry['schedule'])
+            except Exception as e:
+                logger.warning(f"Cannot compute schedule interval for {entry.get('task')}: {e}")
+                continue
+            if interval:
+                intervals[entry['task']] = min(interval, intervals.get(entry['task'], interval))
+        _intervals = intervals
+    return _intervals
+
+
+def _running_key(name):
+    return f'{KEY_PREFIX}:running:{name}'
+
+
+def _runs_key(name):
+    return f'{KEY_PREFIX}:runs:{name}'
+
+
+def _totals_key(name):
+    return f'{KEY_PREFIX}:totals:{name}'
+
+
+def start(task_id, name):
+    """task_prerun: o'lchovni boshlash va ishlayotgan nusxalarni hisoblash"""
+    run = TaskRun(task_id, name)
+    run.open()
+    _runs[task_id] = run
+    try:
+        pipe = get_redis('metrics').pipeline()
+        pipe.incr(_running_key(name))
+        pipe.expire(_running_key(name), RUNNING_TTL)
+        running, _ = pipe.execute()
+        run.counted = True
+        run.concurrent = running > 1
+    except Exception as e:
+        logger.warning(f"Error reading task metrics for {name}: {e}")
+    return run
+
+
+def finish(task_id, failed=False, skipped=False):
+    """task_postrun: o'lchovni yakunlash va Redis ga yozish (skipped - namuna yozilmaydi)"""
+    run = _runs.pop(task_id, None)
+    if run is None:
+        return None
+    run.close()
+    if skipped:
+        if run.counted:
+            try:
+                get_redis('metrics').decr(_running_key(run.name))
+            except Exception as e:
+                logger.warning(f"Error recording task metrics for {run.name}: {e}")
+        return None
+    duration = run.duration
+    interval = task_intervals().get(run.name)
+    sample = {
+        'task_id': run.task_id,
+        'started_at': run.started_at.isoformat(),
+        'duration': round(duration, 3),
+        'queries': run.queries,
+        'db_time': round(run.db_time, 3),
+        'rows': run.rows,
+        'errors': run.errors,
+        'failed': failed or run.errors > 0,
+        'overlapped': run.concurrent or (interval is not None and duration > interval),
+    }
+    try:
+        pipe = get_redis('metrics').pipeline()
+        if run.counted:
+            pipe.decr(_running_key(run.name))
+        pipe.lpush(_runs_key(run.name), json.dumps(sample))
+        pipe.ltrim(_runs_key(run.name), 0, RECENT_RUNS - 1)
+        pipe.hincrby(_totals_key(run.name), 'runs', 1)
+        if sample['failed']:
+            pipe.hincrby(_totals_key(run.name), 'failures', 1)
+        if sample['overlapped']:
+            pipe.hincrby(_totals_key(run.name), 'overlaps', 1)
+        pipe.zadd(TASKS_KEY, {run.name: time.time()})
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Error recording task metrics for {run.name}: {e}")
+    return sample
+
+
+def _lock_row(counters):
+    if counters is None:
+        return None
+    waited = counters.get('waited', 0)
+    return {
+        'coalesced': counters.get('coalesced', 0),
+        'skipped': counters.get('skipped', 0),
+        'reruns': counters.get('reruns', 0),
+        'waited': waited,
+        'avg_wait_ms': counters.get('wait_ms', 0) / waited if waited else 0,
+    }
+
+
+def summary():
+    """
+    Har bir vazifa bo'yicha ko'rsatkichlar (oxirgi RECENT_RUNS ishga tushish va umumiy hisoblagichlar)
+    va qulf statistikasi (geeks_crm.task_locks, qulfsiz vazifalar uchun lock - None)
+    Qaytaradi: [{'task', 'interval', 'last_run', 'running', 'recent', 'p50_duration', 'p95_duration',
+                 'max_duration', 'p95_queries', 'avg_rows', 'recent_failures', 'recent_overlaps',
+                 'runs', 'failures', 'overlaps', 'last_failed', 'lock'}]
+    lock: {'coalesced', 'skipped', 'reruns', 'waited', 'avg_wait_ms'}
+    """
+    client = get_redis('metrics')
+    intervals = task_intervals()
+    try:
+        locks = task_locks.stats()
+    except Exception as e:
+        logger.warning(f"Task lock stats unavailable: {e}")
+        locks = {}
+    names = sorted({name.decode() for name in client.zrange(TASKS_KEY, 0, -1)} | set(intervals) | set(locks))
+    if not names:
+        return []
+
+    pipe = client.pipeline(transaction=False)
+    for name in names:
+        pipe.lrange(_runs_key(name), 0, -1)
+        pipe.hgetall(_totals_key(name))
+        pipe.get(_running_key(name))
+    results = iter(pipe.execute())
+
+    rows = []
+    for name in names:
+        samples = [json.loads(sample) for sample in next(results)]
+        totals = {key.decode(): int(value) for key, value in next(results).items()}
+        running = int(next(results) or 0)
+        durations = sorted(sample['duration'] for sample in samples)
+        queries = sorted(sample['queries'] for sample in samples)
+        rows.append({
+            'task': name,
+            'interval': intervals.get(name),
+            'last_run': samples[0]['started_at'] if samples else None,
+            'running': max(running, 0),
+            'recent': len(samples),
+            'p50_duration': percentile(durations, 0.5),
+            'p95_duration': percentile(durations, 0.95),
+            'max_duration': durations[-1] if durations else 0,
+            'p95_queries': percentile(queries, 0.95),
+            'avg_rows': sum(sample['rows'] for sample in samples) / len(samples) if samples else 0,
+            'recent_failures': sum(1 for sample in samples if sample['failed']),
+            'recent_overlaps': sum(1 for sample in samples if sample['overlapped']),
+            'runs': totals.get('runs', 0),
+            'failures': totals.get('failures', 0),
+            'overlaps': totals.get('overlaps', 0),
+            'last_failed': bool(samples) and samples[0]['failed'],
+            'lock': _lock_row(locks.get(name)),
+        })
+    rows.sort(key=lambda row: (-row['recent_failures'] - row['recent_overlaps'], -row['p95_duration']))
+    return rows
@@ -0,0 +1,169 @@
+import logging
+import os
+import socket
+from unittest import mock, skipUnless
+from urllib.parse import urlparse
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from celery.schedules import crontab
+
+from . import metrics, task_metrics
+from geeks_crm import task_locks
+from geeks_crm.redis_clients import get_redis
+from .metrics import QueryBudgetExceeded
+from exams.views import ExamListView
+
+User = get_user_model()
+
+TEST_REDIS_URL = os.environ.get('METRICS_TEST_REDIS_URL', 'redis://localhost:6379/15')
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def redis_available(url):
+    parsed = urlparse(url)
+    try:
+        socket.create_connection((parsed.hostname, parsed.port or 6379), timeout=0.5).close()
+        return True
+    except OSError:
+        return False
+
+
+@override_settings(CACHES=LOCMEM_CACHE, REQUEST_METRICS_RECORD=False)
+class RequestMetricsMiddlewareTestCase(TestCase):
+    """Test per-request query counting and view query budgets"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.admin = User.objects.create_user(username='admin', password='admin123', role='admin')
+        self.client.force_login(self.admin)
+        self.url = reverse('exams:exam_list')
+
+    def test_server_timing_header(self):
+        """Responses report DB time and query count"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", total;dur=[\d.]+$')
+
+    @override_settings(QUERY_BUDGET_STRICT=True)
+    def test_budget_exceeded_fails_in_strict_mode(self):
+        """A view running more queries than its budget raises in tests"""
+        with mock.patch.object(ExamListView, 'query_budget', 1):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get(self.url)
+
+    @override_settings(QUERY_BUDGET_STRICT=False)
+    def test_budget_exceeded_logs_otherwise(self):
+        """Outside strict mode an exceeded budget is only logged"""
+        with mock.patch.object(ExamListView, 'query_budget', 1):
+            with self.assertLogs('analytics.metrics', level='WARNING') as logs:
+                response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('exams:exam_list', logs.output[0])
+
+    def test_percentile(self):
+        """Nearest-rank percentiles"""
+        values = list(range(1, 101))
+        self.assertEqual(metrics.percentile(values, 0.5), 50)
+        self.assertEqual(metrics.percentile(values, 0.95), 95)
+        self.assertEqual(metrics.percentile([7], 0.95), 7)
+        self.assertEqual(metrics.percentile([], 0.5), 0)
+
+
+@skipUnless(redis_available(TEST_REDIS_URL), 'Redis is not available')
+@override_settings(CACHES=LOCMEM_CACHE, REQUEST_METRICS_RECORD=True, METRICS_REDIS_URL=TEST_REDIS_URL)
+class RequestMetricsStoreTestCase(TestCase):
+    """Test the rolling window kept in Redis and the admin page"""
+
+    def setUp(self):
+        """Set up test data"""
+        get_redis('metrics').flushdb()
+        self.admin = User.objects.create_user(username='admin', password='admin123', role='admin')
+        self.client.force_login(self.admin)
+
+    def test_summary_after_requests(self):
+        """Recorded requests show up with percentiles and the declared budget"""
+        for _ in range(3):
+            self.client.get(reverse('exams:exam_list'))
+        rows = {row['view']: row for row in metrics.summary(5)}
+        row = rows['exams:exam_list']
+        self.assertEqual(row['count'], 3)
+        self.assertEqual(row['budget'], ExamListView.query_budget)
+        self.assertFalse(row['over_budget'])
+        self.assertGreater(row['p50_queries'], 0)
+
+        response = self.client.get(reverse('analytics:request_metrics'), {'window': 5})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'exams:exam_list')
+
+
+@override_settings(CACHES=LOCMEM_CACHE, METRICS_REDIS_URL='redis://127.0.0.1:1/0')
+class TaskMetricsTestCase(TestCase):
+    """Test per-task query, row and error counting"""
+
+    def test_schedule_interval(self):
+        """Beat schedules are converted to seconds between runs"""
+        self.assertEqual(task_metrics.schedule_interval(crontab(minute='*/5')), 300)
+        self.assertEqual(task_metrics.schedule_interval(crontab(hour=9, minute=0)), 86400)
+        self.assertEqual(task_metrics.schedule_interval(600.0), None)
+
+    def test_run_counts_queries_rows_and_errors(self):
+        """Queries, written rows and logged errors are attributed to the run"""
+        with self.assertLogs('analytics.task_metrics', level='WARNING'):
+            task_metrics.start('task-1', 'tests.sample')
+        User.objects.create_user(username='u1', password='x')
+        User.objects.filter(username='u1').update(first_name='Ali')
+        list(User.objects.all())
+        logging.getLogger('tests.sample').error('boom')
+        with self.assertLogs('analytics.task_metrics', level='WARNING'):
+            sample = task_metrics.finish('task-1')
+        self.assertGreaterEqual(sample['queries'], 3)
+        self.assertEqual(sample['rows'], 2)
+        self.assertEqual(sample['errors'], 1)
+        self.assertTrue(sample['failed'])
+        self.assertFalse(sample['overlapped'])
+        self.assertIsNone(task_metrics.finish('task-1'))
+
+
+@skipUnless(redis_available(TEST_REDIS_URL), 'Redis is not available')
+@override_settings(CACHES=LOCMEM_CACHE, METRICS_REDIS_URL=TEST_REDIS_URL, TASK_LOCK_REDIS_URL=TEST_REDIS_URL)
+class TaskMetricsStoreTestCase(TestCase):
+    """Test task samples kept in Redis, overlap detection and the admin page"""
+
+    def setUp(self):
+        """Set up test data"""
+        get_redis('metrics').flushdb()
+        self.admin = User.objects.create_user(username='admin', password='admin123', role='admin')
+        self.client.force_login(self.admin)
+
+    def test_skipped_runs_and_lock_stats(self):
+        """Runs skipped by the task lock leave no sample; lock counters are merged in"""
+        task_metrics.start('a', 'tests.sample')
+        self.assertIsNone(task_metrics.finish('a', skipped=True))
+        task_locks.record('tests.sample', coalesced=3, waited=2, wait_ms=50)
+        row = {row['task']: row for row in task_metrics.summary()}['tests.sample']
+        self.assertEqual((row['runs'], row['running']), (0, 0))
+        self.assertEqual(row['lock']['coalesced'], 3)
+        self.assertEqual(row['lock']['avg_wait_ms'], 25)
+
+    def test_concurrent_runs_are_flagged(self):
+        """A run started while another copy is running counts as an overlap"""
+        task_metrics.start('a', 'tests.sample')
+        task_metrics.start('b', 'tests.sample')
+        second = task_metrics.finish('b')
+        first = task_metrics.finish('a', failed=True)
+        self.assertTrue(second['overlapped'])
+        self.assertFalse(first['overlapped'])
+
+        row = {row['task']: row for row in task_metrics.summary()}['tests.sample']
+        self.assertEqual(row['runs'], 2)
+        self.assertEqual(row['recent_overlaps'], 1)
+        self.assertEqual(row['failures'], 1)
+        self.assertTrue(row['last_failed'])
+        self.assertEqual(row['running'], 0)
+
+        response = self.client.get(reverse('analytics:task_metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'tests.sample')
@@ -9,5 +9,7 @@ urlpatterns = [
     path('branch/<int:branch_id>/', views.BranchStatisticsView.as_view(), name='branch_statistics_detail'),
     path('courses/', views.CourseStatisticsView.as_view(), name='course_statistics'),
     path('course/<int:course_id>/', views.CourseStatisticsView.as_view(), name='course_statistics_detail'),
+    path('requests/', views.RequestMetricsView.as_view(), name='request_metrics'),
+    path('tasks/', views.TaskMetricsView.as_view(), name='task_metrics'),
 ]
 
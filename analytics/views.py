@@ -1,3 +1,5 @@
+import logging
+
 from django.views.generic import TemplateView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.db.models import Count, Avg, Sum, Q
@@ -13,6 +15,9 @@ from gamification.models import StudentPoints, GroupRanking, BranchRanking, Over
 from crm.models import Lead, FollowUp
 from mentors.models import MentorKPI
 from finance.models import Contract, Payment, PaymentPlan, Debt, PaymentReminder
+from . import metrics, task_metrics
+
+logger = logging.getLogger(__name__)
 
 
 class StatisticsDashboardView(RoleRequiredMixin, TemplateView):
@@ -296,3 +301,45 @@ class CourseStatisticsView(RoleRequiredMixin, TemplateView):
         
         return context
 
+
+
+class RequestMetricsView(AdminRequiredMixin, TemplateView):
+    """
+    View lar bo'yicha so'rovlar soni va javob vaqti (p50/p95, Redis dagi oxirgi oyna)
+    """
+    template_name = 'analytics/request_metrics.html'
+    WINDOW_CHOICES = [5, 15, 60]
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        try:
+            window = int(self.request.GET.get('window', 60))
+        except ValueError:
+            window = 60
+        window = window if window in self.WINDOW_CHOICES else 60
+        context['window'] = window
+        context['window_choices'] = self.WINDOW_CHOICES
+        try:
+            context['rows'] = metrics.summary(window)
+        except Exception as e:
+            logger.warning(f"Request metrics unavailable: {e}")
+            context['rows'] = []
+            context['unavailable'] = True
+        return context
+
+
+class TaskMetricsView(AdminRequiredMixin, TemplateView):
+    """
+    Celery vazifalari: davomiylik, so'rovlar, o'zgargan qatorlar, xatolar va ustma-ust ishlashlar
+    """
+    template_name = 'analytics/task_metrics.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        try:
+            context['rows'] = task_metrics.summary()
+        except Exception as e:
+            logger.warning(f"Task metrics unavailable: {e}")
+            context['rows'] = []
+            context['unavailable'] = True
+        return context
@@ -1,20 +1,65 @@
 """
 Django signals for attendance app
 """
+from django.db.models import Count, Q
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from django.utils import timezone
+
+from geeks_crm import side_effects
 from .models import Attendance, AttendanceStatistics
 
 
+STATISTICS_FIELDS = ['total_lessons', 'present_count', 'late_count', 'absent_count', 'attendance_percentage', 'updated_at']
+
+
 @receiver(post_save, sender=Attendance)
 def update_attendance_statistics(sender, instance, **kwargs):
     """
-    Davomat o'zgarganda, statistikani avtomatik yangilash
+    Davomat o'zgarganda, statistikani yangilash (commit dan keyin, har bir o'quvchi-guruh uchun bir marta)
+    """
+    if instance.lesson and instance.lesson.group_id:
+        side_effects.mark('attendance_statistics', (instance.student_id, instance.lesson.group_id))
+
+
+@side_effects.handler('attendance_statistics')
+def recalculate_attendance_statistics(pairs):
     """
-    if instance.lesson and instance.lesson.group:
-        stats, created = AttendanceStatistics.objects.get_or_create(
-            student=instance.student,
-            group=instance.lesson.group
-        )
-        stats.calculate_statistics()
+    (student_id, group_id) juftliklari statistikasini bitta guruhlangan so'rov bilan qayta hisoblash
+    (AttendanceStatistics.calculate_statistics ning partiyaviy varianti)
+    """
+    student_ids = {student_id for student_id, _ in pairs}
+    group_ids = {group_id for _, group_id in pairs}
+    counts = {
+        (row['student_id'], row['lesson__group_id']): row
+        for row in Attendance.objects.filter(
+            student_id__in=student_ids, lesson__group_id__in=group_ids
+        ).values('student_id', 'lesson__group_id').annotate(
+            total=Count('id'),
+            present=Count('id', filter=Q(status='present')),
+            late=Count('id', filter=Q(status='late')),
+            absent=Count('id', filter=Q(status='absent')),
+        ).order_by()
+    }
+    existing = {
+        (stats.student_id, stats.group_id): stats
+        for stats in AttendanceStatistics.objects.filter(student_id__in=student_ids, group_id__in=group_ids)
+    }
+
+    now = timezone.now()
+    to_create, to_update = [], []
+    for student_id, group_id in pairs:
+        row = counts.get((student_id, group_id), {})
+        stats = existing.get((student_id, group_id)) or AttendanceStatistics(student_id=student_id, group_id=group_id)
+        stats.total_lessons = row.get('total', 0)
+        stats.present_count = row.get('present', 0)
+        stats.late_count = row.get('late', 0)
+        stats.absent_count = row.get('absent', 0)
+        # Keldi va kech qoldi hisobga olinadi
+        attended = stats.present_count + stats.late_count
+        stats.attendance_percentage = attended / stats.total_lessons * 100 if stats.total_lessons else 0.0
+        stats.updated_at = now
+        (to_update if stats.pk else to_create).append(stats)
 
+    AttendanceStatistics.objects.bulk_create(to_create, ignore_conflicts=True)
+    AttendanceStatistics.objects.bulk_update(to_update, STATISTICS_FIELDS)
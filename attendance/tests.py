@@ -1,3 +1,105 @@
+from datetime import time, timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
 from django.test import TestCase
+from django.utils import timezone
+
+from accounts.models import Branch
+from courses.models import Course, Group, Lesson
+from geeks_crm import side_effects
+from .models import Attendance, AttendanceStatistics
+from .signals import recalculate_attendance_statistics
+
+User = get_user_model()
+
+
+class AttendanceStatisticsBatchTestCase(TestCase):
+    """Test that attendance statistics are recalculated once per transaction"""
+
+    def setUp(self):
+        """Set up test data"""
+        branch = Branch.objects.create(name='Test Branch')
+        course = Course.objects.create(name='Test Course', branch=branch)
+        self.group = Group.objects.create(course=course, name='G1', start_time=time(10, 0), end_time=time(12, 0))
+        self.students = [
+            User.objects.create_user(username=f'student{i}', password='student123', role='student')
+            for i in range(3)
+        ]
+        self.group.students.add(*self.students)
+
+    def _lesson(self, days_ago):
+        return Lesson.objects.create(
+            group=self.group,
+            date=timezone.localdate() - timedelta(days=days_ago),
+            start_time=time(10, 0),
+            end_time=time(12, 0),
+        )
+
+    def test_lessons_create_statistics_in_one_batch(self):
+        """New lessons mark everyone absent and one batch builds the statistics"""
+        handler = mock.Mock(wraps=recalculate_attendance_statistics)
+        with mock.patch.dict(side_effects._handlers, {'attendance_statistics': (0, handler)}):
+            with self.captureOnCommitCallbacks(execute=True):
+                self._lesson(2)
+                self._lesson(1)
+        handler.assert_called_once()
+        self.assertEqual(len(handler.call_args.args[0]), 3)
+        stats = AttendanceStatistics.objects.get(student=self.students[0], group=self.group)
+        self.assertEqual((stats.total_lessons, stats.absent_count, stats.attendance_percentage), (2, 2, 0.0))
+
+    def test_deferred_updates(self):
+        """Updates inside deferred() are applied once the block ends"""
+        with self.captureOnCommitCallbacks(execute=True):
+            lessons = [self._lesson(2), self._lesson(1)]
+        with self.captureOnCommitCallbacks(execute=True):
+            with side_effects.deferred():
+                for lesson in lessons:
+                    attendance = Attendance.objects.get(lesson=lesson, student=self.students[0])
+                    attendance.status = 'present' if lesson == lessons[0] else 'late'
+                    attendance.save(update_fields=['status'])
+                self.assertEqual(AttendanceStatistics.objects.get(student=self.students[0]).present_count, 0)
+        stats = AttendanceStatistics.objects.get(student=self.students[0], group=self.group)
+        self.assertEqual((stats.present_count, stats.late_count, stats.absent_count), (1, 1, 0))
+        self.assertEqual(stats.attendance_percentage, 100.0)
+
+    def test_rolled_back_changes_are_dropped(self):
+        """Keys marked inside a rolled back transaction are not recalculated"""
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                self._lesson(1)
+                transaction.set_rollback(True)
+        self.assertEqual(callbacks, [])
+        self.assertFalse(AttendanceStatistics.objects.exists())
+
+
+class SideEffectsCaptureTestCase(TestCase):
+    """Test that a batch started before captureOnCommitCallbacks still runs inside it"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.calls = []
+        patcher = mock.patch.dict(side_effects._handlers, {'test_effect': (0, self.calls.append)})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        side_effects.mark('test_effect', 'setup')
+
+    def test_mark_after_setup_runs_in_capture(self):
+        """Keys marked inside the capture run with the pending setUp batch, once"""
+        with self.captureOnCommitCallbacks(execute=True):
+            side_effects.mark('test_effect', 'first')
+            side_effects.mark('test_effect', 'second')
+        self.assertEqual(self.calls, [{'setup', 'first', 'second'}])
+
+    def test_rolled_back_savepoint_keeps_outer_batch(self):
+        """Rolling back an inner block drops only its trigger; the batch runs on the next capture"""
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                side_effects.mark('test_effect', 'rolled_back')
+                transaction.set_rollback(True)
+        self.assertEqual((callbacks, self.calls), ([], []))
 
-# Create your tests here.
+        with self.captureOnCommitCallbacks(execute=True):
+            side_effects.mark('test_effect', 'after')
+        self.assertEqual(self.calls, [{'setup', 'rolled_back', 'after'}])
@@ -8,15 +8,18 @@ from datetime import datetime, timedelta
 import calendar
 from .models import Attendance, AttendanceStatistics
 from courses.models import Lesson, Group
+from courses.roster import roster_metrics
 from accounts.models import User
-from accounts.mixins import MentorRequiredMixin, TailwindFormMixin
+from accounts.access import get_access
+from accounts.mixins import MentorRequiredMixin, TailwindFormMixin, KeysetPaginationMixin
 
 
-class AttendanceListView(LoginRequiredMixin, ListView):
+class AttendanceListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     model = Attendance
     template_name = 'attendance/attendance_list.html'
     context_object_name = 'attendances'
     paginate_by = 50
+    keyset_ordering = ['-lesson__date', '-lesson__start_time', '-id']
     
     def dispatch(self, request, *args, **kwargs):
         # Mentors and admins should only access attendance from group detail page
@@ -24,7 +27,7 @@ class AttendanceListView(LoginRequiredMixin, ListView):
             # Redirect to groups list or first group
             from courses.models import Group
             if request.user.is_mentor:
-                groups = Group.objects.filter(mentor=request.user, is_active=True)
+                groups = Group.objects.filter(pk__in=get_access(request).mentored_group_ids, is_active=True)
             else:
                 groups = Group.objects.filter(is_active=True)
             
@@ -42,7 +45,7 @@ class AttendanceListView(LoginRequiredMixin, ListView):
         if self.request.user.is_student:
             queryset = queryset.filter(student=self.request.user)
         elif self.request.user.is_mentor:
-            queryset = queryset.filter(lesson__group__mentor=self.request.user)
+            queryset = queryset.filter(lesson__group__in=get_access(self.request).mentored_group_ids)
         
         # Filterlar
         group_id = self.request.GET.get('group')
@@ -89,7 +92,7 @@ class AttendanceListView(LoginRequiredMixin, ListView):
         
         # Mentor uchun guruhlar ro'yxati
         if self.request.user.is_mentor:
-            context['groups'] = Group.objects.filter(mentor=self.request.user, is_active=True)
+            context['groups'] = Group.objects.filter(pk__in=get_access(self.request).mentored_group_ids, is_active=True)
         elif self.request.user.is_admin or self.request.user.is_manager:
             context['groups'] = Group.objects.filter(is_active=True)
         
@@ -105,6 +108,7 @@ class AttendanceListView(LoginRequiredMixin, ListView):
 class GroupAttendanceView(LoginRequiredMixin, TemplateView):
     """Guruh bo'yicha interaktiv davomat sahifasi"""
     template_name = 'attendance/group_attendance.html'
+    query_budget = 16
     
     def dispatch(self, request, *args, **kwargs):
         """Permission check - move here from get_context_data"""
@@ -194,21 +198,15 @@ class GroupAttendanceView(LoginRequiredMixin, TemplateView):
         context['lesson_dates'] = lesson_dates
         context['lessons_list'] = lessons_list
         
-        # Talabalar va ularning davomati
-        students = group.students.all().order_by('first_name', 'last_name')
+        # Talabalar va ularning davomati, ball va o'rni (bir nechta umumiy so'rov, keshlanadi)
+        students = list(group.students.all().order_by('first_name', 'last_name'))
+        metrics = roster_metrics(group, students, year, month)
         
         student_data = []
         for student in students:
-            # Har bir talaba uchun davomat ma'lumotlari
-            attendances = Attendance.objects.filter(
-                student=student,
-                lesson__group=group,
-                lesson__date__gte=start_date,
-                lesson__date__lte=end_date
-            ).select_related('lesson')
-            
+            student_metrics = metrics[student.pk]
             # Davomat dictionary (date -> status)
-            att_dict = {att.lesson.date: att.status for att in attendances}
+            att_dict = student_metrics['attendances']
             
             # Statistika
             present = sum(1 for s in att_dict.values() if s == 'present')
@@ -229,34 +227,12 @@ class GroupAttendanceView(LoginRequiredMixin, TemplateView):
                 'total': total,
                 'percentage': percentage,
                 'has_debt': has_debt,
+                'total_points': student_metrics['total_points'],
+                'rank': student_metrics['rank'],
             })
         
-        # Add points and rankings to student data
-        from gamification.models import StudentPoints, GroupRanking
-        for data in student_data:
-            student = data['student']
-            # Get or create student points and calculate
-            student_points, created = StudentPoints.objects.get_or_create(
-                student=student,
-                group=group
-            )
-            if created or not student_points.total_points:
-                student_points.calculate_total_points()
-            
-            # Get ranking
-            ranking = GroupRanking.objects.filter(
-                group=group,
-                student=student
-            ).first()
-            
-            data['total_points'] = student_points.total_points
-            data['rank'] = ranking.rank if ranking else None
-        
         # Sort by points for ranking tab
-        student_data_sorted = sorted(student_data, key=lambda x: x.get('total_points', 0), reverse=True)
-        for idx, data in enumerate(student_data_sorted, 1):
-            if data.get('rank') is None:
-                data['rank'] = idx
+        student_data_sorted = sorted(student_data, key=lambda x: x['total_points'], reverse=True)
         
         context['student_data'] = student_data
         context['student_data_sorted'] = student_data_sorted
@@ -321,6 +297,7 @@ class AttendanceToggleView(LoginRequiredMixin, View):
                 student=student,
                 defaults={'status': status}
             )
+            lesson.mark_attendance_taken()
             
             return JsonResponse({
                 'success': True,
@@ -350,14 +327,16 @@ class AttendanceCreateView(TailwindFormMixin, MentorRequiredMixin, CreateView):
         else:
             # Show only mentor's lessons
             form.fields['lesson'].queryset = Lesson.objects.filter(
-                group__mentor=self.request.user
+                group__in=get_access(self.request).mentored_group_ids
             ).order_by('-date')
         return form
     
     def form_valid(self, form):
         if 'lesson_id' in self.kwargs:
             form.instance.lesson = Lesson.objects.get(pk=self.kwargs['lesson_id'])
-        return super().form_valid(form)
+        response = super().form_valid(form)
+        self.object.lesson.mark_attendance_taken()
+        return response
 
 
 class SaveGradeView(LoginRequiredMixin, View):
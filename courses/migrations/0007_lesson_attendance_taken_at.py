@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-19 18:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0006_alter_topic_description'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lesson',
+            name='attendance_taken_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
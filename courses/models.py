@@ -122,6 +122,49 @@ class Room(models.Model):
         return f"{self.branch.name} - {self.name}"
 
 
+class GroupQuerySet(models.QuerySet):
+    """
+    Guruh sig'imi ko'rsatkichlari bitta so'rovda (har bir guruh uchun alohida COUNT o'rniga)
+    """
+    def with_capacity(self):
+        """
+        enrolled_count, trial_count, total_count, free_seats va fill_percent annotatsiyalari
+        Group.enrolled_students_count va boshqa propertylar ularni ishlatadi
+        """
+        from django.apps import apps
+        from django.db.models import Case, Count, F, FloatField, IntegerField, OuterRef, Subquery, Value, When
+        from django.db.models.functions import Coalesce
+
+        Lead = apps.get_model('crm', 'Lead')
+        enrolled = (
+            Group.students.through.objects.filter(group=OuterRef('pk'), user__role='student')
+            .order_by().values('group').annotate(count=Count('pk')).values('count')
+        )
+        trial = (
+            Lead.objects.filter(trial_group=OuterRef('pk'), status__code__in=Group.TRIAL_STATUS_CODES)
+            .order_by().values('trial_group').annotate(count=Count('pk')).values('count')
+        )
+        return self.annotate(
+            enrolled_count=Coalesce(Subquery(enrolled, output_field=IntegerField()), Value(0)),
+            trial_count=Coalesce(Subquery(trial, output_field=IntegerField()), Value(0)),
+        ).annotate(
+            total_count=F('enrolled_count') + F('trial_count'),
+            free_seats=F('capacity') - F('enrolled_count') - F('trial_count'),
+            fill_percent=Case(
+                When(capacity=0, then=Value(0.0)),
+                default=(F('enrolled_count') + F('trial_count')) * 100.0 / F('capacity'),
+                output_field=FloatField(),
+            ),
+        )
+    
+    def with_free_seats(self, course=None):
+        """Bo'sh joyi bor faol guruhlar (sinov darsiga yozish uchun), course berilsa shu kurs bo'yicha"""
+        queryset = self.with_capacity().filter(is_active=True, free_seats__gt=0)
+        if course is not None:
+            queryset = queryset.filter(course=course)
+        return queryset
+
+
 class Group(models.Model):
     """
     Guruhlar
@@ -131,6 +174,8 @@ class Group(models.Model):
         ('even', 'Juft kunlar'),
         ('daily', 'Har kuni'),
     ]
+    # Joy egallagan sinov lidlari statuslari
+    TRIAL_STATUS_CODES = ['trial_registered', 'trial_attended']
     
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='groups')
     name = models.CharField(max_length=200)
@@ -147,6 +192,8 @@ class Group(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = GroupQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'Guruh'
         verbose_name_plural = 'Guruhlar'
@@ -155,29 +202,39 @@ class Group(models.Model):
     def __str__(self):
         return f"{self.course.name} - {self.name}"
     
+    # Propertylar Group.objects.with_capacity() annotatsiyalari bo'lsa ularni ishlatadi,
+    # aks holda alohida COUNT so'rovi bajariladi
+    
     @property
     def enrolled_students_count(self):
         """Enrolled students soni (trial students hisobga olinadi)"""
-        from accounts.models import User
+        if 'enrolled_count' in self.__dict__:
+            return self.enrolled_count
         return self.students.filter(role='student').count()
     
     @property
     def trial_students_count(self):
         """Trial students soni"""
+        if 'trial_count' in self.__dict__:
+            return self.trial_count
         from crm.models import Lead
         return Lead.objects.filter(
             trial_group=self,
-            status__code__in=['trial_registered', 'trial_attended']
+            status__code__in=self.TRIAL_STATUS_CODES
         ).count()
     
     @property
     def total_students_count(self):
         """Jami students (enrolled + trial)"""
+        if 'total_count' in self.__dict__:
+            return self.total_count
         return self.enrolled_students_count + self.trial_students_count
     
     @property
     def fill_percentage(self):
         """Guruh to'lish darajasi"""
+        if 'fill_percent' in self.__dict__:
+            return self.fill_percent
         if self.capacity == 0:
             return 0
         return (self.total_students_count / self.capacity) * 100
@@ -249,6 +306,8 @@ class Lesson(models.Model):
     description = models.TextField(blank=True, null=True)
     notes = models.TextField(blank=True, null=True)  # Mentor uchun eslatmalar
     questions = models.TextField(blank=True, null=True)  # Savollar ro'yxati
+    # Mentor davomatni kiritgan vaqt (avtomatik "kelmadi" yozuvlari hisobga olinmaydi)
+    attendance_taken_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -264,6 +323,18 @@ class Lesson(models.Model):
     def __str__(self):
         return f"{self.group.name} - {self.date} {self.start_time}"
 
+    def mark_attendance_taken(self):
+        """
+        Davomat kiritilganini belgilash (birinchi marta).
+        save() emas, update() - dars signallari (xabarnomalar) qayta ishga tushmaydi
+        """
+        if self.attendance_taken_at is not None:
+            return
+        self.attendance_taken_at = timezone.now()
+        Lesson.objects.filter(pk=self.pk, attendance_taken_at__isnull=True).update(
+            attendance_taken_at=self.attendance_taken_at
+        )
+
 
 class StudentProgress(models.Model):
     """
@@ -0,0 +1,99 @@
+"""
+Guruh ro'yxati ko'rsatkichlari (ball, o'rin, oylik davomat)
+Har bir o'quvchi uchun alohida so'rov o'rniga: o'quvchilar, StudentPoints va oy davomati -
+jami uchta so'rov. Natija (guruh, oy) bo'yicha keshlanadi; davomat, dars, ball yoki guruh tarkibi
+o'zgarganda signallar guruh versiyasini yangilaydi va eski natijalar o'z-o'zidan eskiradi.
+O'qishda hech narsa yozilmaydi (StudentPoints yo'q bo'lsa ball 0).
+"""
+import calendar
+import logging
+from datetime import date
+
+from django.core.cache import cache
+
+from geeks_crm.cache_versions import CacheVersions
+
+logger = logging.getLogger(__name__)
+
+
+CACHE_PREFIX = 'roster'
+ROSTER_TIMEOUT = 3600
+
+_versions = CacheVersions(CACHE_PREFIX)
+
+
+def invalidate_roster(*group_ids):
+    """Guruhlarning barcha oylardagi keshlangan ko'rsatkichlarini eskirtirish"""
+    _versions.bump(*group_ids)
+
+
+def competition_ranks(points):
+    """{student_id: ball} -> {student_id: o'rin} ("1224": teng ballar bir xil o'rin)"""
+    ranks = {}
+    ordered = sorted(points.items(), key=lambda item: -item[1])
+    for position, (student_id, total) in enumerate(ordered, 1):
+        if position > 1 and total == ordered[position - 2][1]:
+            ranks[student_id] = ranks[ordered[position - 2][0]]
+        else:
+            ranks[student_id] = position
+    return ranks
+
+
+def build_roster_metrics(group_id, student_ids, year, month):
+    """
+    Ko'rsatkichlarni bazadan hisoblash (2 ta so'rov)
+    Qaytaradi: {student_id: {'total_points', 'rank', 'attendances': {sana: status}}}
+    """
+    from attendance.models import Attendance
+    from gamification.models import StudentPoints
+
+    start_date = date(year, month, 1)
+    end_date = date(year, month, calendar.monthrange(year, month)[1])
+
+    points = dict.fromkeys(student_ids, 0)
+    points.update(
+        StudentPoints.objects.filter(group_id=group_id, student_id__in=student_ids)
+        .order_by().values_list('student_id', 'total_points')
+    )
+
+    attendances = {student_id: {} for student_id in student_ids}
+    rows = Attendance.objects.filter(
+        lesson__group_id=group_id,
+        student_id__in=student_ids,
+        lesson__date__gte=start_date,
+        lesson__date__lte=end_date,
+    ).order_by().values_list('student_id', 'lesson__date', 'status')
+    for student_id, lesson_date, status in rows:
+        attendances[student_id][lesson_date] = status
+
+    ranks = competition_ranks(points)
+    return {
+        student_id: {
+            'total_points': points[student_id],
+            'rank': ranks[student_id],
+            'attendances': attendances[student_id],
+        }
+        for student_id in student_ids
+    }
+
+
+def roster_metrics(group, students, year, month):
+    """
+    Guruh o'quvchilari uchun ko'rsatkichlar (keshdan yoki build_roster_metrics)
+    students - view allaqachon olgan o'quvchilar ro'yxati
+    """
+    student_ids = sorted(student.pk for student in students)
+    try:
+        key = f'{CACHE_PREFIX}:{group.pk}:{_versions.get(group.pk)}:{year}-{month:02d}'
+        metrics = cache.get(key)
+    except Exception as e:
+        logger.warning(f"Error reading roster metrics cache: {e}")
+        return build_roster_metrics(group.pk, student_ids, year, month)
+
+    if metrics is None or sorted(metrics) != student_ids:
+        metrics = build_roster_metrics(group.pk, student_ids, year, month)
+        try:
+            cache.set(key, metrics, ROSTER_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"Error writing roster metrics cache: {e}")
+    return metrics
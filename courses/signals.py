@@ -1,10 +1,13 @@
 """
 Django signals for courses app
 """
-from django.db.models.signals import post_save, m2m_changed
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.dispatch import receiver
-from .models import StudentProgress, Topic, Lesson
+from .models import StudentProgress, Topic, Lesson, Group
+from .roster import invalidate_roster
 from attendance.models import Attendance
+from gamification.models import StudentPoints
+from geeks_crm import side_effects
 
 
 @receiver(m2m_changed, sender=StudentProgress.completed_topics.through)
@@ -24,12 +27,14 @@ def create_attendance_records(sender, instance, created, **kwargs):
     if created and instance.group:
         from accounts.models import User
         students = instance.group.students.filter(role='student')
-        for student in students:
-            Attendance.objects.get_or_create(
-                lesson=instance,
-                student=student,
-                defaults={'status': 'absent'}
-            )
+        # Statistika va ballar butun guruh uchun bir marta qayta hisoblanadi
+        with side_effects.deferred():
+            for student in students:
+                Attendance.objects.get_or_create(
+                    lesson=instance,
+                    student=student,
+                    defaults={'status': 'absent'}
+                )
 
 
 @receiver(post_save, sender=Lesson)
@@ -42,3 +47,54 @@ def send_lesson_completion_notification_signal(sender, instance, created, **kwar
         # Celery taskni chaqirish
         send_lesson_completion_notification.delay(instance.id)
 
+
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+@receiver(post_save, sender=StudentPoints)
+@receiver(post_delete, sender=StudentPoints)
+def invalidate_roster_on_group_change(sender, instance, **kwargs):
+    """
+    Dars yoki ball o'zgarganda guruh ro'yxati ko'rsatkichlari keshini eskirtirish
+    """
+    side_effects.mark('roster', ('group', instance.group_id))
+
+
+@receiver(post_save, sender=Attendance)
+@receiver(post_delete, sender=Attendance)
+def invalidate_roster_on_attendance(sender, instance, **kwargs):
+    """
+    Davomat o'zgarganda guruh ro'yxati ko'rsatkichlari keshini eskirtirish
+    """
+    side_effects.mark('roster', ('lesson', instance.lesson_id))
+
+
+@receiver(m2m_changed, sender=Group.students.through)
+def invalidate_roster_on_students_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Guruh tarkibi o'zgarganda ro'yxat ko'rsatkichlari keshini eskirtirish
+    """
+    if action == 'pre_clear' and reverse:
+        # user.student_groups.clear() - post_clear da pk_set bo'lmaydi, guruhlarni oldindan aniqlash
+        group_ids = instance.student_groups.values_list('pk', flat=True)
+    elif action in ('post_add', 'post_remove') and reverse:
+        group_ids = pk_set or ()
+    elif action in ('post_add', 'post_remove', 'post_clear') and not reverse:
+        group_ids = [instance.pk]
+    else:
+        return
+    for group_id in group_ids:
+        side_effects.mark('roster', ('group', group_id))
+
+
+@side_effects.handler('roster', order=50)
+def invalidate_rosters(keys):
+    """
+    ('group' | 'lesson', id) kalitlarini guruhlarga aylantirib (darslar - bitta so'rov),
+    commit dan keyin guruhlar versiyasini bir marta yangilash
+    """
+    group_ids = {pk for kind, pk in keys if kind == 'group'}
+    lesson_ids = {pk for kind, pk in keys if kind == 'lesson'}
+    if lesson_ids:
+        group_ids.update(Lesson.objects.filter(pk__in=lesson_ids).values_list('group_id', flat=True))
+    invalidate_roster(*group_ids)
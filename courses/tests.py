@@ -1,9 +1,20 @@
-from django.test import TestCase, Client
+from datetime import time
+from unittest import mock
+
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.messages import get_messages
-from .models import Course, Module, Topic, Group
+from .models import Course, Module, Topic, Group, Lesson
+from .roster import build_roster_metrics, roster_metrics
+from .signals import invalidate_roster_on_attendance
 from accounts.models import Branch
+from attendance.models import Attendance
+from gamification.models import StudentPoints
 
 User = get_user_model()
 
@@ -281,3 +292,178 @@ class GroupCRUDTestCase(TestCase):
         
         # Check group was deleted
         self.assertFalse(Group.objects.filter(pk=group_id).exists())
+
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class RosterMetricsTestCase(TestCase):
+    """Test batched roster metrics for group pages"""
+
+    def setUp(self):
+        """Set up test data"""
+        cache.clear()
+        branch = Branch.objects.create(name='Test Branch')
+        course = Course.objects.create(name='Test Course', branch=branch)
+        self.admin = User.objects.create_user(username='admin', password='admin123', role='admin')
+        mentor = User.objects.create_user(username='mentor', password='mentor123', role='mentor')
+        self.group = Group.objects.create(name='Test Group', course=course, mentor=mentor,
+                                          start_time=time(10, 0), end_time=time(12, 0))
+        self.today = timezone.localdate()
+        self.lesson = Lesson.objects.bulk_create([
+            Lesson(group=self.group, date=self.today, start_time=time(10, 0), end_time=time(12, 0)),
+        ])[0]
+        self.students = []
+        for i, total in enumerate([30, 50, 30]):
+            self.add_student(f'student{i}', total)
+
+    def add_student(self, username, total_points):
+        student = User.objects.create_user(username=username, password='student123', role='student')
+        self.group.students.add(student)
+        StudentPoints.objects.bulk_create([StudentPoints(student=student, group=self.group, total_points=total_points)])
+        Attendance.objects.bulk_create([Attendance(lesson=self.lesson, student=student, status='present')])
+        self.students.append(student)
+        return student
+
+    def test_metrics_and_ranks(self):
+        """Points, competition ranks and the attendance matrix come from the database"""
+        newcomer = User.objects.create_user(username='newcomer', password='student123', role='student')
+        self.group.students.add(newcomer)
+        students = self.students + [newcomer]
+
+        with self.assertNumQueries(2):
+            metrics = build_roster_metrics(self.group.pk, [s.pk for s in students], self.today.year, self.today.month)
+
+        self.assertEqual([metrics[s.pk]['rank'] for s in students], [2, 1, 2, 4])
+        self.assertEqual(metrics[newcomer.pk]['total_points'], 0)
+        self.assertEqual(metrics[self.students[0].pk]['attendances'], {self.today: 'present'})
+        self.assertEqual(metrics[newcomer.pk]['attendances'], {})
+        self.assertFalse(StudentPoints.objects.filter(student=newcomer).exists())
+
+    def test_cached_until_attendance_changes(self):
+        """Cached metrics are reused and dropped when attendance changes"""
+        students = list(self.group.students.all())
+        roster_metrics(self.group, students, self.today.year, self.today.month)
+        with self.assertNumQueries(0):
+            roster_metrics(self.group, students, self.today.year, self.today.month)
+
+        attendance = Attendance.objects.get(student=self.students[0])
+        attendance.status = 'absent'
+        with self.captureOnCommitCallbacks(execute=True):
+            attendance.save(update_fields=['status'])
+        metrics = roster_metrics(self.group, students, self.today.year, self.today.month)
+        self.assertEqual(metrics[self.students[0].pk]['attendances'], {self.today: 'absent'})
+
+    def test_invalidated_once_after_commit(self):
+        """Attendance edits mark the lesson without loading it and bump the group version after commit"""
+        attendances = list(Attendance.objects.filter(lesson=self.lesson))
+        with mock.patch('courses.signals.invalidate_roster') as invalidate:
+            with self.captureOnCommitCallbacks(execute=True):
+                with self.assertNumQueries(0):
+                    for attendance in attendances:
+                        invalidate_roster_on_attendance(Attendance, attendance)
+                invalidate.assert_not_called()
+        invalidate.assert_called_once_with(self.group.pk)
+
+    def test_reverse_clear_invalidates_student_groups_only(self):
+        """Clearing a student's groups bumps only the groups they belonged to"""
+        with mock.patch('courses.signals.invalidate_roster') as invalidate:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.students[0].student_groups.clear()
+        invalidate.assert_called_once_with(self.group.pk)
+
+    def test_group_pages_query_count(self):
+        """Group pages do not run queries per student and do not write on GET"""
+        self.client.login(username='admin', password='admin123')
+        urls = [
+            reverse('courses:group_detail', kwargs={'pk': self.group.pk}),
+            reverse('attendance:group_attendance', kwargs={'group_id': self.group.pk}),
+        ]
+
+        def count_queries(url):
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            return len(queries)
+
+        counts = [count_queries(url) for url in urls]
+        for i in range(5):
+            self.add_student(f'extra{i}', i)
+        points_before = StudentPoints.objects.count()
+        self.assertEqual([count_queries(url) for url in urls], counts)
+        self.assertEqual(StudentPoints.objects.count(), points_before)
+
+
+class GroupCapacityTestCase(TestCase):
+    """Test annotated group capacity figures"""
+
+    def setUp(self):
+        """Set up test data"""
+        from crm.models import Lead, LeadStatus
+
+        branch = Branch.objects.create(name='Test Branch')
+        self.course = Course.objects.create(name='Test Course', branch=branch)
+        other_course = Course.objects.create(name='Other Course', branch=branch)
+        self.full = Group.objects.create(name='Full', course=self.course, capacity=2,
+                                         start_time=time(10, 0), end_time=time(12, 0))
+        self.open = Group.objects.create(name='Open', course=self.course, capacity=4,
+                                         start_time=time(10, 0), end_time=time(12, 0))
+        self.other = Group.objects.create(name='Other', course=other_course, capacity=0,
+                                          start_time=time(10, 0), end_time=time(12, 0))
+        Group.objects.create(name='Inactive', course=self.course, capacity=10, is_active=False,
+                             start_time=time(10, 0), end_time=time(12, 0))
+
+        students = [
+            User.objects.create_user(username=f'student{i}', password='student123', role='student')
+            for i in range(3)
+        ]
+        self.full.students.add(students[0], students[1])
+        self.open.students.add(students[2])
+        self.open.students.add(User.objects.create_user(username='mentor', password='mentor123', role='mentor'))
+
+        registered = LeadStatus.objects.create(name='Sinovga yozildi', code='trial_registered')
+        lost = LeadStatus.objects.create(name="Yo'qotildi", code='lost')
+        Lead.objects.bulk_create([
+            Lead(name='Lead 1', phone='+998900000001', status=registered, trial_group=self.open),
+            Lead(name='Lead 2', phone='+998900000002', status=lost, trial_group=self.open),
+        ])
+
+    def test_annotations_match_properties(self):
+        """Annotated figures equal the per-row property queries"""
+        expected = {
+            group.pk: (group.enrolled_students_count, group.trial_students_count,
+                       group.total_students_count, group.fill_percentage)
+            for group in Group.objects.all()
+        }
+        self.assertEqual(expected[self.open.pk], (1, 1, 2, 50.0))
+
+        with self.assertNumQueries(1):
+            annotated = {
+                group.pk: (group.enrolled_students_count, group.trial_students_count,
+                           group.total_students_count, group.fill_percentage)
+                for group in Group.objects.with_capacity()
+            }
+        self.assertEqual(annotated, expected)
+
+    def test_with_free_seats(self):
+        """Only active groups with free seats are offered for trials"""
+        self.assertEqual(list(Group.objects.with_free_seats()), [self.open])
+        self.assertEqual(list(Group.objects.with_free_seats(course=self.course)), [self.open])
+        self.assertEqual(Group.objects.with_free_seats().get().free_seats, 2)
+
+    def test_trial_register_offers_lead_course_groups(self):
+        """The trial form only offers free groups of the lead's course"""
+        from crm.models import Lead
+
+        other_open = Group.objects.create(name='Other open', course=Course.objects.get(name='Other Course'),
+                                          capacity=5, start_time=time(10, 0), end_time=time(12, 0))
+        lead = Lead.objects.create(name='Lead 3', phone='+998900000003', interested_course=self.course)
+        User.objects.create_user(username='admin', password='admin123', role='admin')
+        self.client.login(username='admin', password='admin123')
+
+        response = self.client.get(reverse('crm:trial_register', kwargs={'lead_pk': lead.pk}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['form'].fields['group'].queryset), [self.open])
+        self.assertNotIn('groups', response.context)
+        self.assertIn(other_open, Group.objects.with_free_seats())
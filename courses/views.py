@@ -4,10 +4,13 @@ from django.contrib import messages
 from django.shortcuts import redirect, get_object_or_404
 from django.http import JsonResponse
 from django.urls import reverse_lazy
+from django.utils import timezone
 from django.db.models import Count
 import json
 from .models import Course, Module, Topic, TopicMaterial, Group, GroupTransfer, Lesson, StudentProgress, Room
+from .roster import roster_metrics
 from accounts.models import User, Branch
+from accounts.access import get_access
 from accounts.mixins import RoleRequiredMixin, TailwindFormMixin
 
 
@@ -22,12 +25,12 @@ class CourseListView(LoginRequiredMixin, ListView):
         
         # Studentlar uchun faqat o'zi o'qiyotgan kurslar
         if self.request.user.is_student:
-            student_groups = Group.objects.filter(students=self.request.user, is_active=True)
+            student_groups = Group.objects.filter(pk__in=get_access(self.request).student_group_ids, is_active=True)
             course_ids = student_groups.values_list('course_id', flat=True).distinct()
             queryset = queryset.filter(id__in=course_ids)
         # Mentorlar uchun faqat o'z guruhlaridagi kurslar
         elif self.request.user.is_mentor:
-            mentor_groups = Group.objects.filter(mentor=self.request.user, is_active=True)
+            mentor_groups = Group.objects.filter(pk__in=get_access(self.request).mentored_group_ids, is_active=True)
             course_ids = mentor_groups.values_list('course_id', flat=True).distinct()
             queryset = queryset.filter(id__in=course_ids)
         
@@ -77,14 +80,14 @@ class CourseDetailView(LoginRequiredMixin, DetailView):
         # Studentlar uchun faqat o'zi o'qiyotgan kurslar
         if self.request.user.is_student:
             student_courses = Group.objects.filter(
-                students=self.request.user,
+                pk__in=get_access(self.request).student_group_ids,
                 is_active=True
             ).values_list('course_id', flat=True).distinct()
             queryset = queryset.filter(id__in=student_courses)
         # Mentorlar uchun faqat o'z guruhlaridagi kurslar
         elif self.request.user.is_mentor:
             mentor_courses = Group.objects.filter(
-                mentor=self.request.user,
+                pk__in=get_access(self.request).mentored_group_ids,
                 is_active=True
             ).values_list('course_id', flat=True).distinct()
             queryset = queryset.filter(id__in=mentor_courses)
@@ -96,7 +99,7 @@ class CourseDetailView(LoginRequiredMixin, DetailView):
         
         # Studentlar uchun faqat o'zi o'qiyotgan guruhlar
         if self.request.user.is_student:
-            groups = Group.objects.filter(course=self.object, students=self.request.user, is_active=True)
+            groups = Group.objects.filter(course=self.object, pk__in=get_access(self.request).student_group_ids, is_active=True)
         else:
             groups = Group.objects.filter(course=self.object, is_active=True)
         
@@ -174,7 +177,7 @@ class ModuleCreateView(RoleRequiredMixin, View):
         if request.user.is_mentor:
             from django.core.exceptions import PermissionDenied
             mentor_courses = Group.objects.filter(
-                mentor=request.user,
+                pk__in=get_access(request).mentored_group_ids,
                 is_active=True
             ).values_list('course_id', flat=True).distinct()
             if course.id not in mentor_courses:
@@ -208,7 +211,7 @@ class ModuleUpdateView(RoleRequiredMixin, View):
         if request.user.is_mentor:
             from django.core.exceptions import PermissionDenied
             mentor_courses = Group.objects.filter(
-                mentor=request.user,
+                pk__in=get_access(request).mentored_group_ids,
                 is_active=True
             ).values_list('course_id', flat=True).distinct()
             if module.course.id not in mentor_courses:
@@ -235,7 +238,7 @@ class ModuleDeleteView(RoleRequiredMixin, View):
         if request.user.is_mentor:
             from django.core.exceptions import PermissionDenied
             mentor_courses = Group.objects.filter(
-                mentor=request.user,
+                pk__in=get_access(request).mentored_group_ids,
                 is_active=True
             ).values_list('course_id', flat=True).distinct()
             if module.course.id not in mentor_courses:
@@ -263,7 +266,7 @@ class TopicCreateView(RoleRequiredMixin, View):
         if request.user.is_mentor:
             from django.core.exceptions import PermissionDenied
             mentor_courses = Group.objects.filter(
-                mentor=request.user,
+                pk__in=get_access(request).mentored_group_ids,
                 is_active=True
             ).values_list('course_id', flat=True).distinct()
             if module.course.id not in mentor_courses:
@@ -299,7 +302,7 @@ class TopicUpdateView(RoleRequiredMixin, View):
         if request.user.is_mentor:
             from django.core.exceptions import PermissionDenied
             mentor_courses = Group.objects.filter(
-                mentor=request.user,
+                pk__in=get_access(request).mentored_group_ids,
                 is_active=True
             ).values_list('course_id', flat=True).distinct()
             if topic.module.course.id not in mentor_courses:
@@ -327,7 +330,7 @@ class TopicDeleteView(RoleRequiredMixin, View):
         if request.user.is_mentor:
             from django.core.exceptions import PermissionDenied
             mentor_courses = Group.objects.filter(
-                mentor=request.user,
+                pk__in=get_access(request).mentored_group_ids,
                 is_active=True
             ).values_list('course_id', flat=True).distinct()
             if topic.module.course.id not in mentor_courses:
@@ -365,7 +368,7 @@ class TopicDetailView(LoginRequiredMixin, DetailView):
         
         # Get lessons related to this topic for mentor's groups
         if self.request.user.is_mentor:
-            mentor_groups = Group.objects.filter(mentor=self.request.user, is_active=True)
+            mentor_groups = Group.objects.filter(pk__in=get_access(self.request).mentored_group_ids, is_active=True)
             context['lessons'] = Lesson.objects.filter(
                 topic=self.object,
                 group__in=mentor_groups
@@ -388,16 +391,13 @@ class GroupListView(LoginRequiredMixin, ListView):
     template_name = 'courses/group_list.html'
     context_object_name = 'groups'
     paginate_by = 20
+    query_budget = 12
     
     def get_queryset(self):
-        queryset = Group.objects.select_related('course', 'mentor', 'room')
+        queryset = Group.objects.select_related('course', 'mentor', 'room').with_capacity()
         
-        # Studentlar uchun faqat o'zi o'qiyotgan guruhlar
-        if self.request.user.is_student:
-            queryset = queryset.filter(students=self.request.user)
-        # Mentorlar uchun faqat o'z guruhlari
-        elif self.request.user.is_mentor:
-            queryset = queryset.filter(mentor=self.request.user)
+        # Studentlar uchun faqat o'zi o'qiyotgan, mentorlar uchun faqat o'z guruhlari
+        queryset = get_access(self.request).scope_groups(queryset, 'pk')
         
         # Filterlar
         course = self.request.GET.get('course')
@@ -431,16 +431,13 @@ class GroupDetailView(LoginRequiredMixin, DetailView):
     model = Group
     template_name = 'courses/group_detail.html'
     context_object_name = 'group'
+    query_budget = 12
     
     def get_queryset(self):
         queryset = Group.objects.select_related('course', 'mentor', 'room').prefetch_related('students', 'lessons')
         
-        # Studentlar uchun faqat o'zi o'qiyotgan guruhlar
-        if self.request.user.is_student:
-            queryset = queryset.filter(students=self.request.user)
-        # Mentorlar uchun faqat o'z guruhlari
-        elif self.request.user.is_mentor:
-            queryset = queryset.filter(mentor=self.request.user)
+        # Studentlar uchun faqat o'zi o'qiyotgan, mentorlar uchun faqat o'z guruhlari
+        queryset = get_access(self.request).scope_groups(queryset, 'pk')
         
         return queryset
     
@@ -463,35 +460,21 @@ class GroupDetailView(LoginRequiredMixin, DetailView):
             pk__in=self.object.students.values_list('pk', flat=True)
         )
         
-        # Student data with points and ratings for tabs
-        from gamification.models import StudentPoints, GroupRanking
-        student_data = []
-        for student in self.object.students.all().order_by('first_name', 'last_name'):
-            # Get or create student points and calculate
-            student_points, created = StudentPoints.objects.get_or_create(
-                student=student,
-                group=self.object
-            )
-            if created or not student_points.total_points:
-                student_points.calculate_total_points()
-            
-            # Get ranking
-            ranking = GroupRanking.objects.filter(
-                group=self.object,
-                student=student
-            ).first()
-            
-            student_data.append({
+        # Student data with points and ratings for tabs (bir nechta umumiy so'rov, keshlanadi)
+        today = timezone.localdate()
+        students = sorted(self.object.students.all(), key=lambda s: (s.first_name, s.last_name))
+        metrics = roster_metrics(self.object, students, today.year, today.month)
+        student_data = [
+            {
                 'student': student,
-                'total_points': student_points.total_points,
-                'rank': ranking.rank if ranking else None,
-            })
+                'total_points': metrics[student.pk]['total_points'],
+                'rank': metrics[student.pk]['rank'],
+            }
+            for student in students
+        ]
         
         # Sort by points descending for ranking tab
         student_data_sorted = sorted(student_data, key=lambda x: x['total_points'], reverse=True)
-        for idx, data in enumerate(student_data_sorted, 1):
-            if data['rank'] is None:
-                data['rank'] = idx
         
         context['student_data'] = student_data
         context['student_data_sorted'] = student_data_sorted
@@ -710,10 +693,7 @@ class LessonListView(LoginRequiredMixin, ListView):
     
     def get_queryset(self):
         queryset = Lesson.objects.select_related('group', 'group__mentor', 'topic')
-        if self.request.user.is_student:
-            queryset = queryset.filter(group__students=self.request.user)
-        elif self.request.user.is_mentor:
-            queryset = queryset.filter(group__mentor=self.request.user)
+        queryset = get_access(self.request).scope_groups(queryset, 'group')
         
         # Group filter
         group_id = self.request.GET.get('group')
@@ -726,12 +706,7 @@ class LessonListView(LoginRequiredMixin, ListView):
         context = super().get_context_data(**kwargs)
         
         # Get available groups for filter
-        if self.request.user.is_student:
-            groups = Group.objects.filter(students=self.request.user, is_active=True)
-        elif self.request.user.is_mentor:
-            groups = Group.objects.filter(mentor=self.request.user, is_active=True)
-        else:
-            groups = Group.objects.filter(is_active=True)
+        groups = get_access(self.request).scope_groups(Group.objects.filter(is_active=True), 'pk')
         
         context['groups'] = groups.order_by('course__name', 'name')
         context['selected_group'] = self.request.GET.get('group')
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from .models import (
-    LeadStatus, Lead, LeadHistory, FollowUp, TrialLesson,
+    LeadStatus, Lead, LeadHistory, LeadStatusDwell, LeadFunnel, FollowUp, TrialLesson,
     SalesProfile, WorkSchedule, Leave, SalesKPI, DailyKPI,
     SalesMessage, SalesMessageRead, Offer, Reactivation, Message
 )
@@ -19,7 +19,7 @@ class LeadAdmin(admin.ModelAdmin):
     list_filter = ['status', 'source', 'interested_course', 'branch', 'assigned_sales', 'created_at']
     search_fields = ['name', 'phone', 'secondary_phone']
     ordering = ['-created_at']
-    readonly_fields = ['created_at', 'updated_at', 'assigned_at', 'lost_at', 'enrolled_at']
+    readonly_fields = ['created_at', 'updated_at', 'assigned_at', 'status_changed_at', 'lost_at', 'enrolled_at']
     fieldsets = (
         ('Asosiy ma\'lumotlar', {
             'fields': ('name', 'phone', 'secondary_phone')
@@ -37,7 +37,7 @@ class LeadAdmin(admin.ModelAdmin):
             'fields': ('enrolled_at', 'enrolled_group', 'lost_at')
         }),
         ('Vaqt', {
-            'fields': ('created_at', 'updated_at', 'created_by')
+            'fields': ('created_at', 'updated_at', 'status_changed_at', 'created_by')
         }),
     )
 
@@ -51,6 +51,20 @@ class LeadHistoryAdmin(admin.ModelAdmin):
     readonly_fields = ['created_at']
 
 
+@admin.register(LeadStatusDwell)
+class LeadStatusDwellAdmin(admin.ModelAdmin):
+    list_display = ['lead', 'status', 'visits', 'total_seconds', 'last_left_at']
+    list_filter = ['status']
+    search_fields = ['lead__name', 'lead__phone']
+
+
+@admin.register(LeadFunnel)
+class LeadFunnelAdmin(admin.ModelAdmin):
+    list_display = ['lead', 'source', 'branch', 'sales', 'created_at', 'trial_registered_at', 'enrolled_at', 'lost_at']
+    list_filter = ['source', 'branch', 'created_at']
+    search_fields = ['lead__name', 'lead__phone']
+
+
 @admin.register(FollowUp)
 class FollowUpAdmin(admin.ModelAdmin):
     list_display = ['lead', 'sales', 'due_date', 'completed', 'is_overdue', 'followup_sequence']
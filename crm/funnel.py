@@ -0,0 +1,198 @@
+"""
+Lid voronkasi va konversiya tahlili (LeadFunnel fakt jadvali)
+
+refresh() LeadHistory ni oxirgi qayta ishlangan ID dan boshlab bir marta o'qib chiqadi va har bir
+lid uchun bosqichlarga birinchi yetgan vaqtlarni LeadFunnel qatoriga yozadi (kohorta o'lchamlari
+- manba, filial, kurs, sotuvchi - Lead dan yangilanadi). Bosqich "yetilgan" deb hisoblanadi,
+agar lid shu yoki undan keyingi bosqichga o'tgan bo'lsa (sinovsiz yozilgan lid sinov bosqichidan
+ham o'tgan hisoblanadi). Tarixsiz lidlar (bulk_create, update()) joriy statusi va
+status_changed_at bo'yicha qo'shiladi.
+
+So'rovlar guruhlangan SQL bilan:
+    cohort_funnel   - kohorta (hafta, oy, manba, filial, kurs, sotuvchi) bo'yicha bosqichlarga yetganlar,
+                      ixtiyoriy ravishda lid yaratilgandan keyin N kun ichida
+    time_to_convert - bosqichga yetish uchun o'rtacha va eng uzoq vaqt
+
+Yangilash: crm.tasks.refresh_lead_funnel (davriy) yoki python manage.py refresh_lead_funnel [--full].
+Tarix ID lari tartibsiz commit qilinishi mumkin - kechki --full qayta qurish bunday o'tkazib
+yuborilgan yozuvlarni tiklaydi.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Max, Q
+from django.db.models.functions import TruncMonth, TruncWeek
+
+from .models import Lead, LeadFunnel, LeadHistory, LeadStatus
+
+
+REFRESH_BATCH_SIZE = 2000
+SECONDS_PER_DAY = 86400
+
+# Voronka bosqichlari tartibda: (status kodi, LeadFunnel maydoni)
+STAGES = [
+    ('contacted', 'contacted_at'),
+    ('interested', 'interested_at'),
+    ('trial_registered', 'trial_registered_at'),
+    ('trial_attended', 'trial_attended_at'),
+    ('offer_sent', 'offer_sent_at'),
+    ('enrolled', 'enrolled_at'),
+]
+STAGE_FIELDS = dict(STAGES)
+STAGE_LABELS = {code: label for code, label in LeadStatus.STATUS_CHOICES if code in STAGE_FIELDS}
+
+# Status kodi -> nechta bosqichdan o'tilgan (kelmagan sinov ham sinovga yozilish bosqichi)
+STATUS_DEPTH = {
+    'contacted': 1,
+    'interested': 2,
+    'trial_registered': 3,
+    'trial_not_attended': 3,
+    'trial_attended': 4,
+    'offer_sent': 5,
+    'enrolled': 6,
+}
+
+DIMENSION_FIELDS = ['created_at', 'source', 'branch_id', 'course_id', 'sales_id']
+
+DIMENSIONS = {
+    'week': TruncWeek('created_at'),
+    'month': TruncMonth('created_at'),
+    'source': F('source'),
+    'branch': F('branch_id'),
+    'course': F('course_id'),
+    'sales': F('sales_id'),
+}
+
+
+def _percentage(part, total):
+    return part / total * 100 if total else 0
+
+
+def _reach(stages, code, at):
+    """status kodiga o'tish: shu va oldingi bosqichlarning eng erta vaqtini saqlash"""
+    if at is None:
+        return
+    fields = [field for _, field in STAGES[:STATUS_DEPTH.get(code, 0)]]
+    if code == 'lost':
+        fields.append('lost_at')
+    for field in fields:
+        if field not in stages or at < stages[field]:
+            stages[field] = at
+
+
+def refresh(full=False, batch_size=REFRESH_BATCH_SIZE):
+    """
+    Fakt jadvalini yangilash (full=True - noldan qayta qurish)
+    Oxirgi tarix ID sidan keyingi yozuvlari bor lidlar va yangi lidlar qayta ishlanadi.
+    Yangilangan lidlar sonini qaytaradi
+    """
+    with transaction.atomic():
+        if full:
+            LeadFunnel.objects.all().delete()
+            last_history_id = last_lead_id = 0
+        else:
+            checkpoint = LeadFunnel.objects.aggregate(history=Max('last_history_id'), lead=Max('lead_id'))
+            last_history_id, last_lead_id = checkpoint['history'] or 0, checkpoint['lead'] or 0
+
+        codes = dict(LeadStatus.objects.values_list('pk', 'code'))
+        reached, history_ids = {}, {}
+        entries = (
+            LeadHistory.objects.filter(pk__gt=last_history_id)
+            .values_list('pk', 'lead_id', 'new_status_id', 'created_at')
+            .order_by('pk')
+        )
+        for history_id, lead_id, status_id, created_at in entries.iterator(chunk_size=batch_size):
+            history_ids[lead_id] = history_id
+            if status_id is not None:
+                _reach(reached.setdefault(lead_id, {}), codes.get(status_id), created_at)
+
+        lead_ids = sorted(set(history_ids) | set(
+            Lead.objects.filter(pk__gt=last_lead_id).values_list('pk', flat=True)
+        ))
+        for start in range(0, len(lead_ids), batch_size):
+            _write(lead_ids[start:start + batch_size], reached, history_ids, codes)
+    return len(lead_ids)
+
+
+def _write(lead_ids, reached, history_ids, codes):
+    existing = LeadFunnel.objects.in_bulk(lead_ids)
+    to_create, to_update = [], []
+    leads = Lead.objects.filter(pk__in=lead_ids).values_list(
+        'pk', 'created_at', 'source', 'branch_id', 'interested_course_id', 'assigned_sales_id',
+        'status_id', 'status_changed_at',
+    )
+    for pk, created_at, source, branch_id, course_id, sales_id, status_id, status_changed_at in leads:
+        fact = existing.get(pk) or LeadFunnel(lead_id=pk)
+        fact.created_at, fact.source = created_at, source
+        fact.branch_id, fact.course_id, fact.sales_id = branch_id, course_id, sales_id
+
+        stages = dict(reached.get(pk, {}))
+        _reach(stages, codes.get(status_id), status_changed_at)
+        for field, at in stages.items():
+            current = getattr(fact, field)
+            if current is None or at < current:
+                setattr(fact, field, at)
+        fact.last_history_id = max(fact.last_history_id, history_ids.get(pk, 0))
+        (to_update if pk in existing else to_create).append(fact)
+
+    LeadFunnel.objects.bulk_create(to_create)
+    LeadFunnel.objects.bulk_update(
+        to_update, DIMENSION_FIELDS + list(STAGE_FIELDS.values()) + ['lost_at', 'last_history_id']
+    )
+
+
+def _scoped(facts, start, end):
+    facts = LeadFunnel.objects.all() if facts is None else facts
+    if start is not None:
+        facts = facts.filter(created_at__gte=start)
+    if end is not None:
+        facts = facts.filter(created_at__lt=end)
+    return facts
+
+
+def cohort_funnel(group_by='week', within_days=None, start=None, end=None, facts=None):
+    """
+    Kohortalar bo'yicha voronka (bitta guruhlangan so'rov)
+    group_by    - DIMENSIONS kaliti; start/end - lid yaratilgan vaqt oralig'i
+    within_days - bosqichga lid yaratilgandan keyin shu kunlar ichida yetganlar
+    facts       - cheklangan LeadFunnel queryset (masalan filial yoki sotuvchi bo'yicha)
+    Qator: {'cohort', 'leads', 'lost', <bosqich kodi>: soni, ..., 'rates': {<bosqich kodi>: foiz}}
+    """
+    annotations = {'leads': Count('pk'), 'lost': Count('pk', filter=Q(lost_at__isnull=False))}
+    for stage, field in STAGES:
+        reached = Q(**{f'{field}__isnull': False})
+        if within_days is not None:
+            reached &= Q(**{f'{field}__lte': F('created_at') + timedelta(days=within_days)})
+        annotations[stage] = Count('pk', filter=reached)
+
+    rows = list(
+        _scoped(facts, start, end).annotate(cohort=DIMENSIONS[group_by])
+        .values('cohort').annotate(**annotations).order_by('cohort')
+    )
+    for row in rows:
+        row['rates'] = {stage: _percentage(row[stage], row['leads']) for stage, _ in STAGES}
+    return rows
+
+
+def time_to_convert(stage='enrolled', group_by='source', start=None, end=None, facts=None):
+    """
+    Lid yaratilgandan stage bosqichiga yetguncha vaqt, kohortalar bo'yicha (bitta so'rov)
+    Qator: {'cohort', 'converted', 'avg_days', 'max_days'}
+    """
+    field = STAGE_FIELDS[stage]
+    duration = ExpressionWrapper(F(field) - F('created_at'), output_field=DurationField())
+    rows = list(
+        _scoped(facts, start, end).filter(**{f'{field}__isnull': False})
+        .annotate(cohort=DIMENSIONS[group_by])
+        .values('cohort').annotate(converted=Count('pk'), avg=Avg(duration), longest=Max(duration))
+        .order_by('cohort')
+    )
+    return [
+        {
+            'cohort': row['cohort'],
+            'converted': row['converted'],
+            'avg_days': row['avg'].total_seconds() / SECONDS_PER_DAY if row['avg'] else 0,
+            'max_days': row['longest'].total_seconds() / SECONDS_PER_DAY if row['longest'] else 0,
+        }
+        for row in rows
+    ]
@@ -0,0 +1,78 @@
+"""
+Django management command: lidlar jadvali sahifalash benchmarki (OFFSET va keyset)
+Usage: python manage.py benchmark_lead_pagination [--leads 1000000] [--pages 1,100,1000,10000]
+Sinov lidlari tranzaksiya ichida yaratiladi va oxirida bekor qilinadi (baza o'zgarmaydi).
+"""
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from accounts.pagination import KeysetPaginator
+from crm.models import Lead
+
+PER_PAGE = 50
+ORDERING = ['-created_at', '-id']
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Lidlar jadvali chuqur sahifalari tezligini o'lchash (sinov lidlari bilan, baza o'zgarmaydi)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--leads', type=int, default=1000000, help="Yaratiladigan sinov lidlari soni")
+        parser.add_argument('--pages', default='1,100,1000,10000', help="O'lchanadigan sahifa raqamlari")
+        parser.add_argument('--repeat', type=int, default=20, help="Har bir o'lchov takrorlari soni")
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _run(self, options):
+        started = time.perf_counter()
+        batch_size = options['batch_size']
+        for start in range(0, options['leads'], batch_size):
+            Lead.objects.bulk_create([
+                Lead(name=f'Benchmark {i}', phone=f'+99890{i:07d}')
+                for i in range(start, min(start + batch_size, options['leads']))
+            ], batch_size=batch_size)
+        self.stdout.write(f"{options['leads']} ta lid: {time.perf_counter() - started:.1f}s")
+
+        queryset = Lead.objects.select_related('status', 'assigned_sales', 'interested_course', 'branch')
+        paginator = KeysetPaginator(queryset, PER_PAGE, ORDERING)
+        for number in [int(value) for value in options['pages'].split(',')]:
+            offset = (number - 1) * PER_PAGE
+            if offset >= options['leads']:
+                continue
+            # Keyset uchun kursor: oldingi sahifaning oxirgi yozuvi (o'lchovga kirmaydi)
+            cursor = paginator.cursor(paginator.ordered()[offset - 1]) if offset else None
+            legacy = self._measure(options['repeat'], lambda: list(
+                queryset.order_by(*ORDERING)[offset:offset + PER_PAGE]
+            ))
+            keyset = self._measure(options['repeat'], lambda: paginator.page(after=cursor).object_list)
+            self.stdout.write(f"sahifa {number}: OFFSET {legacy}, keyset {keyset}")
+
+        exact = self._measure(options['repeat'], queryset.count)
+        estimated = self._measure(options['repeat'], lambda: KeysetPaginator(queryset, PER_PAGE, ORDERING).count)
+        self.stdout.write(f"umumiy son: COUNT {exact}, paginator.count {estimated}")
+
+    def _measure(self, repeat, run):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        return (
+            f"p50={statistics.median(timings):.1f}ms "
+            f"p95={timings[max(int(len(timings) * 0.95) - 1, 0)]:.1f}ms"
+        )
@@ -0,0 +1,93 @@
+"""
+Django management command: lid qidiruvi benchmarki (icontains va crm.search)
+Usage: python manage.py benchmark_lead_search [--leads 1000000] [--queries 200]
+Sinov lidlari tranzaksiya ichida yaratiladi va oxirida bekor qilinadi (baza o'zgarmaydi).
+"""
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from crm.models import Lead
+from crm.search import index_leads, search_leads, search_q
+
+FIRST_NAMES = ['Ali', 'Alisher', 'Aziz', 'Bekzod', 'Dilshod', 'Jasur', 'Madina', 'Malika', 'Nodira',
+               "O'tkir", 'Sardor', 'Shahzoda', 'Timur', 'Umida', 'Zarina', 'Javohir', 'Kamola', 'Laylo']
+LAST_NAMES = ['Aliyev', 'Karimov', 'Rahimov', 'Tursunov', 'Valiyev', 'Yusupov', "G'ulomov", 'Saidova',
+              'Qodirova', 'Ergasheva', 'Nazarov', 'Ismoilov', 'Abdullayev', 'Sobirova']
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Lid qidiruvi tezligini o'lchash (sinov lidlari bilan, baza o'zgarmaydi)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--leads', type=int, default=1000000, help="Yaratiladigan sinov lidlari soni")
+        parser.add_argument('--queries', type=int, default=200, help="Har bir turdagi qidiruvlar soni")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        try:
+            with transaction.atomic():
+                self._run(options)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _run(self, options):
+        started = time.perf_counter()
+        phones = []
+        batch_size = options['batch_size']
+        for start in range(0, options['leads'], batch_size):
+            leads = []
+            for i in range(start, min(start + batch_size, options['leads'])):
+                phone = f"+99890{self.random.randrange(10 ** 7):07d}"
+                phones.append(phone)
+                leads.append(Lead(
+                    name=f"{self.random.choice(FIRST_NAMES)} {self.random.choice(LAST_NAMES)}",
+                    phone=phone,
+                ))
+            created = Lead.objects.bulk_create(leads, batch_size=batch_size)
+            index_leads((lead.pk, lead.name, lead.phone, None) for lead in created)
+        self.stdout.write(f"{options['leads']} ta lid va indeks: {time.perf_counter() - started:.1f}s")
+
+        queries = {
+            'ism prefiksi': [
+                f"{self.random.choice(FIRST_NAMES)[:3]} {self.random.choice(LAST_NAMES)[:3]}"
+                for _ in range(options['queries'])
+            ],
+            'telefon oxiri': [self.random.choice(phones)[-7:] for _ in range(options['queries'])],
+            'telefon to\'liq': [self.random.choice(phones) for _ in range(options['queries'])],
+        }
+        for label, values in queries.items():
+            legacy = self._measure(values, lambda query: list(
+                Lead.objects.filter(Q(name__icontains=query) | Q(phone__icontains=query))
+                .order_by('-created_at').values_list('pk', flat=True)[:50]
+            ))
+            indexed = self._measure(values, lambda query: list(
+                Lead.objects.filter(search_q(query)).order_by('-created_at').values_list('pk', flat=True)[:50]
+            ))
+            ranked = self._measure(values, lambda query: search_leads(query, limit=20))
+            self.stdout.write(
+                f"{label}: icontains {legacy}, indeks {indexed}, search_leads {ranked}"
+            )
+
+    def _measure(self, values, run):
+        timings = []
+        for value in values:
+            started = time.perf_counter()
+            run(value)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        return (
+            f"p50={statistics.median(timings):.1f}ms "
+            f"p95={timings[max(int(len(timings) * 0.95) - 1, 0)]:.1f}ms"
+        )
@@ -0,0 +1,20 @@
+"""
+Django management command: lid qidiruv indeksini qayta qurish
+Usage: python manage.py rebuild_lead_search [--batch-size 2000]
+Birinchi o'rnatishda va lidlar bulk_create/update() bilan o'zgartirilgandan keyin ishlatiladi
+(signallar faqat save() da indeksni yangilaydi).
+"""
+from django.core.management.base import BaseCommand
+
+from crm.search import INDEX_BATCH_SIZE, rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Lid qidiruv indeksini (ism tokenlari, telefon raqamlari) qayta qurish"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=INDEX_BATCH_SIZE, help="Bir partiyadagi lidlar soni")
+
+    def handle(self, *args, **options):
+        leads, tokens = rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"{leads} ta lid indekslandi, {tokens} ta token"))
@@ -0,0 +1,20 @@
+"""
+Django management command: lid status vaqtlarini LeadHistory dan qayta hisoblash
+Usage: python manage.py rebuild_lead_status_timing [--lead ID ...]
+Migratsiyadan keyin bir marta va lidlar update() bilan o'zgartirilgandan keyin ishlatiladi
+(signallar faqat save() da LeadStatusDwell va status_changed_at ni yangilaydi).
+"""
+from django.core.management.base import BaseCommand
+
+from crm.status_timing import rebuild_dwell
+
+
+class Command(BaseCommand):
+    help = "Lidlarning statusda turish vaqtlarini (LeadStatusDwell, status_changed_at) qayta hisoblash"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lead', type=int, nargs='+', help="Faqat shu lidlar (ID)")
+
+    def handle(self, *args, **options):
+        count = rebuild_dwell(options['lead'])
+        self.stdout.write(self.style.SUCCESS(f"{count} ta lid status vaqtlari qayta hisoblandi"))
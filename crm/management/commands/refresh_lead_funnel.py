@@ -0,0 +1,21 @@
+"""
+Django management command: lid voronkasi fakt jadvalini yangilash
+Usage: python manage.py refresh_lead_funnel [--full] [--batch-size 2000]
+Odatda oxirgi qayta ishlangan LeadHistory ID sidan keyingi yozuvlar o'qiladi;
+--full jadvalni noldan qayta quradi (birinchi o'rnatishda va ma'lumot ko'chirishdan keyin).
+"""
+from django.core.management.base import BaseCommand
+
+from crm.funnel import REFRESH_BATCH_SIZE, refresh
+
+
+class Command(BaseCommand):
+    help = "Lid voronkasi fakt jadvalini (LeadFunnel) LeadHistory dan yangilash"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="Noldan qayta qurish")
+        parser.add_argument('--batch-size', type=int, default=REFRESH_BATCH_SIZE, help="Bir partiyadagi lidlar soni")
+
+    def handle(self, *args, **options):
+        count = refresh(full=options['full'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"{count} ta lid voronkasi yangilandi"))
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.1 on 2026-10-19 16:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0004_lead_converted_student'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeadSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('name', 'Ism tokeni'), ('phone', 'Telefon raqamlari'), ('phone_rev', 'Telefon raqamlari (teskari)')], max_length=10)),
+                ('token', models.CharField(max_length=100)),
+                ('lead', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='crm.lead')),
+            ],
+            options={
+                'verbose_name': 'Lid qidiruv tokeni',
+                'verbose_name_plural': 'Lid qidiruv tokenlari',
+                'indexes': [models.Index(fields=['kind', 'token', 'lead'], name='crm_leadsea_kind_1b6c07_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.0.1 on 2026-10-19 16:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_remove_parent_profile_add_telegram_id'),
+        ('courses', '0006_alter_topic_description'),
+        ('crm', '0005_lead_search_token'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='followup',
+            index=models.Index(fields=['due_date'], name='crm_followu_due_dat_70cb78_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['created_at'], name='crm_lead_created_d9bbc3_idx'),
+        ),
+    ]
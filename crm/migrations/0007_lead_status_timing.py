@@ -0,0 +1,71 @@
+# Generated by Django 5.0.1 on 2026-10-19 17:32
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def populate_status_changed_at(apps, schema_editor):
+    Lead = apps.get_model('crm', 'Lead')
+    LeadHistory = apps.get_model('crm', 'LeadHistory')
+    last_change = LeadHistory.objects.filter(
+        lead=models.OuterRef('pk'),
+        new_status=models.OuterRef('status')
+    ).order_by('-created_at').values('created_at')[:1]
+    Lead.objects.update(status_changed_at=Coalesce(models.Subquery(last_change), models.F('created_at')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_student_summary'),
+        ('courses', '0006_alter_topic_description'),
+        ('crm', '0006_keyset_pagination_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeadStatusDwell',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('visits', models.PositiveIntegerField(default=0, verbose_name='Kirishlar soni')),
+                ('total_seconds', models.PositiveBigIntegerField(default=0, verbose_name='Jami vaqt (soniya)')),
+                ('last_left_at', models.DateTimeField(blank=True, null=True, verbose_name='Oxirgi chiqqan vaqt')),
+            ],
+            options={
+                'verbose_name': 'Statusda turish vaqti',
+                'verbose_name_plural': 'Statusda turish vaqtlari',
+            },
+        ),
+        migrations.AddField(
+            model_name='lead',
+            name='status_changed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name="Status o'zgargan vaqt"),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['status', 'status_changed_at'], name='crm_lead_status__8887ac_idx'),
+        ),
+        migrations.AddField(
+            model_name='leadstatusdwell',
+            name='lead',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_dwells', to='crm.lead', verbose_name='Lid'),
+        ),
+        migrations.AddField(
+            model_name='leadstatusdwell',
+            name='status',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='dwells', to='crm.leadstatus', verbose_name='Status'),
+        ),
+        migrations.AddIndex(
+            model_name='leadstatusdwell',
+            index=models.Index(fields=['status', 'last_left_at'], name='crm_leadsta_status__c14902_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='leadstatusdwell',
+            unique_together={('lead', 'status')},
+        ),
+        migrations.RunPython(populate_status_changed_at, migrations.RunPython.noop),
+    ]
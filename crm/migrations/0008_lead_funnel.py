@@ -0,0 +1,42 @@
+# Generated by Django 5.0.1 on 2026-10-19 17:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_student_summary'),
+        ('courses', '0006_alter_topic_description'),
+        ('crm', '0007_lead_status_timing'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeadFunnel',
+            fields=[
+                ('lead', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='funnel', serialize=False, to='crm.lead', verbose_name='Lid')),
+                ('created_at', models.DateTimeField(verbose_name='Lid yaratilgan vaqt')),
+                ('source', models.CharField(max_length=20, verbose_name='Manba')),
+                ('contacted_at', models.DateTimeField(blank=True, null=True, verbose_name='Aloqa qilindi')),
+                ('interested_at', models.DateTimeField(blank=True, null=True, verbose_name='Qiziqdi')),
+                ('trial_registered_at', models.DateTimeField(blank=True, null=True, verbose_name='Sinovga yozildi')),
+                ('trial_attended_at', models.DateTimeField(blank=True, null=True, verbose_name='Sinovga keldi')),
+                ('offer_sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Taklif yuborildi')),
+                ('enrolled_at', models.DateTimeField(blank=True, null=True, verbose_name='Kursga yozildi')),
+                ('lost_at', models.DateTimeField(blank=True, null=True, verbose_name="Yo'qotildi")),
+                ('last_history_id', models.PositiveBigIntegerField(default=0, verbose_name='Oxirgi tarix ID si')),
+                ('branch', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lead_funnels', to='accounts.branch', verbose_name='Filial')),
+                ('course', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lead_funnels', to='courses.course', verbose_name='Kurs')),
+                ('sales', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lead_funnels', to=settings.AUTH_USER_MODEL, verbose_name='Sotuvchi')),
+            ],
+            options={
+                'verbose_name': 'Lid voronkasi',
+                'verbose_name_plural': 'Lid voronkasi',
+                'indexes': [models.Index(fields=['created_at'], name='crm_leadfun_created_0e24eb_idx'), models.Index(fields=['source', 'created_at'], name='crm_leadfun_source_60faff_idx'), models.Index(fields=['branch', 'created_at'], name='crm_leadfun_branch__e5d199_idx'), models.Index(fields=['course', 'created_at'], name='crm_leadfun_course__311012_idx'), models.Index(fields=['sales', 'created_at'], name='crm_leadfun_sales_i_047607_idx'), models.Index(fields=['last_history_id'], name='crm_leadfun_last_hi_1688d5_idx')],
+            },
+        ),
+    ]
@@ -96,6 +96,8 @@ class Lead(models.Model):
     enrolled_at = models.DateTimeField(null=True, blank=True, verbose_name='Yozilgan vaqt')
     enrolled_group = models.ForeignKey(Group, on_delete=models.SET_NULL, null=True, blank=True,
                                        related_name='enrolled_leads', verbose_name='Yozilgan guruh')
+    # Joriy statusga o'tgan vaqt (crm.signals yangilaydi, bulk_create da default)
+    status_changed_at = models.DateTimeField(default=timezone.now, verbose_name="Status o'zgargan vaqt")
     
     # Studentga aylantirilgan
     converted_student = models.OneToOneField(
@@ -122,6 +124,8 @@ class Lead(models.Model):
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['status', 'status_changed_at']),
+            models.Index(fields=['created_at']),
             models.Index(fields=['assigned_sales', 'status']),
             models.Index(fields=['branch', 'status']),
             models.Index(fields=['trial_date', 'trial_time']),
@@ -134,17 +138,37 @@ class Lead(models.Model):
     @property
     def days_in_status(self):
         """Statusda qancha kun bo'lgan"""
-        if self.status:
-            last_change = LeadHistory.objects.filter(
-                lead=self,
-                new_status=self.status
-            ).order_by('-created_at').first()
-            
-            if last_change:
-                return (timezone.now() - last_change.created_at).days
+        if self.status_id and self.status_changed_at:
+            return (timezone.now() - self.status_changed_at).days
         return 0
 
 
+class LeadSearchToken(models.Model):
+    """
+    Lid qidiruv indeksi (crm.search): ism tokenlari va telefon raqamlari.
+    Har bir token (kind, token) indeksi bo'yicha prefiks oralig'i bilan qidiriladi.
+    """
+    KIND_CHOICES = [
+        ('name', 'Ism tokeni'),
+        ('phone', 'Telefon raqamlari'),
+        ('phone_rev', 'Telefon raqamlari (teskari)'),
+    ]
+    
+    lead = models.ForeignKey(Lead, on_delete=models.CASCADE, related_name='search_tokens')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    token = models.CharField(max_length=100)
+    
+    class Meta:
+        verbose_name = 'Lid qidiruv tokeni'
+        verbose_name_plural = 'Lid qidiruv tokenlari'
+        indexes = [
+            models.Index(fields=['kind', 'token', 'lead']),
+        ]
+    
+    def __str__(self):
+        return f"{self.kind}: {self.token}"
+
+
 class LeadHistory(models.Model):
     """
     Lead tarixi (status o'zgarishlari)
@@ -172,6 +196,75 @@ class LeadHistory(models.Model):
         return f"{self.lead.name} - {self.old_status} → {self.new_status}"
 
 
+class LeadStatusDwell(models.Model):
+    """
+    Lidning har bir statusda o'tkazgan vaqti (yopilgan bosqichlar yig'indisi)
+    Lid statusdan chiqqanda crm.signals qo'shadi; joriy bosqich - Lead.status_changed_at
+    """
+    lead = models.ForeignKey(Lead, on_delete=models.CASCADE, related_name='status_dwells',
+                             verbose_name='Lid')
+    status = models.ForeignKey(LeadStatus, on_delete=models.CASCADE, related_name='dwells',
+                               verbose_name='Status')
+    visits = models.PositiveIntegerField(default=0, verbose_name='Kirishlar soni')
+    total_seconds = models.PositiveBigIntegerField(default=0, verbose_name="Jami vaqt (soniya)")
+    last_left_at = models.DateTimeField(null=True, blank=True, verbose_name='Oxirgi chiqqan vaqt')
+
+    class Meta:
+        verbose_name = 'Statusda turish vaqti'
+        verbose_name_plural = 'Statusda turish vaqtlari'
+        unique_together = ['lead', 'status']
+        indexes = [
+            models.Index(fields=['status', 'last_left_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.lead.name} - {self.status}: {self.total_seconds // 86400} kun"
+
+
+class LeadFunnel(models.Model):
+    """
+    Lid voronkasi fakt jadvali (crm.funnel): har bir lid uchun bitta qator
+    Kohorta o'lchamlari (manba, filial, kurs, sotuvchi) va har bir bosqichga birinchi yetgan vaqt
+    LeadHistory dan oxirgi qayta ishlangan ID dan boshlab yangilanadi
+    """
+    lead = models.OneToOneField(Lead, on_delete=models.CASCADE, primary_key=True, related_name='funnel',
+                                verbose_name='Lid')
+    created_at = models.DateTimeField(verbose_name='Lid yaratilgan vaqt')
+    source = models.CharField(max_length=20, verbose_name='Manba')
+    branch = models.ForeignKey(Branch, on_delete=models.SET_NULL, null=True, blank=True,
+                               related_name='lead_funnels', verbose_name='Filial')
+    course = models.ForeignKey(Course, on_delete=models.SET_NULL, null=True, blank=True,
+                               related_name='lead_funnels', verbose_name='Kurs')
+    sales = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True,
+                              related_name='lead_funnels', verbose_name='Sotuvchi')
+
+    # Bosqichga (yoki undan keyingisiga) birinchi yetgan vaqt
+    contacted_at = models.DateTimeField(null=True, blank=True, verbose_name='Aloqa qilindi')
+    interested_at = models.DateTimeField(null=True, blank=True, verbose_name='Qiziqdi')
+    trial_registered_at = models.DateTimeField(null=True, blank=True, verbose_name='Sinovga yozildi')
+    trial_attended_at = models.DateTimeField(null=True, blank=True, verbose_name='Sinovga keldi')
+    offer_sent_at = models.DateTimeField(null=True, blank=True, verbose_name='Taklif yuborildi')
+    enrolled_at = models.DateTimeField(null=True, blank=True, verbose_name='Kursga yozildi')
+    lost_at = models.DateTimeField(null=True, blank=True, verbose_name="Yo'qotildi")
+
+    last_history_id = models.PositiveBigIntegerField(default=0, verbose_name="Oxirgi tarix ID si")
+
+    class Meta:
+        verbose_name = 'Lid voronkasi'
+        verbose_name_plural = 'Lid voronkasi'
+        indexes = [
+            models.Index(fields=['created_at']),
+            models.Index(fields=['source', 'created_at']),
+            models.Index(fields=['branch', 'created_at']),
+            models.Index(fields=['course', 'created_at']),
+            models.Index(fields=['sales', 'created_at']),
+            models.Index(fields=['last_history_id']),
+        ]
+
+    def __str__(self):
+        return f"{self.lead_id} - {self.source}"
+
+
 class FollowUp(models.Model):
     """
     Follow-up vazifalar
@@ -197,6 +290,7 @@ class FollowUp(models.Model):
         verbose_name_plural = 'Follow-uplar'
         ordering = ['due_date']
         indexes = [
+            models.Index(fields=['due_date']),
             models.Index(fields=['sales', 'due_date']),
             models.Index(fields=['completed', 'due_date']),
             models.Index(fields=['is_overdue', 'due_date']),
@@ -0,0 +1,92 @@
+"""
+Sotuvchilar samaradorligi: lidlar soni, yozilganlar, konversiya va oylik KPI
+
+Har bir sotuvchi uchun alohida Lead.count() o'rniga bitta guruhlangan so'rov: sotuvchi
+(User yoki SalesProfile) qatorlariga lidlar soni annotatsiya qilinadi, oylik SalesKPI
+qiymatlari subquery bilan qo'shiladi. Faqat o'qiydi - KPI yozuvi yo'q bo'lsa qiymatlar None
+(KPI lar calculate_monthly_kpi vazifasida yaratiladi).
+
+Foydalanuvchilar: SalesUserListView, SalesKPIListView, SalesKPIDetailView, send_daily_statistics.
+"""
+from django.db.models import Avg, Case, Count, F, FloatField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import SalesKPI
+
+SALES_ROLES = ['sales', 'sales_manager']
+KPI_FIELDS = {
+    'kpi_score': 'total_kpi_score',
+    'kpi_contacts': 'total_contacts',
+    'kpi_followup_completion': 'followup_completion_rate',
+    'kpi_overdue_followups': 'overdue_followups',
+}
+
+
+def performance_annotations(user_ref='pk', lead_path='assigned_leads', year=None, month=None):
+    """
+    Sotuvchi qatoriga qo'shiladigan annotatsiyalar
+    user_ref  - qatordagi foydalanuvchi ID si (User uchun 'pk', SalesProfile uchun 'user_id')
+    lead_path - qatordan lidlarga yo'l (SalesProfile uchun 'user__assigned_leads')
+    """
+    now = timezone.now()
+    year, month = year or now.year, month or now.month
+    kpis = SalesKPI.objects.filter(sales_id=OuterRef(user_ref), year=year, month=month)
+    annotations = {
+        'leads_total': Count(lead_path),
+        'leads_enrolled': Count(lead_path, filter=Q(**{f'{lead_path}__status__code': 'enrolled'})),
+        'leads_lost': Count(lead_path, filter=Q(**{f'{lead_path}__status__code': 'lost'})),
+    }
+    annotations.update({
+        name: Subquery(kpis.values(field)[:1]) for name, field in KPI_FIELDS.items()
+    })
+    return annotations
+
+
+def with_conversion(queryset):
+    """Konversiya foizi (yozilganlar / jami lidlar) - leads_total va leads_enrolled dan keyin"""
+    return queryset.annotate(conversion=Case(
+        When(leads_total=0, then=Value(0.0)),
+        default=F('leads_enrolled') * 100.0 / F('leads_total'),
+        output_field=FloatField(),
+    ))
+
+
+def sales_performance(users=None, year=None, month=None):
+    """Faol sotuvchilar (User) samaradorlik ko'rsatkichlari bilan, KPI bo'yicha kamayish tartibida"""
+    from accounts.models import User
+
+    if users is None:
+        users = User.objects.filter(role__in=SALES_ROLES, is_active=True)
+    queryset = users.select_related('sales_profile').annotate(**performance_annotations(year=year, month=month))
+    return with_conversion(queryset).order_by(
+        Coalesce('kpi_score', Value(0.0)).desc(), 'first_name', 'pk'
+    )
+
+
+def profile_performance(profiles, year=None, month=None):
+    """SalesProfile queryset samaradorlik ko'rsatkichlari bilan (tartib saqlanadi)"""
+    return with_conversion(profiles.annotate(
+        **performance_annotations('user_id', 'user__assigned_leads', year=year, month=month)
+    ))
+
+
+def team_totals(performance):
+    """Annotatsiya qilingan queryset bo'yicha jami (bitta so'rov, KPI o'rtachasi mavjud KPI lar bo'yicha)"""
+    totals = performance.order_by().aggregate(
+        total_leads=Coalesce(Sum('leads_total'), 0),
+        total_enrolled=Coalesce(Sum('leads_enrolled'), 0),
+        avg_kpi=Avg('kpi_score'),
+    )
+    total_leads = totals['total_leads']
+    return {
+        'total_leads': total_leads,
+        'total_enrolled': totals['total_enrolled'],
+        'avg_conversion': totals['total_enrolled'] / total_leads * 100 if total_leads else 0,
+        'avg_kpi': totals['avg_kpi'] or 0,
+    }
+
+
+def kpi_values(row):
+    """Annotatsiyalardan SalesKPI maydonlari (shablonlar uchun; KPI yo'q bo'lsa 0)"""
+    return {field: getattr(row, name) or 0 for name, field in KPI_FIELDS.items()}
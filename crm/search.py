@@ -0,0 +1,176 @@
+"""
+Lid qidiruvi (ism va telefon)
+Ism kichik harfli tokenlarga, telefon faqat raqamlarga normallashtiriladi va LeadSearchToken
+jadvalida (kind, token) indeksi bilan saqlanadi. Qidiruv - indeks bo'yicha prefiks oralig'i:
+- ism: so'rovdagi har bir so'z biror ism tokenining boshi bo'lishi kerak ("ali val" -> Alisher Valiyev)
+- telefon: raqamlar boshidan ("99890...") yoki oxiridan ("1234567") mos kelishi mumkin
+  (oxiridan qidirish uchun teskari raqamlar saqlanadi)
+icontains dan farqli ravishda jadvalni to'liq ko'rib chiqmaydi.
+Indeks signallar orqali yangilanadi, to'liq qayta qurish: python manage.py rebuild_lead_search
+"""
+import re
+
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Lead, LeadSearchToken
+
+
+APOSTROPHES = str.maketrans({char: "'" for char in "‘’ʻʼ`´"})
+TOKEN_RE = re.compile(r"[\w']+")
+MIN_PHONE_DIGITS = 3
+MAX_TOKEN_LENGTH = 100
+PREFIX_END = '\U0010ffff'
+INDEX_BATCH_SIZE = 2000
+CANDIDATE_LIMIT = 500
+
+# search_leads() ballari
+PHONE_EXACT_SCORE = 100
+PHONE_PREFIX_SCORE = 80
+PHONE_SUFFIX_SCORE = 70
+NAME_SCORE = 40
+NAME_EXACT_TERM_SCORE = 10
+NAME_PREFIX_TERM_SCORE = 5
+
+
+def normalize_phone(value):
+    """Faqat raqamlar: '+998 (90) 123-45-67' -> '998901234567'"""
+    return re.sub(r'\D', '', value or '')
+
+
+def name_tokens(value):
+    """Kichik harfli, takrorlanmaydigan so'zlar (o‘/o' kabi apostroflar bir xil)"""
+    value = (value or '').translate(APOSTROPHES).casefold()
+    tokens = []
+    for token in TOKEN_RE.findall(value):
+        token = token.strip("'")[:MAX_TOKEN_LENGTH]
+        if token and token not in tokens:
+            tokens.append(token)
+    return tokens
+
+
+def lead_tokens(lead_id, name, phones):
+    """Bitta lid uchun LeadSearchToken obyektlari (saqlanmagan)"""
+    rows = {('name', token) for token in name_tokens(name)}
+    for phone in phones:
+        digits = normalize_phone(phone)[:MAX_TOKEN_LENGTH]
+        if digits:
+            rows.add(('phone', digits))
+            rows.add(('phone_rev', digits[::-1]))
+    return [LeadSearchToken(lead_id=lead_id, kind=kind, token=token) for kind, token in sorted(rows)]
+
+
+def index_leads(rows):
+    """
+    Lidlar indeksini yangilash
+    rows: (id, name, phone, secondary_phone) lar
+    """
+    rows = list(rows)
+    if not rows:
+        return 0
+    tokens = []
+    for lead_id, name, phone, secondary_phone in rows:
+        tokens += lead_tokens(lead_id, name, [phone, secondary_phone])
+    with transaction.atomic():
+        LeadSearchToken.objects.filter(lead_id__in=[row[0] for row in rows]).delete()
+        LeadSearchToken.objects.bulk_create(tokens, batch_size=INDEX_BATCH_SIZE)
+    return len(tokens)
+
+
+def index_lead(lead):
+    return index_leads([(lead.pk, lead.name, lead.phone, lead.secondary_phone)])
+
+
+def rebuild_index(batch_size=INDEX_BATCH_SIZE):
+    """Barcha lidlar indeksini qayta qurish. Qaytaradi: (lidlar, tokenlar) soni"""
+    leads = tokens = 0
+    batch = []
+    rows = Lead.objects.order_by('pk').values_list('id', 'name', 'phone', 'secondary_phone')
+    for row in rows.iterator(chunk_size=batch_size):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            tokens += index_leads(batch)
+            leads += len(batch)
+            batch = []
+    tokens += index_leads(batch)
+    leads += len(batch)
+    return leads, tokens
+
+
+def _prefix_tokens(kind, prefix):
+    # Oraliq (gte/lt) indeksdan foydalanadi; startswith - collation farqlari uchun aniqlik tekshiruvi
+    return LeadSearchToken.objects.filter(
+        kind=kind, token__gte=prefix, token__lt=prefix + PREFIX_END, token__startswith=prefix,
+    )
+
+
+def search_q(query):
+    """
+    Lead queryset uchun filtr (Q). So'rovda qidiriladigan narsa bo'lmasa None.
+    Masalan: Lead.objects.filter(search_q('ali 90'))
+    """
+    terms = name_tokens(query)
+    digits = normalize_phone(query)
+
+    condition = None
+    if terms:
+        condition = Q()
+        for term in terms:
+            condition &= Q(pk__in=_prefix_tokens('name', term).values('lead_id'))
+    if len(digits) >= MIN_PHONE_DIGITS:
+        phone = (
+            Q(pk__in=_prefix_tokens('phone', digits).values('lead_id'))
+            | Q(pk__in=_prefix_tokens('phone_rev', digits[::-1]).values('lead_id'))
+        )
+        condition = phone if condition is None else condition | phone
+    return condition
+
+
+def search_leads(query, queryset=None, limit=20):
+    """
+    Mosligi bo'yicha tartiblangan lidlar (avtomatik to'ldirish uchun), 3 ta so'rov.
+    Tartib: telefon to'liq > telefon boshi > telefon oxiri > ism (to'liq so'zlar prefiksdan yuqori),
+    teng bo'lsa yangi lidlar oldin.
+    """
+    condition = search_q(query)
+    if condition is None:
+        return []
+    queryset = Lead.objects.all() if queryset is None else queryset
+    candidate_ids = list(
+        queryset.filter(condition).order_by('-pk').values_list('pk', flat=True)[:CANDIDATE_LIMIT]
+    )
+    if not candidate_ids:
+        return []
+
+    terms = name_tokens(query)
+    digits = normalize_phone(query)
+    tokens = {}
+    for lead_id, kind, token in LeadSearchToken.objects.filter(lead_id__in=candidate_ids).values_list(
+        'lead_id', 'kind', 'token'
+    ):
+        tokens.setdefault(lead_id, {}).setdefault(kind, []).append(token)
+
+    scores = {lead_id: _score(tokens.get(lead_id, {}), terms, digits) for lead_id in candidate_ids}
+    ranked = sorted(candidate_ids, key=lambda lead_id: (-scores[lead_id], -lead_id))[:limit]
+    leads = queryset.in_bulk(ranked)
+    return [leads[lead_id] for lead_id in ranked if lead_id in leads]
+
+
+def _score(tokens, terms, digits):
+    score = 0
+    if len(digits) >= MIN_PHONE_DIGITS:
+        phones = tokens.get('phone', [])
+        if digits in phones:
+            score = PHONE_EXACT_SCORE
+        elif any(phone.startswith(digits) for phone in phones):
+            score = PHONE_PREFIX_SCORE
+        elif any(phone.endswith(digits) for phone in phones):
+            score = PHONE_SUFFIX_SCORE
+
+    names = tokens.get('name', [])
+    if terms and all(any(name.startswith(term) for name in names) for term in terms):
+        name_score = NAME_SCORE + sum(
+            NAME_EXACT_TERM_SCORE if term in names else NAME_PREFIX_TERM_SCORE for term in terms
+        )
+        score = max(score, name_score)
+    return score
@@ -2,22 +2,33 @@
 Django signals for CRM app
 Lead status o'zgarishlari, follow-up yaratish, eslatmalar
 """
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_init, post_save, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
 from datetime import timedelta
 
+from geeks_crm import side_effects
+
+
+# Lid qidiruv indeksi (crm.search) shu maydonlardan quriladi
+LEAD_SEARCH_FIELDS = ('name', 'phone', 'secondary_phone')
+
 
 @receiver(pre_save, sender='crm.Lead')
 def track_lead_status_change(sender, instance, **kwargs):
     """
     Lead status o'zgarishini kuzatish
+    Status o'zgarsa status_changed_at shu saqlashning o'zida yangilanadi
     """
+    instance._old_status_changed_at = None
     if instance.pk:
         try:
             old_instance = sender.objects.get(pk=instance.pk)
             instance._old_status = old_instance.status
             instance._old_sales = old_instance.assigned_sales
+            instance._old_status_changed_at = old_instance.status_changed_at
+            if old_instance.status_id != instance.status_id:
+                instance.status_changed_at = timezone.now()
         except sender.DoesNotExist:
             instance._old_status = None
             instance._old_sales = None
@@ -27,11 +38,13 @@ def track_lead_status_change(sender, instance, **kwargs):
 
 
 @receiver(post_save, sender='crm.Lead')
-def handle_lead_changes(sender, instance, created, **kwargs):
+def handle_lead_changes(sender, instance, created, update_fields=None, **kwargs):
     """
     Lead yaratilganda yoki o'zgarganda
+    Celery vazifalari commit dan keyin, bir partiyadagi bir xil chaqiruvlar bitta bo'lib yuboriladi
     """
     from .models import LeadHistory, FollowUp
+    from .status_timing import record_dwell
     
     if created:
         # Yangi lead yaratildi
@@ -46,16 +59,16 @@ def handle_lead_changes(sender, instance, created, **kwargs):
         # Agar sotuvchi tayinlanmagan bo'lsa, avtomatik taqsimlash
         if not instance.assigned_sales:
             from .tasks import assign_leads_to_sales
-            assign_leads_to_sales.delay()
+            side_effects.delay_on_commit(assign_leads_to_sales)
         else:
             # Agar sotuvchi tayinlangan bo'lsa, follow-up yaratish
             from .tasks import create_initial_followup
-            create_initial_followup.delay(instance.id)
+            side_effects.delay_on_commit(create_initial_followup, instance.id)
             
             # Telegram notification
             try:
                 from telegram_bot.tasks import send_lead_assignment_notification
-                send_lead_assignment_notification.delay(instance.id)
+                side_effects.delay_on_commit(send_lead_assignment_notification, instance.id)
             except ImportError:
                 pass
     
@@ -63,6 +76,13 @@ def handle_lead_changes(sender, instance, created, **kwargs):
         # Status o'zgargan
         old_status = getattr(instance, '_old_status', None)
         if old_status != instance.status:
+            # Eski statusdagi bosqichni yopish; update_fields da bo'lmasa vaqt alohida yoziladi
+            if update_fields is not None and 'status_changed_at' not in update_fields:
+                sender.objects.filter(pk=instance.pk).update(status_changed_at=instance.status_changed_at)
+            if old_status is not None:
+                record_dwell(instance.pk, old_status.pk, getattr(instance, '_old_status_changed_at', None),
+                             instance.status_changed_at)
+
             LeadHistory.objects.create(
                 lead=instance,
                 old_status=old_status,
@@ -73,7 +93,7 @@ def handle_lead_changes(sender, instance, created, **kwargs):
             # Status bo'yicha follow-up yaratish
             if instance.status and instance.assigned_sales:
                 from .tasks import create_status_followup
-                create_status_followup.delay(instance.id, instance.status.code)
+                side_effects.delay_on_commit(create_status_followup, instance.id, instance.status.code)
             
             # Lost status
             if instance.status and instance.status.code == 'lost' and not instance.lost_at:
@@ -96,7 +116,7 @@ def handle_lead_changes(sender, instance, created, **kwargs):
             # Telegram notification
             try:
                 from telegram_bot.tasks import send_lead_assignment_notification
-                send_lead_assignment_notification.delay(instance.id)
+                side_effects.delay_on_commit(send_lead_assignment_notification, instance.id)
             except ImportError:
                 pass
 
@@ -312,3 +332,24 @@ def handle_message_send(sender, instance, created, **kwargs):
             instance.save(update_fields=['telegram_sent'])
         except ImportError:
             pass
+
+
+@receiver(post_init, sender='crm.Lead')
+def remember_lead_search_fields(sender, instance, **kwargs):
+    """
+    Qidiruv indeksiga kiradigan maydonlarning yuklangan qiymatlari
+    (__dict__ dan - kechiktirilgan maydonlar uchun so'rov qilinmaydi)
+    """
+    instance._search_source = tuple(instance.__dict__.get(field) for field in LEAD_SEARCH_FIELDS)
+
+
+@receiver(post_save, sender='crm.Lead')
+def update_lead_search_index(sender, instance, created, **kwargs):
+    """
+    Ism yoki telefon o'zgarganda lid qidiruv indeksini yangilash
+    """
+    source = tuple(getattr(instance, field) for field in LEAD_SEARCH_FIELDS)
+    if created or source != getattr(instance, '_search_source', None):
+        from .search import index_lead
+        index_lead(instance)
+        instance._search_source = source
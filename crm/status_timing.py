@@ -0,0 +1,157 @@
+"""
+Lid status vaqtlari: statusda turish muddati va bosqichlar bo'yicha hisobot
+
+Lead.status_changed_at - joriy statusga o'tgan vaqt (crm.signals: pre_save belgilaydi,
+handle_lead_changes yopilgan bosqichni yozadi). LeadStatusDwell - har bir (lid, status)
+juftligi uchun bitta qator: nechta marta kirgan va jami qancha soniya turgan.
+
+    stuck_leads   - N kundan ortiq bir statusda turgan lidlar ((status, status_changed_at) indeksi)
+    dwell_report  - bosqichlar bo'yicha o'rtacha turish vaqti, SQL da guruhlangan ikki so'rov
+    rebuild_dwell - LeadHistory dan jadvalni qayta qurish (migratsiyadan keyin bir marta):
+                    python manage.py rebuild_lead_status_timing
+"""
+from datetime import timedelta
+from itertools import groupby
+
+from django.db import transaction
+from django.db.models import Avg, Count, F, Min, Q, Sum
+from django.utils import timezone
+
+from .models import Lead, LeadHistory, LeadStatus, LeadStatusDwell
+
+
+SECONDS_PER_DAY = 86400
+REBUILD_BATCH_SIZE = 2000
+
+
+def record_dwell(lead_id, status_id, entered_at, left_at):
+    """Yopilgan bosqichni (lid statusdan chiqdi) jadvalga qo'shish"""
+    if not status_id or not entered_at or not left_at:
+        return
+    seconds = max(int((left_at - entered_at).total_seconds()), 0)
+    updated = LeadStatusDwell.objects.filter(lead_id=lead_id, status_id=status_id).update(
+        visits=F('visits') + 1,
+        total_seconds=F('total_seconds') + seconds,
+        last_left_at=left_at,
+    )
+    if not updated:
+        LeadStatusDwell.objects.create(
+            lead_id=lead_id, status_id=status_id, visits=1, total_seconds=seconds, last_left_at=left_at
+        )
+
+
+def stuck_leads(status, days, leads=None, now=None):
+    """status da days kundan ko'p turgan lidlar (status - LeadStatus yoki uning ID si)"""
+    now = now or timezone.now()
+    leads = Lead.objects.all() if leads is None else leads
+    return leads.filter(status=status, status_changed_at__lt=now - timedelta(days=days))
+
+
+def dwell_report(leads=None, stuck_days=None, now=None):
+    """
+    Faol statuslar bo'yicha hisobot (status tartibida):
+        passed        - statusdan o'tgan lidlar soni
+        avg_days      - o'tgan lidlarning statusda o'rtacha turgan kuni (bir necha kirish qo'shiladi)
+        current       - hozir shu statusdagi lidlar
+        oldest_days   - hozirgilardan eng uzoq turgani (kun)
+        stuck         - stuck_days dan ko'p turganlar (stuck_days berilganda)
+    leads - hisobotni cheklash uchun Lead queryset (filial, sotuvchi)
+    """
+    now = now or timezone.now()
+    dwells = LeadStatusDwell.objects.all()
+    current = Lead.objects.filter(status__isnull=False)
+    if leads is not None:
+        dwells = dwells.filter(lead__in=leads.values('pk'))
+        current = leads.filter(status__isnull=False)
+
+    passed = {
+        row['status_id']: row
+        for row in dwells.values('status_id').annotate(
+            passed=Count('id'), avg_seconds=Avg('total_seconds'), total_seconds=Sum('total_seconds'),
+        ).order_by()
+    }
+    current_annotations = {'current': Count('id'), 'oldest': Min('status_changed_at')}
+    if stuck_days is not None:
+        current_annotations['stuck'] = Count(
+            'id', filter=Q(status_changed_at__lt=now - timedelta(days=stuck_days))
+        )
+    in_status = {
+        row['status_id']: row
+        for row in current.values('status_id').annotate(**current_annotations).order_by()
+    }
+
+    report = []
+    for status in LeadStatus.objects.filter(is_active=True).order_by('order'):
+        closed = passed.get(status.pk, {})
+        open_ = in_status.get(status.pk, {})
+        row = {
+            'status': status,
+            'passed': closed.get('passed', 0),
+            'avg_days': (closed.get('avg_seconds') or 0) / SECONDS_PER_DAY,
+            'total_days': (closed.get('total_seconds') or 0) / SECONDS_PER_DAY,
+            'current': open_.get('current', 0),
+            'oldest_days': (now - open_['oldest']).days if open_.get('oldest') else 0,
+        }
+        if stuck_days is not None:
+            row['stuck'] = open_.get('stuck', 0)
+        report.append(row)
+    return report
+
+
+def _lead_dwells(lead, history):
+    """Bitta lid tarixidan (vaqt bo'yicha) yopilgan bosqichlar va joriy status boshlanishi"""
+    totals = {}
+    status_id, entered_at = None, lead['created_at']
+    for entry in history:
+        new_status_id = entry['new_status_id']
+        if new_status_id is None and entry['old_status_id'] is None:
+            continue  # sotuvchi almashgani
+        if new_status_id == status_id:
+            continue  # bir o'zgarish uchun takroriy yozuv (view va signal)
+        if status_id is not None:
+            visits, seconds, _ = totals.get(status_id, (0, 0, None))
+            seconds += max(int((entry['created_at'] - entered_at).total_seconds()), 0)
+            totals[status_id] = (visits + 1, seconds, entry['created_at'])
+        status_id, entered_at = new_status_id, entry['created_at']
+    return totals, status_id, entered_at
+
+
+def rebuild_dwell(lead_ids=None):
+    """
+    LeadHistory dan LeadStatusDwell va Lead.status_changed_at ni qayta hisoblash
+    Qayta qurilgan lidlar sonini qaytaradi
+    """
+    leads = Lead.objects.order_by('pk')
+    if lead_ids is not None:
+        leads = leads.filter(pk__in=lead_ids)
+    leads = list(leads.values('pk', 'status_id', 'created_at'))
+
+    rebuilt = 0
+    for start in range(0, len(leads), REBUILD_BATCH_SIZE):
+        batch = {lead['pk']: lead for lead in leads[start:start + REBUILD_BATCH_SIZE]}
+        history = (
+            LeadHistory.objects.filter(lead_id__in=batch)
+            .values('lead_id', 'old_status_id', 'new_status_id', 'created_at')
+            .order_by('lead_id', 'created_at', 'pk')
+        )
+        by_lead = {lead_id: list(entries) for lead_id, entries in groupby(history, key=lambda e: e['lead_id'])}
+
+        dwells, changed_at = [], []
+        for lead_id, lead in batch.items():
+            totals, status_id, entered_at = _lead_dwells(lead, by_lead.get(lead_id, []))
+            dwells.extend(
+                LeadStatusDwell(lead_id=lead_id, status_id=dwell_status_id, visits=visits,
+                                total_seconds=seconds, last_left_at=left_at)
+                for dwell_status_id, (visits, seconds, left_at) in totals.items()
+            )
+            # Tarix joriy status bilan tugamasa (update() bilan o'zgartirilgan), lid yaratilgan vaqt
+            changed_at.append(Lead(pk=lead_id, status_changed_at=(
+                entered_at if status_id == lead['status_id'] else lead['created_at']
+            )))
+
+        with transaction.atomic():
+            LeadStatusDwell.objects.filter(lead_id__in=batch).delete()
+            LeadStatusDwell.objects.bulk_create(dwells)
+            Lead.objects.bulk_update(changed_at, ['status_changed_at'])
+        rebuilt += len(batch)
+    return rebuilt
@@ -8,10 +8,13 @@ from django.db.models import Q, Count, Avg
 from datetime import timedelta
 import logging
 
+from geeks_crm import side_effects
+from geeks_crm.task_locks import SingletonTask
+
 logger = logging.getLogger(__name__)
 
 
-@shared_task
+@shared_task(base=SingletonTask, debounce=10)
 def import_leads_from_google_sheets():
     """
     Google Sheets'dan lidlarni import qilish (Har 5 daqiqa)
@@ -42,41 +45,41 @@ def import_leads_from_google_sheets():
         imported = 0
         duplicates = 0
         
-        for record in records:
-            name = record.get('name', '').strip()
-            phone = record.get('phone', '').strip()
-            
-            if not name or not phone:
-                continue
-            
-            # Duplicate tekshirish
-            if Lead.objects.filter(phone=phone).exists():
-                duplicates += 1
-                continue
-            
-            Lead.objects.create(
-                name=name,
-                phone=phone,
-                secondary_phone=record.get('secondary_phone', ''),
-                source='google_sheets',
-                status=new_status
-            )
-            imported += 1
+        # Lid signallaridagi taqsimlash vazifasi import oxirida bir marta yuboriladi
+        with side_effects.deferred():
+            for record in records:
+                name = record.get('name', '').strip()
+                phone = record.get('phone', '').strip()
+                
+                if not name or not phone:
+                    continue
+                
+                # Duplicate tekshirish
+                if Lead.objects.filter(phone=phone).exists():
+                    duplicates += 1
+                    continue
+                
+                Lead.objects.create(
+                    name=name,
+                    phone=phone,
+                    secondary_phone=record.get('secondary_phone', ''),
+                    source='google_sheets',
+                    status=new_status
+                )
+                imported += 1
         
         logger.info(f"Google Sheets import: {imported} yangi, {duplicates} dublikat")
-        
-        # Import qilingan lidlarni avtomatik taqsimlash
-        if imported > 0:
-            assign_leads_to_sales.delay()
     
     except Exception as e:
         logger.error(f"Google Sheets import xatosi: {e}")
 
 
-@shared_task
+@shared_task(base=SingletonTask, debounce=30, on_busy='rerun')
 def assign_leads_to_sales():
     """
     Yangi lidlarni sotuvchilarga avtomatik taqsimlash
+    Har bir lid yaratilishidagi .delay() lar 30 soniya ichida bitta ishga tushishga birlashadi,
+    ish davomida kelganlari uchun tugagach yana bir marta ishlaydi (ikki worker bir lidni talashmaydi)
     """
     try:
         from .models import Lead, LeadStatus, LeadHistory, SalesProfile
@@ -253,7 +256,7 @@ def send_followup_reminders():
         logger.error(f"Follow-up eslatma xatosi: {e}")
 
 
-@shared_task
+@shared_task(base=SingletonTask)
 def check_overdue_followups():
     """
     Overdue follow-up'larni tekshirish (Har 30 daqiqa)
@@ -619,6 +622,19 @@ def send_daily_statistics():
             ).count()
         }
         
+        # Sotuvchilar: lidlar, yozilganlar, konversiya va oylik KPI (bitta so'rov)
+        from .performance import sales_performance
+        stats['sales'] = [
+            {
+                'name': sales.get_full_name() or sales.username,
+                'leads': sales.leads_total,
+                'enrolled': sales.leads_enrolled,
+                'conversion': round(sales.conversion, 1),
+                'kpi': sales.kpi_score,
+            }
+            for sales in sales_performance(year=yesterday.year, month=yesterday.month)
+        ]
+        
         # Telegram guruhiga yuborish
         try:
             from telegram_bot.tasks import send_daily_stats
@@ -786,3 +802,18 @@ def check_leave_expiry():
     
     except Exception as e:
         logger.error(f"Ruxsat tekshirish xatosi: {e}")
+
+
+@shared_task(base=SingletonTask)
+def refresh_lead_funnel(full=False):
+    """
+    Lid voronkasi fakt jadvalini yangilash (Har 30 daqiqa, kechasi to'liq)
+    """
+    try:
+        from .funnel import refresh
+        
+        count = refresh(full=full)
+        logger.info(f"Lid voronkasi yangilandi: {count} ta lid")
+    
+    except Exception as e:
+        logger.error(f"Lid voronkasi yangilash xatosi: {e}")
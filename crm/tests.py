@@ -1,14 +1,43 @@
-from django.test import TestCase, Client
+import os
+import socket
+from datetime import timedelta
+from unittest import mock, skipUnless
+from urllib.parse import urlparse
+
+from celery import Task, shared_task
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.contrib.messages import get_messages
 from django.utils import timezone
-from .models import Lead, LeadStatus, FollowUp
+from .models import Lead, LeadFunnel, LeadHistory, LeadStatus, LeadStatusDwell, FollowUp, SalesKPI, SalesProfile
+from .performance import kpi_values, profile_performance, sales_performance, team_totals
+from .search import name_tokens, normalize_phone, rebuild_index, search_leads, search_q
+from .funnel import cohort_funnel, refresh as refresh_funnel, time_to_convert
+from .status_timing import dwell_report, rebuild_dwell, stuck_leads
 from accounts.models import Branch
 from courses.models import Course
+from geeks_crm import task_locks
+from geeks_crm.redis_clients import get_redis
+from geeks_crm.task_locks import SingletonTask
+from .tasks import assign_leads_to_sales
 
 User = get_user_model()
 
+TEST_REDIS_URL = os.environ.get('TASK_LOCK_TEST_REDIS_URL', 'redis://localhost:6379/15')
+UNREACHABLE_REDIS_URL = 'redis://127.0.0.1:1/0'
+
+
+def redis_available(url):
+    parsed = urlparse(url)
+    try:
+        socket.create_connection((parsed.hostname, parsed.port or 6379), timeout=0.5).close()
+        return True
+    except OSError:
+        return False
+
 
 class LeadCRUDTestCase(TestCase):
     """Test CRUD operations for Lead model"""
@@ -338,3 +367,426 @@ class FollowUpCRUDTestCase(TestCase):
         self.followup.refresh_from_db()
         self.assertTrue(self.followup.completed)
         self.assertIsNotNone(self.followup.completed_at)
+
+
+class LeadSearchTestCase(TestCase):
+    """Test the indexed lead search"""
+
+    def setUp(self):
+        """Set up test data"""
+        Lead.objects.bulk_create([
+            Lead(name='Alisher Valiyev', phone='+998 (90) 123-45-67'),
+            Lead(name='Ali Karimov', phone='+998911112233', secondary_phone='+998901234500'),
+            Lead(name="O‘tkir G'ulomov", phone='998935554433'),
+            Lead(name='Malika Aliyeva', phone='+998901234'),
+        ])
+        rebuild_index()
+        self.leads = {lead.name: lead for lead in Lead.objects.all()}
+
+    def names(self, query):
+        return sorted(Lead.objects.filter(search_q(query)).values_list('name', flat=True))
+
+    def test_normalization(self):
+        """Phones keep digits only, names become lowercase tokens"""
+        self.assertEqual(normalize_phone('+998 (90) 123-45-67'), '998901234567')
+        self.assertEqual(name_tokens("O‘tkir  G'ulomov o'tkir"), ["o'tkir", "g'ulomov"])
+
+    def test_name_token_prefix(self):
+        """Every query word must start one of the name tokens"""
+        self.assertEqual(self.names('ali'), ['Ali Karimov', 'Alisher Valiyev', 'Malika Aliyeva'])
+        self.assertEqual(self.names('val ALI'), ['Alisher Valiyev'])
+        self.assertEqual(self.names("o'tk"), ["O‘tkir G'ulomov"])
+        self.assertEqual(self.names('lish'), [])
+
+    def test_phone_prefix_and_suffix(self):
+        """Phones match from the start or from the end, including the secondary phone"""
+        self.assertEqual(self.names('+99890'), ['Ali Karimov', 'Alisher Valiyev', 'Malika Aliyeva'])
+        self.assertEqual(self.names('55-44-33'), ["O‘tkir G'ulomov"])
+        self.assertEqual(self.names('901 234 567'), ['Alisher Valiyev'])
+        self.assertIsNone(search_q('  - '))
+
+    def test_ranked_search(self):
+        """Exact phone matches rank above prefixes; exact name tokens above prefixes"""
+        ranked = search_leads('998901234')
+        self.assertEqual([lead.name for lead in ranked], ['Malika Aliyeva', 'Ali Karimov', 'Alisher Valiyev'])
+        ranked = search_leads('ali')
+        self.assertEqual(ranked[0].name, 'Ali Karimov')
+        with self.assertNumQueries(3):
+            search_leads('ali', queryset=Lead.objects.filter(phone__startswith='+'))
+
+    def test_index_follows_saves(self):
+        """Saving a lead re-indexes it when the name or phone changes"""
+        lead = Lead.objects.get(pk=self.leads['Malika Aliyeva'].pk)
+        lead.name = 'Malika Saidova'
+        lead.save()
+        self.assertEqual(self.names('saidova'), ['Malika Saidova'])
+        self.assertEqual(self.names('aliyeva'), [])
+
+        lead = Lead.objects.get(pk=lead.pk)
+        # The status tracker's own lookup and the UPDATE; the index is untouched
+        with self.assertNumQueries(2):
+            lead.notes = 'Izoh'
+            lead.save(update_fields=['notes'])
+
+
+class LeadStatusTimingTestCase(TestCase):
+    """Test stored lead status timing and the dwell-time table"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.new = LeadStatus.objects.create(name='Yangi', code='new', order=1)
+        self.contacted = LeadStatus.objects.create(name='Aloqa qilindi', code='contacted', order=2)
+        self.interested = LeadStatus.objects.create(name='Qiziqmoqda', code='interested', order=3)
+        self.lead = Lead.objects.create(name='Lead', phone='+998901112233', status=self.new)
+
+    def move(self, lead, status, days_ago):
+        """Backdate the current status and then change it"""
+        Lead.objects.filter(pk=lead.pk).update(status_changed_at=timezone.now() - timedelta(days=days_ago))
+        lead.refresh_from_db()
+        lead.status = status
+        lead.save()
+        return lead
+
+    def test_status_change_records_dwell(self):
+        """Leaving a status adds its time to the dwell row and restarts the status clock"""
+        self.move(self.lead, self.contacted, 3)
+        self.assertLess(timezone.now() - self.lead.status_changed_at, timedelta(minutes=1))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.lead.days_in_status, 0)
+
+        self.move(self.lead, self.new, 2)
+        self.move(self.lead, self.contacted, 1)
+        self.lead.refresh_from_db()
+        self.assertEqual(self.lead.status, self.contacted)
+
+        dwell = LeadStatusDwell.objects.get(lead=self.lead, status=self.new)
+        self.assertEqual(dwell.visits, 2)
+        self.assertAlmostEqual(dwell.total_seconds, 4 * 86400, delta=60)
+        dwell = LeadStatusDwell.objects.get(lead=self.lead, status=self.contacted)
+        self.assertEqual(dwell.visits, 1)
+        self.assertAlmostEqual(dwell.total_seconds, 2 * 86400, delta=60)
+
+    def test_update_fields_save_keeps_status_time(self):
+        """A status change saved with update_fields still stores status_changed_at"""
+        Lead.objects.filter(pk=self.lead.pk).update(status_changed_at=timezone.now() - timedelta(days=5))
+        self.lead.refresh_from_db()
+        self.lead.status = self.interested
+        self.lead.save(update_fields=['status'])
+        self.lead.refresh_from_db()
+        self.assertEqual(self.lead.days_in_status, 0)
+        self.assertEqual(LeadStatusDwell.objects.get(lead=self.lead).status, self.new)
+
+    def test_stuck_leads_and_report(self):
+        """Stuck leads and the stage report come from indexed, grouped queries"""
+        other = Lead.objects.create(name='Other', phone='+998901112244', status=self.new)
+        self.move(self.lead, self.contacted, 4)
+        self.move(other, self.contacted, 2)
+        Lead.objects.filter(pk=self.lead.pk).update(status_changed_at=timezone.now() - timedelta(days=10))
+        self.assertEqual(list(stuck_leads(self.contacted, 7)), [self.lead])
+        self.assertEqual(list(stuck_leads(self.new, 7)), [])
+
+        with self.assertNumQueries(3):
+            report = dwell_report(stuck_days=7)
+        rows = {row['status'].code: row for row in report}
+        self.assertEqual([row['status'].code for row in report], ['new', 'contacted', 'interested'])
+        self.assertEqual((rows['new']['passed'], rows['new']['current']), (2, 0))
+        self.assertAlmostEqual(rows['new']['avg_days'], 3, places=2)
+        self.assertEqual((rows['contacted']['passed'], rows['contacted']['current']), (0, 2))
+        self.assertEqual((rows['contacted']['stuck'], rows['contacted']['oldest_days']), (1, 10))
+
+        scoped = {row['status'].code: row for row in dwell_report(Lead.objects.filter(pk=other.pk))}
+        self.assertEqual((scoped['new']['passed'], scoped['contacted']['current']), (1, 1))
+        self.assertAlmostEqual(scoped['new']['avg_days'], 2, places=2)
+
+    def test_rebuild_from_history(self):
+        """The dwell table and status clock can be rebuilt from lead history"""
+        self.lead.status = self.contacted
+        self.lead.save()
+        self.lead.status = self.interested
+        self.lead.save()
+        start = timezone.now() - timedelta(days=10)
+        history = list(LeadHistory.objects.filter(lead=self.lead).order_by('created_at'))
+        self.assertEqual(len(history), 3)
+        for entry, days in zip(history, [0, 4, 7]):
+            LeadHistory.objects.filter(pk=entry.pk).update(created_at=start + timedelta(days=days))
+        LeadStatusDwell.objects.all().delete()
+        Lead.objects.update(status_changed_at=timezone.now())
+        Lead.objects.bulk_create([Lead(name='Imported', phone='+998901112255', status=self.new)])
+
+        self.assertEqual(rebuild_dwell(), 2)
+        dwells = {
+            dwell.status_id: (dwell.visits, dwell.total_seconds)
+            for dwell in LeadStatusDwell.objects.filter(lead=self.lead)
+        }
+        self.assertEqual(dwells, {self.new.pk: (1, 4 * 86400), self.contacted.pk: (1, 3 * 86400)})
+        self.lead.refresh_from_db()
+        self.assertEqual(self.lead.status_changed_at, start + timedelta(days=7))
+        imported = Lead.objects.get(name='Imported')
+        self.assertEqual(imported.status_changed_at, imported.created_at)
+        self.assertFalse(LeadStatusDwell.objects.filter(lead=imported).exists())
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class LeadFunnelTestCase(TestCase):
+    """Test the lead funnel fact table and cohort queries"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.statuses = {
+            code: LeadStatus.objects.create(name=code, code=code, order=order)
+            for order, code in enumerate(['new', 'contacted', 'trial_registered', 'trial_attended',
+                                          'enrolled', 'lost'])
+        }
+        self.start = timezone.now() - timedelta(days=60)
+        self.first = self.walk('instagram', [('contacted', 1), ('trial_registered', 3), ('enrolled', 10)])
+        self.second = self.walk('instagram', [('contacted', 2), ('lost', 5)])
+        self.third = self.walk('telegram', [('contacted', 1), ('enrolled', 35)])
+
+    def walk(self, source, steps):
+        """Create a lead at self.start and move it through statuses on the given days"""
+        lead = Lead.objects.create(name=source, phone='+998900000000', source=source, status=self.statuses['new'])
+        Lead.objects.filter(pk=lead.pk).update(created_at=self.start)
+        LeadHistory.objects.filter(lead=lead).update(created_at=self.start)
+        lead.refresh_from_db()
+        for code, day in steps:
+            lead.status = self.statuses[code]
+            lead.save()
+            entry = LeadHistory.objects.filter(lead=lead, new_status=lead.status).latest('pk')
+            LeadHistory.objects.filter(pk=entry.pk).update(created_at=self.start + timedelta(days=day))
+        return lead
+
+    def test_cohort_funnel(self):
+        """Stages reached are counted per cohort, optionally within a window after creation"""
+        self.assertEqual(refresh_funnel(), 3)
+        rows = {row['cohort']: row for row in cohort_funnel('source')}
+        instagram, telegram = rows['instagram'], rows['telegram']
+        self.assertEqual((instagram['leads'], instagram['contacted'], instagram['trial_registered']), (2, 2, 1))
+        self.assertEqual((instagram['trial_attended'], instagram['enrolled'], instagram['lost']), (1, 1, 1))
+        self.assertEqual(instagram['rates']['enrolled'], 50)
+        self.assertEqual((telegram['leads'], telegram['enrolled']), (1, 1))
+
+        within = {row['cohort']: row for row in cohort_funnel('source', within_days=30)}
+        self.assertEqual((within['instagram']['enrolled'], within['telegram']['enrolled']), (1, 0))
+        self.assertEqual([row['leads'] for row in cohort_funnel('week')], [3])
+        scoped = cohort_funnel('source', facts=LeadFunnel.objects.filter(lead=self.third))
+        self.assertEqual([row['cohort'] for row in scoped], ['telegram'])
+
+        times = {row['cohort']: row for row in time_to_convert('enrolled', 'source')}
+        self.assertAlmostEqual(times['instagram']['avg_days'], 10, places=3)
+        self.assertAlmostEqual(times['telegram']['max_days'], 35, places=3)
+
+    def test_incremental_refresh(self):
+        """Only leads with new history or new leads are processed after the checkpoint"""
+        refresh_funnel()
+        self.second.status = self.statuses['trial_registered']
+        self.second.save()
+        Lead.objects.bulk_create([
+            Lead(name='Imported', phone='+998901234567', source='excel', status=self.statuses['contacted'])
+        ])
+        self.assertEqual(refresh_funnel(), 2)
+        self.assertEqual(refresh_funnel(), 0)
+
+        fact = LeadFunnel.objects.get(lead=self.second)
+        self.assertEqual(fact.contacted_at, self.start + timedelta(days=2))
+        self.assertIsNotNone(fact.trial_registered_at)
+        imported = LeadFunnel.objects.get(lead__name='Imported')
+        self.assertIsNotNone(imported.contacted_at)
+        self.assertIsNone(imported.enrolled_at)
+
+        before = list(LeadFunnel.objects.order_by('pk').values())
+        self.assertEqual(refresh_funnel(full=True), 4)
+        self.assertEqual(list(LeadFunnel.objects.order_by('pk').values()), before)
+
+    def test_analytics_view(self):
+        """The analytics page shows weekly and source funnels"""
+        refresh_funnel()
+        LeadFunnel.objects.update(created_at=timezone.now() - timedelta(days=3))
+        admin = User.objects.create_user(username='admin', password='admin123', role='admin')
+        self.client.force_login(admin)
+        response = self.client.get(reverse('crm:analytics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['weekly_funnel'][0]['leads'], 3)
+        self.assertEqual(len(response.context['weekly_funnel'][0]['stages']), 6)
+        sources = {row['cohort']: row for row in response.context['source_funnel']}
+        self.assertEqual(sources['instagram']['label'], 'Instagram')
+        self.assertContains(response, 'Voronka')
+
+
+class SalesFixtureMixin:
+    def setUp(self):
+        """Set up test data"""
+        self.branch = Branch.objects.create(name='Branch')
+        self.enrolled = LeadStatus.objects.create(name='Enrolled', code='enrolled', order=1)
+        self.admin = User.objects.create_user(username='admin', password='admin123', role='admin')
+        self.add_sales(2)
+
+    def add_sales(self, count):
+        start = SalesProfile.objects.count()
+        for i in range(start, start + count):
+            user = User.objects.create_user(username=f'sales{i}', password='sales123', role='sales')
+            SalesProfile.objects.bulk_create([SalesProfile(user=user, branch=self.branch)])
+            Lead.objects.bulk_create([
+                Lead(name=f'Lead {i}-{j}', phone=f'+99890{i:03d}{j:04d}', assigned_sales=user,
+                     status=self.enrolled if j == 0 else None)
+                for j in range(3)
+            ])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+                   QUERY_BUDGET_STRICT=True)
+class SalesUserListQueryBudgetTestCase(SalesFixtureMixin, TestCase):
+    """Test that the sales list does not run a query per salesperson"""
+
+    def get(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('crm:sales_list'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_query_count_does_not_grow(self):
+        """Lead and sale counts per salesperson come from one grouped query"""
+        self.client.force_login(self.admin)
+        queries, response = self.get()
+        profile = response.context['sales_profiles'][0]
+        self.assertEqual((profile.leads_total, profile.leads_enrolled), (3, 1))
+        self.assertEqual(response.context['overall_stats']['total_leads'], 6)
+
+        self.add_sales(5)
+        more_queries, response = self.get()
+        self.assertEqual(more_queries, queries)
+        self.assertEqual(response.context['overall_stats']['total_enrolled'], 7)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+                   QUERY_BUDGET_STRICT=True)
+class SalesPerformanceTestCase(SalesFixtureMixin, TestCase):
+    """Test the shared sales performance queries and the KPI pages built on them"""
+
+    def test_performance_values(self):
+        """Totals, conversion and current-month KPI come from one query"""
+        now = timezone.now()
+        second = User.objects.get(username='sales1')
+        SalesKPI.objects.create(sales=second, month=now.month, year=now.year, total_kpi_score=70, total_contacts=4)
+        SalesKPI.objects.create(sales=second, month=1, year=2000, total_kpi_score=99)
+        with self.assertNumQueries(1):
+            rows = list(sales_performance())
+        self.assertEqual([row.username for row in rows], ['sales1', 'sales0'])
+        self.assertEqual((rows[0].leads_total, rows[0].leads_enrolled), (3, 1))
+        self.assertAlmostEqual(rows[0].conversion, 100 / 3)
+        self.assertEqual(kpi_values(rows[0])['total_contacts'], 4)
+        self.assertIsNone(rows[1].kpi_score)
+        self.assertEqual(team_totals(profile_performance(SalesProfile.objects.all()))['avg_kpi'], 70)
+
+    def test_kpi_pages_do_not_write(self):
+        """KPI list and detail pages read without creating KPI rows or querying per seller"""
+        self.client.force_login(self.admin)
+        url = reverse('crm:sales_kpi')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(len(response.context['sales_kpi_data']), 2)
+        self.assertEqual(response.context['sales_kpi_data'][0]['total_leads'], 3)
+
+        self.add_sales(4)
+        with CaptureQueriesContext(connection) as more_queries:
+            response = self.client.get(url)
+        self.assertEqual(len(more_queries), len(queries))
+        self.assertEqual(len(response.context['sales_kpi_data']), 6)
+
+        seller = User.objects.get(username='sales0')
+        response = self.client.get(reverse('crm:sales_kpi_detail', args=[seller.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.context['total_leads'], response.context['enrolled_leads']), (3, 1))
+        self.assertFalse(SalesKPI.objects.exists())
+
+
+_lock_test_calls = []
+
+
+@shared_task(base=SingletonTask, on_busy='rerun', name='crm.tests.lock_test_task')
+def lock_test_task(nested=False):
+    """Runs itself once more while holding the lock when nested=True"""
+    _lock_test_calls.append(nested)
+    if nested:
+        return lock_test_task(nested=True)
+    return 'done'
+
+
+@skipUnless(redis_available(TEST_REDIS_URL), 'Redis is not available')
+@override_settings(TASK_LOCK_REDIS_URL=TEST_REDIS_URL)
+class SingletonTaskTestCase(TestCase):
+    """Test Redis locking and .delay() coalescing of periodic tasks"""
+
+    def setUp(self):
+        """Set up test data"""
+        get_redis('task_lock').flushdb()
+        _lock_test_calls.clear()
+
+    def test_delay_burst_is_coalesced(self):
+        """Repeated .delay() calls within the debounce window enqueue one delayed run"""
+        with mock.patch.object(Task, 'apply_async') as enqueue:
+            results = [assign_leads_to_sales.delay() for _ in range(5)]
+        enqueue.assert_called_once()
+        self.assertEqual(enqueue.call_args.kwargs['countdown'], assign_leads_to_sales.debounce)
+        self.assertEqual({result.id for result in results[1:]}, {enqueue.call_args.kwargs['task_id']})
+        stats = task_locks.stats()[assign_leads_to_sales.name]
+        self.assertEqual(stats['coalesced'], 4)
+
+    def test_run_closes_debounce_window(self):
+        """Once the delayed run starts, new calls schedule another run"""
+        with mock.patch.object(Task, 'apply_async') as enqueue:
+            assign_leads_to_sales.delay()
+            task_id = enqueue.call_args.kwargs['task_id']
+            assign_leads_to_sales.apply(task_id=task_id)
+            assign_leads_to_sales.delay()
+        self.assertEqual(enqueue.call_count, 2)
+
+    def test_busy_run_is_skipped_and_rerun(self):
+        """A run that finds the lock held is skipped and the holder reruns once afterwards"""
+        with mock.patch.object(Task, 'apply_async') as enqueue:
+            result = lock_test_task(nested=True)
+        self.assertIsNone(result)
+        self.assertEqual(_lock_test_calls, [True])
+        enqueue.assert_called_once()
+        self.assertEqual(enqueue.call_args.args, ((), {'nested': True}))
+        stats = task_locks.stats()[lock_test_task.name]
+        self.assertEqual((stats['runs'], stats['skipped'], stats['reruns']), (1, 1, 1))
+        self.assertFalse(get_redis('task_lock').exists(lock_test_task.singleton_key('running', (), {'nested': True})))
+
+    def test_lock_wait(self):
+        """With lock_wait the run waits for the holder instead of skipping"""
+        key = lock_test_task.singleton_key('running')
+        get_redis('task_lock').set(key, 'other-worker', px=300)
+        with mock.patch.object(lock_test_task, 'lock_wait', 2):
+            self.assertEqual(lock_test_task(), 'done')
+        stats = task_locks.stats()[lock_test_task.name]
+        self.assertEqual(stats['waited'], 1)
+        self.assertGreater(stats['wait_ms'], 0)
+
+
+@override_settings(TASK_LOCK_REDIS_URL=UNREACHABLE_REDIS_URL)
+class SingletonTaskFallbackTestCase(TestCase):
+    """Test that tasks still run when the lock store is down"""
+
+    def setUp(self):
+        """Set up test data"""
+        _lock_test_calls.clear()
+
+    def test_runs_without_lock(self):
+        """Without Redis the task runs unlocked and only logs a warning"""
+        with self.assertLogs('geeks_crm.task_locks', level='WARNING'):
+            self.assertEqual(lock_test_task(), 'done')
+        self.assertEqual(_lock_test_calls, [False])
+
+
+@override_settings(TASK_LOCK_REDIS_URL=UNREACHABLE_REDIS_URL)
+class LeadSignalTasksTestCase(TestCase):
+    """Test that lead signals send their Celery tasks once, after commit"""
+
+    def test_bulk_lead_creation_sends_one_assignment(self):
+        """Creating many unassigned leads in one transaction enqueues a single assignment run"""
+        with mock.patch.object(Task, 'apply_async') as enqueue, self.assertLogs('geeks_crm.task_locks', level='WARNING'):
+            with self.captureOnCommitCallbacks(execute=True):
+                for i in range(5):
+                    Lead.objects.create(name=f'Lead {i}', phone=f'+99890000000{i}')
+                enqueue.assert_not_called()
+        enqueue.assert_called_once()
@@ -3,7 +3,7 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.shortcuts import get_object_or_404, redirect
 from django.contrib import messages
 from django.utils import timezone
-from django.db.models import Q, Count, Avg
+from django.db.models import Q, Count
 from django.http import JsonResponse, HttpResponse
 from django.urls import reverse_lazy, reverse
 from datetime import timedelta
@@ -23,9 +23,14 @@ from .models import (
     WorkSchedule, Leave, SalesKPI, DailyKPI, SalesMessage, SalesMessageRead,
     Offer, Reactivation
 )
+from .funnel import STAGES, STAGE_LABELS, cohort_funnel, time_to_convert
+from .performance import kpi_values, profile_performance, sales_performance, team_totals
+from .search import search_q
 from accounts.models import User, Branch
-from accounts.mixins import RoleRequiredMixin, AdminRequiredMixin, TailwindFormMixin
-from courses.models import Course, Group, Room
+from accounts.access import get_access
+from accounts.mixins import RoleRequiredMixin, AdminRequiredMixin, TailwindFormMixin, KeysetPaginationMixin
+from courses.models import Course, Group
+from geeks_crm import side_effects
 
 
 # ==================== LEAD VIEWS ====================
@@ -47,11 +52,7 @@ class LeadKanbanView(LoginRequiredMixin, TemplateView):
         
         # Sales users see ALL leads (not filtered)
         # Sales managers see branch leads only
-        if self.request.user.is_sales_manager:
-            if hasattr(self.request.user, 'sales_profile') and self.request.user.sales_profile:
-                branch = self.request.user.sales_profile.branch
-                if branch:
-                    leads = leads.filter(branch=branch)
+        leads = get_access(self.request).scope_branch(leads)
         
         # Har bir status uchun lidlarni guruhlash
         kanban_data = []
@@ -93,7 +94,7 @@ class LeadKanbanView(LoginRequiredMixin, TemplateView):
         return context
 
 
-class LeadTableView(LoginRequiredMixin, ListView):
+class LeadTableView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     """
     Jadval ko'rinishi + filter + export
     """
@@ -101,17 +102,14 @@ class LeadTableView(LoginRequiredMixin, ListView):
     template_name = 'crm/lead_table.html'
     context_object_name = 'leads'
     paginate_by = 50
+    query_budget = 11
     
     def get_queryset(self):
         queryset = Lead.objects.select_related('status', 'assigned_sales', 'interested_course', 'branch')
         
         # Sales users see ALL leads (not filtered)
         # Sales managers see branch leads only
-        if self.request.user.is_sales_manager:
-            if hasattr(self.request.user, 'sales_profile') and self.request.user.sales_profile:
-                branch = self.request.user.sales_profile.branch
-                if branch:
-                    queryset = queryset.filter(branch=branch)
+        queryset = get_access(self.request).scope_branch(queryset)
         
         # Filterlar
         status = self.request.GET.get('status')
@@ -132,9 +130,8 @@ class LeadTableView(LoginRequiredMixin, ListView):
         
         search = self.request.GET.get('search')
         if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) | Q(phone__icontains=search)
-            )
+            condition = search_q(search)
+            queryset = queryset.filter(condition) if condition is not None else queryset.none()
         
         return queryset.order_by('-created_at')
     
@@ -162,11 +159,8 @@ class LeadExportView(LoginRequiredMixin, View):
         # Role bo'yicha filtrlash
         if request.user.is_sales:
             leads = leads.filter(assigned_sales=request.user)
-        elif request.user.is_sales_manager:
-            if hasattr(request.user, 'sales_profile') and request.user.sales_profile:
-                branch = request.user.sales_profile.branch
-                if branch:
-                    leads = leads.filter(branch=branch)
+        else:
+            leads = get_access(request).scope_branch(leads)
         
         # Filterlar - LeadTableView bilan bir xil
         status = request.GET.get('status')
@@ -187,10 +181,8 @@ class LeadExportView(LoginRequiredMixin, View):
         
         search = request.GET.get('search')
         if search:
-            from django.db.models import Q
-            leads = leads.filter(
-                Q(name__icontains=search) | Q(phone__icontains=search)
-            )
+            condition = search_q(search)
+            leads = leads.filter(condition) if condition is not None else leads.none()
         
         leads = leads.order_by('-created_at')
         
@@ -277,11 +269,7 @@ class LeadListView(LoginRequiredMixin, ListView):
         
         # Sales users see ALL leads (not filtered)
         # Sales managers see branch leads only
-        if self.request.user.is_sales_manager:
-            if hasattr(self.request.user, 'sales_profile') and self.request.user.sales_profile:
-                branch = self.request.user.sales_profile.branch
-                if branch:
-                    queryset = queryset.filter(branch=branch)
+        queryset = get_access(self.request).scope_branch(queryset)
         
         status_filter = self.request.GET.get('status')
         if status_filter:
@@ -365,7 +353,7 @@ class LeadDetailView(LoginRequiredMixin, DetailView):
         )
         
         context['statuses'] = LeadStatus.objects.filter(is_active=True).order_by('order')
-        context['groups'] = Group.objects.filter(is_active=True)
+        context['groups'] = Group.objects.filter(is_active=True).select_related('course').with_capacity()
         context['sales_users'] = User.objects.filter(role__in=['sales', 'sales_manager'], is_active=True)
         
         # Permissions
@@ -584,27 +572,29 @@ class LeadImportExcelView(RoleRequiredMixin, TemplateView):
             imported = 0
             duplicates = 0
             
-            for row in ws.iter_rows(min_row=2, values_only=True):
-                if not row[0] or not row[1]:
-                    continue
-                
-                name = str(row[0]).strip()
-                phone = str(row[1]).strip()
-                
-                # Duplicate tekshirish
-                if Lead.objects.filter(phone=phone).exists():
-                    duplicates += 1
-                    continue
-                
-                Lead.objects.create(
-                    name=name,
-                    phone=phone,
-                    secondary_phone=str(row[2]).strip() if row[2] else None,
-                    source='excel',
-                    status=new_status,
-                    created_by=request.user
-                )
-                imported += 1
+            # Taqsimlash vazifasi har bir lid uchun emas, import oxirida bir marta yuboriladi
+            with side_effects.deferred():
+                for row in ws.iter_rows(min_row=2, values_only=True):
+                    if not row[0] or not row[1]:
+                        continue
+                    
+                    name = str(row[0]).strip()
+                    phone = str(row[1]).strip()
+                    
+                    # Duplicate tekshirish
+                    if Lead.objects.filter(phone=phone).exists():
+                        duplicates += 1
+                        continue
+                    
+                    Lead.objects.create(
+                        name=name,
+                        phone=phone,
+                        secondary_phone=str(row[2]).strip() if row[2] else None,
+                        source='excel',
+                        status=new_status,
+                        created_by=request.user
+                    )
+                    imported += 1
             
             messages.success(request, f'{imported} ta lid import qilindi. {duplicates} ta dublikat.')
         
@@ -701,11 +691,10 @@ class FollowUpCompleteView(LoginRequiredMixin, View):
         
         # Ish vaqti tekshiruvi
         if request.user.is_sales:
-            if hasattr(request.user, 'sales_profile') and request.user.sales_profile:
-                profile = request.user.sales_profile
-                if not profile.is_working_now():
-                    messages.warning(request, 'Follow-up faqat ish vaqtida bajarilishi mumkin.')
-                    return redirect('crm:followup_today')
+            profile = get_access(request).sales_profile
+            if profile and not profile.is_working_now():
+                messages.warning(request, 'Follow-up faqat ish vaqtida bajarilishi mumkin.')
+                return redirect('crm:followup_today')
         
         followup.completed = True
         followup.completed_at = timezone.now()
@@ -800,7 +789,7 @@ class FollowUpBulkDeleteView(AdminRequiredMixin, View):
         return redirect('crm:followup_overdue')
 
 
-class FollowUpListView(LoginRequiredMixin, ListView):
+class FollowUpListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     """
     Follow-up'lar ro'yxati
     """
@@ -808,6 +797,7 @@ class FollowUpListView(LoginRequiredMixin, ListView):
     template_name = 'crm/followup_list.html'
     context_object_name = 'followups'
     paginate_by = 25
+    keyset_ordering = ['due_date', 'id']
     
     def get_queryset(self):
         queryset = FollowUp.objects.select_related('lead', 'sales')
@@ -910,15 +900,26 @@ class TrialRegisterView(TailwindFormMixin, RoleRequiredMixin, CreateView):
     fields = ['group', 'room', 'date', 'time']
     allowed_roles = ['admin', 'manager', 'sales_manager', 'sales']
     
+    def get_lead(self):
+        if not hasattr(self, 'lead'):
+            self.lead = get_object_or_404(Lead, pk=self.kwargs['lead_pk'])
+        return self.lead
+    
+    def get_form(self, form_class=None):
+        form = super().get_form(form_class)
+        # Faqat lid qiziqqan kursning bo'sh joyi bor guruhlari (to'lgan guruhni tanlab bo'lmaydi)
+        form.fields['group'].queryset = Group.objects.with_free_seats(
+            course=self.get_lead().interested_course_id
+        ).select_related('course')
+        return form
+    
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['lead'] = get_object_or_404(Lead, pk=self.kwargs['lead_pk'])
-        context['groups'] = Group.objects.filter(is_active=True)
-        context['rooms'] = Room.objects.filter(is_active=True)
+        context['lead'] = self.get_lead()
         return context
     
     def form_valid(self, form):
-        lead = get_object_or_404(Lead, pk=self.kwargs['lead_pk'])
+        lead = self.get_lead()
         form.instance.lead = lead
         
         # Lead statusini yangilash
@@ -1000,6 +1001,11 @@ class TrialLessonCreateView(TailwindFormMixin, RoleRequiredMixin, CreateView):
     allowed_roles = ['admin', 'manager', 'sales_manager', 'sales']
     success_url = reverse_lazy('crm:lead_list')
     
+    def get_form(self, form_class=None):
+        form = super().get_form(form_class)
+        form.fields['group'].queryset = Group.objects.with_free_seats().select_related('course')
+        return form
+    
     def form_valid(self, form):
         messages.success(self.request, 'Sinov darsi muvaffaqiyatli yaratildi.')
         return super().form_valid(form)
@@ -1184,8 +1190,9 @@ class SalesUserListView(RoleRequiredMixin, ListView):
     context_object_name = 'sales_profiles'
     allowed_roles = ['admin', 'manager', 'sales_manager']
     paginate_by = 25
+    query_budget = 13
     
-    def get_queryset(self):
+    def get_filtered_profiles(self):
         queryset = SalesProfile.objects.select_related('user', 'branch').filter(user__is_active=True)
         
         # Filterlar
@@ -1201,53 +1208,25 @@ class SalesUserListView(RoleRequiredMixin, ListView):
         elif status == 'inactive':
             queryset = queryset.filter(is_active_sales=False)
         
-        return queryset.order_by('user__first_name')
+        return queryset
+    
+    def get_queryset(self):
+        # Lidlar soni, yozilganlar va oylik KPI - bitta guruhlangan so'rovda (crm.performance)
+        return profile_performance(self.get_filtered_profiles()).order_by('user__first_name')
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        profiles = self.get_queryset()
-        
-        # Basic counts
-        context['total_count'] = profiles.count()
-        context['active_count'] = profiles.filter(is_active_sales=True, is_on_leave=False).count()
-        context['on_leave_count'] = profiles.filter(is_on_leave=True).count()
-        
-        # Get all sales users from filtered profiles
-        sales_users = [profile.user for profile in profiles]
-        
-        # Overall statistics for filtered salespeople
-        total_leads = Lead.objects.filter(assigned_sales__in=sales_users).count() if sales_users else 0
-        total_enrolled = Lead.objects.filter(
-            assigned_sales__in=sales_users,
-            status__code='enrolled'
-        ).count() if sales_users else 0
-        avg_conversion = (total_enrolled / total_leads * 100) if total_leads > 0 else 0
-        
-        # Average KPI score (current month)
-        current_month = timezone.now().month
-        current_year = timezone.now().year
-        kpis = SalesKPI.objects.filter(
-            sales__in=sales_users,
-            month=current_month,
-            year=current_year
-        ).aggregate(avg_kpi=Avg('total_kpi_score'))
-        avg_kpi = kpis['avg_kpi'] or 0
-        
-        # Har bir sotuvchi uchun lid va sotuvlar soni
-        for profile in context['sales_profiles']:
-            profile.leads_count = Lead.objects.filter(assigned_sales=profile.user).count()
-            profile.sales_count = Lead.objects.filter(
-                assigned_sales=profile.user, 
-                status__code='enrolled'
-            ).count()
+        profiles = self.get_filtered_profiles()
         
-        # Overall statistics
-        context['overall_stats'] = {
-            'total_leads': total_leads,
-            'total_enrolled': total_enrolled,
-            'avg_conversion': avg_conversion,
-            'avg_kpi': avg_kpi,
-        }
+        # Basic counts (bitta so'rov)
+        context.update(profiles.aggregate(
+            total_count=Count('id'),
+            active_count=Count('id', filter=Q(is_active_sales=True, is_on_leave=False)),
+            on_leave_count=Count('id', filter=Q(is_on_leave=True)),
+        ))
+        
+        # Overall statistics (filtrlangan sotuvchilar bo'yicha)
+        context['overall_stats'] = team_totals(profile_performance(profiles))
         
         # Filter uchun filiallar
         context['branches'] = Branch.objects.all()
@@ -1592,6 +1571,15 @@ class CRMAnalyticsView(RoleRequiredMixin, TemplateView):
     """
     template_name = 'crm/analytics.html'
     allowed_roles = ['admin', 'manager', 'sales_manager']
+    FUNNEL_WEEKS = 8
+    FUNNEL_WINDOW_DAYS = 30
+    
+    @staticmethod
+    def funnel_rows(rows):
+        """Shablon uchun bosqich kataklari: [(soni, foiz)] STAGES tartibida"""
+        for row in rows:
+            row['stages'] = [(row[stage], row['rates'][stage]) for stage, _ in STAGES]
+        return rows
     
     def get_context_data(self, **kwargs):
         from django.core.cache import cache
@@ -1637,6 +1625,22 @@ class CRMAnalyticsView(RoleRequiredMixin, TemplateView):
                 count=Count('id')
             ).order_by('-count'))
             
+            # Voronka: oxirgi haftalar kohortalari, bosqichga yaratilgandan keyin N kun ichida yetganlar
+            funnel_start = timezone.now() - timedelta(weeks=self.FUNNEL_WEEKS)
+            source_labels = dict(Lead.SOURCE_CHOICES)
+            weekly_funnel = self.funnel_rows(
+                cohort_funnel('week', within_days=self.FUNNEL_WINDOW_DAYS, start=funnel_start)
+            )
+            source_funnel = self.funnel_rows(
+                cohort_funnel('source', within_days=self.FUNNEL_WINDOW_DAYS, start=funnel_start)
+            )
+            enroll_times = {
+                row['cohort']: row for row in time_to_convert('enrolled', 'source', start=funnel_start)
+            }
+            for row in source_funnel:
+                row['label'] = source_labels.get(row['cohort'], row['cohort'])
+                row['enroll_days'] = enroll_times.get(row['cohort'], {}).get('avg_days')
+            
             stats = {
                 'total_leads': total_leads,
                 'enrolled_leads': enrolled_leads,
@@ -1648,6 +1652,10 @@ class CRMAnalyticsView(RoleRequiredMixin, TemplateView):
                 'conversion_rate': conversion_rate,
                 'sales_stats': sales_stats,
                 'source_stats': source_stats,
+                'funnel_stages': [STAGE_LABELS[stage] for stage, _ in STAGES],
+                'funnel_window_days': self.FUNNEL_WINDOW_DAYS,
+                'weekly_funnel': weekly_funnel,
+                'source_funnel': source_funnel,
             }
             
             # Cache for 5 minutes
@@ -1675,33 +1683,16 @@ class SalesKPIListView(RoleRequiredMixin, TemplateView):
         context['selected_month'] = month
         context['selected_year'] = year
         
-        # Get all sales users
-        sales_users = User.objects.filter(role__in=['sales', 'sales_manager'], is_active=True)
-        
-        # Get KPI data for each salesperson for selected month/year
+        # Lidlar, konversiya va tanlangan oy KPI si - bitta so'rov, yozuvsiz
         sales_kpi_data = []
-        for sales in sales_users:
-            try:
-                kpi = SalesKPI.objects.get(sales=sales, month=month, year=year)
-            except SalesKPI.DoesNotExist:
-                # Create default KPI if doesn't exist
-                kpi = SalesKPI.objects.create(sales=sales, month=month, year=year)
-            
-            # Get additional stats
-            total_leads = Lead.objects.filter(assigned_sales=sales).count()
-            enrolled_leads = Lead.objects.filter(assigned_sales=sales, status__code='enrolled').count()
-            conversion_rate = (enrolled_leads / total_leads * 100) if total_leads > 0 else 0
-            
+        for sales in sales_performance(year=year, month=month):
             sales_kpi_data.append({
                 'sales': sales,
-                'kpi': kpi,
-                'total_leads': total_leads,
-                'enrolled_leads': enrolled_leads,
-                'conversion_rate': conversion_rate,
+                'kpi': kpi_values(sales),
+                'total_leads': sales.leads_total,
+                'enrolled_leads': sales.leads_enrolled,
+                'conversion_rate': sales.conversion,
             })
-        
-        # Sort by KPI score
-        sales_kpi_data.sort(key=lambda x: x['kpi'].total_kpi_score, reverse=True)
         context['sales_kpi_data'] = sales_kpi_data
         
         # Month options for dropdown
@@ -1738,13 +1729,9 @@ class SalesKPIDetailView(RoleRequiredMixin, DetailView):
         month = self.kwargs.get('month') or int(self.request.GET.get('month', timezone.now().month))
         year = self.kwargs.get('year') or int(self.request.GET.get('year', timezone.now().year))
         
-        kpi, created = SalesKPI.objects.get_or_create(
-            sales=sales,
-            month=month,
-            year=year
-        )
-        
-        return kpi
+        # O'qishda yozuv yaratilmaydi - KPI hali hisoblanmagan bo'lsa bo'sh (saqlanmagan) obyekt
+        kpi = SalesKPI.objects.filter(sales=sales, month=month, year=year).first()
+        return kpi or SalesKPI(sales=sales, month=month, year=year)
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -1754,26 +1741,17 @@ class SalesKPIDetailView(RoleRequiredMixin, DetailView):
         # Additional statistics for sales user
         from django.db.models import Count, Q
         
-        # Total leads assigned to this sales
-        total_leads = Lead.objects.filter(assigned_sales=sales).count()
-        context['total_leads'] = total_leads
-        
-        # Enrolled leads (sales count)
-        enrolled_leads = Lead.objects.filter(assigned_sales=sales, status__code='enrolled').count()
-        context['enrolled_leads'] = enrolled_leads
-        
-        # Conversion rate
-        conversion_rate = (enrolled_leads / total_leads * 100) if total_leads > 0 else 0
-        context['conversion_rate'] = conversion_rate
+        # Lidlar, yozilganlar, yo'qotilganlar va konversiya (bitta so'rov)
+        stats = sales_performance(User.objects.filter(pk=sales.pk)).first()
+        context['total_leads'] = stats.leads_total if stats else 0
+        context['enrolled_leads'] = stats.leads_enrolled if stats else 0
+        context['conversion_rate'] = stats.conversion if stats else 0
+        context['lost_leads'] = stats.leads_lost if stats else 0
         
         # Trial lessons count
         trial_lessons = TrialLesson.objects.filter(lead__assigned_sales=sales).count()
         context['trial_lessons_count'] = trial_lessons
         
-        # Lost leads
-        lost_leads = Lead.objects.filter(assigned_sales=sales, status__code='lost').count()
-        context['lost_leads'] = lost_leads
-        
         # Overdue follow-ups
         overdue_followups = FollowUp.objects.filter(
             sales=sales,
@@ -1,3 +1,55 @@
-from django.test import TestCase
+from datetime import time, timedelta
 
-# Create your tests here.
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Exam, ExamResult
+from accounts.models import Branch, User
+from courses.models import Course, Group
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHE, QUERY_BUDGET_STRICT=True)
+class ExamListQueryBudgetTestCase(TestCase):
+    """Test that the exam list does not run a query per exam"""
+
+    def setUp(self):
+        """Set up test data"""
+        branch = Branch.objects.create(name='Branch')
+        self.course = Course.objects.create(name='Course', branch=branch)
+        self.group = Group.objects.create(course=self.course, name='G1', start_time=time(10, 0), end_time=time(12, 0))
+        self.student = User.objects.create_user(username='student', password='student123', role='student')
+        self.group.students.add(self.student)
+        self.add_exams(3)
+
+    def add_exams(self, count):
+        now = timezone.now()
+        exams = Exam.objects.bulk_create([
+            Exam(course=self.course, group=self.group, title=f'Exam {i}', date=now + timedelta(days=i - count))
+            for i in range(count)
+        ])
+        ExamResult.objects.bulk_create([
+            ExamResult(exam=exam, student=self.student, score=60, is_passed=i % 2 == 0)
+            for i, exam in enumerate(exams)
+        ])
+
+    def get(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('exams:exam_list'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_query_count_does_not_grow(self):
+        """Results for every listed exam are loaded in one query"""
+        self.client.force_login(self.student)
+        queries, response = self.get()
+        self.assertEqual(response.context['passed_exams'], 2)
+
+        self.add_exams(10)
+        more_queries, response = self.get()
+        self.assertEqual(more_queries, queries)
+        self.assertEqual(response.context['passed_exams'], 7)
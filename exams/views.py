@@ -6,8 +6,10 @@ from django.utils import timezone
 from django.urls import reverse_lazy
 from django.db.models import Avg, Count
 from .models import Exam, ExamResult, Question, StudentAnswer, Answer
+from accounts.access import get_access
 from accounts.mixins import RoleRequiredMixin, MentorRequiredMixin, TailwindFormMixin
 from courses.models import Course, Group
+from geeks_crm import side_effects
 
 
 class ExamListView(LoginRequiredMixin, ListView):
@@ -15,14 +17,15 @@ class ExamListView(LoginRequiredMixin, ListView):
     template_name = 'exams/exam_list.html'
     context_object_name = 'exams'
     paginate_by = 25
+    query_budget = 15
     
     def get_queryset(self):
         queryset = Exam.objects.select_related('course', 'group')
         
         if self.request.user.is_student:
-            queryset = queryset.filter(group__students=self.request.user, is_active=True)
+            queryset = queryset.filter(group__in=get_access(self.request).student_group_ids, is_active=True)
         elif self.request.user.is_mentor:
-            queryset = queryset.filter(group__mentor=self.request.user)
+            queryset = queryset.filter(group__in=get_access(self.request).mentored_group_ids)
         
         # Filterlar
         course_id = self.request.GET.get('course')
@@ -45,13 +48,10 @@ class ExamListView(LoginRequiredMixin, ListView):
         # For students, add exam results
         if self.request.user.is_student:
             from .models import ExamResult
-            exam_results = {}
-            for exam in queryset:
-                result = ExamResult.objects.filter(
-                    exam=exam,
-                    student=self.request.user
-                ).first()
-                exam_results[exam.id] = result
+            exam_results = {
+                result.exam_id: result
+                for result in ExamResult.objects.filter(exam__in=queryset.order_by(), student=self.request.user)
+            }
             context['exam_results'] = exam_results
             
             # Calculate stats
@@ -69,12 +69,12 @@ class ExamListView(LoginRequiredMixin, ListView):
             context['stats'].append({'label': 'O\'tdi', 'value': context.get('passed_exams', 0), 'icon': 'fas fa-trophy', 'color': 'text-yellow-600'})
         
         if self.request.user.is_mentor:
-            context['groups'] = Group.objects.filter(mentor=self.request.user, is_active=True)
+            context['groups'] = Group.objects.filter(pk__in=get_access(self.request).mentored_group_ids, is_active=True)
         elif self.request.user.is_admin or self.request.user.is_manager:
             context['groups'] = Group.objects.filter(is_active=True)
             context['courses'] = Course.objects.filter(is_active=True)
         elif self.request.user.is_student:
-            context['groups'] = Group.objects.filter(students=self.request.user, is_active=True)
+            context['groups'] = Group.objects.filter(pk__in=get_access(self.request).student_group_ids, is_active=True)
         
         # Permissions
         user = self.request.user
@@ -199,7 +199,7 @@ class ExamCreateView(RoleRequiredMixin, CreateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         if self.request.user.is_mentor:
-            context['groups'] = Group.objects.filter(mentor=self.request.user, is_active=True)
+            context['groups'] = Group.objects.filter(pk__in=get_access(self.request).mentored_group_ids, is_active=True)
         else:
             context['groups'] = Group.objects.filter(is_active=True)
         context['courses'] = Course.objects.filter(is_active=True)
@@ -223,7 +223,7 @@ class ExamUpdateView(RoleRequiredMixin, UpdateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         if self.request.user.is_mentor:
-            context['groups'] = Group.objects.filter(mentor=self.request.user, is_active=True)
+            context['groups'] = Group.objects.filter(pk__in=get_access(self.request).mentored_group_ids, is_active=True)
         else:
             context['groups'] = Group.objects.filter(is_active=True)
         context['courses'] = Course.objects.filter(is_active=True)
@@ -354,18 +354,20 @@ class ExamResultEntryView(RoleRequiredMixin, TemplateView):
         student_ids = request.POST.getlist('student_ids')
         scores = request.POST.getlist('scores')
         
-        for i, student_id in enumerate(student_ids):
-            if scores[i]:
-                score = int(scores[i])
-                result, created = ExamResult.objects.update_or_create(
-                    exam=exam,
-                    student_id=student_id,
-                    defaults={
-                        'score': score,
-                        'is_passed': score >= exam.passing_score,
-                        'submitted_at': timezone.now()
-                    }
-                )
+        # Ballar har bir o'quvchi uchun saqlashlardan keyin bir marta qayta hisoblanadi
+        with side_effects.deferred():
+            for i, student_id in enumerate(student_ids):
+                if scores[i]:
+                    score = int(scores[i])
+                    result, created = ExamResult.objects.update_or_create(
+                        exam=exam,
+                        student_id=student_id,
+                        defaults={
+                            'score': score,
+                            'is_passed': score >= exam.passing_score,
+                            'submitted_at': timezone.now()
+                        }
+                    )
         
         messages.success(request, 'Natijalar saqlandi.')
         return redirect('exams:exam_results', pk=pk)
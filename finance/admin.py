@@ -21,7 +21,7 @@ class ContractAdmin(admin.ModelAdmin):
     search_fields = ['contract_number', 'student__username', 'student__email']
     ordering = ['-created_at']
     readonly_fields = ['paid_amount', 'remaining_amount', 'payment_percentage', 'is_paid',
-                      'created_at', 'updated_at']
+                      'next_due_date', 'created_at', 'updated_at']
     fieldsets = (
         ('Asosiy ma\'lumotlar', {
             'fields': ('contract_number', 'student', 'course', 'group', 'lead', 'status')
@@ -29,7 +29,7 @@ class ContractAdmin(admin.ModelAdmin):
         ('Shartnoma ma\'lumotlari', {
             'fields': ('start_date', 'end_date', 'total_amount', 'discount_amount', 
                       'discount_percentage', 'paid_amount', 'remaining_amount', 
-                      'payment_percentage', 'is_paid')
+                      'payment_percentage', 'is_paid', 'next_due_date')
         }),
         ('Qo\'shimcha', {
             'fields': ('notes', 'signed_at', 'signed_by', 'created_by', 'created_at', 'updated_at')
@@ -0,0 +1,216 @@
+"""
+Shartnoma balanslarini yuritish
+paid_amount har bir to'lovda qayta yig'ilmaydi - faqat farq (delta) atomik UPDATE bilan qo'shiladi.
+To'lov rejalari (PaymentPlan) taqsimoti va next_due_date shu tranzaksiyada yangilanadi.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, DateField, DecimalField, F, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from geeks_crm import side_effects
+from .models import Contract, Payment, PaymentPlan
+
+
+BATCH_SIZE = 500
+
+# Oylik summalar yaxlitlanganda (masalan 1000/3) oxirgi rejada tiyin farq qolmasligi uchun
+ALLOCATION_TOLERANCE = Decimal('0.01')
+
+AMOUNT_FIELD = DecimalField(max_digits=10, decimal_places=2)
+
+
+def _to_decimal(value):
+    if isinstance(value, Decimal):
+        return value
+    return Decimal(str(value or 0))
+
+
+def _batches(items, size=BATCH_SIZE):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _case_by_value(values, output_field, default):
+    """
+    {pk: qiymat} → CASE WHEN pk IN (...) THEN qiymat; bir xil qiymatlar bitta WHEN ga guruhlanadi
+    """
+    groups = defaultdict(list)
+    for pk, value in values.items():
+        groups[value].append(pk)
+    return Case(
+        *[When(pk__in=pks, then=Value(value)) for value, pks in groups.items()],
+        default=default,
+        output_field=output_field,
+    )
+
+
+def remember_payment_state(payment):
+    """
+    To'lovning bazadagi holatini eslab qolish (status o'tishlarini aniqlash uchun).
+    Payment.from_db va saqlangandan keyin chaqiriladi - qo'shimcha so'rov yo'q.
+    """
+    payment._balance_state = (payment.contract_id, payment.status, _to_decimal(payment.amount))
+
+
+def payment_deltas(payment, deleted=False):
+    """
+    To'lov o'zgarishi shartnomalar paid_amount iga qanday ta'sir qilishi.
+    Faqat 'completed' to'lovlar hisobga olinadi, shuning uchun:
+    pending→completed: +amount, completed→refunded/cancelled: -amount,
+    summa yoki shartnoma o'zgarsa: eskisi ayiriladi, yangisi qo'shiladi.
+    Qaytaradi: {contract_id: delta}
+    """
+    deltas = defaultdict(Decimal)
+    old_state = getattr(payment, '_balance_state', None)
+    if old_state:
+        old_contract_id, old_status, old_amount = old_state
+        if old_status == 'completed':
+            deltas[old_contract_id] -= old_amount
+    if not deleted and payment.status == 'completed':
+        deltas[payment.contract_id] += _to_decimal(payment.amount)
+    return {contract_id: delta for contract_id, delta in deltas.items() if delta}
+
+
+def apply_contract_deltas(deltas, paid_on=None, allocate=True):
+    """
+    paid_amount = paid_amount + delta (bir nechta shartnoma uchun bitta UPDATE),
+    so'ng to'lov rejalari taqsimotini yangilash (allocate=False - chaqiruvchi o'zi taqsimlaydi).
+    deltas: {contract_id: Decimal}
+    """
+    deltas = {contract_id: delta for contract_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    now = timezone.now()
+    with transaction.atomic():
+        for batch in _batches(deltas):
+            Contract.objects.filter(pk__in=batch).update(
+                paid_amount=F('paid_amount') + _case_by_value(
+                    {contract_id: deltas[contract_id] for contract_id in batch},
+                    AMOUNT_FIELD,
+                    Value(Decimal('0')),
+                ),
+                updated_at=now,
+            )
+        if allocate:
+            allocate_payment_plans(deltas.keys(), paid_on=paid_on)
+
+
+def allocate_payment_plans(contract_ids, paid_on=None):
+    """
+    To'lov rejalarini shartnoma paid_amount i bo'yicha taqsimlash.
+    Rejalar installment_number tartibida yopiladi; to'lov aniq rejaga bog'langan bo'lsa
+    (Payment.payment_plan) u reja har doim to'langan hisoblanadi.
+    Shartnomaning next_due_date maydoni birinchi to'lanmagan reja sanasiga teng bo'ladi.
+    So'rovlar soni shartnomalar soniga bog'liq emas.
+    """
+    contract_ids = list(contract_ids)
+    if not contract_ids:
+        return
+
+    paid_on = paid_on or timezone.now().date()
+    now = timezone.now()
+
+    budgets = {}
+    next_due = {}
+    for batch in _batches(contract_ids):
+        for contract_id, paid_amount, next_due_date in Contract.objects.filter(pk__in=batch).values_list(
+            'id', 'paid_amount', 'next_due_date'
+        ).order_by():
+            budgets[contract_id] = paid_amount or Decimal('0')
+            next_due[contract_id] = next_due_date
+
+    plans = defaultdict(list)
+    for batch in _batches(contract_ids):
+        plan_rows = PaymentPlan.objects.filter(contract_id__in=batch).annotate(
+            linked_payments=Count('payments', filter=Q(payments__status='completed'))
+        ).values_list('id', 'contract_id', 'amount', 'due_date', 'is_paid', 'linked_payments').order_by(
+            'contract_id', 'installment_number'
+        )
+        for row in plan_rows:
+            plans[row[1]].append(row)
+
+    newly_paid, newly_unpaid = [], []
+    next_due_changes = {}
+    for contract_id, budget in budgets.items():
+        first_unpaid_due = None
+        for plan_id, _, amount, due_date, is_paid, linked_payments in plans.get(contract_id, []):
+            if linked_payments:
+                should_be_paid = True
+            else:
+                should_be_paid = budget + ALLOCATION_TOLERANCE >= amount
+            if should_be_paid:
+                budget -= amount
+            elif first_unpaid_due is None:
+                first_unpaid_due = due_date
+
+            if should_be_paid and not is_paid:
+                newly_paid.append(plan_id)
+            elif not should_be_paid and is_paid:
+                newly_unpaid.append(plan_id)
+
+        if next_due.get(contract_id) != first_unpaid_due:
+            next_due_changes[contract_id] = first_unpaid_due
+
+    for batch in _batches(newly_paid):
+        PaymentPlan.objects.filter(pk__in=batch).update(is_paid=True, paid_date=paid_on, updated_at=now)
+    for batch in _batches(newly_unpaid):
+        PaymentPlan.objects.filter(pk__in=batch).update(is_paid=False, paid_date=None, updated_at=now)
+    for batch in _batches(next_due_changes):
+        Contract.objects.filter(pk__in=batch).update(
+            next_due_date=_case_by_value(
+                {contract_id: next_due_changes[contract_id] for contract_id in batch},
+                DateField(),
+                None,
+            )
+        )
+
+
+def apply_payment_change(payment, deleted=False):
+    """
+    Bitta to'lov saqlanganda/o'chirilganda shartnoma balansini yangilash.
+    paid_amount darhol o'zgaradi, rejalar taqsimoti - commit dan keyin, har bir shartnoma uchun bir marta
+    (finance.signals.allocate_changed_contracts).
+    Xotiradagi payment.contract ham yangilanadi, keyingi contract.save() eski qiymatni yozmasligi uchun.
+    """
+    deltas = payment_deltas(payment, deleted=deleted)
+    paid_on = timezone.localdate(payment.paid_at) if payment.paid_at else None
+    apply_contract_deltas(deltas, paid_on=paid_on, allocate=False)
+    for contract_id in deltas:
+        side_effects.mark('payment_plans', (contract_id, paid_on))
+
+    if Payment.contract.is_cached(payment) and payment.contract_id in deltas:
+        payment.contract.paid_amount = _to_decimal(payment.contract.paid_amount) + deltas[payment.contract_id]
+
+    if not deleted:
+        remember_payment_state(payment)
+
+
+def find_balance_mismatches(contract_ids=None):
+    """
+    paid_amount ni yakunlangan to'lovlar yig'indisi bilan solishtirish (bitta guruhlangan so'rov).
+    Qaytaradi: [(contract_id, saqlangan, haqiqiy), ...]
+    """
+    contracts = Contract.objects.all()
+    if contract_ids is not None:
+        contracts = contracts.filter(pk__in=list(contract_ids))
+    rows = contracts.annotate(
+        actual_paid=Coalesce(
+            Sum('payments__amount', filter=Q(payments__status='completed')),
+            Value(Decimal('0')),
+            output_field=AMOUNT_FIELD,
+        )
+    ).exclude(paid_amount=F('actual_paid')).values_list('id', 'paid_amount', 'actual_paid').order_by('id')
+    return list(rows)
+
+
+def fix_balance_mismatches(mismatches):
+    """Topilgan farqlarni tuzatish va rejalarni qayta taqsimlash"""
+    deltas = {contract_id: _to_decimal(actual) - _to_decimal(stored) for contract_id, stored, actual in mismatches}
+    apply_contract_deltas(deltas)
+    return len(deltas)
@@ -0,0 +1,38 @@
+"""
+Django management command: Oylik moliya hisobotlarini yaratish / qayta hisoblash
+Usage: python manage.py build_financial_reports --from 2025-01 --to 2025-12
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from finance.reports import build_monthly_reports
+
+
+def parse_month(value):
+    try:
+        year, month = value.split('-')
+        year, month = int(year), int(month)
+    except ValueError:
+        raise CommandError(f"Noto'g'ri oy formati: {value} (YYYY-MM kutilmoqda)")
+    if not 1 <= month <= 12:
+        raise CommandError(f"Noto'g'ri oy: {value}")
+    return year, month
+
+
+class Command(BaseCommand):
+    help = 'Oylik moliya hisobotlarini (umumiy + filiallar) yaratish yoki yangilash'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start', help='Boshlanish oyi (YYYY-MM), default: joriy oy')
+        parser.add_argument('--to', dest='end', help='Tugash oyi (YYYY-MM), default: --from')
+    
+    def handle(self, *args, **options):
+        now = timezone.now()
+        start = parse_month(options['start']) if options['start'] else (now.year, now.month)
+        end = parse_month(options['end']) if options['end'] else start
+        if end < start:
+            raise CommandError("--to oyi --from oyidan oldin bo'lishi mumkin emas")
+        
+        reports = build_monthly_reports(start, end)
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(reports)} ta hisobot yangilandi: {start[0]}-{start[1]:02d} — {end[0]}-{end[1]:02d}"
+        ))
@@ -0,0 +1,30 @@
+"""
+Django management command: Shartnoma balanslarini tekshirish
+Usage: python manage.py check_contract_balances [--fix]
+"""
+from django.core.management.base import BaseCommand
+from finance.balances import find_balance_mismatches, fix_balance_mismatches
+
+
+class Command(BaseCommand):
+    help = "Contract.paid_amount ni yakunlangan to'lovlar yig'indisi bilan solishtirish"
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Topilgan farqlarni tuzatish')
+    
+    def handle(self, *args, **options):
+        mismatches = find_balance_mismatches()
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS('Barcha shartnoma balanslari to\'g\'ri.'))
+            return
+        
+        for contract_id, stored, actual in mismatches:
+            self.stdout.write(f"Shartnoma #{contract_id}: saqlangan {stored}, haqiqiy {actual}")
+        
+        if options['fix']:
+            fixed = fix_balance_mismatches(mismatches)
+            self.stdout.write(self.style.SUCCESS(f"{fixed} ta shartnoma balansi tuzatildi."))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f"{len(mismatches)} ta shartnomada farq topildi. Tuzatish uchun --fix qo'shing."
+            ))
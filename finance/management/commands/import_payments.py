@@ -0,0 +1,44 @@
+"""
+Django management command: To'lovlarni fayldan import qilish
+Usage: python manage.py import_payments statement.xlsx [--dry-run]
+"""
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from finance.payment_import import import_payments
+
+
+class Command(BaseCommand):
+    help = "Bank ko'chirmasi / to'lovlar faylini (CSV yoki XLSX) import qilish"
+    
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV yoki XLSX fayl')
+        parser.add_argument('--method', default='transfer', help="Standart to'lov turi (default: transfer)")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Import qilib, tranzaksiyani bekor qilish (tekshirish va benchmark uchun)")
+    
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f"Fayl topilmadi: {path}")
+        
+        mode = 'rb' if path.lower().endswith(('.xlsx', '.xlsm')) else 'r'
+        encoding = None if mode == 'rb' else 'utf-8-sig'
+        with open(path, mode, encoding=encoding) as file:
+            result = import_payments(
+                file,
+                filename=os.path.basename(path),
+                default_method=options['method'],
+                dry_run=options['dry_run'],
+            )
+        
+        for item in result.unmatched:
+            self.stdout.write(f"Qator {item['row']}: {item['reason']} {item['values']}")
+        
+        self.stdout.write(self.style.SUCCESS(
+            f"{result.total_rows} qator: {result.created} ta to'lov ({result.total_amount:,.2f} so'm), "
+            f"{result.contracts_updated} ta shartnoma, {result.duplicates} dublikat, "
+            f"{len(result.unmatched)} mos kelmadi. "
+            f"{result.elapsed:.2f}s ({result.rows_per_second:,.0f} qator/s)"
+            + (' [dry-run]' if options['dry_run'] else '')
+        ))
@@ -0,0 +1,173 @@
+"""
+Moliya ko'rsatkichlari (dashboard va hisobotlar uchun)
+Har bir ko'rsatkich guruhi bitta so'rov bilan hisoblanadi va Redis keshida saqlanadi.
+Kesh to'lov/shartnoma/qarz o'zgarganda signallar orqali tozalanadi.
+"""
+import logging
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Count, DecimalField, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncMonth
+from django.utils import timezone
+
+from .models import Contract, Payment, PaymentPlan, Debt, PaymentReminder
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY = 'finance_metrics'
+CACHE_TIMEOUT = 600  # 10 daqiqa (eslatmalar va "bu oy" ko'rsatkichlari uchun)
+SERIES_MONTHS = 12
+
+ZERO = Value(Decimal('0'))
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+
+
+def _money_sum(field, **filter_kwargs):
+    condition = Q(**filter_kwargs) if filter_kwargs else None
+    return Coalesce(Sum(field, filter=condition), ZERO, output_field=MONEY)
+
+
+def _month_key(value):
+    if isinstance(value, datetime):
+        value = value.date()
+    return value.replace(day=1)
+
+
+def last_months(count, today=None):
+    """Oxirgi `count` oyning birinchi kunlari (eskidan yangiga), joriy oy ham kiradi"""
+    today = today or timezone.localdate()
+    year, month = today.year, today.month
+    months = []
+    for _ in range(count):
+        months.append(date(year, month, 1))
+        month -= 1
+        if month == 0:
+            year, month = year - 1, 12
+    return list(reversed(months))
+
+
+def monthly_series(months=SERIES_MONTHS):
+    """
+    Oylar bo'yicha to'lovlar va shartnomalar summasi.
+    Har bir jadval uchun bitta TruncMonth guruhlangan so'rov.
+    """
+    month_starts = last_months(months)
+    since = timezone.make_aware(datetime.combine(month_starts[0], datetime.min.time()))
+
+    payments = {
+        _month_key(row['month']): row['total']
+        for row in Payment.objects.filter(status='completed', paid_at__gte=since)
+        .annotate(month=TruncMonth('paid_at')).values('month')
+        .annotate(total=Sum('amount')).order_by()
+    }
+    contracts = {
+        _month_key(row['month']): row
+        for row in Contract.objects.filter(created_at__gte=since)
+        .annotate(month=TruncMonth('created_at')).values('month')
+        .annotate(total=Sum('total_amount'), count=Count('id')).order_by()
+    }
+
+    series = []
+    for month_start in month_starts:
+        contract_row = contracts.get(month_start, {})
+        series.append({
+            'month': month_start.strftime('%Y-%m'),
+            'label': month_start.strftime('%b'),
+            'payments': payments.get(month_start) or 0,
+            'contracts': contract_row.get('total') or 0,
+            'contracts_count': contract_row.get('count', 0),
+        })
+    return series
+
+
+def course_breakdown():
+    """
+    Faol kurslar bo'yicha daromad, to'langan summa va shartnomalar soni (bitta so'rov)
+    """
+    from courses.models import Course
+
+    rows = Course.objects.filter(is_active=True).annotate(
+        revenue=_money_sum('contracts__total_amount'),
+        paid=_money_sum('contracts__paid_amount'),
+        contracts_count=Count('contracts'),
+    ).values('id', 'name', 'revenue', 'paid', 'contracts_count').order_by('name')
+
+    return [
+        {
+            'id': row['id'],
+            'name': row['name'],
+            'revenue': row['revenue'],
+            'paid': row['paid'],
+            'remaining': row['revenue'] - row['paid'],
+            'contracts': row['contracts_count'],
+        }
+        for row in rows
+    ]
+
+
+def dashboard_totals():
+    """
+    Dashboard kartochkalari uchun umumiy ko'rsatkichlar.
+    Har bir jadval uchun bitta shartli agregatsiya so'rovi.
+    """
+    now = timezone.now()
+    today = timezone.localdate()
+    month_start = timezone.make_aware(datetime.combine(today.replace(day=1), datetime.min.time()))
+
+    contracts = Contract.objects.aggregate(
+        total_contracts=Count('id'),
+        active_contracts=Count('id', filter=Q(status='active')),
+        total_revenue=_money_sum('total_amount'),
+        total_paid=_money_sum('paid_amount'),
+        contracts_this_month=Count('id', filter=Q(created_at__gte=month_start)),
+        revenue_this_month=_money_sum('total_amount', created_at__gte=month_start),
+    )
+    payments = Payment.objects.filter(status='completed', paid_at__gte=month_start).aggregate(
+        payments_this_month=_money_sum('amount'),
+    )
+    debts = Debt.objects.filter(is_paid=False).aggregate(
+        total_debts=_money_sum('amount'),
+        overdue_debts=_money_sum('amount', due_date__lt=today),
+    )
+
+    totals = {**contracts, **payments, **debts}
+    totals['pending_reminders'] = PaymentReminder.objects.filter(
+        is_sent=False, reminder_date__lte=today
+    ).count()
+    totals['pending_payments'] = PaymentPlan.objects.filter(
+        is_paid=False, due_date__gte=today
+    ).count()
+    totals['generated_at'] = now
+    return totals
+
+
+def get_finance_metrics():
+    """
+    Dashboard va hisobotlar uchun barcha ko'rsatkichlar (keshlangan; Redis ishlamasa bazadan)
+    """
+    try:
+        metrics = cache.get(CACHE_KEY)
+    except Exception as e:
+        logger.warning(f"Error reading finance metrics cache: {e}")
+        metrics = None
+    if metrics is None:
+        metrics = {
+            'totals': dashboard_totals(),
+            'monthly_series': monthly_series(),
+            'courses': course_breakdown(),
+        }
+        try:
+            cache.set(CACHE_KEY, metrics, CACHE_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"Error writing finance metrics cache: {e}")
+    return metrics
+
+
+def invalidate_finance_metrics():
+    try:
+        cache.delete(CACHE_KEY)
+    except Exception as e:
+        # To'lov allaqachon yozilgan - kesh CACHE_TIMEOUT dan keyin baribir yangilanadi
+        logger.warning(f"Error invalidating finance metrics cache: {e}")
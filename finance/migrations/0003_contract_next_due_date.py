@@ -0,0 +1,37 @@
+# Generated by Django 5.0.1 on 2026-10-19 14:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_next_due_date(apps, schema_editor):
+    Contract = apps.get_model('finance', 'Contract')
+    PaymentPlan = apps.get_model('finance', 'PaymentPlan')
+    first_unpaid = PaymentPlan.objects.filter(
+        contract=models.OuterRef('pk'),
+        is_paid=False
+    ).order_by('installment_number').values('due_date')[:1]
+    Contract.objects.update(next_due_date=models.Subquery(first_unpaid))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0006_alter_topic_description'),
+        ('crm', '0004_lead_converted_student'),
+        ('finance', '0002_alter_contract_options_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contract',
+            name='next_due_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='contract',
+            index=models.Index(fields=['status', 'next_due_date'], name='finance_con_status_59cce8_idx'),
+        ),
+        migrations.RunPython(populate_next_due_date, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.1 on 2026-10-19 16:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0003_contract_next_due_date'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['paid_at', 'created_at'], name='finance_pay_paid_at_eebfb2_idx'),
+        ),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
 from django.core.validators import MinValueValidator
@@ -61,6 +61,7 @@ class Contract(models.Model):
                                         validators=[MinValueValidator(0)])
     discount_percentage = models.DecimalField(max_digits=5, decimal_places=2, default=0,
                                             validators=[MinValueValidator(0)])
+    next_due_date = models.DateField(null=True, blank=True)  # Birinchi to'lanmagan reja sanasi
     
     # Qo'shimcha ma'lumotlar
     notes = models.TextField(blank=True, null=True)
@@ -83,6 +84,7 @@ class Contract(models.Model):
             models.Index(fields=['student', 'status']),
             models.Index(fields=['status', 'start_date']),
             models.Index(fields=['contract_number']),
+            models.Index(fields=['status', 'next_due_date']),
         ]
     
     def __str__(self):
@@ -195,28 +197,30 @@ class Payment(models.Model):
         indexes = [
             models.Index(fields=['contract', 'paid_at']),
             models.Index(fields=['status', 'paid_at']),
+            models.Index(fields=['paid_at', 'created_at']),
             models.Index(fields=['payment_number']),
         ]
     
     def __str__(self):
         return f"{self.payment_number} - {self.amount} so'm"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Balans o'zgarishini (delta) hisoblash uchun bazadagi holat
+        if not instance.get_deferred_fields() & {'contract_id', 'status', 'amount'}:
+            from .balances import remember_payment_state
+            remember_payment_state(instance)
+        return instance
+    
     def save(self, *args, **kwargs):
         # To'lov yakunlanganda
         if self.status == 'completed' and not self.paid_at:
             self.paid_at = timezone.now()
-            
-            # Contract paid_amount yangilash
-            self.contract.paid_amount += self.amount
-            self.contract.save()
-            
-            # PaymentPlan yangilash
-            if self.payment_plan:
-                self.payment_plan.is_paid = True
-                self.payment_plan.paid_date = timezone.now().date()
-                self.payment_plan.save()
         
-        super().save(*args, **kwargs)
+        # Contract balansi va PaymentPlan post_save signalida shu tranzaksiya ichida yangilanadi
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
 
 class PaymentHistory(models.Model):
@@ -0,0 +1,316 @@
+"""
+To'lovlarni fayldan (bank ko'chirmasi, CSV/XLSX) paketli import qilish
+Qatorlar shartnomaga xotiradagi indekslar orqali bog'lanadi (shartnoma raqami yoki telefon),
+to'lovlar bulk_create bilan yaratiladi, balanslar va to'lov rejalari set-based yangilanadi.
+"""
+import csv
+import io
+import re
+import secrets
+import time
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+
+from .balances import apply_contract_deltas
+from .metrics import invalidate_finance_metrics
+from .models import Contract, Payment, PaymentHistory
+
+
+BATCH_SIZE = 1000
+
+# Sarlavha nomlari (kichik harflarda) → ichki maydon
+COLUMN_ALIASES = {
+    'contract_number': 'contract_number',
+    'contract': 'contract_number',
+    'shartnoma': 'contract_number',
+    'shartnoma raqami': 'contract_number',
+    'phone': 'phone',
+    'telefon': 'phone',
+    'amount': 'amount',
+    'summa': 'amount',
+    'paid_at': 'paid_at',
+    'date': 'paid_at',
+    'sana': 'paid_at',
+    'payment_method': 'payment_method',
+    'method': 'payment_method',
+    "to'lov turi": 'payment_method',
+    'receipt_number': 'receipt_number',
+    'receipt': 'receipt_number',
+    'chek': 'receipt_number',
+    'notes': 'notes',
+    'izoh': 'notes',
+}
+
+# Shartnomaga to'lov qabul qilinmaydigan statuslar
+CLOSED_CONTRACT_STATUSES = ['cancelled']
+
+DATE_FORMATS = ['%Y-%m-%d', '%d.%m.%Y', '%d/%m/%Y', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%d.%m.%Y %H:%M']
+
+PAYMENT_METHODS = {code for code, _ in Payment.PAYMENT_METHOD_CHOICES}
+
+
+class PaymentImportResult:
+    """
+    Import natijasi
+    """
+    def __init__(self):
+        self.total_rows = 0
+        self.created = 0
+        self.total_amount = Decimal('0')
+        self.duplicates = 0
+        self.unmatched = []  # [{'row': 5, 'reason': '...', 'values': {...}}]
+        self.contracts_updated = 0
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_second(self):
+        if not self.elapsed:
+            return 0
+        return self.total_rows / self.elapsed
+
+    def add_unmatched(self, row_number, reason, values):
+        self.unmatched.append({'row': row_number, 'reason': reason, 'values': values})
+
+
+def normalize_phone(value):
+    """Faqat raqamlar, oxirgi 9 ta raqam (+998 kodisiz)"""
+    digits = re.sub(r'\D', '', str(value or ''))
+    return digits[-9:] if len(digits) >= 9 else digits
+
+
+def parse_amount(value):
+    if isinstance(value, (int, float, Decimal)):
+        amount = Decimal(str(value))
+    else:
+        text = str(value or '').replace(' ', '').replace('\xa0', '')
+        # "1,200,000.00" va "1200000,50" ikkalasini ham qo'llab-quvvatlash
+        if ',' in text and '.' in text:
+            text = text.replace(',', '')
+        else:
+            text = text.replace(',', '.')
+        try:
+            amount = Decimal(text)
+        except InvalidOperation:
+            return None
+    return amount.quantize(Decimal('0.01')) if amount > 0 else None
+
+
+def parse_paid_at(value):
+    if not value:
+        return timezone.now()
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, date):
+        parsed = datetime(value.year, value.month, value.day)
+    else:
+        parsed = None
+        for fmt in DATE_FORMATS:
+            try:
+                parsed = datetime.strptime(str(value).strip(), fmt)
+                break
+            except ValueError:
+                continue
+        if parsed is None:
+            return None
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def read_payment_rows(file, filename=''):
+    """
+    CSV yoki XLSX fayldan qatorlarni o'qish.
+    Birinchi qator - sarlavhalar. Qaytaradi: (qator_raqami, {maydon: qiymat}) generator
+    """
+    if filename.lower().endswith(('.xlsx', '.xlsm')):
+        import openpyxl
+        wb = openpyxl.load_workbook(file, read_only=True, data_only=True)
+        rows = wb.active.iter_rows(values_only=True)
+    else:
+        content = file.read()
+        if isinstance(content, bytes):
+            content = content.decode('utf-8-sig')
+        sample = content[:4096]
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+        except csv.Error:
+            dialect = csv.excel
+        rows = csv.reader(io.StringIO(content), dialect)
+
+    header = next(rows, None)
+    if not header:
+        return
+    columns = [COLUMN_ALIASES.get(str(name or '').strip().lower()) for name in header]
+
+    for row_number, row in enumerate(rows, start=2):
+        values = {}
+        for column, value in zip(columns, row):
+            if column and value not in (None, ''):
+                values[column] = value.strip() if isinstance(value, str) else value
+        if values:
+            yield row_number, values
+
+
+class ContractIndex:
+    """
+    Shartnomalarni raqam va telefon bo'yicha xotirada izlash (bitta so'rov bilan quriladi)
+    """
+    def __init__(self):
+        self.by_number = {}
+        self.by_phone = defaultdict(set)
+        self.status = {}
+
+        rows = Contract.objects.exclude(status__in=CLOSED_CONTRACT_STATUSES).values_list(
+            'id', 'contract_number', 'status', 'student__phone', 'lead__phone', 'lead__secondary_phone'
+        ).order_by('id').iterator(chunk_size=5000)
+        for contract_id, number, status, student_phone, lead_phone, lead_secondary_phone in rows:
+            self.by_number[number.strip().upper()] = contract_id
+            self.status[contract_id] = status
+            for phone in (student_phone, lead_phone, lead_secondary_phone):
+                phone = normalize_phone(phone)
+                if phone:
+                    self.by_phone[phone].add(contract_id)
+
+    def match(self, values):
+        """
+        Qaytaradi: (contract_id, None) yoki (None, sabab)
+        """
+        number = (_text(values.get('contract_number')) or '').upper()
+        if number:
+            contract_id = self.by_number.get(number)
+            if contract_id:
+                return contract_id, None
+            return None, 'Shartnoma raqami topilmadi'
+
+        phone = normalize_phone(values.get('phone'))
+        if not phone:
+            return None, "Shartnoma raqami yoki telefon ko'rsatilmagan"
+
+        candidates = self.by_phone.get(phone, set())
+        if not candidates:
+            return None, 'Telefon bo\'yicha shartnoma topilmadi'
+        if len(candidates) > 1:
+            # Bir nechta shartnoma bo'lsa - faqat bitta faol shartnoma aniq moslik hisoblanadi
+            active = [contract_id for contract_id in candidates if self.status[contract_id] == 'active']
+            if len(active) != 1:
+                return None, 'Telefon bir nechta shartnomaga mos keladi'
+            return active[0], None
+        return next(iter(candidates)), None
+
+
+def _text(value):
+    """Excel raqamli katakchalari (12345.0) uchun ham toza matn"""
+    if value in (None, ''):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _existing_receipts(receipts):
+    existing = set()
+    receipts = list(receipts)
+    for i in range(0, len(receipts), BATCH_SIZE):
+        existing.update(
+            Payment.objects.filter(receipt_number__in=receipts[i:i + BATCH_SIZE]).values_list('receipt_number', flat=True).order_by()
+        )
+    return existing
+
+
+def import_payments(file, filename='', created_by=None, default_method='transfer', dry_run=False):
+    """
+    To'lovlar faylini import qilish.
+    So'rovlar soni qatorlar soniga emas, paketlar soniga bog'liq:
+    indeks (1) + chek dublikatlari + bulk_create(Payment, PaymentHistory) + balans/rejalar yangilash.
+    dry_run=True - hamma narsa hisoblanadi, lekin tranzaksiya bekor qilinadi.
+    """
+    started = time.monotonic()
+    result = PaymentImportResult()
+    index = ContractIndex()
+
+    parsed = []
+    for row_number, values in read_payment_rows(file, filename):
+        result.total_rows += 1
+
+        contract_id, reason = index.match(values)
+        if reason:
+            result.add_unmatched(row_number, reason, values)
+            continue
+
+        amount = parse_amount(values.get('amount'))
+        if amount is None:
+            result.add_unmatched(row_number, "Summa noto'g'ri", values)
+            continue
+
+        paid_at = parse_paid_at(values.get('paid_at'))
+        if paid_at is None:
+            result.add_unmatched(row_number, "Sana noto'g'ri", values)
+            continue
+
+        method = str(values.get('payment_method') or '').strip().lower()
+        parsed.append({
+            'row': row_number,
+            'contract_id': contract_id,
+            'amount': amount,
+            'paid_at': paid_at,
+            'payment_method': method if method in PAYMENT_METHODS else default_method,
+            'receipt_number': _text(values.get('receipt_number')),
+            'notes': values.get('notes'),
+        })
+
+    # Qayta import qilingan cheklar (bazada yoki faylning o'zida)
+    existing = _existing_receipts({item['receipt_number'] for item in parsed if item['receipt_number']})
+    stamp = f"{timezone.now().strftime('%Y%m%d%H%M%S')}-{secrets.token_hex(3)}"
+    payments = []
+    deltas = defaultdict(Decimal)
+    for item in parsed:
+        receipt = item['receipt_number']
+        if receipt:
+            if receipt in existing:
+                result.duplicates += 1
+                continue
+            existing.add(receipt)
+
+        payments.append(Payment(
+            payment_number=f"IMP-{stamp}-{item['row']}",
+            contract_id=item['contract_id'],
+            amount=item['amount'],
+            payment_method=item['payment_method'],
+            status='completed',
+            paid_at=item['paid_at'],
+            receipt_number=receipt,
+            notes=item['notes'],
+            created_by=created_by,
+        ))
+        deltas[item['contract_id']] += item['amount']
+        result.total_amount += item['amount']
+
+    with transaction.atomic():
+        # bulk_create signallarni chaqirmaydi - tarix va balanslar quyida paketli yoziladi
+        Payment.objects.bulk_create(payments, batch_size=BATCH_SIZE)
+        PaymentHistory.objects.bulk_create([
+            PaymentHistory(
+                payment=payment,
+                action='created',
+                new_value=f"To'lov yaratildi: {payment.amount} so'm",
+                changed_by=created_by,
+                notes=f"Import: {filename or 'fayl'}",
+            )
+            for payment in payments
+        ], batch_size=BATCH_SIZE)
+        paid_on = timezone.localdate(max(payment.paid_at for payment in payments)) if payments else None
+        apply_contract_deltas(deltas, paid_on=paid_on)
+
+        result.created = len(payments)
+        result.contracts_updated = len(deltas)
+        if dry_run:
+            transaction.set_rollback(True)
+        elif payments:
+            transaction.on_commit(invalidate_finance_metrics)
+
+    result.elapsed = time.monotonic() - started
+    return result
@@ -0,0 +1,165 @@
+"""
+Oylik moliya hisobotlarini yaratish
+Barcha filiallar va umumiy hisobot bitta guruhlangan so'rov orqali hisoblanadi
+"""
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import Contract, Payment, Debt, FinancialReport
+
+
+REPORT_FIELDS = ['total_contracts', 'total_revenue', 'total_payments', 'total_debts', 'total_discounts']
+
+
+def month_bounds(year, month):
+    """Oyning birinchi va oxirgi kuni"""
+    period_start = date(year, month, 1)
+    if month == 12:
+        period_end = date(year + 1, 1, 1) - timedelta(days=1)
+    else:
+        period_end = date(year, month + 1, 1) - timedelta(days=1)
+    return period_start, period_end
+
+
+def iter_months(start, end):
+    """
+    (yil, oy) juftliklari, start va end ham kiradi
+    start, end: (year, month)
+    """
+    year, month = start
+    while (year, month) <= tuple(end):
+        yield year, month
+        month += 1
+        if month > 12:
+            year, month = year + 1, 1
+
+
+def _month_key(value):
+    """TruncMonth natijasini date ga keltirish (DateTimeField uchun datetime qaytadi)"""
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def _empty_totals():
+    return {
+        'total_contracts': 0,
+        'total_revenue': Decimal('0'),
+        'total_payments': Decimal('0'),
+        'total_debts': Decimal('0'),
+        'total_discounts': Decimal('0'),
+    }
+
+
+def collect_monthly_totals(start, end):
+    """
+    Har bir (oy, filial) uchun statistikani hisoblash.
+    Har bir jadval (Contract, Payment, Debt) uchun bitta guruhlangan so'rov.
+    Qaytaradi: {(period_start, branch_id): totals}, branch_id=None - umumiy hisobot
+    """
+    range_start = month_bounds(*start)[0]
+    range_end = month_bounds(*end)[1]
+    totals = {}
+
+    def add(month, branch_id, **values):
+        month = _month_key(month)
+        for key in (branch_id, None):
+            bucket = totals.setdefault((month, key), _empty_totals())
+            for field, value in values.items():
+                bucket[field] += value or 0
+
+    contract_rows = (
+        Contract.objects
+        .filter(created_at__date__gte=range_start, created_at__date__lte=range_end)
+        .annotate(month=TruncMonth('created_at'))
+        .values('month', 'course__branch')
+        .annotate(count=Count('id'), revenue=Sum('total_amount'), discounts=Sum('discount_amount'))
+        .order_by()
+    )
+    for row in contract_rows:
+        add(row['month'], row['course__branch'], total_contracts=row['count'],
+            total_revenue=row['revenue'], total_discounts=row['discounts'])
+
+    payment_rows = (
+        Payment.objects
+        .filter(paid_at__date__gte=range_start, paid_at__date__lte=range_end, status='completed')
+        .annotate(month=TruncMonth('paid_at'))
+        .values('month', 'contract__course__branch')
+        .annotate(total=Sum('amount'))
+        .order_by()
+    )
+    for row in payment_rows:
+        add(row['month'], row['contract__course__branch'], total_payments=row['total'])
+
+    debt_rows = (
+        Debt.objects
+        .filter(due_date__gte=range_start, due_date__lte=range_end, is_paid=False)
+        .annotate(month=TruncMonth('due_date'))
+        .values('month', 'contract__course__branch')
+        .annotate(total=Sum('amount'))
+        .order_by()
+    )
+    for row in debt_rows:
+        add(row['month'], row['contract__course__branch'], total_debts=row['total'])
+
+    return totals
+
+
+def build_monthly_reports(start, end=None, created_by=None):
+    """
+    Oylik hisobotlarni yaratish yoki yangilash (umumiy + har bir filial).
+    start, end: (year, month); end berilmasa faqat start oyi.
+    Mavjud hisobotlar bulk_update, yangilari bulk_create orqali saqlanadi.
+    """
+    from accounts.models import Branch
+
+    end = end or start
+    months = list(iter_months(start, end))
+    if not months:
+        return []
+
+    totals = collect_monthly_totals(start, end)
+    branch_ids = list(Branch.objects.order_by('id').values_list('id', flat=True))
+    periods = {month_bounds(year, month)[0]: month_bounds(year, month) for year, month in months}
+
+    existing = {}
+    for report in FinancialReport.objects.filter(
+        report_type='monthly',
+        period_start__in=list(periods),
+    ).order_by('id'):
+        key = (report.period_start, report.period_end, report.branch_id)
+        existing.setdefault(key, report)
+
+    now = timezone.now()
+    to_create, to_update = [], []
+    for period_start, period_end in periods.values():
+        for branch_id in [None] + branch_ids:
+            values = totals.get((period_start, branch_id), _empty_totals())
+            report = existing.get((period_start, period_end, branch_id))
+            if report is None:
+                report = FinancialReport(
+                    report_type='monthly',
+                    period_start=period_start,
+                    period_end=period_end,
+                    branch_id=branch_id,
+                    created_by=created_by,
+                )
+                to_create.append(report)
+            else:
+                report.updated_at = now
+                to_update.append(report)
+            for field, value in values.items():
+                setattr(report, field, value)
+
+    with transaction.atomic():
+        if to_update:
+            FinancialReport.objects.bulk_update(to_update, REPORT_FIELDS + ['updated_at'], batch_size=500)
+        if to_create:
+            FinancialReport.objects.bulk_create(to_create, batch_size=500)
+
+    return to_update + to_create
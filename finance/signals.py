@@ -2,10 +2,15 @@
 Django signals for Finance app
 Avtomatik yangilanishlar
 """
-from django.db.models.signals import post_save, pre_save
-from django.db.models import Sum
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from .models import Contract, Payment, PaymentPlan, PaymentHistory
+from .models import Contract, Payment, PaymentPlan, PaymentHistory, Debt
+from geeks_crm import side_effects
+from .balances import allocate_payment_plans, apply_payment_change
+from .metrics import invalidate_finance_metrics
 
 
 @receiver(post_save, sender=Payment)
@@ -22,19 +27,19 @@ def create_payment_history(sender, instance, created, **kwargs):
             notes=f"To'lov raqami: {instance.payment_number}"
         )
     else:
-        # Status o'zgargan
-        if 'status' in kwargs.get('update_fields', []):
-            old_status = Payment.objects.get(pk=instance.pk).status if Payment.objects.filter(pk=instance.pk).exists() else None
-            
-            if old_status != instance.status:
-                PaymentHistory.objects.create(
-                    payment=instance,
-                    action='status_changed',
-                    old_value=old_status,
-                    new_value=instance.status,
-                    changed_by=None,
-                    notes=f"Status o'zgardi: {old_status} → {instance.status}"
-                )
+        # Status o'zgargan (eski holat Payment.from_db da eslab qolingan - qo'shimcha so'rov yo'q)
+        old_state = getattr(instance, '_balance_state', None)
+        old_status = old_state[1] if old_state else None
+        
+        if old_status != instance.status:
+            PaymentHistory.objects.create(
+                payment=instance,
+                action='status_changed',
+                old_value=old_status,
+                new_value=instance.status,
+                changed_by=None,
+                notes=f"Status o'zgardi: {old_status} → {instance.status}"
+            )
 
 
 @receiver(post_save, sender=Contract)
@@ -54,30 +59,60 @@ def create_payment_plans(sender, instance, created, **kwargs):
         monthly_amount = (instance.total_amount - instance.discount_amount) / months
         
         current_date = instance.start_date
-        for i in range(1, months + 1):
-            # Har oy uchun 30 kun qo'shish
-            due_date = current_date + timedelta(days=30 * i)
-            
-            PaymentPlan.objects.create(
+        plans = [
+            PaymentPlan(
                 contract=instance,
                 installment_number=i,
                 amount=monthly_amount,
-                due_date=due_date
+                # Har oy uchun 30 kun qo'shish
+                due_date=current_date + timedelta(days=30 * i)
             )
+            for i in range(1, months + 1)
+        ]
+        PaymentPlan.objects.bulk_create(plans)
+        
+        instance.next_due_date = plans[0].due_date
+        Contract.objects.filter(pk=instance.pk).update(next_due_date=instance.next_due_date)
 
 
 @receiver(post_save, sender=Payment)
 def update_contract_paid_amount(sender, instance, **kwargs):
     """
     To'lov yaratilganda yoki o'zgarganda contract paid_amount ni yangilash
+    Qayta yig'ish o'rniga faqat farq (delta) qo'shiladi: pending→completed, refund va h.k.
     """
-    if instance.status == 'completed':
-        # Contract paid_amount ni qayta hisoblash
-        total_paid = Payment.objects.filter(
-            contract=instance.contract,
-            status='completed'
-        ).aggregate(total=Sum('amount'))['total'] or 0
-        
-        instance.contract.paid_amount = total_paid
-        instance.contract.save()
+    apply_payment_change(instance)
+
+
+@receiver(post_delete, sender=Payment)
+def revert_contract_paid_amount(sender, instance, **kwargs):
+    """
+    Yakunlangan to'lov o'chirilganda contract paid_amount dan ayirish
+    """
+    apply_payment_change(instance, deleted=True)
 
+
+@side_effects.handler('payment_plans')
+def allocate_changed_contracts(keys):
+    """
+    Balansi o'zgargan shartnomalar rejalarini taqsimlash ((contract_id, paid_on) bo'yicha,
+    bir xil sanadagilar bitta chaqiruvda)
+    """
+    by_date = defaultdict(set)
+    for contract_id, paid_on in keys:
+        by_date[paid_on].add(contract_id)
+    for paid_on, contract_ids in by_date.items():
+        allocate_payment_plans(contract_ids, paid_on=paid_on)
+
+
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+@receiver(post_save, sender=Contract)
+@receiver(post_delete, sender=Contract)
+@receiver(post_save, sender=Debt)
+@receiver(post_delete, sender=Debt)
+def invalidate_finance_metrics_cache(sender, **kwargs):
+    """
+    Moliya dashboard keshini tozalash (tranzaksiya yakunlangandan keyin)
+    """
+    transaction.on_commit(invalidate_finance_metrics)
@@ -4,9 +4,10 @@ Avtomatik eslatmalar va hisobotlar
 """
 from celery import shared_task
 from django.utils import timezone
-from django.db.models import Q, Sum
+from django.db.models import Q
 from datetime import timedelta
-from .models import Contract, PaymentPlan, Debt, PaymentReminder, FinancialReport
+from .models import PaymentPlan, Debt, PaymentReminder
+from .reports import build_monthly_reports
 from telegram_bot.tasks import send_payment_reminder
 import logging
 
@@ -114,6 +115,7 @@ def create_payment_reminders():
 def generate_monthly_financial_report(month=None, year=None, branch_id=None):
     """
     Oylik moliya hisoboti yaratish
+    Umumiy va barcha filiallar hisobotlari bitta o'tishda yangilanadi
     """
     try:
         if not month or not year:
@@ -121,68 +123,36 @@ def generate_monthly_financial_report(month=None, year=None, branch_id=None):
             month = month or now.month
             year = year or now.year
         
-        # Oyning boshi va oxiri
-        from datetime import datetime
-        period_start = datetime(year, month, 1).date()
-        if month == 12:
-            period_end = datetime(year + 1, 1, 1).date() - timedelta(days=1)
-        else:
-            period_end = datetime(year, month + 1, 1).date() - timedelta(days=1)
+        reports = build_monthly_reports((year, month))
         
-        # Hisobot yaratish
-        report, created = FinancialReport.objects.get_or_create(
-            report_type='monthly',
-            period_start=period_start,
-            period_end=period_end,
-            branch_id=branch_id,
-            defaults={
-                'created_by_id': 1  # Admin user ID
-            }
-        )
-        
-        # Statistikalar
-        contracts = Contract.objects.filter(
-            created_at__date__gte=period_start,
-            created_at__date__lte=period_end
-        )
-        if branch_id:
-            contracts = contracts.filter(course__branch_id=branch_id)
-        
-        report.total_contracts = contracts.count()
-        report.total_revenue = contracts.aggregate(total=Sum('total_amount'))['total'] or 0
-        report.total_discounts = contracts.aggregate(total=Sum('discount_amount'))['total'] or 0
-        
-        # To'lovlar
-        payments = Payment.objects.filter(
-            paid_at__date__gte=period_start,
-            paid_at__date__lte=period_end,
-            status='completed'
-        )
-        if branch_id:
-            payments = payments.filter(contract__course__branch_id=branch_id)
-        
-        report.total_payments = payments.aggregate(total=Sum('amount'))['total'] or 0
-        
-        # Qarzlar
-        debts = Debt.objects.filter(
-            due_date__gte=period_start,
-            due_date__lte=period_end,
-            is_paid=False
-        )
-        if branch_id:
-            debts = debts.filter(contract__course__branch_id=branch_id)
-        
-        report.total_debts = debts.aggregate(total=Sum('amount'))['total'] or 0
+        logger.info(f"Monthly financial report generated: {month}/{year} ({len(reports)} reports)")
         
-        report.save()
-        
-        logger.info(f"Monthly financial report generated: {month}/{year}")
-        return report.id
+        # branch_id berilgan bo'lsa - filial hisoboti, aks holda umumiy hisobot
+        for report in reports:
+            if report.branch_id == branch_id:
+                return report.id
     
     except Exception as e:
         logger.error(f"Error generating monthly financial report: {e}")
 
 
+@shared_task
+def backfill_monthly_financial_reports(start_year, start_month, end_year, end_month):
+    """
+    Oylar oralig'i uchun moliya hisobotlarini qayta yaratish
+    """
+    try:
+        reports = build_monthly_reports((start_year, start_month), (end_year, end_month))
+        logger.info(
+            f"Financial reports backfilled: {start_month}/{start_year} - {end_month}/{end_year} "
+            f"({len(reports)} reports)"
+        )
+        return len(reports)
+    
+    except Exception as e:
+        logger.error(f"Error backfilling financial reports: {e}")
+
+
 @shared_task
 def check_overdue_payments():
     """
@@ -1,3 +1,386 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from .models import Contract, Payment, PaymentHistory, Debt, FinancialReport
+from .balances import allocate_payment_plans, find_balance_mismatches
+from .reports import build_monthly_reports, month_bounds
+from accounts.models import Branch
+from courses.models import Course
+
+User = get_user_model()
+UNREACHABLE_CACHE = {'default': {
+    'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://127.0.0.1:1/0',
+}}
+
+
+class FinancialReportBuilderTestCase(TestCase):
+    """Test one-pass monthly financial report generation"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.branch_a = Branch.objects.create(name='Branch A')
+        self.branch_b = Branch.objects.create(name='Branch B')
+        self.student = User.objects.create_user(username='student', password='student123', role='student')
+        self.course_a = Course.objects.create(name='Course A', branch=self.branch_a, price=1000)
+        self.course_b = Course.objects.create(name='Course B', branch=self.branch_b, price=1000)
+
+        today = timezone.localdate()
+        self.year, self.month = today.year, today.month
+
+        self.contract_a = self._contract('CNT-A', self.course_a, 1000, 100)
+        self.contract_b = self._contract('CNT-B', self.course_b, 500, 0)
+
+        Payment.objects.create(payment_number='PAY-A', contract=self.contract_a, amount=300, status='completed')
+        Payment.objects.create(payment_number='PAY-B', contract=self.contract_b, amount=200, status='completed')
+        Payment.objects.create(payment_number='PAY-P', contract=self.contract_b, amount=999, status='pending')
+        Debt.objects.create(contract=self.contract_b, amount=50, due_date=today)
+
+    def _contract(self, number, course, total, discount):
+        return Contract.objects.create(
+            contract_number=number,
+            student=self.student,
+            course=course,
+            start_date=timezone.localdate(),
+            end_date=timezone.localdate() + timedelta(days=90),
+            total_amount=total,
+            discount_amount=discount,
+        )
+
+    def test_builds_company_and_branch_reports(self):
+        """Company-wide and per-branch reports are produced in one call"""
+        with self.assertNumQueries(8):
+            reports = build_monthly_reports((self.year, self.month))
+        self.assertEqual(len(reports), 3)
+
+        by_branch = {report.branch_id: report for report in FinancialReport.objects.all()}
+        overall = by_branch[None]
+        self.assertEqual(overall.total_contracts, 2)
+        self.assertEqual(overall.total_revenue, Decimal('1500'))
+        self.assertEqual(overall.total_discounts, Decimal('100'))
+        self.assertEqual(overall.total_payments, Decimal('500'))
+        self.assertEqual(overall.total_debts, Decimal('50'))
+
+        branch_b = by_branch[self.branch_b.id]
+        self.assertEqual(branch_b.total_contracts, 1)
+        self.assertEqual(branch_b.total_payments, Decimal('200'))
+        self.assertEqual(branch_b.total_debts, Decimal('50'))
+
+    def test_rebuild_updates_existing_reports(self):
+        """Re-running the builder updates rows instead of duplicating them"""
+        build_monthly_reports((self.year, self.month))
+        Payment.objects.create(payment_number='PAY-A2', contract=self.contract_a, amount=100, status='completed')
+        build_monthly_reports((self.year, self.month))
+
+        self.assertEqual(FinancialReport.objects.count(), 3)
+        report = FinancialReport.objects.get(branch=self.branch_a)
+        self.assertEqual(report.total_payments, Decimal('400'))
+
+    def test_backfill_month_range(self):
+        """Backfilling a range creates empty reports for months without data"""
+        start = (self.year - 1, self.month)
+        reports = build_monthly_reports(start, (self.year, self.month))
+        self.assertEqual(len(reports), 13 * 3)
+
+        period_start, period_end = month_bounds(*start)
+        old_report = FinancialReport.objects.get(period_start=period_start, branch__isnull=True)
+        self.assertEqual(old_report.period_end, period_end)
+        self.assertEqual(old_report.total_contracts, 0)
+
+    def test_month_bounds(self):
+        """Month bounds handle December and leap years"""
+        self.assertEqual(month_bounds(2024, 12), (date(2024, 12, 1), date(2024, 12, 31)))
+        self.assertEqual(month_bounds(2024, 2), (date(2024, 2, 1), date(2024, 2, 29)))
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ContractBalanceTestCase(TestCase):
+    """Test delta-based contract balance maintenance"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.branch = Branch.objects.create(name='Test Branch')
+        self.student = User.objects.create_user(username='student', password='student123', role='student')
+        self.course = Course.objects.create(name='Test Course', branch=self.branch, duration_weeks=12, price=900)
+        self.contract = Contract.objects.create(
+            contract_number='CNT-1',
+            student=self.student,
+            course=self.course,
+            status='active',
+            start_date=timezone.localdate(),
+            end_date=timezone.localdate() + timedelta(days=90),
+            total_amount=900,
+        )
+        self.plans = list(self.contract.payment_plans.order_by('installment_number'))
+
+    def _payment(self, number, amount, status='completed'):
+        # Rejalar taqsimoti commit dan keyin ishlaydi (geeks_crm.side_effects)
+        with self.captureOnCommitCallbacks(execute=True):
+            return Payment.objects.create(payment_number=number, contract=self.contract, amount=amount, status=status)
+
+    def test_plans_and_next_due_date_created(self):
+        """Active contract gets payment plans and the first due date"""
+        self.contract.refresh_from_db()
+        self.assertEqual(len(self.plans), 3)
+        self.assertEqual(self.contract.next_due_date, self.plans[0].due_date)
+
+    def test_completed_payment_adds_delta_and_allocates_plans(self):
+        """A completed payment increments paid_amount and closes covered plans"""
+        self._payment('PAY-1', 600)
+        self.contract.refresh_from_db()
+        self.assertEqual(self.contract.paid_amount, Decimal('600'))
+        self.assertEqual(self.contract.remaining_amount, Decimal('300'))
+        self.assertEqual(self.contract.next_due_date, self.plans[2].due_date)
+        paid_flags = list(self.contract.payment_plans.order_by('installment_number').values_list('is_paid', flat=True))
+        self.assertEqual(paid_flags, [True, True, False])
+
+    def test_pending_to_completed_and_refund(self):
+        """Status transitions add and subtract the payment amount once"""
+        payment = self._payment('PAY-1', 300, status='pending')
+        self.contract.refresh_from_db()
+        self.assertEqual(self.contract.paid_amount, Decimal('0'))
+
+        payment = Payment.objects.get(pk=payment.pk)
+        payment.status = 'completed'
+        with self.captureOnCommitCallbacks(execute=True):
+            payment.save()
+            payment.save()  # Qayta saqlash ikki marta qo'shmasligi kerak
+        self.contract.refresh_from_db()
+        self.assertEqual(self.contract.paid_amount, Decimal('300'))
+        self.assertEqual(self.contract.next_due_date, self.plans[1].due_date)
+        self.assertTrue(payment.history.filter(action='status_changed', new_value='completed').exists())
+
+        payment.status = 'refunded'
+        with self.captureOnCommitCallbacks(execute=True):
+            payment.save()
+        self.contract.refresh_from_db()
+        self.assertEqual(self.contract.paid_amount, Decimal('0'))
+        self.assertEqual(self.contract.next_due_date, self.plans[0].due_date)
+        self.assertFalse(self.contract.payment_plans.filter(is_paid=True).exists())
+
+    def test_plan_allocation_runs_once_per_transaction(self):
+        """Several payments saved in one transaction allocate the contract's plans once"""
+        with mock.patch('finance.signals.allocate_payment_plans', wraps=allocate_payment_plans) as allocate:
+            with self.captureOnCommitCallbacks(execute=True):
+                for number in range(3):
+                    Payment.objects.create(payment_number=f'PAY-{number}', contract=self.contract, amount=100, status='completed')
+                allocate.assert_not_called()
+        allocate.assert_called_once()
+        self.contract.refresh_from_db()
+        self.assertEqual(self.contract.paid_amount, Decimal('300'))
+        self.assertEqual(self.contract.next_due_date, self.plans[1].due_date)
+
+    def test_delete_completed_payment(self):
+        """Deleting a completed payment reverts its amount"""
+        payment = self._payment('PAY-1', 300)
+        payment.delete()
+        self.contract.refresh_from_db()
+        self.assertEqual(self.contract.paid_amount, Decimal('0'))
+
+    def test_consistency_checker(self):
+        """Checker finds and fixes balances changed behind the ORM's back"""
+        from .balances import fix_balance_mismatches
+
+        self._payment('PAY-1', 300)
+        self.assertEqual(find_balance_mismatches(), [])
+
+        Contract.objects.filter(pk=self.contract.pk).update(paid_amount=0)
+        mismatches = find_balance_mismatches()
+        self.assertEqual(len(mismatches), 1)
+
+        fix_balance_mismatches(mismatches)
+        self.contract.refresh_from_db()
+        self.assertEqual(self.contract.paid_amount, Decimal('300'))
+        self.assertEqual(find_balance_mismatches(), [])
+
+
+class PaymentImportTestCase(TestCase):
+    """Test batch payment import from CSV files"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.branch = Branch.objects.create(name='Test Branch')
+        self.course = Course.objects.create(name='Test Course', branch=self.branch, duration_weeks=8, price=1000)
+        self.student = User.objects.create_user(
+            username='student', password='student123', role='student', phone='+998 90 123-45-67'
+        )
+        self.other = User.objects.create_user(username='other', password='other123', role='student')
+        self.contract = Contract.objects.create(
+            contract_number='CNT-1',
+            student=self.student,
+            course=self.course,
+            status='active',
+            start_date=timezone.localdate(),
+            end_date=timezone.localdate() + timedelta(days=60),
+            total_amount=1000,
+        )
+        self.other_contract = Contract.objects.create(
+            contract_number='CNT-2',
+            student=self.other,
+            course=self.course,
+            status='active',
+            start_date=timezone.localdate(),
+            end_date=timezone.localdate() + timedelta(days=60),
+            total_amount=1000,
+        )
+
+    def _import(self, content):
+        from io import StringIO
+        from .payment_import import import_payments
+        return import_payments(StringIO(content), filename='statement.csv')
+
+    def test_import_matches_by_number_and_phone(self):
+        """Rows are matched by contract number or phone and balances are updated"""
+        result = self._import(
+            "shartnoma,telefon,summa,sana,chek\n"
+            "cnt-2,,300,2025-01-10,R-1\n"
+            ",998901234567,\"1,000.00\",10.01.2025,R-2\n"
+            "CNT-404,,100,2025-01-10,R-3\n"
+            ",+998000000000,100,2025-01-10,R-4\n"
+            "CNT-1,,abc,2025-01-10,R-5\n"
+        )
+        self.assertEqual(result.total_rows, 5)
+        self.assertEqual(result.created, 2)
+        self.assertEqual([item['row'] for item in result.unmatched], [4, 5, 6])
+
+        self.contract.refresh_from_db()
+        self.other_contract.refresh_from_db()
+        self.assertEqual(self.contract.paid_amount, Decimal('1000'))
+        self.assertIsNone(self.contract.next_due_date)
+        self.assertFalse(self.contract.payment_plans.filter(is_paid=False).exists())
+        self.assertEqual(self.other_contract.paid_amount, Decimal('300'))
+        self.assertEqual(PaymentHistory.objects.count(), 2)
+
+    def test_reimport_skips_known_receipts(self):
+        """Receipts already in the database are reported as duplicates"""
+        content = "contract_number,amount,receipt_number\nCNT-1,100,R-1\nCNT-1,100,R-1\n"
+        first = self._import(content)
+        second = self._import(content)
+        self.assertEqual((first.created, first.duplicates), (1, 1))
+        self.assertEqual((second.created, second.duplicates), (0, 2))
+        self.contract.refresh_from_db()
+        self.assertEqual(self.contract.paid_amount, Decimal('100'))
+
+    def test_query_count_does_not_grow_with_rows(self):
+        """Import cost is per batch, not per payment"""
+        rows = ''.join(f"CNT-{1 + i % 2},10,R-{i}\n" for i in range(50))
+        with self.assertNumQueries(11):
+            result = self._import("contract_number,amount,receipt_number\n" + rows)
+        self.assertEqual(result.created, 50)
+        self.assertEqual(find_balance_mismatches(), [])
+
+    def test_import_view_reports_unmatched_rows(self):
+        """The import page shows the result of an uploaded file"""
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from django.urls import reverse
+
+        User.objects.create_user(username='accountant', password='accountant123', role='accountant')
+        self.client.login(username='accountant', password='accountant123')
+        upload = SimpleUploadedFile('statement.csv', b"shartnoma,summa\nCNT-1,100\nCNT-404,100\n", content_type='text/csv')
+        response = self.client.post(reverse('finance:payment_import'), {'payment_file': upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['result'].created, 1)
+        self.assertContains(response, 'Shartnoma raqami topilmadi')
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class FinanceMetricsTestCase(TestCase):
+    """Test grouped finance metrics used by the dashboard and reports pages"""
+
+    def setUp(self):
+        """Set up test data"""
+        cache.clear()
+        self.branch = Branch.objects.create(name='Test Branch')
+        self.student = User.objects.create_user(username='student', password='student123', role='student')
+        self.admin = User.objects.create_user(username='admin', password='admin123', role='admin')
+        self.contract_count = 0
+
+    def _add_course_with_payment(self, amount=100):
+        self.contract_count += 1
+        course = Course.objects.create(name=f'Course {self.contract_count}', branch=self.branch, price=1000)
+        contract = Contract.objects.create(
+            contract_number=f'CNT-{self.contract_count}',
+            student=self.student,
+            course=course,
+            start_date=timezone.localdate(),
+            end_date=timezone.localdate() + timedelta(days=90),
+            total_amount=1000,
+        )
+        Payment.objects.create(
+            payment_number=f'PAY-{self.contract_count}', contract=contract, amount=amount, status='completed'
+        )
+        return contract
+
+    def _count_queries(self, url_name):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from django.urls import reverse
+
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(url_name))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_metrics_values(self):
+        """Series and course breakdown come from grouped queries"""
+        from .metrics import course_breakdown, dashboard_totals, monthly_series
+
+        self._add_course_with_payment(100)
+        self._add_course_with_payment(250)
+
+        with self.assertNumQueries(2):
+            series = monthly_series()
+        self.assertEqual(len(series), 12)
+        self.assertEqual(series[-1]['payments'], Decimal('350'))
+        self.assertEqual(series[-1]['contracts'], Decimal('2000'))
+        self.assertEqual(series[-1]['contracts_count'], 2)
+
+        with self.assertNumQueries(1):
+            courses = course_breakdown()
+        self.assertEqual([course['paid'] for course in courses], [Decimal('100'), Decimal('250')])
+        self.assertEqual(courses[0]['remaining'], Decimal('900'))
+
+        totals = dashboard_totals()
+        self.assertEqual(totals['total_contracts'], 2)
+        self.assertEqual(totals['total_paid'], Decimal('350'))
+        self.assertEqual(totals['payments_this_month'], Decimal('350'))
+
+    def test_pages_render_with_constant_queries(self):
+        """Dashboard and reports do not issue queries per course or per month"""
+        self.client.login(username='admin', password='admin123')
+        self._add_course_with_payment()
+        dashboard_queries = self._count_queries('finance:dashboard')
+        reports_queries = self._count_queries('finance:reports')
+
+        for _ in range(3):
+            self._add_course_with_payment()
+        self.assertEqual(self._count_queries('finance:dashboard'), dashboard_queries)
+        self.assertEqual(self._count_queries('finance:reports'), reports_queries)
+
+    def test_payment_write_invalidates_cache(self):
+        """Saving a payment drops the cached metrics after commit"""
+        from .metrics import CACHE_KEY, get_finance_metrics
+
+        contract = self._add_course_with_payment()
+        get_finance_metrics()
+        self.assertIsNotNone(cache.get(CACHE_KEY))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Payment.objects.create(payment_number='PAY-X', contract=contract, amount=50, status='completed')
+        self.assertIsNone(cache.get(CACHE_KEY))
+
+    def test_cache_errors_fall_back_to_database(self):
+        """A down cache neither fails payment saves nor the dashboard"""
+        from .metrics import get_finance_metrics
+
+        contract = self._add_course_with_payment()
+        self.client.login(username='admin', password='admin123')
+        with override_settings(CACHES=UNREACHABLE_CACHE):
+            with self.captureOnCommitCallbacks(execute=True):
+                Payment.objects.create(payment_number='PAY-X', contract=contract, amount=50, status='completed')
+            self.assertEqual(get_finance_metrics()['totals']['total_paid'], Decimal('150'))
@@ -15,6 +15,7 @@ urlpatterns = [
     # Payments
     path('payments/', views.PaymentListView.as_view(), name='payment_list'),
     path('payments/create/', views.PaymentCreateView.as_view(), name='payment_create'),
+    path('payments/import/', views.PaymentImportView.as_view(), name='payment_import'),
     
     # Debts
     path('debts/', views.DebtListView.as_view(), name='debt_list'),
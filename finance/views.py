@@ -8,7 +8,7 @@ from django.urls import reverse_lazy
 from .models import (
     Contract, Payment, PaymentPlan, Debt, PaymentReminder, FinancialReport
 )
-from accounts.mixins import RoleRequiredMixin, AdminRequiredMixin, TailwindFormMixin
+from accounts.mixins import RoleRequiredMixin, AdminRequiredMixin, TailwindFormMixin, KeysetPaginationMixin
 
 
 class ContractListView(RoleRequiredMixin, ListView):
@@ -129,15 +129,16 @@ class ContractCreateView(TailwindFormMixin, RoleRequiredMixin, CreateView):
         return super().form_valid(form)
 
 
-class PaymentListView(RoleRequiredMixin, ListView):
-    paginate_by = 30
+class PaymentListView(RoleRequiredMixin, KeysetPaginationMixin, ListView):
     """
-    To'lovlar ro'yxati
+    To'lovlar ro'yxati (to'lanmaganlar - paid_at bo'sh - oxirida)
     """
     model = Payment
     template_name = 'finance/payment_list.html'
     context_object_name = 'payments'
     allowed_roles = ['admin', 'manager', 'accountant']
+    paginate_by = 30
+    keyset_ordering = ['-paid_at', '-created_at', '-id']
     
     def get_queryset(self):
         queryset = Payment.objects.select_related('contract', 'contract__student')
@@ -217,6 +218,35 @@ class PaymentCreateView(TailwindFormMixin, RoleRequiredMixin, CreateView):
         return super().form_valid(form)
 
 
+class PaymentImportView(RoleRequiredMixin, TemplateView):
+    """
+    To'lovlarni fayldan (bank ko'chirmasi) import qilish
+    """
+    template_name = 'finance/payment_import.html'
+    allowed_roles = ['admin', 'manager', 'accountant']
+    
+    def post(self, request):
+        from .payment_import import import_payments
+        
+        file = request.FILES.get('payment_file')
+        if not file:
+            messages.error(request, 'Fayl tanlanmadi.')
+            return self.get(request)
+        
+        try:
+            result = import_payments(file, filename=file.name, created_by=request.user)
+        except Exception as e:
+            messages.error(request, f'Import xatosi: {str(e)}')
+            return self.get(request)
+        
+        messages.success(
+            request,
+            f"{result.created} ta to'lov import qilindi. "
+            f"{result.duplicates} ta dublikat, {len(result.unmatched)} ta qator mos kelmadi."
+        )
+        return self.render_to_response(self.get_context_data(result=result))
+
+
 class DebtListView(RoleRequiredMixin, ListView):
     """
     Qarzlar ro'yxati
@@ -286,26 +316,14 @@ class FinancialReportDetailView(AdminRequiredMixin, DetailView):
         context = super().get_context_data(**kwargs)
         report = self.object
         
-        # Shartnomalar
-        contracts = Contract.objects.filter(
-            created_at__gte=report.period_start,
-            created_at__lte=report.period_end
-        )
-        if report.branch:
-            contracts = contracts.filter(course__branch=report.branch)
-        
-        context['contracts'] = contracts
-        
-        # To'lovlar
-        payments = Payment.objects.filter(
-            paid_at__gte=report.period_start,
-            paid_at__lte=report.period_end,
-            status='completed'
-        )
-        if report.branch:
-            payments = payments.filter(contract__course__branch=report.branch)
-        
-        context['payments'] = payments
+        # Umumiy hisobot uchun filiallar kesimi (saqlangan hisobotlardan)
+        if report.branch_id is None:
+            context['branch_reports'] = FinancialReport.objects.filter(
+                report_type=report.report_type,
+                period_start=report.period_start,
+                period_end=report.period_end,
+                branch__isnull=False
+            ).select_related('branch').order_by('branch__name')
         
         return context
 
@@ -318,78 +336,24 @@ class DashboardView(RoleRequiredMixin, TemplateView):
     allowed_roles = ['admin', 'manager', 'accountant']
     
     def get_context_data(self, **kwargs):
+        from .metrics import get_finance_metrics
+        
         context = super().get_context_data(**kwargs)
-        now = timezone.now()
-        this_month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        
-        # Umumiy statistika
-        context['total_contracts'] = Contract.objects.count()
-        context['active_contracts'] = Contract.objects.filter(status='active').count()
-        context['total_revenue'] = Contract.objects.aggregate(
-            total=Sum('total_amount')
-        )['total'] or 0
-        context['total_paid'] = Contract.objects.aggregate(
-            total=Sum('paid_amount')
-        )['total'] or 0
-        
-        # Bu oy
-        context['contracts_this_month'] = Contract.objects.filter(
-            created_at__gte=this_month_start
-        ).count()
-        context['revenue_this_month'] = Contract.objects.filter(
-            created_at__gte=this_month_start
-        ).aggregate(total=Sum('total_amount'))['total'] or 0
-        context['payments_this_month'] = Payment.objects.filter(
-            paid_at__gte=this_month_start,
-            status='completed'
-        ).aggregate(total=Sum('amount'))['total'] or 0
+        metrics = get_finance_metrics()
         
-        # Qarzlar
-        context['total_debts'] = Debt.objects.filter(is_paid=False).aggregate(
-            total=Sum('amount')
-        )['total'] or 0
-        context['overdue_debts'] = Debt.objects.filter(
-            is_paid=False,
-            due_date__lt=now.date()
-        ).aggregate(total=Sum('amount'))['total'] or 0
+        # Umumiy statistika, bu oy, qarzlar, eslatmalar (keshlangan)
+        context.update(metrics['totals'])
         
-        # Eslatmalar
-        context['pending_reminders'] = PaymentReminder.objects.filter(
-            is_sent=False,
-            reminder_date__lte=now.date()
-        ).count()
-        
-        # Oylik statistika (chart uchun)
-        from datetime import timedelta
-        monthly_data = []
-        for i in range(6):
-            month_start = (now - timedelta(days=30*i)).replace(day=1)
-            if i < 5:
-                month_end = (now - timedelta(days=30*(i-1))).replace(day=1) - timedelta(days=1)
-            else:
-                month_end = now
-            
-            payments_sum = Payment.objects.filter(
-                paid_at__gte=month_start,
-                paid_at__lte=month_end,
-                status='completed'
-            ).aggregate(total=Sum('amount'))['total'] or 0
-            
-            monthly_data.append({
-                'month': month_start.strftime('%b'),
-                'amount': payments_sum
-            })
-        
-        context['monthly_data'] = list(reversed(monthly_data))
+        # Oylik statistika (chart uchun) - oxirgi 6 oy
+        context['monthly_data'] = [
+            {'month': item['label'], 'amount': item['payments']}
+            for item in metrics['monthly_series'][-6:]
+        ]
         
         # Template uchun to'g'ri nomlar
         context['monthly_income'] = context['payments_this_month']
         context['total_debt'] = context['total_debts']
         context['contracts_count'] = context['total_contracts']
-        context['pending_payments'] = PaymentPlan.objects.filter(
-            is_paid=False,
-            due_date__gte=now.date()
-        ).count()
         
         # So'nggi to'lovlar
         context['recent_payments'] = Payment.objects.select_related(
@@ -407,46 +371,15 @@ class ReportsView(RoleRequiredMixin, TemplateView):
     allowed_roles = ['admin', 'manager', 'accountant']
     
     def get_context_data(self, **kwargs):
-        from datetime import timedelta
-        from courses.models import Course
+        from .metrics import get_finance_metrics
         
         context = super().get_context_data(**kwargs)
-        now = timezone.now()
+        metrics = get_finance_metrics()
         
         # Kurslar bo'yicha daromad
-        courses_data = []
-        for course in Course.objects.filter(is_active=True):
-            revenue = Contract.objects.filter(course=course).aggregate(total=Sum('total_amount'))['total'] or 0
-            paid = Contract.objects.filter(course=course).aggregate(total=Sum('paid_amount'))['total'] or 0
-            courses_data.append({
-                'name': course.name,
-                'revenue': revenue,
-                'paid': paid,
-                'contracts': Contract.objects.filter(course=course).count()
-            })
-        context['courses_data'] = courses_data
+        context['courses_data'] = metrics['courses']
         
         # Oylik trend
-        monthly_trend = []
-        for i in range(12):
-            month_start = (now - timedelta(days=30*i)).replace(day=1)
-            payments_sum = Payment.objects.filter(
-                paid_at__year=month_start.year,
-                paid_at__month=month_start.month,
-                status='completed'
-            ).aggregate(total=Sum('amount'))['total'] or 0
-            
-            contracts_sum = Contract.objects.filter(
-                created_at__year=month_start.year,
-                created_at__month=month_start.month
-            ).aggregate(total=Sum('total_amount'))['total'] or 0
-            
-            monthly_trend.append({
-                'month': month_start.strftime('%Y-%m'),
-                'payments': payments_sum,
-                'contracts': contracts_sum
-            })
-        
-        context['monthly_trend'] = list(reversed(monthly_trend))
+        context['monthly_trend'] = metrics['monthly_series']
         
         return context
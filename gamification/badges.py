@@ -0,0 +1,195 @@
+"""
+Badge qoidalari: deklarativ ta'rif va partiyaviy baholash
+
+Har bir qoida qaysi ko'rsatkichlarga bog'liqligini e'lon qiladi:
+    points      - StudentPoints.total_points
+    attendance  - AttendanceStatistics.attendance_percentage
+    homework    - topshirilgan va vaqtida topshirilgan uy vazifalari soni
+Badge o'z turi qoidasi (TYPE_RULES) yoki points_required > 0 bo'lsa ball qoidasi bajarilganda beriladi.
+
+Signal lar o'zgargan ko'rsatkichni belgilaydi va award_badges faqat shu ko'rsatkichga bog'liq
+qoidalarni tekshiradi. award_all_badges (kechki vazifa) barcha o'quvchilar uchun bir nechta
+guruhlangan so'rov bilan ishlaydi. Ikkalasi ham StudentBadge.bulk_create(ignore_conflicts=True) bilan yozadi.
+
+Faol badge ta'riflari jarayon ichida keshlanadi: Badge saqlanganda/o'chirilganda (signals)
+yoki BADGE_DEFINITIONS_TTL o'tganda (boshqa jarayondagi o'zgarishlar uchun) qayta yuklanadi.
+"""
+import time
+from collections import namedtuple
+
+from django.db.models import Count, Q
+
+from attendance.models import AttendanceStatistics
+from geeks_crm import side_effects
+from homework.models import Homework
+from .models import Badge, StudentBadge, StudentPoints
+
+
+INPUTS = frozenset({'points', 'attendance', 'homework'})
+
+BADGE_DEFINITIONS_TTL = 300  # soniya
+HOMEWORK_MASTER_RATIO = 0.9  # 90% vaqtida
+
+Rule = namedtuple('Rule', ['inputs', 'earned'])
+Facts = namedtuple('Facts', ['total_points', 'attendance_percentage', 'homework_total', 'homework_on_time'])
+
+
+TYPE_RULES = {
+    'perfect_attendance': Rule(
+        frozenset({'attendance'}),
+        lambda facts, badge: facts.attendance_percentage == 100,
+    ),
+    'homework_master': Rule(
+        frozenset({'homework'}),
+        lambda facts, badge: (
+            facts.homework_total > 0
+            and facts.homework_on_time / facts.homework_total >= HOMEWORK_MASTER_RATIO
+        ),
+    ),
+}
+
+POINTS_RULE = Rule(
+    frozenset({'points'}),
+    lambda facts, badge: facts.total_points >= badge.points_required,
+)
+
+
+def badge_rules(badge):
+    """Badge ga tegishli qoidalar (tur qoidasi va/yoki ball qoidasi)"""
+    rules = []
+    if badge.badge_type in TYPE_RULES:
+        rules.append(TYPE_RULES[badge.badge_type])
+    if badge.points_required > 0:
+        rules.append(POINTS_RULE)
+    return rules
+
+
+_definitions = None
+_loaded_at = 0.0
+
+
+def active_badges():
+    """Faol badge lar va ularning qoidalari: [(badge, rules)] (jarayon ichida keshlanadi)"""
+    global _definitions, _loaded_at
+    if _definitions is None or time.monotonic() - _loaded_at > BADGE_DEFINITIONS_TTL:
+        _definitions = [
+            (badge, badge_rules(badge))
+            for badge in Badge.objects.filter(is_active=True)
+        ]
+        _loaded_at = time.monotonic()
+    return _definitions
+
+
+def invalidate_badges():
+    """Badge ta'riflari keshini tashlash"""
+    global _definitions
+    _definitions = None
+
+
+def load_facts(inputs, pairs=None):
+    """
+    Ko'rsatkichlarni guruhlangan so'rovlar bilan yuklash: {(student_id, group_id): Facts}
+    pairs=None - barcha o'quvchilar; faqat inputs dagi ko'rsatkichlar so'raladi
+    """
+    def scoped(queryset, group_field):
+        if pairs is None:
+            return queryset
+        return queryset.filter(**{
+            'student_id__in': {student_id for student_id, _ in pairs},
+            f'{group_field}__in': {group_id for _, group_id in pairs},
+        })
+
+    points, attendance, homework = {}, {}, {}
+    if 'points' in inputs:
+        points = {
+            (student_id, group_id): total
+            for student_id, group_id, total in scoped(StudentPoints.objects, 'group_id')
+            .values_list('student_id', 'group_id', 'total_points').order_by()
+        }
+    if 'attendance' in inputs:
+        attendance = {
+            (student_id, group_id): percentage
+            for student_id, group_id, percentage in scoped(AttendanceStatistics.objects, 'group_id')
+            .values_list('student_id', 'group_id', 'attendance_percentage').order_by()
+        }
+    if 'homework' in inputs:
+        homework = {
+            (row['student_id'], row['lesson__group_id']): (row['total'], row['on_time'])
+            for row in scoped(Homework.objects.filter(is_submitted=True), 'lesson__group_id')
+            .values('student_id', 'lesson__group_id')
+            .annotate(total=Count('id'), on_time=Count('id', filter=Q(is_late=False)))
+            .order_by()
+        }
+
+    keys = set(pairs) if pairs is not None else set(points) | set(attendance) | set(homework)
+    facts = {}
+    for key in keys:
+        homework_total, homework_on_time = homework.get(key, (0, 0))
+        facts[key] = Facts(
+            total_points=points.get(key, 0),
+            attendance_percentage=attendance.get(key),
+            homework_total=homework_total,
+            homework_on_time=homework_on_time,
+        )
+    return facts
+
+
+def award_badges(changes):
+    """
+    O'zgargan ko'rsatkichlarga bog'liq qoidalarni tekshirib badge berish.
+    changes: {(student_id, group_id): {'points', 'attendance', ...}}
+    Yangi berilgan badge lar sonini qaytaradi.
+    """
+    changes = {pair: INPUTS & set(inputs) for pair, inputs in changes.items() if pair[1] is not None}
+    needed = set().union(*changes.values()) if changes else set()
+    if not needed:
+        return 0
+    definitions = [
+        (badge, rules) for badge, rules in active_badges()
+        if any(rule.inputs & needed for rule in rules)
+    ]
+    if not definitions:
+        return 0
+
+    inputs = set().union(*(rule.inputs for _, rules in definitions for rule in rules)) & needed
+    facts = load_facts(inputs, set(changes))
+    earned = set()
+    for (student_id, group_id), changed in changes.items():
+        for badge, rules in definitions:
+            if any(rule.inputs & changed and rule.earned(facts[student_id, group_id], badge) for rule in rules):
+                earned.add((student_id, badge.id, group_id))
+    return _create(earned, student_ids={student_id for student_id, _ in changes})
+
+
+def award_all_badges():
+    """Barcha o'quvchilar uchun barcha qoidalarni tekshirish (kechki partiya)"""
+    definitions = active_badges()
+    if not definitions:
+        return 0
+
+    facts = load_facts(INPUTS)
+    earned = set()
+    for (student_id, group_id), student_facts in facts.items():
+        for badge, rules in definitions:
+            if any(rule.earned(student_facts, badge) for rule in rules):
+                earned.add((student_id, badge.id, group_id))
+    return _create(earned)
+
+
+def _create(earned, student_ids=None):
+    if not earned:
+        return 0
+    existing = StudentBadge.objects.filter(badge_id__in={badge_id for _, badge_id, _ in earned})
+    if student_ids is not None:
+        existing = existing.filter(student_id__in=student_ids)
+    new = earned - set(existing.values_list('student_id', 'badge_id', 'group_id').order_by())
+    StudentBadge.objects.bulk_create(
+        [StudentBadge(student_id=student_id, badge_id=badge_id, group_id=group_id) for student_id, badge_id, group_id in new],
+        ignore_conflicts=True,
+        batch_size=500,
+    )
+    # bulk_create signal yubormaydi - dashboard badge sonini shu yerda belgilash
+    with side_effects.deferred():
+        for student_id in {student_id for student_id, _, _ in new}:
+            side_effects.mark('student_summary', (student_id, 'badges'))
+    return len(new)
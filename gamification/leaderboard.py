@@ -0,0 +1,335 @@
+"""
+Redis sorted set asosidagi reytinglar (leaderboard)
+Doskalar: umumiy, filial, guruh va oy bo'yicha. Ball StudentPoints/PointTransaction o'zgarganda
+signallar orqali delta bilan yangilanadi (ZINCRBY/ZADD), to'liq qayta qurish:
+python manage.py rebuild_leaderboards
+
+O'rin - "1224" tartibida: 1 + ballari qat'iy ko'proq bo'lgan o'quvchilar soni (ZCOUNT, O(log n)).
+Redis ishlamasa o'qish so'rovlari bazadagi guruhlangan so'rovga qaytadi; hali qurilmagan doska
+(BUILT_KEY to'plamida yo'q) bazadan o'qiladi va shu ballardan quriladi.
+"""
+import logging
+from collections import namedtuple
+from datetime import date, datetime, time
+
+from django.db.models import Sum
+from django.utils import timezone
+
+from geeks_crm.redis_clients import REDIS_ERRORS, get_redis
+
+from .models import PointTransaction, StudentPoints
+
+logger = logging.getLogger(__name__)
+
+
+KEY_PREFIX = 'leaderboard'
+REBUILD_SUFFIX = ':rebuild'
+# Qayta qurilgan doskalar to'plami - bu yerda yo'q doska (kalit bo'lsa ham to'liq emas) bazadan o'qiladi
+BUILT_KEY = f'{KEY_PREFIX}:built'
+WRITE_BATCH_SIZE = 1000
+
+Entry = namedtuple('Entry', ['student_id', 'score', 'rank'])
+
+def month_bounds(year, month):
+    start = date(year, month, 1)
+    end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return start, end
+
+
+class Leaderboard:
+    """
+    Bitta reyting doskasi (sorted set: a'zo - student_id, ball - score)
+    sql_scores() - xuddi shu doskaning bazadagi ekvivalenti (qayta qurish, zaxira va tekshiruv uchun)
+    """
+    def __init__(self, key, queryset, value_field):
+        self.key = f'{KEY_PREFIX}:{key}'
+        self._queryset = queryset
+        self._value_field = value_field
+
+    @classmethod
+    def overall(cls):
+        return cls('overall', StudentPoints.objects.all(), 'total_points')
+
+    @classmethod
+    def branch(cls, branch_id):
+        return cls(
+            f'branch:{branch_id}',
+            StudentPoints.objects.filter(group__course__branch_id=branch_id),
+            'total_points',
+        )
+
+    @classmethod
+    def group(cls, group_id):
+        return cls(f'group:{group_id}', StudentPoints.objects.filter(group_id=group_id), 'total_points')
+
+    @classmethod
+    def month(cls, year, month):
+        start, end = month_bounds(year, month)
+        return cls(
+            f'month:{year}-{month:02d}',
+            PointTransaction.objects.filter(
+                created_at__gte=timezone.make_aware(datetime.combine(start, time.min)),
+                created_at__lt=timezone.make_aware(datetime.combine(end, time.min)),
+            ),
+            'points',
+        )
+
+    def sql_scores(self):
+        """Bazadan {student_id: ball} (bitta guruhlangan so'rov)"""
+        return dict(
+            self._queryset.order_by().values('student_id').annotate(score=Sum(self._value_field))
+            .values_list('student_id', 'score')
+        )
+
+    # O'qish
+
+    def top(self, limit=100):
+        """Eng yuqori limit ta o'quvchi"""
+        try:
+            client = get_redis('leaderboard')
+            pipe = client.pipeline(transaction=False)
+            pipe.sismember(BUILT_KEY, self.key)
+            pipe.zrevrange(self.key, 0, limit - 1, withscores=True)
+            built, rows = pipe.execute()
+            if not built:
+                return _top(self.load(client), limit)
+        except REDIS_ERRORS as e:
+            logger.warning(f"Leaderboard {self.key} unavailable, using database: {e}")
+            return _top(self.sql_scores(), limit)
+        return _with_ranks([(int(member), int(score)) for member, score in rows], first_rank=1)
+
+    def rank(self, student_id):
+        """O'quvchining o'rni va bali (doskada bo'lmasa None)"""
+        try:
+            client = get_redis('leaderboard')
+            pipe = client.pipeline(transaction=False)
+            pipe.sismember(BUILT_KEY, self.key)
+            pipe.zscore(self.key, student_id)
+            built, score = pipe.execute()
+            if not built:
+                return _rank(self.load(client), student_id)
+            if score is None:
+                return None
+            higher = client.zcount(self.key, f'({score}', '+inf')
+        except REDIS_ERRORS as e:
+            logger.warning(f"Leaderboard {self.key} unavailable, using database: {e}")
+            return _rank(self.sql_scores(), student_id)
+        return Entry(student_id, int(score), higher + 1)
+
+    def around(self, student_id, radius=5):
+        """O'quvchi va undan yuqori/pastdagi radius ta qo'shnilar"""
+        try:
+            client = get_redis('leaderboard')
+            pipe = client.pipeline(transaction=False)
+            pipe.sismember(BUILT_KEY, self.key)
+            pipe.zrevrank(self.key, student_id)
+            built, position = pipe.execute()
+            if not built:
+                return _around(self.load(client), student_id, radius)
+            if position is None:
+                return []
+            start = max(position - radius, 0)
+            rows = client.zrevrange(self.key, start, position + radius, withscores=True)
+            if not rows:
+                return []
+            first_rank = client.zcount(self.key, f'({rows[0][1]}', '+inf') + 1
+        except REDIS_ERRORS as e:
+            logger.warning(f"Leaderboard {self.key} unavailable, using database: {e}")
+            return _around(self.sql_scores(), student_id, radius)
+        return _with_ranks([(int(member), int(score)) for member, score in rows], first_rank)
+
+    def size(self):
+        return get_redis('leaderboard').zcard(self.key)
+
+    def load(self, client, scores=None):
+        """
+        Hali qurilmagan doska (yangi o'rnatish, Redis tozalangan, kechki qayta qurishdan oldin):
+        ballar bazadan olinadi va doska shu ballardan quriladi. Qaytaradi: {student_id: ball}
+        """
+        scores = self.sql_scores() if scores is None else scores
+        try:
+            self.rebuild(client, scores)
+        except REDIS_ERRORS as e:
+            logger.warning(f"Error building leaderboard {self.key}: {e}")
+        return scores
+
+    # Yozish
+
+    def rebuild(self, client=None, scores=None):
+        """
+        Doskani bazadan qayta qurish (vaqtinchalik kalitga yozib RENAME - o'quvchilar bo'sh doskani ko'rmaydi)
+        va qurilgan doskalar to'plamiga qo'shish
+        """
+        client = client or get_redis('leaderboard')
+        scores = self.sql_scores() if scores is None else scores
+        pipe = client.pipeline()
+        if not scores:
+            pipe.delete(self.key)
+            pipe.sadd(BUILT_KEY, self.key)
+            pipe.execute()
+            return 0
+        temp_key = self.key + REBUILD_SUFFIX
+        items = list(scores.items())
+        pipe.delete(temp_key)
+        for start in range(0, len(items), WRITE_BATCH_SIZE):
+            pipe.zadd(temp_key, dict(items[start:start + WRITE_BATCH_SIZE]))
+        pipe.rename(temp_key, self.key)
+        pipe.sadd(BUILT_KEY, self.key)
+        pipe.execute()
+        return len(items)
+
+
+def _sorted_scores(scores):
+    return sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+
+
+def _top(scores, limit):
+    return _with_ranks(_sorted_scores(scores), first_rank=1)[:limit]
+
+
+def _rank(scores, student_id):
+    if student_id not in scores:
+        return None
+    score = scores[student_id]
+    return Entry(student_id, int(score), 1 + sum(1 for value in scores.values() if value > score))
+
+
+def _around(scores, student_id, radius):
+    ranked = _with_ranks(_sorted_scores(scores), first_rank=1)
+    position = next((i for i, entry in enumerate(ranked) if entry.student_id == student_id), None)
+    if position is None:
+        return []
+    return ranked[max(position - radius, 0):position + radius + 1]
+
+
+def _with_ranks(rows, first_rank):
+    """Kamayish tartibidagi (student_id, ball) larga "1224" o'rinlar"""
+    entries = []
+    rank = first_rank
+    for position, (student_id, score) in enumerate(rows):
+        if position and score < rows[position - 1][1]:
+            rank = first_rank + position
+        entries.append(Entry(student_id, score, rank))
+    return entries
+
+
+def group_ranks(student_id, group_ids):
+    """
+    O'quvchining bir nechta guruhdagi o'rni (2 ta pipeline; Redis ishlamasa yoki doskalar
+    qurilmagan bo'lsa - shu guruhlar uchun bitta so'rov)
+    Qaytaradi: {group_id: rank}
+    """
+    group_ids = list(group_ids)
+    client = None
+    ranks = {}
+    missing = group_ids
+    try:
+        client = get_redis('leaderboard')
+        pipe = client.pipeline(transaction=False)
+        for group_id in group_ids:
+            pipe.sismember(BUILT_KEY, Leaderboard.group(group_id).key)
+            pipe.zscore(Leaderboard.group(group_id).key, student_id)
+        results = pipe.execute()
+        built = dict(zip(group_ids, results[::2]))
+        scores = dict(zip(group_ids, results[1::2]))
+
+        missing = [group_id for group_id in group_ids if not built[group_id]]
+        present = [group_id for group_id in group_ids if built[group_id] and scores[group_id] is not None]
+        pipe = client.pipeline(transaction=False)
+        for group_id in present:
+            pipe.zcount(Leaderboard.group(group_id).key, f'({scores[group_id]}', '+inf')
+        ranks = {group_id: higher + 1 for group_id, higher in zip(present, pipe.execute())}
+    except REDIS_ERRORS as e:
+        logger.warning(f"Group leaderboards unavailable, using database: {e}")
+        client = None
+        ranks = {}
+        missing = group_ids
+
+    if missing:
+        totals = {group_id: {} for group_id in missing}
+        for group_id, row_student_id, total in StudentPoints.objects.filter(group_id__in=missing).values_list(
+            'group_id', 'student_id', 'total_points'
+        ).order_by():
+            totals[group_id][row_student_id] = total
+        for group_id, scores in totals.items():
+            if client is not None:
+                Leaderboard.group(group_id).load(client, scores)
+            entry = _rank(scores, student_id)
+            if entry is not None:
+                ranks[group_id] = entry.rank
+    return ranks
+
+
+def _zincrby_or_remove(pipe, board, student_id, delta, removed):
+    """
+    removed=True (manba yozuv o'chirilgan) va o'quvchining doskaga tegishli yozuvlari qolmagan
+    bo'lsa a'zo o'chiriladi - aks holda bazada yo'q o'quvchi 0 ball bilan qolib ketardi
+    """
+    if removed and not board._queryset.filter(student_id=student_id).exists():
+        pipe.zrem(board.key, student_id)
+    else:
+        pipe.zincrby(board.key, delta, student_id)
+
+
+def apply_points_change(student_id, group_id, branch_id, old_total, new_total):
+    """
+    StudentPoints o'zgarishini doskalarga qo'llash (bitta MULTI/EXEC).
+    new_total=None - yozuv o'chirilgan
+    """
+    removed = new_total is None
+    delta = (new_total or 0) - (old_total or 0)
+    pipe = get_redis('leaderboard').pipeline()
+    if removed:
+        pipe.zrem(Leaderboard.group(group_id).key, student_id)
+    else:
+        pipe.zadd(Leaderboard.group(group_id).key, {student_id: new_total})
+    _zincrby_or_remove(pipe, Leaderboard.overall(), student_id, delta, removed)
+    if branch_id:
+        _zincrby_or_remove(pipe, Leaderboard.branch(branch_id), student_id, delta, removed)
+    pipe.execute()
+
+
+def apply_transaction_change(student_id, created_at, delta, removed=False):
+    """Oylik doskaga ball deltasini qo'llash (removed=True - tranzaksiya o'chirilgan)"""
+    local = timezone.localtime(created_at)
+    pipe = get_redis('leaderboard').pipeline()
+    _zincrby_or_remove(pipe, Leaderboard.month(local.year, local.month), student_id, delta, removed)
+    pipe.execute()
+
+
+def all_leaderboards():
+    """Bazadagi ma'lumotlar bo'yicha barcha doskalar"""
+    from accounts.models import Branch
+    from courses.models import Group
+    from django.db.models.functions import TruncMonth
+
+    boards = [Leaderboard.overall()]
+    boards += [Leaderboard.branch(branch_id) for branch_id in Branch.objects.values_list('id', flat=True)]
+    boards += [
+        Leaderboard.group(group_id)
+        for group_id in Group.objects.filter(student_points__isnull=False).values_list('id', flat=True).distinct()
+    ]
+    months = (
+        PointTransaction.objects.annotate(month=TruncMonth('created_at'))
+        .values_list('month', flat=True).order_by().distinct()
+    )
+    boards += [Leaderboard.month(month.year, month.month) for month in months]
+    return boards
+
+
+def rebuild_all():
+    """
+    Barcha doskalarni qayta qurish, bazada endi yo'q doskalarni o'chirish.
+    Qaytaradi: {doska kaliti: a'zolar soni}
+    """
+    client = get_redis('leaderboard')
+    boards = all_leaderboards()
+    counts = {board.key: board.rebuild(client) for board in boards}
+    stale = [
+        key for key in client.scan_iter(match=f'{KEY_PREFIX}:*')
+        if key.decode() not in counts and key.decode() != BUILT_KEY
+    ]
+    if stale:
+        client.delete(*stale)
+        client.srem(BUILT_KEY, *stale)
+    return counts
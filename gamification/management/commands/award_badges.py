@@ -0,0 +1,16 @@
+"""
+Django management command: badge qoidalarini barcha o'quvchilar uchun tekshirish
+Usage: python manage.py award_badges
+Yangi badge qo'shilganda yoki chegarasi o'zgarganda avval topilgan o'quvchilarga ham berish uchun.
+"""
+from django.core.management.base import BaseCommand
+
+from gamification.badges import award_all_badges
+
+
+class Command(BaseCommand):
+    help = "Badge qoidalarini barcha o'quvchilar uchun tekshirib, badge berish"
+
+    def handle(self, *args, **options):
+        created = award_all_badges()
+        self.stdout.write(self.style.SUCCESS(f"{created} ta badge berildi"))
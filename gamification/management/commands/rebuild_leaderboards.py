@@ -0,0 +1,42 @@
+"""
+Django management command: Redis reyting doskalarini bazadan qayta qurish
+Usage: python manage.py rebuild_leaderboards [--check]
+--check - qayta qurmasdan, doskalarni bazadagi ballar bilan solishtirish
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from gamification.leaderboard import all_leaderboards, rebuild_all
+from geeks_crm.redis_clients import get_redis
+
+
+class Command(BaseCommand):
+    help = "Reyting doskalarini (umumiy, filial, guruh, oylik) bazadan qayta qurish"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help="Faqat farqlarni ko'rsatish")
+
+    def handle(self, *args, **options):
+        if options['check']:
+            self._check()
+            return
+
+        counts = rebuild_all()
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(counts)} ta doska qayta qurildi, jami {sum(counts.values())} ta a'zo"
+        ))
+
+    def _check(self):
+        client = get_redis('leaderboard')
+        mismatched = 0
+        for board in all_leaderboards():
+            expected = board.sql_scores()
+            actual = {
+                int(member): int(score)
+                for member, score in client.zrange(board.key, 0, -1, withscores=True)
+            }
+            if actual != expected:
+                mismatched += 1
+                self.stdout.write(self.style.WARNING(f"{board.key}: farq bor"))
+        if mismatched:
+            raise CommandError(f"{mismatched} ta doska bazaga mos emas")
+        self.stdout.write(self.style.SUCCESS("Barcha doskalar bazaga mos"))
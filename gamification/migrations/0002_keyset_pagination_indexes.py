@@ -0,0 +1,22 @@
+# Generated by Django 5.0.1 on 2026-10-19 16:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0002_attendance_attendance__student_ce9d17_idx_and_more'),
+        ('exams', '0002_exam_exams_exam_date_adbaa1_idx_and_more'),
+        ('gamification', '0001_initial'),
+        ('homework', '0003_remove_homework_description_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pointtransaction',
+            index=models.Index(fields=['created_at'], name='gamificatio_created_3e09c6_idx'),
+        ),
+    ]
@@ -43,6 +43,7 @@ class PointTransaction(models.Model):
         verbose_name_plural = _('Point Transactions')
         ordering = ['-created_at']
         indexes = [
+            models.Index(fields=['created_at']),
             models.Index(fields=['student', 'created_at']),
             models.Index(fields=['point_type', 'created_at']),
         ]
@@ -2,13 +2,22 @@
 Django signals for gamification app
 Ball berish avtomatik tizimi
 """
-from django.db.models.signals import post_save
+import logging
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
 from django.dispatch import receiver
 from django.utils import timezone
-from .models import PointTransaction, StudentPoints, Badge, StudentBadge
+from .models import PointTransaction, StudentPoints, Badge
 from attendance.models import Attendance
 from homework.models import Homework, HomeworkGrade
 from exams.models import ExamResult
+from courses.models import Group
+from geeks_crm import side_effects
+from . import badges, leaderboard
+
+logger = logging.getLogger(__name__)
 
 
 @receiver(post_save, sender=Attendance)
@@ -18,6 +27,10 @@ def award_points_for_attendance(sender, instance, created, **kwargs):
     - Keldi: +5
     - Kelmadi: -5
     """
+    if instance.lesson.group_id:
+        # Davomat foizi o'zgargan bo'lishi mumkin (statistika commit dan keyin qayta hisoblanadi)
+        side_effects.mark('badges', (instance.student_id, instance.lesson.group_id, 'attendance'))
+
     if created or 'status' in kwargs.get('update_fields', []):
         # Eski transaksiyalarni o'chirish
         PointTransaction.objects.filter(
@@ -50,8 +63,8 @@ def award_points_for_attendance(sender, instance, created, **kwargs):
             attendance=instance
         )
         
-        # StudentPoints yangilash
-        update_student_points(instance.student, instance.lesson.group)
+        # StudentPoints yangilash (commit dan keyin)
+        side_effects.mark('student_points', (instance.student_id, instance.lesson.group_id))
 
 
 @receiver(post_save, sender=Homework)
@@ -61,6 +74,9 @@ def award_points_for_homework(sender, instance, created, **kwargs):
     - Vaqtida topshirish: +10
     - Kech topshirish: +3
     """
+    if instance.lesson.group_id:
+        side_effects.mark('badges', (instance.student_id, instance.lesson.group_id, 'homework'))
+
     if instance.is_submitted and instance.submitted_at:
         # Eski transaksiyalarni o'chirish
         PointTransaction.objects.filter(
@@ -87,8 +103,8 @@ def award_points_for_homework(sender, instance, created, **kwargs):
             homework=instance
         )
         
-        # StudentPoints yangilash
-        update_student_points(instance.student, instance.lesson.group)
+        # StudentPoints yangilash (commit dan keyin)
+        side_effects.mark('student_points', (instance.student_id, instance.lesson.group_id))
 
 
 @receiver(post_save, sender=ExamResult)
@@ -125,78 +141,101 @@ def award_points_for_exam(sender, instance, created, **kwargs):
                 exam_result=instance
             )
             
-            # StudentPoints yangilash
-            if instance.exam.group:
-                update_student_points(instance.student, instance.exam.group)
+            # StudentPoints yangilash (commit dan keyin)
+            if instance.exam.group_id:
+                side_effects.mark('student_points', (instance.student_id, instance.exam.group_id))
 
 
-def update_student_points(student, group):
+@side_effects.handler('student_points', order=10)
+def recalculate_student_points(pairs):
     """
-    O'quvchi balllarini yangilash
+    (student_id, group_id) juftliklari uchun ballarni qayta hisoblash.
+    Jami ball o'zgargan bo'lsa ball qoidalariga bog'liq badge lar tekshiriladi
     """
-    student_points, created = StudentPoints.objects.get_or_create(
-        student=student,
-        group=group
-    )
-    student_points.calculate_total_points()
-    
-    # Badge tekshirish
-    check_and_award_badges(student, group)
+    from accounts.models import User
+
+    students = User.objects.in_bulk({student_id for student_id, _ in pairs})
+    groups = Group.objects.in_bulk({group_id for _, group_id in pairs})
+    for student_id, group_id in pairs:
+        if student_id in students and group_id in groups:
+            student_points, created = StudentPoints.objects.get_or_create(
+                student=students[student_id],
+                group=groups[group_id]
+            )
+            old_total = None if created else student_points.total_points
+            student_points.calculate_total_points()
+            if student_points.total_points != old_total:
+                side_effects.mark('badges', (student_id, group_id, 'points'))
 
 
-def check_and_award_badges(student, group):
+@side_effects.handler('badges', order=20)
+def evaluate_badges(keys):
     """
-    Badge berish shartlarini tekshirish va berish
+    (student_id, group_id, ko'rsatkich) kalitlari bo'yicha faqat o'zgargan ko'rsatkichga
+    bog'liq badge qoidalarini tekshirish (davomat statistikasi va ballardan keyin ishlaydi)
     """
-    student_points = StudentPoints.objects.filter(student=student, group=group).first()
-    if not student_points:
+    changes = defaultdict(set)
+    for student_id, group_id, changed in keys:
+        changes[student_id, group_id].add(changed)
+    badges.award_badges(changes)
+
+
+@receiver(post_save, sender=Badge)
+@receiver(post_delete, sender=Badge)
+def invalidate_badge_definitions(sender, **kwargs):
+    """Badge ta'riflari keshini yangilash"""
+    badges.invalidate_badges()
+
+
+@receiver(post_init, sender=StudentPoints)
+def remember_total_points(sender, instance, **kwargs):
+    """Leaderboard delta uchun yuklangan ballni eslab qolish"""
+    instance._leaderboard_total = instance.__dict__.get('total_points') if instance.pk else None
+
+
+@receiver(post_save, sender=StudentPoints)
+@receiver(post_delete, sender=StudentPoints)
+def update_points_leaderboards(sender, instance, **kwargs):
+    """Umumiy, filial va guruh doskalarini yangilash (commit dan keyin)"""
+    old_total = getattr(instance, '_leaderboard_total', None)
+    new_total = None if kwargs.get('signal') is post_delete else instance.total_points
+    if old_total == new_total:
         return
-    
-    # Perfect Attendance badge
-    from attendance.models import AttendanceStatistics
-    attendance_stats = AttendanceStatistics.objects.filter(
-        student=student,
-        group=group
-    ).first()
-    
-    if attendance_stats and attendance_stats.attendance_percentage == 100:
-        badge = Badge.objects.filter(badge_type='perfect_attendance').first()
-        if badge:
-            StudentBadge.objects.get_or_create(
-                student=student,
-                badge=badge,
-                group=group
-            )
-    
-    # Homework Master badge
-    from homework.models import Homework
-    total_homeworks = Homework.objects.filter(
-        student=student,
-        lesson__group=group,
-        is_submitted=True
-    ).count()
-    on_time_homeworks = Homework.objects.filter(
-        student=student,
-        lesson__group=group,
-        is_submitted=True,
-        is_late=False
-    ).count()
-    
-    if total_homeworks > 0 and (on_time_homeworks / total_homeworks) >= 0.9:  # 90% vaqtida
-        badge = Badge.objects.filter(badge_type='homework_master').first()
-        if badge:
-            StudentBadge.objects.get_or_create(
-                student=student,
-                badge=badge,
-                group=group
-            )
-    
-    # Ball asosida badge berish
-    for badge in Badge.objects.filter(is_active=True, points_required__gt=0):
-        if student_points.total_points >= badge.points_required:
-            StudentBadge.objects.get_or_create(
-                student=student,
-                badge=badge,
-                group=group
-            )
+    instance._leaderboard_total = new_total
+    student_id, group_id = instance.student_id, instance.group_id
+
+    def apply():
+        try:
+            branch_id = Group.objects.filter(pk=group_id).values_list('course__branch_id', flat=True).first()
+            leaderboard.apply_points_change(student_id, group_id, branch_id, old_total, new_total)
+        except Exception as e:
+            # Doska rebuild_leaderboards bilan tiklanadi
+            logger.warning(f"Error updating leaderboards for student {student_id}: {e}")
+
+    transaction.on_commit(apply)
+
+
+@receiver(post_init, sender=PointTransaction)
+def remember_transaction_points(sender, instance, **kwargs):
+    instance._leaderboard_points = instance.__dict__.get('points') if instance.pk else None
+
+
+@receiver(post_save, sender=PointTransaction)
+@receiver(post_delete, sender=PointTransaction)
+def update_monthly_leaderboard(sender, instance, **kwargs):
+    """Oylik doskani yangilash (tranzaksiya yaratilgan, o'zgargan yoki o'chirilgan)"""
+    removed = kwargs.get('signal') is post_delete
+    old_points = getattr(instance, '_leaderboard_points', None) or 0
+    delta = -old_points if removed else instance.points - old_points
+    if not delta and not removed and not kwargs.get('created'):
+        return
+    instance._leaderboard_points = None if removed else instance.points
+    student_id, created_at = instance.student_id, instance.created_at
+
+    def apply():
+        try:
+            leaderboard.apply_transaction_change(student_id, created_at, delta, removed=removed)
+        except Exception as e:
+            logger.warning(f"Error updating monthly leaderboard for student {student_id}: {e}")
 
+    transaction.on_commit(apply)
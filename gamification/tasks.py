@@ -11,6 +11,7 @@ from .models import (
 )
 from accounts.models import User, Branch
 from courses.models import Group
+from geeks_crm import side_effects
 import logging
 
 logger = logging.getLogger(__name__)
@@ -24,34 +25,40 @@ def update_group_rankings():
     try:
         groups = Group.objects.filter(is_active=True)
         
-        for group in groups:
-            # Barcha o'quvchilar balllarini yangilash
-            students = group.students.filter(role='student')
-            for student in students:
-                student_points, created = StudentPoints.objects.get_or_create(
-                    student=student,
-                    group=group
-                )
-                student_points.calculate_total_points()
+        # Ballar va reyting o'zgarishlari (dashboard ko'rsatkichlari) bitta partiyada qayta hisoblanadi
+        with side_effects.deferred():
+            for group in groups:
+                # Barcha o'quvchilar balllarini yangilash
+                students = group.students.filter(role='student')
+                for student in students:
+                    student_points, created = StudentPoints.objects.get_or_create(
+                        student=student,
+                        group=group
+                    )
+                    student_points.calculate_total_points()
             
-            # Reyting yaratish/yangilash
-            student_points_list = StudentPoints.objects.filter(
-                group=group
-            ).order_by('-total_points')
+                # Reyting yaratish/yangilash
+                student_points_list = StudentPoints.objects.filter(
+                    group=group
+                ).order_by('-total_points')
             
-            rank = 1
-            for student_points in student_points_list:
-                GroupRanking.objects.update_or_create(
-                    group=group,
-                    student=student_points.student,
-                    defaults={
-                        'rank': rank,
-                        'total_points': student_points.total_points
-                    }
-                )
-                rank += 1
+                rank = 1
+                for student_points in student_points_list:
+                    GroupRanking.objects.update_or_create(
+                        group=group,
+                        student=student_points.student,
+                        defaults={
+                            'rank': rank,
+                            'total_points': student_points.total_points
+                        }
+                    )
+                    rank += 1
         
         logger.info(f"Group rankings updated for {groups.count()} groups")
+        
+        # Bot /points javoblarini yangi reyting bilan oldindan tayyorlash
+        from telegram_bot.tasks import prewarm_points_responses
+        prewarm_points_responses.delay()
     
     except Exception as e:
         logger.error(f"Error updating group rankings: {e}")
@@ -191,3 +198,34 @@ def update_monthly_rankings():
     except Exception as e:
         logger.error(f"Error updating monthly rankings: {e}")
 
+
+
+@shared_task
+def rebuild_leaderboards():
+    """
+    Redis reyting doskalarini bazadan qayta qurish (signallar o'tkazib yuborgan farqlarni tuzatadi)
+    """
+    try:
+        from .leaderboard import rebuild_all
+        
+        counts = rebuild_all()
+        logger.info(f"Leaderboards rebuilt: {len(counts)} boards, {sum(counts.values())} members")
+    
+    except Exception as e:
+        logger.error(f"Error rebuilding leaderboards: {e}")
+
+
+@shared_task
+def award_badges():
+    """
+    Barcha o'quvchilar uchun badge qoidalarini partiyada tekshirish (o'tkazib yuborilgan va
+    yangi qo'shilgan badge larni beradi)
+    """
+    try:
+        from .badges import award_all_badges
+        
+        created = award_all_badges()
+        logger.info(f"Badges awarded: {created}")
+    
+    except Exception as e:
+        logger.error(f"Error awarding badges: {e}")
@@ -1,3 +1,307 @@
-from django.test import TestCase
+import os
+import socket
+from datetime import time, timedelta
+from unittest import skipUnless
+from urllib.parse import urlparse
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import badges, leaderboard
+from .leaderboard import Leaderboard, rebuild_all
+from .models import Badge, PointTransaction, StudentBadge, StudentPoints
+from accounts.models import Branch
+from attendance.models import Attendance, AttendanceStatistics
+from courses.models import Course, Group, Lesson
+from geeks_crm.redis_clients import get_redis
+from homework.models import Homework
+
+User = get_user_model()
+
+TEST_REDIS_URL = os.environ.get('LEADERBOARD_TEST_REDIS_URL', 'redis://localhost:6379/15')
+UNREACHABLE_REDIS_URL = 'redis://127.0.0.1:1/0'
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def redis_available(url):
+    parsed = urlparse(url)
+    try:
+        socket.create_connection((parsed.hostname, parsed.port or 6379), timeout=0.5).close()
+        return True
+    except OSError:
+        return False
+
+
+def sql_ranks(scores):
+    """Competition ranks computed independently from the leaderboard module"""
+    return {
+        student_id: 1 + sum(1 for other in scores.values() if other > score)
+        for student_id, score in scores.items()
+    }
+
+
+class LeaderboardFixtureMixin:
+    def setUp(self):
+        """Set up test data"""
+        self.branches = [Branch.objects.create(name=f'Branch {i}') for i in range(2)]
+        courses = [Course.objects.create(name=f'Course {i}', branch=branch) for i, branch in enumerate(self.branches)]
+        self.groups = [
+            Group.objects.create(course=courses[i % 2], name=f'G{i}', start_time=time(10, 0), end_time=time(12, 0))
+            for i in range(3)
+        ]
+        self.students = [
+            User.objects.create_user(username=f'student{i}', password='student123', role='student')
+            for i in range(8)
+        ]
+
+    def give_points(self):
+        """Points with ties, several groups per student and a month split"""
+        totals = [50, 30, 30, 80, 10, 0, 30, 65]
+        for i, (student, total) in enumerate(zip(self.students, totals)):
+            StudentPoints.objects.create(student=student, group=self.groups[i % 3], total_points=total)
+            if i % 2:
+                StudentPoints.objects.create(student=student, group=self.groups[(i + 1) % 3], total_points=total // 2)
+            PointTransaction.objects.create(student=student, points=total, point_type='manual')
+
+
+@skipUnless(redis_available(TEST_REDIS_URL), 'Redis is not available')
+@override_settings(LEADERBOARD_REDIS_URL=TEST_REDIS_URL, CACHES=LOCMEM_CACHE)
+class LeaderboardParityTestCase(LeaderboardFixtureMixin, TestCase):
+    """Test that incrementally maintained boards match the SQL rankings"""
+
+    def setUp(self):
+        super().setUp()
+        get_redis('leaderboard').flushdb()
+
+    def boards(self):
+        return leaderboard.all_leaderboards()
+
+    def assert_parity(self):
+        client = get_redis('leaderboard')
+        for board in self.boards():
+            expected = board.sql_scores()
+            actual = {int(member): int(score) for member, score in client.zrange(board.key, 0, -1, withscores=True)}
+            self.assertEqual(actual, expected, board.key)
+
+            ranks = sql_ranks(expected)
+            for student_id in expected:
+                self.assertEqual(board.rank(student_id).rank, ranks[student_id], board.key)
+            self.assertEqual([(entry.student_id, entry.rank) for entry in board.top(3)],
+                             [(entry.student_id, ranks[entry.student_id]) for entry in board.top(3)])
+
+    def test_incremental_updates_match_sql(self):
+        """Signals keep every board equal to the SQL aggregates"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.give_points()
+        self.assert_parity()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            points = StudentPoints.objects.filter(student=self.students[4]).first()
+            points.total_points = 90
+            points.save()
+            StudentPoints.objects.filter(student=self.students[1]).first().delete()
+            PointTransaction.objects.filter(student=self.students[0]).delete()
+            PointTransaction.objects.create(student=self.students[2], points=-5, point_type='manual')
+        self.assert_parity()
+
+    def test_rebuild_matches_sql(self):
+        """Rebuilding from the database gives the same boards"""
+        StudentPoints.objects.bulk_create([
+            StudentPoints(student=student, group=self.groups[0], total_points=i * 10)
+            for i, student in enumerate(self.students)
+        ])
+        get_redis('leaderboard').zadd('leaderboard:group:999999', {1: 1})
+
+        rebuild_all()
+        self.assert_parity()
+        self.assertFalse(get_redis('leaderboard').exists('leaderboard:group:999999'))
+
+    def test_unbuilt_boards_read_from_sql(self):
+        """Boards missing from the built set are answered from SQL and rebuilt"""
+        StudentPoints.objects.bulk_create([
+            StudentPoints(student=student, group=self.groups[0], total_points=i * 10)
+            for i, student in enumerate(self.students)
+        ])
+        client = get_redis('leaderboard')
+        board = Leaderboard.group(self.groups[0].pk)
+        # The key exists but only holds a signal delta
+        client.zadd(board.key, {self.students[0].pk: 0})
+        ranks = sql_ranks(board.sql_scores())
+
+        self.assertEqual(board.rank(self.students[1].pk).rank, ranks[self.students[1].pk])
+        self.assertTrue(client.sismember(leaderboard.BUILT_KEY, board.key))
+        self.assertEqual(client.zcard(board.key), len(self.students))
+
+        client.flushdb()
+        self.assertEqual(
+            leaderboard.group_ranks(self.students[3].pk, [self.groups[0].pk, self.groups[1].pk]),
+            {self.groups[0].pk: ranks[self.students[3].pk]},
+        )
+        self.assertEqual([entry.student_id for entry in Leaderboard.overall().top(2)],
+                         [self.students[7].pk, self.students[6].pk])
+        self.assertEqual(client.smembers(leaderboard.BUILT_KEY), {
+            board.key.encode(), Leaderboard.group(self.groups[1].pk).key.encode(),
+            Leaderboard.overall().key.encode(),
+        })
+
+    def test_around(self):
+        """Neighbourhood keeps competition ranks around the student"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.give_points()
+        board = Leaderboard.overall()
+        ranks = sql_ranks(board.sql_scores())
+        around = board.around(self.students[2].pk, radius=1)
+        self.assertEqual(len(around), 3)
+        self.assertIn(self.students[2].pk, [entry.student_id for entry in around])
+        for entry in around:
+            self.assertEqual(entry.rank, ranks[entry.student_id])
+
+
+@override_settings(LEADERBOARD_REDIS_URL=UNREACHABLE_REDIS_URL, CACHES=LOCMEM_CACHE)
+class LeaderboardFallbackTestCase(LeaderboardFixtureMixin, TestCase):
+    """Test leaderboard reads and ranking pages when Redis is unavailable"""
+
+    def setUp(self):
+        super().setUp()
+        self.give_points()
+
+    def test_reads_fall_back_to_sql(self):
+        """Top, rank and around use competition ranking from SQL"""
+        board = Leaderboard.overall()
+        scores = board.sql_scores()
+        ranks = sql_ranks(scores)
+
+        top = board.top(3)
+        self.assertEqual([entry.score for entry in top], sorted(scores.values(), reverse=True)[:3])
+        for entry in top:
+            self.assertEqual(entry.rank, ranks[entry.student_id])
+
+        entry = board.rank(self.students[2].pk)
+        self.assertEqual(entry.rank, ranks[self.students[2].pk])
+        self.assertEqual(len(board.around(self.students[2].pk, radius=2)), 5)
+        self.assertIsNone(board.rank(10 ** 6))
+
+    def test_branch_and_group_boards(self):
+        """Branch boards only count points from that branch's groups"""
+        branch_scores = Leaderboard.branch(self.branches[1].pk).sql_scores()
+        expected = {
+            points.student_id: points.total_points
+            for points in StudentPoints.objects.filter(group=self.groups[1])
+        }
+        self.assertEqual(branch_scores, expected)
+        self.assertEqual(Leaderboard.group(self.groups[1].pk).sql_scores(), expected)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_ranking_pages_query_count(self):
+        """Ranking pages do not run a query per student or group"""
+        self.client.force_login(self.students[0])
+        students_url = reverse('gamification:student_ranking')
+        groups_url = reverse('gamification:groups_ranking')
+        students_queries, response = self.count_queries(students_url)
+        self.assertEqual(response.context['student_data'][0]['total_points'], 120)
+        groups_queries, response = self.count_queries(groups_url)
+        self.assertEqual(len(response.context['group_data']), 3)
+
+        for i in range(5):
+            student = User.objects.create_user(username=f'extra{i}', password='student123', role='student')
+            group = Group.objects.create(course=self.groups[0].course, name=f'X{i}',
+                                         start_time=time(10, 0), end_time=time(12, 0))
+            group.students.add(student)
+            StudentPoints.objects.create(student=student, group=group, total_points=i)
+
+        self.assertEqual(self.count_queries(students_url)[0], students_queries)
+        self.assertEqual(self.count_queries(groups_url)[0], groups_queries)
+
+
+@override_settings(LEADERBOARD_REDIS_URL=UNREACHABLE_REDIS_URL, CACHES=LOCMEM_CACHE)
+class BadgeRulesTestCase(TestCase):
+    """Test declarative badge rules, targeted evaluation and the nightly batch"""
+
+    def setUp(self):
+        """Set up test data"""
+        badges.invalidate_badges()
+        branch = Branch.objects.create(name='Test Branch')
+        course = Course.objects.create(name='Test Course', branch=branch)
+        self.group = Group.objects.create(course=course, name='G1', start_time=time(10, 0), end_time=time(12, 0))
+        self.students = [
+            User.objects.create_user(username=f'student{i}', password='student123', role='student')
+            for i in range(3)
+        ]
+        self.group.students.add(*self.students)
+        self.attendance_badge = Badge.objects.create(name='Perfect', badge_type='perfect_attendance')
+        self.homework_badge = Badge.objects.create(name='Master', badge_type='homework_master')
+        self.points_badge = Badge.objects.create(name='Top', badge_type='top_student', points_required=50)
+
+    def tearDown(self):
+        badges.invalidate_badges()
+
+    def earned(self):
+        return set(StudentBadge.objects.values_list('student_id', 'badge_id'))
+
+    def give_facts(self):
+        """Student 0: points, student 1: perfect attendance, student 2: homework on time"""
+        s0, s1, s2 = self.students
+        StudentPoints.objects.create(student=s0, group=self.group, total_points=60)
+        StudentPoints.objects.create(student=s1, group=self.group, total_points=40)
+        AttendanceStatistics.objects.create(student=s1, group=self.group, total_lessons=4,
+                                            present_count=4, attendance_percentage=100.0)
+        lesson = Lesson.objects.create(group=self.group, date=timezone.localdate(),
+                                       start_time=time(10, 0), end_time=time(12, 0))
+        Homework.objects.bulk_create([
+            Homework(lesson=lesson, student=s2, deadline=timezone.now() + timedelta(days=1),
+                     is_submitted=True, is_late=i == 0)
+            for i in range(10)
+        ])
+
+    def test_nightly_batch(self):
+        """The batch awards every rule with a constant number of queries and is idempotent"""
+        self.give_facts()
+        with self.assertNumQueries(6):
+            self.assertEqual(badges.award_all_badges(), 3)
+        s0, s1, s2 = self.students
+        self.assertEqual(self.earned(), {
+            (s0.pk, self.points_badge.pk),
+            (s1.pk, self.attendance_badge.pk),
+            (s2.pk, self.homework_badge.pk),
+        })
+        self.assertEqual(badges.award_all_badges(), 0)
+
+    def test_only_changed_inputs_are_evaluated(self):
+        """Rules whose inputs did not change are not checked"""
+        self.give_facts()
+        pairs = {(student.pk, self.group.pk) for student in self.students}
+        with self.assertNumQueries(4):
+            self.assertEqual(badges.award_badges({pair: {'points'} for pair in pairs}), 1)
+        self.assertEqual(self.earned(), {(self.students[0].pk, self.points_badge.pk)})
+        self.assertEqual(badges.award_badges({pair: {'attendance'} for pair in pairs}), 1)
+        self.assertIn((self.students[1].pk, self.attendance_badge.pk), self.earned())
+
+    def test_definitions_are_cached_and_invalidated(self):
+        """Badge definitions load once per process and reload after a badge changes"""
+        badges.active_badges()
+        with self.assertNumQueries(0):
+            self.assertEqual(len(badges.active_badges()), 3)
+        self.points_badge.is_active = False
+        self.points_badge.save()
+        self.assertEqual(len(badges.active_badges()), 2)
+
+    def test_attendance_signal_awards_badge(self):
+        """Marking attendance awards the perfect attendance badge after commit"""
+        with self.captureOnCommitCallbacks(execute=True):
+            lesson = Lesson.objects.create(group=self.group, date=timezone.localdate(),
+                                           start_time=time(10, 0), end_time=time(12, 0))
+        self.assertEqual(self.earned(), set())
+        with self.captureOnCommitCallbacks(execute=True):
+            attendance = Attendance.objects.get(lesson=lesson, student=self.students[0])
+            attendance.status = 'present'
+            attendance.save(update_fields=['status'])
+        self.assertEqual(self.earned(), {(self.students[0].pk, self.attendance_badge.pk)})
@@ -1,16 +1,52 @@
 from django.views.generic import ListView, DetailView, TemplateView
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import Sum, F, Avg, Count, Q
+from django.db.models import F, Avg, Count, Q, OuterRef, Subquery
 from django.utils import timezone
+from .leaderboard import Leaderboard
 from .models import (
     StudentPoints, StudentBadge, GroupRanking, BranchRanking,
-    OverallRanking, MonthlyRanking, PointTransaction
+    MonthlyRanking, PointTransaction
 )
-from accounts.mixins import RoleRequiredMixin, AdminRequiredMixin
+from accounts.mixins import RoleRequiredMixin, AdminRequiredMixin, KeysetPaginationMixin
 from accounts.models import User
+from accounts.access import get_access
 from courses.models import Group
 
 
+RANKING_LIMIT = 100
+
+
+def _int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def leaderboard_rows(entries, with_badges=False):
+    """
+    Leaderboard yozuvlarini shablon uchun qatorlarga aylantirish (o'quvchilar bitta so'rovda).
+    Faol bo'lmagan o'quvchilar tashlab ketiladi.
+    """
+    students = User.objects.filter(
+        pk__in=[entry.student_id for entry in entries], is_active=True
+    ).prefetch_related('student_groups')
+    if with_badges:
+        students = students.annotate(badges_count=Count('badges'))
+    students = students.in_bulk()
+
+    rows = []
+    for entry in entries:
+        student = students.get(entry.student_id)
+        if student is None:
+            continue
+        row = {'student': student, 'total_points': entry.score, 'rank': entry.rank}
+        if with_badges:
+            row['badges_count'] = student.badges_count
+        rows.append(row)
+    return rows
+
+
 class StudentPointsView(LoginRequiredMixin, DetailView):
     """
     O'quvchi ballari (guruh bo'yicha)
@@ -128,71 +164,40 @@ class BranchRankingView(LoginRequiredMixin, ListView):
 
 class OverallRankingView(LoginRequiredMixin, ListView):
     """
-    Markaz bo'yicha umumiy reyting
+    Markaz bo'yicha umumiy reyting (Redis leaderboard)
     """
-    model = OverallRanking
     template_name = 'gamification/overall_ranking.html'
     context_object_name = 'rankings'
     
     def get_queryset(self):
-        queryset = OverallRanking.objects.select_related('student').order_by('rank')
+        board = Leaderboard.overall()
         
-        # Group filter for students
-        group_id = self.request.GET.get('group')
+        # Group filter for students - o'z guruhi reytingi
+        group_id = _int_or_none(self.request.GET.get('group'))
         if group_id and self.request.user.is_student:
-            # Filter by group - get students in the group
-            from courses.models import Group
-            try:
-                group = Group.objects.get(pk=group_id, students=self.request.user)
-                group_student_ids = group.students.values_list('id', flat=True)
-                queryset = queryset.filter(student_id__in=group_student_ids)
-            except Group.DoesNotExist:
-                pass
+            if group_id in get_access(self.request).student_group_ids:
+                board = Leaderboard.group(group_id)
         
-        return queryset[:100]  # Top 100
+        return board.top(RANKING_LIMIT)
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        # Convert rankings to student list with points for template
-        from .models import StudentPoints
-        from accounts.models import User
-        
-        students_data = []
-        for ranking in context['rankings']:
-            student = ranking.student
-            # Get total points from StudentPoints
-            total_points = StudentPoints.objects.filter(student=student).aggregate(
-                total=Sum('total_points')
-            )['total'] or 0
-            
-            # Get badges count
-            badges_count = student.student_badges.count() if hasattr(student, 'student_badges') else 0
-            
-            students_data.append({
-                'student': student,
-                'total_points': total_points,
-                'badges_count': badges_count,
-                'rank': ranking.rank
-            })
+        students_data = leaderboard_rows(context['rankings'], with_badges=True)
         
         # Top 3 for podium
-        context['top_students'] = students_data[:3] if len(students_data) >= 3 else students_data
+        context['top_students'] = students_data[:3]
         context['students'] = students_data
         
         # Current student's position
         if self.request.user.is_student:
-            try:
-                student_ranking = OverallRanking.objects.get(student=self.request.user)
-                context['current_student_rank'] = student_ranking.rank
-            except OverallRanking.DoesNotExist:
-                context['current_student_rank'] = None
+            entry = Leaderboard.overall().rank(self.request.user.pk)
+            context['current_student_rank'] = entry.rank if entry else None
         
         # Groups for filter (students only)
         if self.request.user.is_student:
-            from courses.models import Group
             context['student_groups'] = Group.objects.filter(
-                students=self.request.user, 
+                pk__in=get_access(self.request).student_group_ids, 
                 is_active=True
             )
             context['selected_group'] = self.request.GET.get('group')
@@ -234,7 +239,7 @@ class MonthlyRankingView(LoginRequiredMixin, ListView):
         return context
 
 
-class PointHistoryView(LoginRequiredMixin, ListView):
+class PointHistoryView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     """
     O'quvchi ball tarixi
     """
@@ -272,41 +277,18 @@ class PointHistoryView(LoginRequiredMixin, ListView):
 
 
 class StudentRankingView(LoginRequiredMixin, TemplateView):
-    """Talabalar umumiy reytingi"""
+    """Talabalar umumiy reytingi (Redis leaderboard)"""
     template_name = 'gamification/student_ranking.html'
+    query_budget = 12
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
         # Filterlar
-        group_id = self.request.GET.get('group')
-        course_id = self.request.GET.get('course')
-        
-        # Talabalar ro'yxati
-        students = User.objects.filter(role='student', is_active=True)
+        group_id = _int_or_none(self.request.GET.get('group'))
+        board = Leaderboard.group(group_id) if group_id else Leaderboard.overall()
         
-        if group_id:
-            students = students.filter(student_groups__id=group_id)
-        
-        # Ball bo'yicha saralash
-        student_data = []
-        for student in students:
-            total_points = StudentPoints.objects.filter(student=student).aggregate(
-                total=Sum('total_points')
-            )['total'] or 0
-            student_data.append({
-                'student': student,
-                'total_points': total_points
-            })
-        
-        # Saralash
-        student_data.sort(key=lambda x: x['total_points'], reverse=True)
-        
-        # Rank qo'shish
-        for i, data in enumerate(student_data):
-            data['rank'] = i + 1
-        
-        context['student_data'] = student_data[:100]  # Top 100
+        context['student_data'] = leaderboard_rows(board.top(RANKING_LIMIT))
         context['groups'] = Group.objects.filter(is_active=True)
         
         return context
@@ -315,32 +297,29 @@ class StudentRankingView(LoginRequiredMixin, TemplateView):
 class GroupsRankingView(LoginRequiredMixin, TemplateView):
     """Guruhlar reytingi"""
     template_name = 'gamification/groups_ranking.html'
+    query_budget = 9
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        groups = Group.objects.filter(is_active=True).select_related('course', 'mentor')
-        
-        group_data = []
-        for group in groups:
-            avg_points = StudentPoints.objects.filter(group=group).aggregate(
-                avg=Avg('total_points')
-            )['avg'] or 0
-            
-            group_data.append({
+        # O'rtacha ball va o'quvchilar soni bitta so'rovda
+        avg_points = StudentPoints.objects.filter(group=OuterRef('pk')).order_by().values('group').annotate(
+            avg=Avg('total_points')
+        ).values('avg')
+        groups = Group.objects.filter(is_active=True).select_related('course', 'mentor').annotate(
+            avg_points=Subquery(avg_points),
+            student_count=Count('students', distinct=True),
+        ).order_by(F('avg_points').desc(nulls_last=True), 'pk')
+        
+        context['group_data'] = [
+            {
                 'group': group,
-                'avg_points': avg_points,
-                'student_count': group.students.count()
-            })
-        
-        # Saralash
-        group_data.sort(key=lambda x: x['avg_points'], reverse=True)
-        
-        # Rank
-        for i, data in enumerate(group_data):
-            data['rank'] = i + 1
-        
-        context['group_data'] = group_data
+                'avg_points': group.avg_points or 0,
+                'student_count': group.student_count,
+                'rank': i + 1,
+            }
+            for i, group in enumerate(groups)
+        ]
         
         return context
 
@@ -352,22 +331,20 @@ class MentorRankingView(AdminRequiredMixin, TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        mentors = User.objects.filter(role='mentor', is_active=True)
+        mentors = list(User.objects.filter(role='mentor', is_active=True))
+        
+        # Guruhlar, o'quvchilar va KPI barcha mentorlar uchun guruhlangan so'rovlar bilan (keshlangan)
+        from mentors.workload import mentor_workloads
+        workloads = mentor_workloads([mentor.pk for mentor in mentors])
         
         mentor_data = []
         for mentor in mentors:
-            groups = Group.objects.filter(mentor=mentor, is_active=True)
-            total_students = sum(g.students.count() for g in groups)
-            
-            # KPI hisoblash
-            from mentors.models import MentorKPI
-            kpi = MentorKPI.objects.filter(mentor=mentor).first()
-            
+            workload = workloads[mentor.pk]
             mentor_data.append({
                 'mentor': mentor,
-                'groups_count': groups.count(),
-                'students_count': total_students,
-                'kpi_score': kpi.total_kpi_score if kpi else 0  # Use total_kpi_score instead of overall_score
+                'groups_count': len(workload['groups']),
+                'students_count': workload['students_count'],
+                'kpi_score': workload['kpi_score'] or 0
             })
         
         # KPI bo'yicha saralash
@@ -5,6 +5,10 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
+
+Telegram webhook (telegram_bot.views.webhook) async view - ASGI serverda
+(masalan: uvicorn geeks_crm.asgi:application) thread ajratmasdan ishlaydi.
+Yangilanishlar alohida jarayonda qayta ishlanadi: python manage.py runbotworker
 """
 
 import os
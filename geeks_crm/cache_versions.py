@@ -0,0 +1,51 @@
+"""
+Scope bo'yicha kesh versiyalari (versiyalangan kesh kalitlari)
+Keshlangan qiymat kaliti bog'liq scope lar versiyalarini o'z ichiga oladi; ma'lumot o'zgarganda
+scope versiyasi yangilanadi (bump) va eski qiymatlar o'chirilmasdan o'z-o'zidan eskiradi:
+    versions = CacheVersions('roster')
+    key = f'roster:{group_id}:{versions.get(group_id)}'
+    ...
+    versions.bump(group_id)
+Versiya - time.time_ns(): kalit keshdan chiqib ketsa ham eski versiya qaytib kelmaydi.
+"""
+import logging
+import time
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+class CacheVersions:
+    """prefix:version:<scope> kalitlarida saqlanadigan versiyalar"""
+    def __init__(self, prefix):
+        self.prefix = prefix
+
+    def key(self, scope):
+        return f'{self.prefix}:version:{scope}'
+
+    def get_many(self, scopes):
+        """Scope versiyalari ro'yxati (yo'qlari yangi qiymat bilan yaratiladi)"""
+        keys = [self.key(scope) for scope in scopes]
+        versions = cache.get_many(keys)
+        missing = [key for key in keys if key not in versions]
+        if missing:
+            for key in missing:
+                cache.add(key, time.time_ns(), None)
+            versions.update(cache.get_many(missing))
+        return [versions.get(key) for key in keys]
+
+    def get(self, scope):
+        return self.get_many([scope])[0]
+
+    def bump(self, *scopes):
+        """Scope larga bog'liq barcha keshlangan qiymatlarni eskirtirish (Redis xatosi - faqat log)"""
+        scopes = {scope for scope in scopes if scope}
+        if not scopes:
+            return
+        version = time.time_ns()
+        try:
+            cache.set_many({self.key(scope): version for scope in scopes}, None)
+        except Exception as e:
+            # Redis ishlamasa qiymatlar o'z TTL idan keyin baribir yangilanadi
+            logger.warning(f"Error bumping {self.prefix} cache versions: {e}")
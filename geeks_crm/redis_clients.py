@@ -0,0 +1,44 @@
+"""
+Yordamchi Redis klientlari (Django keshidan tashqari)
+get_redis(alias) - settings.<ALIAS>_REDIS_URL uchun jarayon bo'yicha bitta sinxron klient:
+- 'leaderboard' - gamification.leaderboard
+- 'task_lock' - geeks_crm.task_locks
+- 'metrics' - analytics.metrics, analytics.task_metrics
+- 'telegram_updates' - telegram_bot.updates (webhook navbatga yozishi)
+
+Klient URL bo'yicha saqlanadi - sozlama o'zgarsa (override_settings) yangi klient yaratiladi.
+Redis xatolarini ushlash: except REDIS_ERRORS
+"""
+import threading
+
+import redis
+from django.conf import settings
+
+
+REDIS_ERRORS = (redis.RedisError, OSError)
+DEFAULT_SOCKET_TIMEOUT = 2  # soniya
+SOCKET_TIMEOUTS = {
+    'metrics': 1,  # O'lchov yozish so'rov javobini kechiktirmasligi kerak
+}
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def redis_url(alias):
+    return getattr(settings, f'{alias.upper()}_REDIS_URL')
+
+
+def get_redis(alias):
+    """alias uchun Redis klienti (ulanishlar puli jarayon ichida umumiy, thread-safe)"""
+    url = redis_url(alias)
+    client = _clients.get((alias, url))
+    if client is None:
+        with _lock:
+            client = _clients.get((alias, url))
+            if client is None:
+                client = redis.Redis.from_url(
+                    url, socket_timeout=SOCKET_TIMEOUTS.get(alias, DEFAULT_SOCKET_TIMEOUT),
+                )
+                _clients[(alias, url)] = client
+    return client
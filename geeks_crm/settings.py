@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 from pathlib import Path
 from decouple import config
 import os
+import sys
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -27,6 +28,9 @@ SECRET_KEY = config('SECRET_KEY', default='django-insecure-c^92fw&(ph@-x&hrdchqb
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = config('DEBUG', default=True, cast=bool)
 
+# python manage.py test
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
+
 ALLOWED_HOSTS = config('ALLOWED_HOSTS', default='localhost,127.0.0.1', cast=lambda v: [s.strip() for s in v.split(',')])
 
 
@@ -66,11 +70,13 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'analytics.middleware.RequestMetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'accounts.middleware.AccessContextMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -218,6 +224,14 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'gamification.tasks.update_group_rankings',
         'schedule': crontab(hour='*/2', minute=0),  # Har 2 soatda
     },
+    'rebuild-leaderboards': {
+        'task': 'gamification.tasks.rebuild_leaderboards',
+        'schedule': crontab(hour=3, minute=30),  # Har kuni soat 3:30
+    },
+    'award-badges': {
+        'task': 'gamification.tasks.award_badges',
+        'schedule': crontab(hour=3, minute=0),  # Har kuni soat 3:00
+    },
     'update-branch-rankings': {
         'task': 'gamification.tasks.update_branch_rankings',
         'schedule': crontab(hour='*/4', minute=0),  # Har 4 soatda
@@ -293,6 +307,15 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'crm.tasks.import_leads_from_google_sheets',
         'schedule': crontab(minute='*/30'),  # Har 30 daqiqada
     },
+    'refresh-lead-funnel': {
+        'task': 'crm.tasks.refresh_lead_funnel',
+        'schedule': crontab(minute='15,45'),  # Har 30 daqiqada
+    },
+    'rebuild-lead-funnel': {
+        'task': 'crm.tasks.refresh_lead_funnel',
+        'schedule': crontab(hour=2, minute=30),  # Har kuni soat 2:30, to'liq qayta qurish
+        'kwargs': {'full': True},
+    },
     # Finance tasks
     'create-payment-reminders': {
         'task': 'finance.tasks.create_payment_reminders',
@@ -311,13 +334,34 @@ CELERY_BEAT_SCHEDULE = {
 # Redis Cache
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'BACKEND': 'analytics.cache.InstrumentedRedisCache',
         'LOCATION': config('REDIS_URL', default='redis://localhost:6379/1'),
     }
 }
 
+# Yordamchi Redis bazalari: geeks_crm.redis_clients.get_redis(alias) → <ALIAS>_REDIS_URL
+# Reytinglar (gamification.leaderboard) - Redis sorted set lar
+LEADERBOARD_REDIS_URL = config('LEADERBOARD_REDIS_URL', default='redis://localhost:6379/3')
+
+# Davriy vazifalar qulfi va debounce (geeks_crm.task_locks)
+TASK_LOCK_REDIS_URL = config('TASK_LOCK_REDIS_URL', default='redis://localhost:6379/5')
+
+# O'lchovlar (analytics.metrics, analytics.task_metrics) uchun Redis
+METRICS_REDIS_URL = config('METRICS_REDIS_URL', default='redis://localhost:6379/4')
+# View lar bo'yicha so'rovlar soni va vaqt, oxirgi 1 soat
+REQUEST_METRICS_RECORD = config('REQUEST_METRICS_RECORD', default=not TESTING, cast=bool)
+# Celery vazifalari: vaqt, SQL so'rovlar, o'zgargan qatorlar, xatolar, ustma-ust ishlashlar
+TASK_METRICS_RECORD = config('TASK_METRICS_RECORD', default=not TESTING, cast=bool)
+# True - view query_budget dan oshsa xato (testlarda yoqilgan), False - faqat ogohlantirish
+QUERY_BUDGET_STRICT = config('QUERY_BUDGET_STRICT', default=TESTING, cast=bool)
+
 # Telegram Bot Configuration
 TELEGRAM_BOT_TOKEN = config('TELEGRAM_BOT_TOKEN', default='')
+# setWebhook(secret_token=...) bilan bir xil qiymat - bo'sh bo'lsa tekshirilmaydi
+TELEGRAM_WEBHOOK_SECRET = config('TELEGRAM_WEBHOOK_SECRET', default='')
+# Webhook yangilanishlari navbati (python manage.py runbotworker), get_redis('telegram_updates')
+TELEGRAM_UPDATES_REDIS_URL = config('TELEGRAM_UPDATES_REDIS_URL', default='redis://localhost:6379/2')
+TELEGRAM_WORKER_CONCURRENCY = config('TELEGRAM_WORKER_CONCURRENCY', default=32, cast=int)
 
 # Google Sheets Configuration
 GOOGLE_SHEETS_CREDENTIALS = config('GOOGLE_SHEETS_CREDENTIALS', default='')
@@ -0,0 +1,160 @@
+"""
+Signal yon ta'sirlarini tranzaksiya bo'yicha yig'ish (qayta hisoblashlar, Celery vazifalari)
+
+Signal og'ir ishni har bir save() da bajarish o'rniga "iflos" kalitni belgilaydi:
+    side_effects.mark('attendance_statistics', (student_id, group_id))
+Tranzaksiya commit bo'lganda (transaction.on_commit) har bir tur uchun handler bir marta,
+takrorlanmagan kalitlar to'plami bilan chaqiriladi:
+    @side_effects.handler('attendance_statistics')
+    def recalculate_attendance_statistics(keys):
+        ...
+Tranzaksiyadan tashqarida (autocommit) handler darhol ishlaydi - avvalgi xatti-harakat.
+Handler lar order bo'yicha (kichigi birinchi) ishlaydi; handler ichida belgilangan kalitlar
+shu partiyaning keyingi aylanishida bajariladi.
+
+Ko'p yozuvli amallar (import, bir nechta natija kiritish) autocommit da ham bitta partiya olishi uchun:
+    with side_effects.deferred():
+        for row in rows:
+            Attendance.objects.update_or_create(...)
+Blok tugaganda (tashqi atomic bo'lsa - commit da) hammasi bir marta bajariladi.
+
+Tranzaksiya bekor qilinsa belgilangan kalitlar ham tashlanadi. Ichki savepoint bekor qilinganda
+undan oldin boshlangan partiya saqlanib qoladi - handler lar bazadan qayta hisoblagani uchun zararsiz.
+"""
+import logging
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+MAX_ROUNDS = 10  # handler lar yangi kalit belgilashda davom etsa - cheksiz aylanishdan himoya
+
+_handlers = {}
+_state = threading.local()
+
+
+def handler(kind, order=0):
+    """Tur uchun partiya handler ini ro'yxatdan o'tkazish: func(keys: set)"""
+    def decorator(func):
+        _handlers[kind] = (order, func)
+        return func
+    return decorator
+
+
+class _Batch:
+    def __init__(self):
+        self.keys = defaultdict(set)
+        self.done = False
+
+    def update(self, keys):
+        for kind, values in keys.items():
+            self.keys[kind].update(values)
+
+    def run(self):
+        _flush(self)
+
+
+def _pending_batch():
+    """Hali bajarilmagan (on_commit da kutayotgan) joriy partiya yoki None"""
+    batch = getattr(_state, 'batch', None)
+    if batch is None or batch.done:
+        return None
+    if getattr(_state, 'flushing', False):
+        return batch
+    # Tranzaksiya yoki savepoint bekor qilinsa on_commit ro'yxatidan chiqib ketadi
+    callbacks = transaction.get_connection().run_on_commit
+    if not any(func == batch.run for _, func, _ in reversed(callbacks)):
+        return None
+    # Har bir qo'shilishda joriy savepoint da yana bir ishga tushiruvchi: partiya oldingi atomic
+    # blokda (masalan, setUp da) ro'yxatga olingan bo'lsa ham keyingi captureOnCommitCallbacks yoki
+    # ichki blok uni bajaradi. Partiya birinchi chaqiruvda ishlaydi, qolganlari hech narsa qilmaydi;
+    # ichki savepoint bekor qilinsa faqat uning ishga tushiruvchisi tushib qoladi.
+    transaction.on_commit(batch.run)
+    return batch
+
+
+def _submit(keys):
+    batch = _pending_batch()
+    if batch is not None:
+        batch.update(keys)
+        return
+    batch = _Batch()
+    batch.update(keys)
+    _state.batch = batch
+    if not getattr(_state, 'flushing', False):
+        transaction.on_commit(batch.run)
+
+
+def mark(kind, key):
+    """Kalitni iflos deb belgilash (qayta hisoblash commit dan keyin bir marta)"""
+    if kind not in _handlers:
+        raise ValueError(f"Unknown side effect: {kind}")
+    deferred_keys = getattr(_state, 'deferred', None)
+    if deferred_keys is not None:
+        deferred_keys[kind].add(key)
+    else:
+        _submit({kind: {key}})
+
+
+@contextmanager
+def deferred():
+    """Blok ichidagi barcha belgilashlarni bitta partiyaga yig'ish (ichma-ich ishlatsa bo'ladi)"""
+    if getattr(_state, 'deferred', None) is not None:
+        yield
+        return
+    _state.deferred = defaultdict(set)
+    try:
+        yield
+    finally:
+        keys, _state.deferred = _state.deferred, None
+        if keys:
+            _submit(keys)
+
+
+def _flush(batch):
+    if batch.done:
+        return
+    batch.done = True
+    _state.batch = None
+    _state.flushing = True
+    try:
+        keys = batch.keys
+        for _ in range(MAX_ROUNDS):
+            for kind, (order, func) in sorted(_handlers.items(), key=lambda item: item[1][0]):
+                values = keys.pop(kind, None)
+                if not values:
+                    continue
+                try:
+                    func(values)
+                except Exception as e:
+                    logger.error(f"Error running {kind} side effects for {len(values)} keys: {e}")
+            follow_up = getattr(_state, 'batch', None)
+            if follow_up is None:
+                break
+            follow_up.done = True
+            _state.batch = None
+            keys = follow_up.keys
+        else:
+            logger.warning(f"Side effects still pending after {MAX_ROUNDS} rounds: {sorted(keys)}")
+    finally:
+        _state.flushing = False
+
+
+def delay_on_commit(task, *args):
+    """task.delay(*args) ni commit dan keyin, partiyadagi bir xil chaqiruvlarni bitta qilib yuborish"""
+    mark('celery_tasks', (task.name, args))
+
+
+@handler('celery_tasks', order=100)
+def send_tasks(calls):
+    from celery import current_app
+
+    for name, args in calls:
+        try:
+            current_app.tasks[name].delay(*args)
+        except Exception as e:
+            logger.error(f"Error sending task {name}{args}: {e}")
@@ -0,0 +1,187 @@
+"""
+Davriy Celery vazifalari uchun Redis qulfi va debounce (SingletonTask)
+
+Bir vazifa bir vaqtda faqat bitta workerda ishlaydi (tasklock:running:<vazifa>). Qulf band bo'lsa:
+- on_busy='skip' - bu ishga tushish o'tkazib yuboriladi (keyingisi jadval bo'yicha keladi)
+- on_busy='rerun' - joriy ishga tushish tugagach vazifa yana bir marta navbatga qo'yiladi
+  (band paytda kelgan barcha chaqiruvlar bitta qayta ishga tushishga birlashadi)
+Qulf TTL - CELERY_TASK_TIME_LIMIT: worker o'lib qolsa ham qulf shu vaqtdan keyin bo'shaydi.
+
+debounce > 0 bo'lsa .delay()/apply_async chaqiruvlari debounce soniya kechiktiriladi va shu oynada
+kelgan qolgan chaqiruvlar o'sha bitta ishga tushishga birlashadi (tasklock:pending:<vazifa>).
+Vazifa boshlanishi bilan oyna yopiladi - ish davomida kelgan chaqiruvlar yangi ishga tushish beradi.
+
+Redis ishlamasa vazifa qulfsiz, odatdagidek ishlaydi (faqat ogohlantirish).
+Statistika (tasklock:stats:<vazifa>): runs, waited, wait_ms, coalesced, skipped, reruns -
+/analytics/tasks/ sahifasida ko'rsatiladi.
+
+Misol:
+    @shared_task(base=SingletonTask, debounce=30, on_busy='rerun')
+    def assign_leads_to_sales():
+        ...
+"""
+import hashlib
+import json
+import logging
+import time
+
+from celery import Task
+from celery.exceptions import Ignore
+from celery.utils import uuid
+from django.conf import settings
+
+from geeks_crm.redis_clients import REDIS_ERRORS, get_redis
+
+logger = logging.getLogger(__name__)
+
+
+KEY_PREFIX = 'tasklock'
+TASKS_KEY = f'{KEY_PREFIX}:tasks'
+PENDING_GRACE = 300  # soniya - navbat sekin bo'lsa ham debounce oynasi ochiq turadi
+POLL_INTERVAL = 0.2
+
+def _stats_key(name):
+    return f'{KEY_PREFIX}:stats:{name}'
+
+
+def _delete_if_equal(client, key, value):
+    """Kalit qiymati value bo'lsa o'chirish (boshqa workerning qulfi/oynasiga tegmaslik uchun)"""
+    def delete(pipe):
+        if pipe.get(key) == value.encode():
+            pipe.multi()
+            pipe.delete(key)
+    client.transaction(delete, key)
+
+
+def record(name, **counters):
+    """Statistika hisoblagichlarini oshirish (Redis xatosi - faqat log)"""
+    try:
+        pipe = get_redis('task_lock').pipeline()
+        for field, amount in counters.items():
+            pipe.hincrby(_stats_key(name), field, amount)
+        pipe.sadd(TASKS_KEY, name)
+        pipe.execute()
+    except REDIS_ERRORS as e:
+        logger.warning(f"Error recording task lock stats for {name}: {e}")
+
+
+def stats():
+    """{vazifa nomi: {'runs', 'waited', 'wait_ms', 'coalesced', 'skipped', 'reruns'}}"""
+    client = get_redis('task_lock')
+    names = sorted(name.decode() for name in client.smembers(TASKS_KEY))
+    pipe = client.pipeline(transaction=False)
+    for name in names:
+        pipe.hgetall(_stats_key(name))
+    return {
+        name: {key.decode(): int(value) for key, value in counters.items()}
+        for name, counters in zip(names, pipe.execute())
+    }
+
+
+class SingletonTask(Task):
+    """
+    Bir vaqtda bitta nusxada ishlaydigan, chaqiruvlari debounce qilinadigan vazifa
+    Sozlamalar shared_task(...) orqali beriladi: debounce, lock_wait, on_busy, lock_timeout
+    """
+    debounce = 0        # soniya, 0 - chaqiruvlar birlashtirilmaydi
+    lock_wait = 0       # qulf bo'shashini kutish, soniya
+    on_busy = 'skip'    # 'skip' yoki 'rerun'
+    lock_timeout = None  # soniya, None - CELERY_TASK_TIME_LIMIT
+
+    def singleton_key(self, kind, args=None, kwargs=None):
+        """Qulf kaliti: vazifa nomi + argumentlar (argumentlari har xil chaqiruvlar alohida)"""
+        key = f'{KEY_PREFIX}:{kind}:{self.name}'
+        if args or kwargs:
+            digest = hashlib.md5(json.dumps([args or [], kwargs or {}], sort_keys=True, default=str).encode())
+            key = f'{key}:{digest.hexdigest()}'
+        return key
+
+    def apply_async(self, args=None, kwargs=None, task_id=None, **options):
+        if not self.debounce or 'countdown' in options or 'eta' in options:
+            return super().apply_async(args, kwargs, task_id=task_id, **options)
+
+        task_id = task_id or uuid()
+        key = self.singleton_key('pending', args, kwargs)
+        try:
+            client = get_redis('task_lock')
+            if not client.set(key, task_id, nx=True, ex=self.debounce + PENDING_GRACE):
+                pending = client.get(key)
+                if pending is not None:
+                    record(self.name, coalesced=1)
+                    return self.AsyncResult(pending.decode())
+                client.set(key, task_id, ex=self.debounce + PENDING_GRACE)
+        except REDIS_ERRORS as e:
+            logger.warning(f"Task debounce unavailable for {self.name}: {e}")
+            return super().apply_async(args, kwargs, task_id=task_id, **options)
+        return super().apply_async(args, kwargs, task_id=task_id, countdown=self.debounce, **options)
+
+    def __call__(self, *args, **kwargs):
+        token = self.request.id or uuid()
+        lock_key = self.singleton_key('running', args, kwargs)
+        try:
+            client = get_redis('task_lock')
+            if self.debounce and self.request.id:
+                _delete_if_equal(client, self.singleton_key('pending', args, kwargs), self.request.id)
+            acquired = self._acquire(client, lock_key, token)
+        except REDIS_ERRORS as e:
+            logger.warning(f"Task lock unavailable for {self.name}, running without lock: {e}")
+            return super().__call__(*args, **kwargs)
+
+        if not acquired:
+            self._busy(client, args, kwargs)
+            if self.request.called_directly:
+                return None
+            raise Ignore()
+
+        try:
+            return super().__call__(*args, **kwargs)
+        finally:
+            self._release(client, lock_key, token, args, kwargs)
+
+    @property
+    def _lock_ttl(self):
+        return self.lock_timeout or getattr(settings, 'CELERY_TASK_TIME_LIMIT', 30 * 60)
+
+    def _acquire(self, client, key, token):
+        started = time.perf_counter()
+        attempts = 0
+        while True:
+            attempts += 1
+            if client.set(key, token, nx=True, ex=self._lock_ttl):
+                if attempts > 1:
+                    record(self.name, runs=1, waited=1, wait_ms=round((time.perf_counter() - started) * 1000))
+                else:
+                    record(self.name, runs=1)
+                return True
+            remaining = self.lock_wait - (time.perf_counter() - started)
+            if remaining <= 0:
+                return False
+            time.sleep(min(POLL_INTERVAL, remaining))
+
+    def _busy(self, client, args, kwargs):
+        logger.info(f"{self.name} is already running, {'rerun scheduled' if self.on_busy == 'rerun' else 'skipped'}")
+        if self.on_busy == 'rerun':
+            try:
+                client.set(self.singleton_key('rerun', args, kwargs), 1, ex=self._lock_ttl)
+            except REDIS_ERRORS as e:
+                logger.warning(f"Error scheduling rerun of {self.name}: {e}")
+        record(self.name, skipped=1)
+
+    def _release(self, client, key, token, args, kwargs):
+        try:
+            _delete_if_equal(client, key, token)
+            if self.on_busy != 'rerun':
+                return
+            pipe = client.pipeline()
+            pipe.get(self.singleton_key('rerun', args, kwargs))
+            pipe.delete(self.singleton_key('rerun', args, kwargs))
+            rerun, _ = pipe.execute()
+        except REDIS_ERRORS as e:
+            logger.warning(f"Error releasing task lock for {self.name}: {e}")
+            return
+        if rerun:
+            record(self.name, reruns=1)
+            try:
+                self.apply_async(args, kwargs)
+            except Exception as e:
+                logger.error(f"Error scheduling rerun of {self.name}: {e}")
@@ -1,5 +1,6 @@
 from django.utils import timezone
 from .models import Homework
+from accounts.access import get_access
 
 
 def homework_notifications(request):
@@ -12,7 +13,7 @@ def homework_notifications(request):
         if request.user.is_mentor:
             # Mentor uchun: topshirilgan lekin baholanmagan vazifalar soni
             submitted_count = Homework.objects.filter(
-                lesson__group__mentor=request.user,
+                lesson__group__in=get_access(request).mentored_group_ids,
                 is_submitted=True
             ).filter(
                 grade__isnull=True
@@ -8,6 +8,7 @@ from django.utils import timezone
 from django.db.models import Q
 from .models import Homework, HomeworkGrade
 from .forms import HomeworkForm, HomeworkGradeForm
+from accounts.access import get_access
 from accounts.mixins import MentorRequiredMixin, RoleRequiredMixin, TailwindFormMixin
 from courses.models import Group, Lesson
 
@@ -25,7 +26,7 @@ class HomeworkListView(LoginRequiredMixin, ListView):
         if self.request.user.is_student:
             queryset = queryset.filter(student=self.request.user)
         elif self.request.user.is_mentor:
-            queryset = queryset.filter(lesson__group__mentor=self.request.user)
+            queryset = queryset.filter(lesson__group__in=get_access(self.request).mentored_group_ids)
         
         # Qo'shimcha filterlar
         status = self.request.GET.get('status')
@@ -84,12 +85,12 @@ class HomeworkListView(LoginRequiredMixin, ListView):
         
         # Guruhlar (mentor/admin uchun)
         if self.request.user.is_mentor:
-            context['groups'] = Group.objects.filter(mentor=self.request.user, is_active=True)
+            context['groups'] = Group.objects.filter(pk__in=get_access(self.request).mentored_group_ids, is_active=True)
         elif self.request.user.is_admin or self.request.user.is_manager:
             context['groups'] = Group.objects.filter(is_active=True)
         elif self.request.user.is_student:
             # Studentlar uchun o'z guruhlari
-            context['groups'] = Group.objects.filter(students=self.request.user, is_active=True)
+            context['groups'] = Group.objects.filter(pk__in=get_access(self.request).student_group_ids, is_active=True)
         
         # Permissions
         user = self.request.user
@@ -121,7 +122,7 @@ class HomeworkAssignView(MentorRequiredMixin, TemplateView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        groups = Group.objects.filter(mentor=self.request.user, is_active=True).select_related('course')
+        groups = Group.objects.filter(pk__in=get_access(self.request).mentored_group_ids, is_active=True).select_related('course')
         context['groups'] = groups
         
         # Har bir guruh uchun oxirgi darslar
@@ -214,7 +215,7 @@ class HomeworkBulkGradeView(MentorRequiredMixin, TemplateView):
         group_id = self.request.GET.get('group')
         
         homeworks = Homework.objects.filter(
-            lesson__group__mentor=self.request.user,
+            lesson__group__in=get_access(self.request).mentored_group_ids,
             is_submitted=True,
             grade__isnull=True
         ).select_related('student', 'lesson__group')
@@ -223,7 +224,7 @@ class HomeworkBulkGradeView(MentorRequiredMixin, TemplateView):
             homeworks = homeworks.filter(lesson__group_id=group_id)
         
         context['homeworks'] = homeworks
-        context['groups'] = Group.objects.filter(mentor=self.request.user, is_active=True)
+        context['groups'] = Group.objects.filter(pk__in=get_access(self.request).mentored_group_ids, is_active=True)
         return context
     
     def post(self, request):
@@ -260,7 +261,7 @@ class HomeworkDetailView(LoginRequiredMixin, DetailView):
             queryset = queryset.filter(student=self.request.user)
         elif self.request.user.is_mentor:
             # Mentor faqat o'z guruhlaridagi vazifalarni ko'ra oladi
-            queryset = queryset.filter(lesson__group__mentor=self.request.user)
+            queryset = queryset.filter(lesson__group__in=get_access(self.request).mentored_group_ids)
         # Admin va manager barcha vazifalarni ko'ra oladi
         
         return queryset
@@ -334,7 +335,7 @@ class HomeworkUpdateView(TailwindFormMixin, RoleRequiredMixin, UpdateView):
     def get_queryset(self):
         queryset = Homework.objects.all()
         if self.request.user.is_mentor:
-            queryset = queryset.filter(lesson__group__mentor=self.request.user)
+            queryset = queryset.filter(lesson__group__in=get_access(self.request).mentored_group_ids)
         return queryset
     
     def get_success_url(self):
@@ -355,7 +356,7 @@ class HomeworkDeleteView(RoleRequiredMixin, DeleteView):
     def get_queryset(self):
         queryset = Homework.objects.all()
         if self.request.user.is_mentor:
-            queryset = queryset.filter(lesson__group__mentor=self.request.user)
+            queryset = queryset.filter(lesson__group__in=get_access(self.request).mentored_group_ids)
         return queryset
     
     def delete(self, request, *args, **kwargs):
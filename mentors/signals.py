@@ -1,9 +1,16 @@
 """
 Django signals for mentors app
 """
-from django.db.models.signals import post_save
+from collections import defaultdict
+
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save
 from django.dispatch import receiver
-from .models import MonthlyReport
+from .models import MentorKPI, MonthlyReport
+from .workload import invalidate_workloads
+from attendance.models import Attendance
+from courses.models import Group, Lesson
+from homework.models import Homework, HomeworkGrade
+from geeks_crm import side_effects
 from telegram_bot.tasks import send_monthly_report_to_parent
 
 
@@ -16,3 +23,110 @@ def send_monthly_report_notification(sender, instance, created, **kwargs):
         # Celery task orqali xabar yuborish
         send_monthly_report_to_parent.delay(instance.id)
 
+
+
+# Kalit turi -> (model, mentor maydoni)
+MENTOR_LOOKUPS = {
+    'group': (Group, 'mentor_id'),
+    'lesson': (Lesson, 'group__mentor_id'),
+    'homework': (Homework, 'lesson__group__mentor_id'),
+}
+
+
+def _mentor_ids(kind, pks):
+    model, field = MENTOR_LOOKUPS[kind]
+    return model.objects.filter(pk__in=pks).values_list(field, flat=True)
+
+
+def _mark(kind, pk, signal):
+    """
+    Dars yoki uy vazifasi o'chirilganda mentor darhol (ota yozuv hali bor paytda) aniqlanadi:
+    commit dan keyin o'chirilgan yozuvga bog'liq kalitlar hech kimga aylanmaydi
+    """
+    if not pk:
+        return
+    if signal is not post_delete:
+        side_effects.mark('mentor_workload', (kind, pk))
+        return
+    for mentor_id in _mentor_ids(kind, [pk]):
+        if mentor_id:
+            side_effects.mark('mentor_workload', ('mentor', mentor_id))
+
+
+@receiver(post_init, sender=Group)
+def remember_group_mentor(sender, instance, **kwargs):
+    # __dict__ - .only()/.defer() da mentor_id uchun qo'shimcha so'rov bo'lmasin
+    instance._loaded_mentor_id = instance.__dict__.get('mentor_id')
+
+
+@receiver(post_save, sender=Group)
+def invalidate_workload_on_group_save(sender, instance, **kwargs):
+    """Guruh o'zgarganda yangi va (mentor almashgan bo'lsa) avvalgi mentor keshini eskirtirish"""
+    for mentor_id in {instance._loaded_mentor_id, instance.mentor_id}:
+        if mentor_id:
+            side_effects.mark('mentor_workload', ('mentor', mentor_id))
+    instance._loaded_mentor_id = instance.mentor_id
+
+
+@receiver(post_save, sender=MentorKPI)
+@receiver(post_delete, sender=MentorKPI)
+@receiver(post_delete, sender=Group)
+def invalidate_workload_on_mentor_change(sender, instance, **kwargs):
+    """Guruh yoki KPI o'zgarganda mentor ish yuklamasi keshini eskirtirish (commit dan keyin)"""
+    if instance.mentor_id:
+        side_effects.mark('mentor_workload', ('mentor', instance.mentor_id))
+
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+def invalidate_workload_on_lesson(sender, instance, signal, **kwargs):
+    _mark('group', instance.group_id, signal)
+
+
+@receiver(post_save, sender=Homework)
+@receiver(post_delete, sender=Homework)
+def invalidate_workload_on_homework(sender, instance, signal, **kwargs):
+    _mark('lesson', instance.lesson_id, signal)
+
+
+@receiver(post_save, sender=Attendance)
+@receiver(post_delete, sender=Attendance)
+def invalidate_workload_on_attendance(sender, instance, **kwargs):
+    """Davomat o'zgarganda (dars orqali mentor aniqlanadi; dars o'chirilsa - uning o'z signali)"""
+    side_effects.mark('mentor_workload', ('lesson', instance.lesson_id))
+
+
+@receiver(post_save, sender=HomeworkGrade)
+@receiver(post_delete, sender=HomeworkGrade)
+def invalidate_workload_on_grade(sender, instance, **kwargs):
+    side_effects.mark('mentor_workload', ('homework', instance.homework_id))
+
+
+@receiver(m2m_changed, sender=Group.students.through)
+def invalidate_workload_on_students_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        if instance.mentor_id:
+            side_effects.mark('mentor_workload', ('mentor', instance.mentor_id))
+    else:
+        # user.student_groups.clear() - pk_set berilmaydi, kesh WORKLOAD_TIMEOUT da eskiradi
+        for group_id in pk_set or ():
+            side_effects.mark('mentor_workload', ('group', group_id))
+
+
+@side_effects.handler('mentor_workload', order=40)
+def invalidate_mentor_workloads(keys):
+    """
+    ('mentor' | 'group' | 'lesson' | 'homework', id) kalitlarini mentorlarga aylantirib,
+    ularning keshini bir marta o'chirish
+    """
+    ids = defaultdict(set)
+    for kind, pk in keys:
+        if pk:
+            ids[kind].add(pk)
+    mentor_ids = set(ids['mentor'])
+    for kind in MENTOR_LOOKUPS:
+        if ids[kind]:
+            mentor_ids.update(_mentor_ids(kind, ids[kind]))
+    invalidate_workloads(*mentor_ids)
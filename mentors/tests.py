@@ -1,3 +1,177 @@
-from django.test import TestCase
+import json
+from datetime import time, timedelta
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import MentorKPI
+from .workload import build_workloads, mentor_workloads
+from accounts.models import Branch, User
+from attendance.models import Attendance
+from courses.models import Course, Group, Lesson
+from homework.models import Homework
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+UNREACHABLE_REDIS_URL = 'redis://127.0.0.1:1/0'
+
+
+@override_settings(CACHES=LOCMEM_CACHE, LEADERBOARD_REDIS_URL=UNREACHABLE_REDIS_URL)
+class MentorWorkloadTestCase(TestCase):
+    """Test the mentor workload service and the views built on it"""
+
+    def setUp(self):
+        """Set up test data"""
+        cache.clear()
+        branch = Branch.objects.create(name='Branch 1')
+        self.course = Course.objects.create(name='Course', branch=branch)
+        self.mentors = [
+            User.objects.create_user(username=f'mentor{i}', password='mentor123', role='mentor')
+            for i in range(2)
+        ]
+        self.students = [
+            User.objects.create_user(username=f'student{i}', password='student123', role='student')
+            for i in range(4)
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.groups = [
+                Group.objects.create(course=self.course, name=f'G{i}', mentor=self.mentors[i // 2],
+                                     start_time=time(10, 0), end_time=time(12, 0))
+                for i in range(3)
+            ]
+            self.groups[0].students.add(*self.students[:3])
+            self.groups[1].students.add(self.students[3])
+            self.groups[2].students.add(*self.students[:2])
+
+    def give_work(self):
+        """Two lessons in G0 (one with attendance entered), one ungraded submission and a KPI"""
+        today = timezone.localdate()
+        with self.captureOnCommitCallbacks(execute=True):
+            lessons = [
+                Lesson.objects.create(group=self.groups[0], date=today, start_time=time(10, 0), end_time=time(12, 0))
+                for _ in range(2)
+            ]
+        Attendance.objects.filter(lesson=lessons[0], student=self.students[0]).update(status='present')
+        lessons[0].mark_attendance_taken()
+        # Mentor belgilamagan o'zgarish davomat kiritilgan deb hisoblanmaydi
+        Attendance.objects.filter(lesson=lessons[1]).update(updated_at=timezone.now() + timedelta(minutes=5))
+        Homework.objects.bulk_create([
+            Homework(lesson=lessons[0], student=student, deadline=timezone.now(), is_submitted=True)
+            for student in self.students[:2]
+        ])
+        MentorKPI.objects.create(mentor=self.mentors[0], month=1, year=2020, total_kpi_score=40)
+        MentorKPI.objects.create(mentor=self.mentors[0], month=today.month, year=today.year, total_kpi_score=75)
+
+    def test_grouped_aggregates(self):
+        """Per-group counters for several mentors come from a fixed number of queries"""
+        self.give_work()
+        with self.assertNumQueries(5):
+            workloads = build_workloads([mentor.pk for mentor in self.mentors])
+        first, second = workloads[self.mentors[0].pk], workloads[self.mentors[1].pk]
+        self.assertEqual([group['name'] for group in first['groups']], ['G0', 'G1'])
+        group = first['groups'][0]
+        self.assertEqual((group['students_count'], group['ungraded_homeworks']), (3, 2))
+        self.assertEqual((group['lessons_today'], group['lessons_due'], group['lessons_entered']), (2, 2, 1))
+        self.assertEqual(group['attendance_completeness'], 50)
+        self.assertEqual((first['students_count'], first['attendance_total'], first['attendance_attended']), (4, 6, 1))
+        self.assertEqual(first['kpi_score'], 75)
+        self.assertEqual((second['students_count'], second['lessons_today'], second['kpi_score']), (2, 0, None))
+
+    def test_attendance_toggle_marks_lesson_taken(self):
+        """Submitting attendance from the group page marks the lesson as entered"""
+        today = timezone.localdate()
+        with self.captureOnCommitCallbacks(execute=True):
+            lesson = Lesson.objects.create(group=self.groups[0], date=today, start_time=time(10, 0), end_time=time(12, 0))
+        self.assertEqual(build_workloads([self.mentors[0].pk])[self.mentors[0].pk]['lessons_entered'], 0)
+
+        self.client.force_login(self.mentors[0])
+        response = self.client.post(
+            reverse('attendance:attendance_toggle'),
+            json.dumps({'student_id': self.students[0].pk, 'date': today.isoformat(),
+                        'group_id': self.groups[0].pk, 'status': 'present'}),
+            content_type='application/json',
+        )
+        self.assertTrue(response.json()['success'])
+        lesson.refresh_from_db()
+        self.assertIsNotNone(lesson.attendance_taken_at)
+        self.assertEqual(build_workloads([self.mentors[0].pk])[self.mentors[0].pk]['lessons_entered'], 1)
+
+    def test_cache_invalidated_by_signals(self):
+        """Cached workloads are reused and dropped after a related change commits"""
+        mentor_ids = [mentor.pk for mentor in self.mentors]
+        mentor_workloads(mentor_ids)
+        with self.assertNumQueries(0):
+            mentor_workloads(mentor_ids)
+
+        student = User.objects.create_user(username='new', password='student123', role='student')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.groups[2].students.add(student)
+        with self.assertNumQueries(5):
+            workloads = mentor_workloads(mentor_ids)
+        self.assertEqual(workloads[self.mentors[1].pk]['students_count'], 3)
+        self.assertEqual(workloads[self.mentors[0].pk]['students_count'], 4)
+
+    def test_mentor_change_invalidates_both_mentors(self):
+        """Moving a group to another mentor refreshes the old and the new mentor"""
+        mentor_ids = [mentor.pk for mentor in self.mentors]
+        mentor_workloads(mentor_ids)
+
+        group = Group.objects.get(pk=self.groups[1].pk)
+        group.mentor = self.mentors[1]
+        with self.captureOnCommitCallbacks(execute=True):
+            group.save()
+        workloads = mentor_workloads(mentor_ids)
+        self.assertEqual(workloads[self.mentors[0].pk]['students_count'], 3)
+        self.assertEqual(workloads[self.mentors[1].pk]['students_count'], 3)
+
+    def test_deleted_lesson_invalidates_mentor(self):
+        """Deleting a lesson with its records refreshes the mentor's workload"""
+        self.give_work()
+        mentor_id = self.mentors[0].pk
+        self.assertEqual(mentor_workloads([mentor_id])[mentor_id]['lessons_today'], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Lesson.objects.filter(group=self.groups[0]).delete()
+        workload = mentor_workloads([mentor_id])[mentor_id]
+        self.assertEqual((workload['lessons_today'], workload['groups'][0]['ungraded_homeworks']), (0, 0))
+
+    def test_views_query_count(self):
+        """Mentor ranking and dashboard do not run queries per mentor or group"""
+        admin = User.objects.create_user(username='admin', password='admin123', role='admin')
+        ranking_url = reverse('gamification:mentor_ranking')
+        self.client.force_login(admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(ranking_url)
+        ranking_queries = len(queries)
+        self.assertEqual(len(response.context['mentor_data']), 2)
+
+        self.client.force_login(self.mentors[0])
+        dashboard_url = reverse('accounts:mentor_dashboard')
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(dashboard_url)
+        dashboard_queries = len(queries)
+        self.assertEqual(response.context['total_students'], 4)
+
+        for i in range(3):
+            mentor = User.objects.create_user(username=f'extra{i}', password='mentor123', role='mentor')
+            for j in range(2):
+                Group.objects.create(course=self.course, name=f'X{i}{j}', mentor=mentor,
+                                     start_time=time(10, 0), end_time=time(12, 0))
+            Group.objects.create(course=self.course, name=f'M{i}', mentor=self.mentors[0],
+                                 start_time=time(10, 0), end_time=time(12, 0))
+        cache.clear()
+
+        self.client.force_login(admin)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(ranking_url)
+        self.assertEqual(len(queries), ranking_queries)
+        self.client.force_login(self.mentors[0])
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(dashboard_url)
+        self.assertEqual(len(queries), dashboard_queries)
+        self.assertEqual(len(response.context['my_groups']), 5)
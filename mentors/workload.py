@@ -0,0 +1,165 @@
+"""
+Mentor ish yuklamasi (guruhlar, o'quvchilar, baholanmagan vazifalar, darslar, davomat kiritilishi, KPI)
+
+Istalgan sondagi mentor uchun beshta guruhlangan so'rov: guruhlar (o'quvchilar soni bilan),
+darslar, oy davomati, baholanmagan uy vazifalari va oxirgi KPI. Natija mentor va kun bo'yicha
+qisqa muddat keshlanadi; guruh, dars, davomat, uy vazifasi yoki KPI o'zgarganda
+(mentors.signals) tegishli mentor keshi tranzaksiya oxirida o'chiriladi.
+
+Davomat kiritilgan dars - Lesson.attendance_taken_at belgilangan dars (mentor davomat
+sahifasida belgilaganda o'rnatiladi; dars yaratilgandagi avtomatik "kelmadi" yozuvlari hisobga olinmaydi).
+"""
+import logging
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+CACHE_PREFIX = 'mentor_workload'
+WORKLOAD_TIMEOUT = 120
+
+
+def _cache_key(mentor_id, today):
+    return f'{CACHE_PREFIX}:{mentor_id}:{today.isoformat()}'
+
+
+def _percentage(part, total):
+    return part / total * 100 if total else 0
+
+
+def build_workloads(mentor_ids, today=None):
+    """
+    Ish yuklamasini bazadan hisoblash (mentorlar sonidan qat'i nazar 5 ta so'rov)
+    Qaytaradi: {mentor_id: {'groups': [...], 'students_count', ..., 'kpi_score', 'kpi_month'}}
+    """
+    from attendance.models import Attendance
+    from courses.models import Group, Lesson
+    from homework.models import Homework
+    from .models import MentorKPI
+
+    today = today or timezone.localdate()
+    month_start = today.replace(day=1)
+    week_start = today - timedelta(days=today.weekday())
+    week_end = week_start + timedelta(days=6)
+
+    groups = list(
+        Group.objects.filter(mentor_id__in=mentor_ids, is_active=True)
+        .annotate(students_count=Count('students', filter=Q(students__role='student'), distinct=True))
+        .values('id', 'mentor_id', 'name', 'course__name', 'students_count')
+        .order_by('name')
+    )
+    group_ids = [group['id'] for group in groups]
+
+    lessons = {
+        row['group_id']: row
+        for row in Lesson.objects.filter(
+            group_id__in=group_ids, date__gte=min(month_start, week_start), date__lte=week_end
+        ).values('group_id').annotate(
+            today=Count('id', filter=Q(date=today)),
+            this_week=Count('id', filter=Q(date__gte=week_start)),
+            due=Count('id', filter=Q(date__gte=month_start, date__lte=today)),
+            entered=Count('id', filter=Q(date__gte=month_start, date__lte=today, attendance_taken_at__isnull=False)),
+        ).order_by()
+    }
+    attendance = {
+        row['lesson__group_id']: row
+        for row in Attendance.objects.filter(
+            lesson__group_id__in=group_ids, lesson__date__gte=month_start, lesson__date__lte=today
+        ).values('lesson__group_id').annotate(
+            total=Count('id'),
+            attended=Count('id', filter=Q(status__in=['present', 'late'])),
+        ).order_by()
+    }
+    ungraded = dict(
+        Homework.objects.filter(lesson__group_id__in=group_ids, is_submitted=True, grade__isnull=True)
+        .values('lesson__group_id').annotate(count=Count('id'))
+        .values_list('lesson__group_id', 'count').order_by()
+    )
+    latest_kpi = {}
+    for kpi in MentorKPI.objects.filter(mentor_id__in=mentor_ids).order_by('mentor_id', '-year', '-month').only(
+        'mentor_id', 'year', 'month', 'total_kpi_score'
+    ):
+        latest_kpi.setdefault(kpi.mentor_id, kpi)
+
+    workloads = {
+        mentor_id: {
+            'groups': [], 'students_count': 0, 'ungraded_homeworks': 0, 'lessons_today': 0,
+            'lessons_this_week': 0, 'lessons_due': 0, 'lessons_entered': 0,
+            'attendance_total': 0, 'attendance_attended': 0,
+            'kpi_score': latest_kpi[mentor_id].total_kpi_score if mentor_id in latest_kpi else None,
+            'kpi_month': (
+                f"{latest_kpi[mentor_id].year}-{latest_kpi[mentor_id].month:02d}" if mentor_id in latest_kpi else None
+            ),
+        }
+        for mentor_id in mentor_ids
+    }
+    for group in groups:
+        group_lessons = lessons.get(group['id'], {})
+        group_attendance = attendance.get(group['id'], {})
+        row = {
+            'id': group['id'],
+            'name': group['name'],
+            'course_name': group['course__name'],
+            'students_count': group['students_count'],
+            'ungraded_homeworks': ungraded.get(group['id'], 0),
+            'lessons_today': group_lessons.get('today', 0),
+            'lessons_this_week': group_lessons.get('this_week', 0),
+            'lessons_due': group_lessons.get('due', 0),
+            'lessons_entered': group_lessons.get('entered', 0),
+        }
+        row['attendance_completeness'] = _percentage(row['lessons_entered'], row['lessons_due'])
+        workload = workloads[group['mentor_id']]
+        workload['groups'].append(row)
+        for field in ('students_count', 'ungraded_homeworks', 'lessons_today', 'lessons_this_week',
+                      'lessons_due', 'lessons_entered'):
+            workload[field] += row[field]
+        workload['attendance_total'] += group_attendance.get('total', 0)
+        workload['attendance_attended'] += group_attendance.get('attended', 0)
+
+    for workload in workloads.values():
+        workload['attendance_percentage'] = _percentage(workload['attendance_attended'], workload['attendance_total'])
+        workload['attendance_completeness'] = _percentage(workload['lessons_entered'], workload['lessons_due'])
+    return workloads
+
+
+def mentor_workloads(mentor_ids, today=None):
+    """Mentorlar ish yuklamasi (keshdan, yetishmaganlari bitta build_workloads bilan)"""
+    today = today or timezone.localdate()
+    mentor_ids = list(mentor_ids)
+    keys = {mentor_id: _cache_key(mentor_id, today) for mentor_id in mentor_ids}
+    try:
+        cached = cache.get_many(list(keys.values()))
+    except Exception as e:
+        logger.warning(f"Error reading mentor workload cache: {e}")
+        return build_workloads(mentor_ids, today)
+
+    workloads = {mentor_id: cached[key] for mentor_id, key in keys.items() if key in cached}
+    missing = [mentor_id for mentor_id in mentor_ids if mentor_id not in workloads]
+    if missing:
+        built = build_workloads(missing, today)
+        workloads.update(built)
+        try:
+            cache.set_many({keys[mentor_id]: workload for mentor_id, workload in built.items()}, WORKLOAD_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"Error writing mentor workload cache: {e}")
+    return workloads
+
+
+def mentor_workload(mentor, today=None):
+    return mentor_workloads([mentor.pk], today)[mentor.pk]
+
+
+def invalidate_workloads(*mentor_ids, today=None):
+    """Mentorlarning bugungi keshlangan ish yuklamasini o'chirish"""
+    mentor_ids = {mentor_id for mentor_id in mentor_ids if mentor_id}
+    if not mentor_ids:
+        return
+    today = today or timezone.localdate()
+    try:
+        cache.delete_many([_cache_key(mentor_id, today) for mentor_id in mentor_ids])
+    except Exception as e:
+        logger.warning(f"Error invalidating mentor workload: {e}")
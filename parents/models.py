@@ -3,9 +3,6 @@ from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
 from accounts.models import User
 from courses.models import Group, Course
-from attendance.models import AttendanceStatistics
-from homework.models import Homework
-from exams.models import ExamResult
 from mentors.models import MonthlyReport
 
 
@@ -100,133 +97,13 @@ class MonthlyParentReport(models.Model):
     
     def generate_report(self):
         """
-        Hisobotni avtomatik generatsiya qilish
+        Hisobotni avtomatik generatsiya qilish (bitta hisobot uchun paketli hisoblagich ishlatiladi)
         """
-        from datetime import datetime
-        from django.db.models import Avg, Count, Q
-        
-        # 1. Davomat statistikasi
-        attendance_stats = AttendanceStatistics.objects.filter(
-            student=self.student,
-            group=self.group
-        ).first()
-        
-        if attendance_stats:
-            self.attendance_percentage = attendance_stats.attendance_percentage
-            self.present_count = attendance_stats.present_count
-            self.late_count = attendance_stats.late_count
-            self.absent_count = attendance_stats.absent_count
-            self.total_lessons = attendance_stats.total_lessons
-        
-        # 2. Uy vazifalari statistikasi
-        homeworks = Homework.objects.filter(
-            student=self.student,
-            lesson__group=self.group,
-            lesson__date__year=self.year,
-            lesson__date__month=self.month
-        )
-        
-        self.total_homeworks = homeworks.count()
-        self.completed_homeworks = homeworks.filter(is_submitted=True).count()
-        self.on_time_homeworks = homeworks.filter(is_submitted=True, is_late=False).count()
-        self.late_homeworks = homeworks.filter(is_submitted=True, is_late=True).count()
-        
-        if self.total_homeworks > 0:
-            self.homework_completion_rate = (self.completed_homeworks / self.total_homeworks) * 100
-        
-        # 3. Imtihon natijalari
-        exam_results = ExamResult.objects.filter(
-            student=self.student,
-            exam__group=self.group,
-            submitted_at__year=self.year,
-            submitted_at__month=self.month
-        )
-        
-        self.total_exams = exam_results.count()
-        self.passed_exams = exam_results.filter(is_passed=True).count()
-        
-        if self.total_exams > 0:
-            avg_score = exam_results.aggregate(avg=Avg('percentage'))['avg'] or 0
-            self.average_exam_score = avg_score
-            
-            best = exam_results.order_by('-percentage').first()
-            worst = exam_results.order_by('percentage').first()
-            
-            if best:
-                self.best_exam_score = best.percentage
-            if worst:
-                self.worst_exam_score = worst.percentage
-        
-        # 4. Progress
-        from courses.models import StudentProgress
-        progress = StudentProgress.objects.filter(
-            student=self.student,
-            course=self.group.course
-        ).first()
-        
-        if progress:
-            self.progress_percentage = progress.progress_percentage
-        
-        # O'tgan oy progress
-        if self.month > 1:
-            prev_month = self.month - 1
-            prev_year = self.year
-        else:
-            prev_month = 12
-            prev_year = self.year - 1
-        
-        prev_report = MonthlyParentReport.objects.filter(
-            student=self.student,
-            group=self.group,
-            month=prev_month,
-            year=prev_year
-        ).first()
-        
-        if prev_report:
-            self.previous_month_progress = prev_report.progress_percentage
-            
-            if self.progress_percentage > prev_report.progress_percentage + 5:
-                self.progress_change = 'improved'
-            elif self.progress_percentage < prev_report.progress_percentage - 5:
-                self.progress_change = 'declined'
-            else:
-                self.progress_change = 'stable'
-        
-        # 5. Kuchli va kuchsiz tomonlar
-        strengths = []
-        weaknesses = []
-        
-        # Kuchli tomonlar
-        if self.attendance_percentage >= 95:
-            strengths.append("A'lo davomat")
-        if self.homework_completion_rate >= 90:
-            strengths.append("Uy vazifalarini to'liq bajarish")
-        if self.average_exam_score >= 80:
-            strengths.append("Yaxshi imtihon natijalari")
-        if self.progress_percentage >= 80:
-            strengths.append("Yuqori progress")
-        
-        # Kuchsiz tomonlar
-        if self.attendance_percentage < 70:
-            weaknesses.append("Past davomat")
-        if self.homework_completion_rate < 60:
-            weaknesses.append("Uy vazifalarini kam bajarish")
-        if self.average_exam_score < 60:
-            weaknesses.append("Past imtihon natijalari")
-        if self.progress_percentage < 50:
-            weaknesses.append("Past progress")
-        
-        self.strengths = ", ".join(strengths) if strengths else "Kuchli tomonlar aniqlanmadi"
-        self.weaknesses = ", ".join(weaknesses) if weaknesses else "Kuchsiz tomonlar yo'q"
-        
-        # 6. Mentor oylik hisoboti
-        self.mentor_report = MonthlyReport.objects.filter(
-            mentor=self.group.mentor,
-            student=self.student,
-            group=self.group,
-            month=self.month,
-            year=self.year
-        ).first()
+        from .reports import apply_metrics, collect_report_metrics
         
+        key = (self.student_id, self.group_id)
+        memberships = {key: (self.group.course_id, self.group.mentor_id)}
+        metrics = collect_report_metrics(self.year, self.month, memberships)[key]
+        apply_metrics(self, metrics)
         self.save()
         return self
@@ -0,0 +1,334 @@
+"""
+Ota-onalar uchun oylik hisobotlarni paketli generatsiya qilish
+Barcha (o'quvchi, guruh, oy) ko'rsatkichlari bir nechta guruhlangan so'rov bilan hisoblanadi,
+MonthlyParentReport qatorlari bitta upsert (INSERT ... ON CONFLICT DO UPDATE) bilan yoziladi.
+So'rovlar soni o'quvchilar soniga bog'liq emas.
+"""
+from collections import defaultdict
+from datetime import date, datetime
+
+from django.db.models import Avg, Count, Max, Min, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from accounts.models import StudentProfile, User
+from attendance.models import Attendance
+from courses.models import Group, StudentProgress
+from exams.models import ExamResult
+from homework.models import Homework
+from mentors.models import MonthlyReport
+
+from .models import MonthlyParentReport
+
+
+BATCH_SIZE = 1000
+
+# Juftliklar shundan kam bo'lsa so'rovlar id ro'yxati bilan toraytiriladi (masalan bitta hisobot uchun)
+ID_FILTER_LIMIT = 1000
+
+# Progress o'zgarishi shu chegaradan katta bo'lsa "yaxshilandi"/"pasaydi"
+PROGRESS_CHANGE_THRESHOLD = 5
+
+METRIC_FIELDS = [
+    'attendance_percentage', 'present_count', 'late_count', 'absent_count', 'total_lessons',
+    'total_homeworks', 'completed_homeworks', 'on_time_homeworks', 'late_homeworks',
+    'homework_completion_rate',
+    'total_exams', 'passed_exams', 'average_exam_score', 'best_exam_score', 'worst_exam_score',
+    'strengths', 'weaknesses', 'mentor_report_id',
+    'progress_percentage', 'previous_month_progress', 'progress_change',
+]
+
+
+def month_range(year, month):
+    """Oyning birinchi kuni va keyingi oyning birinchi kuni"""
+    start = date(year, month, 1)
+    end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return start, end
+
+
+def previous_month(year, month):
+    return (year - 1, 12) if month == 1 else (year, month - 1)
+
+
+def _aware(day):
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+
+def empty_metrics():
+    return {
+        'attendance_percentage': 0.0,
+        'present_count': 0,
+        'late_count': 0,
+        'absent_count': 0,
+        'total_lessons': 0,
+        'total_homeworks': 0,
+        'completed_homeworks': 0,
+        'on_time_homeworks': 0,
+        'late_homeworks': 0,
+        'homework_completion_rate': 0.0,
+        'total_exams': 0,
+        'passed_exams': 0,
+        'average_exam_score': 0.0,
+        'best_exam_score': 0.0,
+        'worst_exam_score': 0.0,
+        'progress_percentage': 0.0,
+        'previous_month_progress': 0.0,
+        'progress_change': None,
+        'mentor_report_id': None,
+    }
+
+
+def report_recipients():
+    """
+    Ota-ona → farzand juftliklari (bitta so'rov).
+    Ota-ona foydalanuvchisi StudentProfile.parent_telegram_id orqali topiladi (bot bilan bir xil).
+    Qaytaradi: {student_id: [parent_id, ...]}
+    """
+    parent_ids = User.objects.filter(
+        role='parent', is_active=True, telegram_id=OuterRef('parent_telegram_id')
+    ).values('id')[:1]
+    rows = StudentProfile.objects.filter(
+        parent_telegram_id__isnull=False, user__is_active=True
+    ).annotate(parent_id=Subquery(parent_ids)).exclude(parent_id=None).values_list(
+        'user_id', 'parent_id'
+    ).order_by()
+
+    recipients = defaultdict(list)
+    for student_id, parent_id in rows:
+        recipients[student_id].append(parent_id)
+    return recipients
+
+
+def collect_report_metrics(year, month, memberships):
+    """
+    Berilgan (o'quvchi, guruh) juftliklari uchun oylik ko'rsatkichlar.
+    memberships: {(student_id, group_id): (course_id, mentor_id)}
+    Har bir manba (davomat, uy vazifalari, imtihonlar, progress, o'tgan oy, mentor hisoboti)
+    uchun bitta guruhlangan so'rov.
+    Qaytaradi: {(student_id, group_id): metrics}
+    """
+    if not memberships:
+        return {}
+
+    start, end = month_range(year, month)
+    student_ids = {student_id for student_id, _ in memberships}
+    group_ids = {group_id for _, group_id in memberships}
+    metrics = {key: empty_metrics() for key in memberships}
+
+    def scoped(queryset, student_field, group_field):
+        if len(memberships) <= ID_FILTER_LIMIT:
+            queryset = queryset.filter(**{f'{student_field}__in': student_ids, f'{group_field}__in': group_ids})
+        return queryset
+
+    # 1. Davomat (oy ichidagi darslar bo'yicha)
+    attendance = scoped(
+        Attendance.objects.filter(lesson__date__gte=start, lesson__date__lt=end),
+        'student_id', 'lesson__group_id',
+    ).values('student_id', 'lesson__group_id').annotate(
+        total=Count('id'),
+        present=Count('id', filter=Q(status='present')),
+        late=Count('id', filter=Q(status='late')),
+        absent=Count('id', filter=Q(status='absent')),
+    ).order_by()
+    for row in attendance:
+        item = metrics.get((row['student_id'], row['lesson__group_id']))
+        if item is None:
+            continue
+        item['total_lessons'] = row['total']
+        item['present_count'] = row['present']
+        item['late_count'] = row['late']
+        item['absent_count'] = row['absent']
+        if row['total']:
+            # Keldi va kech qoldi hisobga olinadi
+            item['attendance_percentage'] = (row['present'] + row['late']) / row['total'] * 100
+
+    # 2. Uy vazifalari
+    homeworks = scoped(
+        Homework.objects.filter(lesson__date__gte=start, lesson__date__lt=end),
+        'student_id', 'lesson__group_id',
+    ).values('student_id', 'lesson__group_id').annotate(
+        total=Count('id'),
+        completed=Count('id', filter=Q(is_submitted=True)),
+        on_time=Count('id', filter=Q(is_submitted=True, is_late=False)),
+        late=Count('id', filter=Q(is_submitted=True, is_late=True)),
+    ).order_by()
+    for row in homeworks:
+        item = metrics.get((row['student_id'], row['lesson__group_id']))
+        if item is None:
+            continue
+        item['total_homeworks'] = row['total']
+        item['completed_homeworks'] = row['completed']
+        item['on_time_homeworks'] = row['on_time']
+        item['late_homeworks'] = row['late']
+        if row['total']:
+            item['homework_completion_rate'] = row['completed'] / row['total'] * 100
+
+    # 3. Imtihon natijalari
+    exams = scoped(
+        ExamResult.objects.filter(submitted_at__gte=_aware(start), submitted_at__lt=_aware(end)),
+        'student_id', 'exam__group_id',
+    ).values('student_id', 'exam__group_id').annotate(
+        total=Count('id'),
+        passed=Count('id', filter=Q(is_passed=True)),
+        average=Avg('percentage'),
+        best=Max('percentage'),
+        worst=Min('percentage'),
+    ).order_by()
+    for row in exams:
+        item = metrics.get((row['student_id'], row['exam__group_id']))
+        if item is None:
+            continue
+        item['total_exams'] = row['total']
+        item['passed_exams'] = row['passed']
+        item['average_exam_score'] = row['average'] or 0.0
+        item['best_exam_score'] = row['best'] or 0.0
+        item['worst_exam_score'] = row['worst'] or 0.0
+
+    # 4. Kurs progressi
+    course_ids = {course_id for course_id, _ in memberships.values()}
+    progress_query = StudentProgress.objects.filter(course_id__in=course_ids)
+    if len(memberships) <= ID_FILTER_LIMIT:
+        progress_query = progress_query.filter(student_id__in=student_ids)
+    progress = {
+        (student_id, course_id): percentage
+        for student_id, course_id, percentage in progress_query.values_list(
+            'student_id', 'course_id', 'progress_percentage'
+        ).order_by()
+    }
+
+    # 5. O'tgan oy hisobotlari (progress o'zgarishi uchun)
+    prev_year, prev_month = previous_month(year, month)
+    previous = {
+        (student_id, group_id): percentage
+        for student_id, group_id, percentage in scoped(
+            MonthlyParentReport.objects.filter(year=prev_year, month=prev_month),
+            'student_id', 'group_id',
+        ).values_list('student_id', 'group_id', 'progress_percentage').order_by()
+    }
+
+    # 6. Mentor oylik hisobotlari
+    mentor_reports = {
+        (mentor_id, student_id, group_id): report_id
+        for report_id, mentor_id, student_id, group_id in scoped(
+            MonthlyReport.objects.filter(year=year, month=month),
+            'student_id', 'group_id',
+        ).values_list('id', 'mentor_id', 'student_id', 'group_id').order_by()
+    }
+
+    for (student_id, group_id), (course_id, mentor_id) in memberships.items():
+        item = metrics[(student_id, group_id)]
+        item['progress_percentage'] = progress.get((student_id, course_id), 0.0)
+        item['mentor_report_id'] = mentor_reports.get((mentor_id, student_id, group_id))
+
+        prev_progress = previous.get((student_id, group_id))
+        if prev_progress is not None:
+            item['previous_month_progress'] = prev_progress
+            if item['progress_percentage'] > prev_progress + PROGRESS_CHANGE_THRESHOLD:
+                item['progress_change'] = 'improved'
+            elif item['progress_percentage'] < prev_progress - PROGRESS_CHANGE_THRESHOLD:
+                item['progress_change'] = 'declined'
+            else:
+                item['progress_change'] = 'stable'
+
+        item['strengths'], item['weaknesses'] = describe_strengths(item)
+
+    return metrics
+
+
+def describe_strengths(metrics):
+    """Kuchli va kuchsiz tomonlar matni"""
+    strengths = []
+    weaknesses = []
+
+    if metrics['attendance_percentage'] >= 95:
+        strengths.append("A'lo davomat")
+    if metrics['homework_completion_rate'] >= 90:
+        strengths.append("Uy vazifalarini to'liq bajarish")
+    if metrics['average_exam_score'] >= 80:
+        strengths.append("Yaxshi imtihon natijalari")
+    if metrics['progress_percentage'] >= 80:
+        strengths.append("Yuqori progress")
+
+    if metrics['attendance_percentage'] < 70:
+        weaknesses.append("Past davomat")
+    if metrics['homework_completion_rate'] < 60:
+        weaknesses.append("Uy vazifalarini kam bajarish")
+    if metrics['average_exam_score'] < 60:
+        weaknesses.append("Past imtihon natijalari")
+    if metrics['progress_percentage'] < 50:
+        weaknesses.append("Past progress")
+
+    return (
+        ", ".join(strengths) if strengths else "Kuchli tomonlar aniqlanmadi",
+        ", ".join(weaknesses) if weaknesses else "Kuchsiz tomonlar yo'q",
+    )
+
+
+def apply_metrics(report, metrics):
+    for field in METRIC_FIELDS:
+        setattr(report, field, metrics[field])
+    return report
+
+
+def active_memberships(student_ids):
+    """
+    Faol guruhlardagi a'zoliklar (bitta so'rov).
+    Qaytaradi: {(student_id, group_id): (course_id, mentor_id)}
+    """
+    rows = Group.students.through.objects.filter(
+        group__is_active=True,
+        user__student_profile__parent_telegram_id__isnull=False,
+    ).values_list('user_id', 'group_id', 'group__course_id', 'group__mentor_id').order_by()
+    return {
+        (student_id, group_id): (course_id, mentor_id)
+        for student_id, group_id, course_id, mentor_id in rows
+        if student_id in student_ids
+    }
+
+
+def build_monthly_parent_reports(year, month):
+    """
+    Barcha ota-onalar uchun oylik hisobotlarni yaratish/yangilash.
+    Qaytaradi: hali yuborilmagan hisobotlar id lari (yetkazib berish uchun bitta paket)
+    """
+    recipients = report_recipients()
+    memberships = active_memberships(recipients.keys())
+    metrics = collect_report_metrics(year, month, memberships)
+
+    # Mavjud hisobotlar qiymatlari bilan - o'zgarmaganlari qayta yozilmaydi
+    existing = {
+        row[:3]: row[3:]
+        for row in MonthlyParentReport.objects.filter(year=year, month=month).values_list(
+            'parent_id', 'student_id', 'group_id', *METRIC_FIELDS
+        ).order_by()
+    }
+
+    now = timezone.now()
+    reports = []
+    for (student_id, group_id), item in metrics.items():
+        values = tuple(item[field] for field in METRIC_FIELDS)
+        for parent_id in recipients[student_id]:
+            if existing.get((parent_id, student_id, group_id)) == values:
+                continue
+            report = MonthlyParentReport(
+                parent_id=parent_id,
+                student_id=student_id,
+                group_id=group_id,
+                month=month,
+                year=year,
+                updated_at=now,
+            )
+            reports.append(apply_metrics(report, item))
+
+    # is_sent va created_at mavjud qatorlarda o'zgarmaydi
+    MonthlyParentReport.objects.bulk_create(
+        reports,
+        batch_size=BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['parent', 'student', 'group', 'month', 'year'],
+        update_fields=METRIC_FIELDS + ['updated_at'],
+    )
+
+    return list(
+        MonthlyParentReport.objects.filter(year=year, month=month, is_sent=False)
+        .values_list('id', flat=True).order_by('id')
+    )
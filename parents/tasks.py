@@ -5,63 +5,125 @@ Oylik hisobotlarni avtomatik generatsiya qilish
 from celery import shared_task
 from django.utils import timezone
 from .models import MonthlyParentReport
-from accounts.models import User
-from courses.models import Group
+from .reports import build_monthly_parent_reports
+import asyncio
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
 
+def previous_month_period():
+    """O'tgan oy (oy, yil)"""
+    now = timezone.localdate()
+    if now.month > 1:
+        return now.month - 1, now.year
+    return 12, now.year - 1
+
+
 @shared_task
 def generate_monthly_parent_reports(month=None, year=None):
     """
-    Barcha ota-onalar uchun oylik hisobotlarni generatsiya qilish
+    Barcha ota-onalar uchun oylik hisobotlarni generatsiya qilish.
+    Ko'rsatkichlar guruhlangan so'rovlar bilan hisoblanadi (parents.reports),
+    yuborilmagan hisobotlar bitta paket bo'lib yetkazib berishga uzatiladi.
     """
     try:
         if not month or not year:
-            now = timezone.now()
             # O'tgan oy uchun hisobot
-            month = month or (now.month - 1 if now.month > 1 else 12)
-            year = year or (now.year if now.month > 1 else now.year - 1)
-        
-        # Barcha ota-onalar
-        parents = User.objects.filter(role='parent', is_active=True)
-        
-        for parent in parents:
-            # Ota-onaning farzandlari
-            students = parent.parent_profile.students.all()
-            
-            for student in students:
-                # Studentning guruhlari
-                groups = Group.objects.filter(students=student, is_active=True)
-                
-                for group in groups:
-                    # Hisobot yaratish yoki olish
-                    report, created = MonthlyParentReport.objects.get_or_create(
-                        parent=parent,
-                        student=student,
-                        group=group,
-                        month=month,
-                        year=year
-                    )
-                    
-                    # Hisobotni generatsiya qilish
-                    report.generate_report()
-                    
-                    # Telegram orqali yuborish
-                    if not report.is_sent:
-                        send_monthly_report_to_parent.delay(report.id)
-        
-        logger.info(f"Monthly parent reports generated for {month}/{year}")
+            default_month, default_year = previous_month_period()
+            month = month or default_month
+            year = year or default_year
+        
+        started = time.monotonic()
+        report_ids = build_monthly_parent_reports(year, month)
+        
+        # bulk_create signal yubormaydi - bot /reports javoblarini eskirtirish
+        from telegram_bot.responses import bump_versions, student_scope
+        bump_versions(*(
+            student_scope(student_id)
+            for student_id in MonthlyParentReport.objects.filter(year=year, month=month)
+            .values_list('student_id', flat=True).order_by().distinct()
+        ))
+        
+        if report_ids:
+            send_monthly_parent_reports.delay(report_ids)
+        
+        logger.info(
+            f"Monthly parent reports generated for {month}/{year}: "
+            f"{len(report_ids)} pending, {time.monotonic() - started:.1f}s"
+        )
+        return len(report_ids)
     
     except Exception as e:
         logger.error(f"Error generating monthly parent reports: {e}")
 
 
+def format_monthly_report_message(report):
+    """
+    Oylik hisobot matni (Telegram uchun)
+    """
+    message = f"📊 Oylik hisobot - {report.year}-{report.month:02d}\n\n"
+    message += f"Farzand: {report.student.get_full_name() or report.student.username}\n"
+    message += f"Guruh: {report.group.name}\n\n"
+    
+    # Davomat
+    message += f"📅 Davomat: {report.attendance_percentage:.1f}%\n"
+    message += f"   Keldi: {report.present_count}, Kech: {report.late_count}, Kelmadi: {report.absent_count}\n\n"
+    
+    # Uy vazifalari
+    message += f"📝 Uy vazifalari: {report.homework_completion_rate:.1f}%\n"
+    message += f"   Bajarildi: {report.completed_homeworks}/{report.total_homeworks}\n"
+    message += f"   Vaqtida: {report.on_time_homeworks}, Kech: {report.late_homeworks}\n\n"
+    
+    # Imtihonlar
+    if report.total_exams > 0:
+        message += f"📚 Imtihonlar: {report.total_exams} ta\n"
+        message += f"   O'tdi: {report.passed_exams}, O'rtacha: {report.average_exam_score:.1f}%\n"
+        message += f"   Eng yaxshi: {report.best_exam_score:.1f}%, Eng yomon: {report.worst_exam_score:.1f}%\n\n"
+    
+    # Progress
+    message += f"📈 Progress: {report.progress_percentage:.1f}%\n"
+    if report.progress_change:
+        progress_text = {
+            'improved': '✅ Yaxshilandi',
+            'stable': '➡️ Barqaror',
+            'declined': '⚠️ Pasaydi',
+        }
+        message += f"   {progress_text.get(report.progress_change, report.progress_change)}\n\n"
+    
+    # Kuchli va kuchsiz tomonlar
+    message += f"💪 Kuchli tomonlar:\n{report.strengths}\n\n"
+    message += f"⚠️ Kuchsiz tomonlar:\n{report.weaknesses}\n"
+    
+    # Mentor sharhi
+    if report.mentor_report and report.mentor_report.additional_notes:
+        message += f"\n👨‍🏫 Mentor sharhi:\n{report.mentor_report.additional_notes}"
+    
+    return message
+
+
+async def _deliver_messages(bot, messages):
+    """
+    Xabarlarni ketma-ket yuborish (bitta bot sessiyasi).
+    Qaytaradi: muvaffaqiyatli yuborilgan hisobotlar id lari
+    """
+    sent = []
+    async with bot:
+        for report_id, chat_id, text in messages:
+            try:
+                await bot.send_message(chat_id=chat_id, text=text)
+                sent.append(report_id)
+            except Exception as e:
+                logger.error(f"Error sending monthly report {report_id} to parent: {e}")
+    return sent
+
+
 @shared_task
-def send_monthly_report_to_parent(report_id):
+def send_monthly_parent_reports(report_ids):
     """
-    Oylik hisobotni Telegram orqali yuborish
+    Oylik hisobotlar paketini Telegram orqali yuborish.
+    Hisobotlar bitta so'rov bilan yuklanadi, yuborilganlari bitta UPDATE bilan belgilanadi.
     """
     try:
         from telegram import Bot
@@ -71,60 +133,36 @@ def send_monthly_report_to_parent(report_id):
             logger.warning("Telegram bot token not configured")
             return
         
-        bot = Bot(token=settings.TELEGRAM_BOT_TOKEN)
-        report = MonthlyParentReport.objects.select_related('parent', 'student', 'group').get(pk=report_id)
-        
-        if not report.parent.telegram_id:
-            logger.warning(f"Parent {report.parent.username} has no telegram_id")
-            return
-        
-        # Xabar tayyorlash
-        message = f"📊 Oylik hisobot - {report.year}-{report.month:02d}\n\n"
-        message += f"Farzand: {report.student.get_full_name() or report.student.username}\n"
-        message += f"Guruh: {report.group.name}\n\n"
-        
-        # Davomat
-        message += f"📅 Davomat: {report.attendance_percentage:.1f}%\n"
-        message += f"   Keldi: {report.present_count}, Kech: {report.late_count}, Kelmadi: {report.absent_count}\n\n"
-        
-        # Uy vazifalari
-        message += f"📝 Uy vazifalari: {report.homework_completion_rate:.1f}%\n"
-        message += f"   Bajarildi: {report.completed_homeworks}/{report.total_homeworks}\n"
-        message += f"   Vaqtida: {report.on_time_homeworks}, Kech: {report.late_homeworks}\n\n"
+        reports = MonthlyParentReport.objects.filter(pk__in=report_ids, is_sent=False).select_related(
+            'parent', 'student', 'group', 'mentor_report'
+        )
         
-        # Imtihonlar
-        if report.total_exams > 0:
-            message += f"📚 Imtihonlar: {report.total_exams} ta\n"
-            message += f"   O'tdi: {report.passed_exams}, O'rtacha: {report.average_exam_score:.1f}%\n"
-            message += f"   Eng yaxshi: {report.best_exam_score:.1f}%, Eng yomon: {report.worst_exam_score:.1f}%\n\n"
+        messages = []
+        for report in reports:
+            if not report.parent.telegram_id:
+                logger.warning(f"Parent {report.parent.username} has no telegram_id")
+                continue
+            messages.append((report.pk, report.parent.telegram_id, format_monthly_report_message(report)))
         
-        # Progress
-        message += f"📈 Progress: {report.progress_percentage:.1f}%\n"
-        if report.progress_change:
-            progress_text = {
-                'improved': '✅ Yaxshilandi',
-                'stable': '➡️ Barqaror',
-                'declined': '⚠️ Pasaydi',
-            }
-            message += f"   {progress_text.get(report.progress_change, report.progress_change)}\n\n"
+        if not messages:
+            return 0
         
-        # Kuchli va kuchsiz tomonlar
-        message += f"💪 Kuchli tomonlar:\n{report.strengths}\n\n"
-        message += f"⚠️ Kuchsiz tomonlar:\n{report.weaknesses}\n"
-        
-        # Mentor sharhi
-        if report.mentor_report and report.mentor_report.additional_notes:
-            message += f"\n👨‍🏫 Mentor sharhi:\n{report.mentor_report.additional_notes}"
-        
-        # Xabar yuborish
-        bot.send_message(chat_id=report.parent.telegram_id, text=message)
+        bot = Bot(token=settings.TELEGRAM_BOT_TOKEN)
+        sent = asyncio.run(_deliver_messages(bot, messages))
         
         # Yuborilgan deb belgilash
-        report.is_sent = True
-        report.save()
+        MonthlyParentReport.objects.filter(pk__in=sent).update(is_sent=True, updated_at=timezone.now())
         
-        logger.info(f"Monthly report sent to parent {report.parent.username}")
+        logger.info(f"Monthly reports sent to parents: {len(sent)}/{len(messages)}")
+        return len(sent)
     
     except Exception as e:
-        logger.error(f"Error sending monthly report to parent: {e}")
+        logger.error(f"Error sending monthly reports to parents: {e}")
 
+
+@shared_task
+def send_monthly_report_to_parent(report_id):
+    """
+    Oylik hisobotni Telegram orqali yuborish
+    """
+    return send_monthly_parent_reports([report_id])
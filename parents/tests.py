@@ -1,3 +1,177 @@
+from datetime import date, datetime, time
+
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.utils import timezone
+
+from .models import MonthlyParentReport
+from .reports import build_monthly_parent_reports, month_range, previous_month
+from accounts.models import Branch, StudentProfile
+from attendance.models import Attendance
+from courses.models import Course, Group, Lesson, StudentProgress
+from exams.models import Exam, ExamResult
+from homework.models import Homework
+from mentors.models import MonthlyReport
+
+User = get_user_model()
+
+
+class MonthlyParentReportBatchTestCase(TestCase):
+    """Test set-based monthly parent report generation"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.year, self.month = 2024, 3
+        branch = Branch.objects.create(name='Branch')
+        self.course = Course.objects.create(name='Python', branch=branch)
+        self.mentor = User.objects.create_user(username='mentor', password='mentor123', role='mentor')
+        self.group = Group.objects.create(
+            course=self.course, name='PY-1', mentor=self.mentor,
+            start_time=time(10, 0), end_time=time(12, 0),
+        )
+
+        self.student = self._student('student', parent_telegram_id=1001)
+        self.other_student = self._student('other', parent_telegram_id=1002)
+        self.orphan = self._student('orphan', parent_telegram_id=None)
+        self.group.students.add(self.student, self.other_student, self.orphan)
+
+        self.parent = User.objects.create_user(
+            username='parent', password='parent123', role='parent', telegram_id=1001
+        )
+        self.other_parent = User.objects.create_user(
+            username='other_parent', password='parent123', role='parent', telegram_id=1002
+        )
+
+        # Signallar (Celery) ishga tushmasligi uchun bulk_create
+        lessons = Lesson.objects.bulk_create([
+            Lesson(group=self.group, date=date(2024, 3, day), start_time=time(10, 0), end_time=time(12, 0))
+            for day in (4, 6, 8, 11)
+        ] + [
+            Lesson(group=self.group, date=date(2024, 2, 26), start_time=time(10, 0), end_time=time(12, 0)),
+        ])
+        statuses = ['present', 'present', 'late', 'absent', 'absent']
+        Attendance.objects.bulk_create([
+            Attendance(lesson=lesson, student=self.student, status=status)
+            for lesson, status in zip(lessons, statuses)
+        ])
+
+        deadline = timezone.make_aware(datetime(2024, 3, 20))
+        Homework.objects.bulk_create([
+            Homework(lesson=lessons[0], student=self.student, deadline=deadline, is_submitted=True),
+            Homework(lesson=lessons[1], student=self.student, deadline=deadline, is_submitted=True, is_late=True),
+            Homework(lesson=lessons[2], student=self.student, deadline=deadline),
+            Homework(lesson=lessons[3], student=self.student, deadline=deadline, is_submitted=True),
+        ])
+
+        exams = Exam.objects.bulk_create([
+            Exam(course=self.course, group=self.group, title=f'Exam {i}',
+                 date=timezone.make_aware(datetime(2024, 3, 10 + i)))
+            for i in range(3)
+        ])
+        ExamResult.objects.bulk_create([
+            ExamResult(exam=exams[0], student=self.student, percentage=90, is_passed=True,
+                       submitted_at=timezone.make_aware(datetime(2024, 3, 10, 12))),
+            ExamResult(exam=exams[1], student=self.student, percentage=50, is_passed=False,
+                       submitted_at=timezone.make_aware(datetime(2024, 3, 11, 12))),
+            ExamResult(exam=exams[2], student=self.student, percentage=70, is_passed=True,
+                       submitted_at=timezone.make_aware(datetime(2024, 4, 1, 12))),
+        ])
+
+        StudentProgress.objects.create(student=self.student, course=self.course, progress_percentage=60)
+        self.mentor_report = MonthlyReport.objects.create(
+            mentor=self.mentor, student=self.student, group=self.group,
+            month=self.month, year=self.year, additional_notes='Yaxshi',
+        )
+        MonthlyParentReport.objects.create(
+            parent=self.parent, student=self.student, group=self.group,
+            month=2, year=2024, progress_percentage=40,
+        )
+
+    def _student(self, username, parent_telegram_id):
+        student = User.objects.create_user(username=username, password='student123', role='student')
+        StudentProfile.objects.create(user=student, parent_telegram_id=parent_telegram_id)
+        return student
+
+    def test_builds_reports_with_monthly_metrics(self):
+        """Metrics are computed for the requested month only"""
+        report_ids = build_monthly_parent_reports(self.year, self.month)
+        self.assertEqual(len(report_ids), 2)
+
+        report = MonthlyParentReport.objects.get(parent=self.parent, year=self.year, month=self.month)
+        self.assertEqual(report.student, self.student)
+        self.assertEqual(report.total_lessons, 4)
+        self.assertEqual(report.present_count, 2)
+        self.assertEqual(report.late_count, 1)
+        self.assertEqual(report.absent_count, 1)
+        self.assertAlmostEqual(report.attendance_percentage, 75.0)
+
+        self.assertEqual(report.total_homeworks, 4)
+        self.assertEqual(report.completed_homeworks, 3)
+        self.assertEqual(report.on_time_homeworks, 2)
+        self.assertEqual(report.late_homeworks, 1)
+        self.assertAlmostEqual(report.homework_completion_rate, 75.0)
+
+        self.assertEqual(report.total_exams, 2)
+        self.assertEqual(report.passed_exams, 1)
+        self.assertAlmostEqual(report.average_exam_score, 70.0)
+        self.assertAlmostEqual(report.best_exam_score, 90.0)
+        self.assertAlmostEqual(report.worst_exam_score, 50.0)
+
+        self.assertEqual(report.progress_percentage, 60)
+        self.assertEqual(report.previous_month_progress, 40)
+        self.assertEqual(report.progress_change, 'improved')
+        self.assertEqual(report.mentor_report, self.mentor_report)
+        self.assertEqual(report.weaknesses, "Kuchsiz tomonlar yo'q")
+
+        empty = MonthlyParentReport.objects.get(parent=self.other_parent)
+        self.assertIn('Past davomat', empty.weaknesses)
+        self.assertEqual(empty.total_lessons, 0)
+        self.assertIsNone(empty.progress_change)
+        self.assertFalse(MonthlyParentReport.objects.filter(student=self.orphan).exists())
+
+    def test_query_count_does_not_grow_with_students(self):
+        """Adding students does not add queries"""
+        with self.assertNumQueries(11):
+            build_monthly_parent_reports(self.year, self.month)
+
+        for i in range(5):
+            student = self._student(f'extra{i}', parent_telegram_id=2000 + i)
+            User.objects.create_user(username=f'extra_parent{i}', password='parent123', role='parent',
+                                     telegram_id=2000 + i)
+            self.group.students.add(student)
+
+        with self.assertNumQueries(11):
+            report_ids = build_monthly_parent_reports(self.year, self.month)
+        self.assertEqual(len(report_ids), 7)
+
+    def test_rebuild_updates_and_keeps_sent_reports(self):
+        """Re-running updates rows in place and only returns unsent reports"""
+        build_monthly_parent_reports(self.year, self.month)
+        MonthlyParentReport.objects.filter(parent=self.other_parent).update(is_sent=True)
+        StudentProgress.objects.filter(student=self.student).update(progress_percentage=30)
+
+        report_ids = build_monthly_parent_reports(self.year, self.month)
+
+        self.assertEqual(MonthlyParentReport.objects.filter(year=self.year, month=self.month).count(), 2)
+        report = MonthlyParentReport.objects.get(parent=self.parent, year=self.year, month=self.month)
+        self.assertEqual(report_ids, [report.pk])
+        self.assertEqual(report.progress_percentage, 30)
+        self.assertEqual(report.progress_change, 'declined')
+
+    def test_generate_report_matches_batch(self):
+        """Single-report generation uses the same metrics"""
+        report = MonthlyParentReport.objects.create(
+            parent=self.parent, student=self.student, group=self.group, month=self.month, year=self.year,
+        )
+        report.generate_report()
+        report.refresh_from_db()
+        self.assertEqual(report.total_lessons, 4)
+        self.assertEqual(report.completed_homeworks, 3)
+        self.assertEqual(report.total_exams, 2)
+        self.assertEqual(report.progress_change, 'improved')
 
-# Create your tests here.
+    def test_month_helpers(self):
+        """Month range and previous month handle year boundaries"""
+        self.assertEqual(month_range(2024, 12), (date(2024, 12, 1), date(2025, 1, 1)))
+        self.assertEqual(previous_month(2024, 1), (2023, 12))
+        self.assertEqual(previous_month(2024, 3), (2024, 2))
@@ -3,6 +3,7 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.utils import timezone
 from datetime import timedelta, datetime
 from courses.models import Lesson, Group, Room
+from accounts.access import get_access
 from accounts.mixins import RoleRequiredMixin
 
 
@@ -40,10 +41,7 @@ class TimetableView(LoginRequiredMixin, TemplateView):
         ).select_related('group', 'group__room', 'group__mentor', 'topic')
         
         # Foydalanuvchi roliga qarab filtrlash
-        if self.request.user.is_student:
-            lessons = lessons.filter(group__students=self.request.user)
-        elif self.request.user.is_mentor:
-            lessons = lessons.filter(group__mentor=self.request.user)
+        lessons = get_access(self.request).scope_groups(lessons, 'group')
         
         # Kunlar bo'yicha guruhlash
         lessons_by_day = {}
@@ -125,12 +123,7 @@ class CalendarView(LoginRequiredMixin, TemplateView):
         
         # Get groups for the user
         from courses.models import Group
-        if self.request.user.is_student:
-            groups = Group.objects.filter(students=self.request.user, is_active=True)
-        elif self.request.user.is_mentor:
-            groups = Group.objects.filter(mentor=self.request.user, is_active=True)
-        else:
-            groups = Group.objects.filter(is_active=True)
+        groups = get_access(self.request).scope_groups(Group.objects.filter(is_active=True), 'pk')
         
         # Generate lessons based on group schedule
         lessons_by_date = {}
@@ -17,15 +17,22 @@ import logging
 logger = logging.getLogger(__name__)
 
 
-def create_bot():
-    """Bot yaratish"""
+def create_bot(connection_pool_size=None):
+    """
+    Bot yaratish
+    connection_pool_size - Bot API ga parallel so'rovlar soni (webhook worker uchun)
+    """
     token = settings.TELEGRAM_BOT_TOKEN
     
     if not token:
         logger.error("TELEGRAM_BOT_TOKEN not configured")
         return None
     
-    application = Application.builder().token(token).build()
+    builder = Application.builder().token(token)
+    if connection_pool_size:
+        # Navbatdan qayta ishlashda polling Updater kerak emas
+        builder = builder.connection_pool_size(connection_pool_size).pool_timeout(30).updater(None)
+    application = builder.build()
     
     # Handlers ni sozlash
     setup_handlers(application)
@@ -6,17 +6,13 @@ from telegram.ext import (
     Application, CommandHandler, MessageHandler, CallbackQueryHandler,
     ContextTypes, filters
 )
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from accounts.models import User
-from courses.models import Lesson, Group
-from homework.models import Homework
-from exams.models import Exam
-from attendance.models import Attendance
-from gamification.models import StudentPoints, GroupRanking
-from parents.models import MonthlyParentReport
-from mentors.models import MonthlyReport
 from django.utils import timezone
-from datetime import timedelta
+from gamification.leaderboard import group_ranks
+from . import queries
+from .identity import aresolve_identity
+from .responses import acached_response, exams_scopes, lessons_scopes, points_scopes, reports_scopes
 import logging
 
 logger = logging.getLogger(__name__)
@@ -28,9 +24,9 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     try:
         # User ni topish
-        db_user = User.objects.filter(telegram_id=user.id).first()
+        identity = await aresolve_identity(user.id)
         
-        if not db_user:
+        if not identity.is_registered:
             await update.message.reply_text(
                 "❌ Siz tizimda ro'yxatdan o'tmagansiz. "
                 "Iltimos, avval veb-sahifada ro'yxatdan o'ting va Telegram ID ni qo'shing."
@@ -45,20 +41,20 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             'admin': "👋 Salom! Siz admin sifatida ro'yxatdan o'tgansiz.",
         }
         
-        message = role_messages.get(db_user.role, "👋 Salom!")
+        message = role_messages.get(identity.role, "👋 Salom!")
         message += "\n\nQuyidagi buyruqlardan foydalaning:\n"
         message += "/help - Yordam\n"
         
-        if db_user.role == 'student':
+        if identity.role == 'student':
             message += "/lessons - Darslar ro'yxati\n"
             message += "/homework - Uy vazifalari\n"
             message += "/exams - Imtihonlar\n"
             message += "/points - Mening ballarim\n"
             message += "/ranking - Reyting\n"
-        elif db_user.role == 'parent':
+        elif identity.role == 'parent':
             message += "/children - Farzandlarim\n"
             message += "/reports - Oylik hisobotlar\n"
-        elif db_user.role == 'mentor':
+        elif identity.role == 'mentor':
             message += "/schedule - Dars jadvali\n"
             message += "/homework_grade - Vazifalarni baholash\n"
             message += "/groups - Mening guruhlarim\n"
@@ -75,15 +71,15 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     
     try:
-        db_user = User.objects.filter(telegram_id=user.id).first()
+        identity = await aresolve_identity(user.id)
         
-        if not db_user:
+        if not identity.is_registered:
             await update.message.reply_text("❌ Siz tizimda ro'yxatdan o'tmagansiz.")
             return
         
         help_text = "📚 <b>Mavjud buyruqlar:</b>\n\n"
         
-        if db_user.role == 'student':
+        if identity.role == 'student':
             help_text += "👨‍🎓 <b>O'quvchi buyruqlari:</b>\n"
             help_text += "/lessons - Bugungi va kelgusi darslar\n"
             help_text += "/homework - Uy vazifalari ro'yxati\n"
@@ -92,13 +88,13 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             help_text += "/ranking - Guruh reytingi\n"
             help_text += "/profile - Mening profilim\n"
         
-        elif db_user.role == 'parent':
+        elif identity.role == 'parent':
             help_text += "👨‍👩‍👦 <b>Ota-ona buyruqlari:</b>\n"
             help_text += "/children - Farzandlarim ro'yxati\n"
             help_text += "/reports - Oylik hisobotlar\n"
             help_text += "/attendance - Davomat ma'lumotlari\n"
         
-        elif db_user.role == 'mentor':
+        elif identity.role == 'mentor':
             help_text += "👨‍🏫 <b>Mentor buyruqlari:</b>\n"
             help_text += "/schedule - Dars jadvali\n"
             help_text += "/homework_grade - Baholash kerak bo'lgan vazifalar\n"
@@ -115,49 +111,53 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ Xatolik yuz berdi.")
 
 
+def render_lessons(lessons, today):
+    """Darslar ro'yxati matni"""
+    if not lessons:
+        return "📅 Hozircha darslar yo'q."
+    
+    message = "📚 <b>Darslar ro'yxati:</b>\n\n"
+    
+    for lesson in lessons:
+        date_str = lesson.date.strftime('%d.%m.%Y')
+        time_str = lesson.start_time.strftime('%H:%M')
+        
+        message += f"📖 <b>{lesson.group.name}</b>\n"
+        message += f"📅 {date_str} {time_str}\n"
+        
+        if lesson.topic:
+            message += f"📝 {lesson.topic.name}\n"
+        
+        mentor = lesson.group.mentor
+        if mentor:
+            message += f"👨‍🏫 {mentor.get_full_name() or mentor.username}\n"
+        
+        # Bugungi dars bo'lsa
+        if lesson.date == today:
+            message += "✅ <b>Bugun</b>\n"
+        
+        message += "\n"
+    
+    return message
+
+
 async def student_lessons(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """O'quvchi uchun darslar ro'yxati"""
     user = update.effective_user
     
     try:
-        db_user = User.objects.filter(telegram_id=user.id, role='student').first()
+        identity = await aresolve_identity(user.id)
         
-        if not db_user:
+        if not identity.has_role('student'):
             await update.message.reply_text("❌ Siz o'quvchi sifatida ro'yxatdan o'tmagansiz.")
             return
         
         # Bugungi va kelgusi darslar
-        today = timezone.now().date()
-        lessons = Lesson.objects.filter(
-            group__students=db_user,
-            date__gte=today
-        ).select_related('group', 'topic', 'mentor').order_by('date', 'start_time')[:5]
-        
-        if not lessons:
-            await update.message.reply_text("📅 Hozircha darslar yo'q.")
-            return
-        
-        message = "📚 <b>Darslar ro'yxati:</b>\n\n"
-        
-        for lesson in lessons:
-            date_str = lesson.date.strftime('%d.%m.%Y')
-            time_str = lesson.start_time.strftime('%H:%M')
-            
-            message += f"📖 <b>{lesson.group.name}</b>\n"
-            message += f"📅 {date_str} {time_str}\n"
-            
-            if lesson.topic:
-                message += f"📝 {lesson.topic.name}\n"
-            
-            if lesson.mentor:
-                message += f"👨‍🏫 {lesson.mentor.get_full_name() or lesson.mentor.username}\n"
-            
-            # Bugungi dars bo'lsa
-            if lesson.date == today:
-                message += "✅ <b>Bugun</b>\n"
-            
-            message += "\n"
+        async def render():
+            lessons = await queries.upcoming_lessons(identity.group_ids)
+            return render_lessons(lessons, timezone.localdate())
         
+        message = await acached_response('lessons', lessons_scopes(identity.group_ids), render)
         await update.message.reply_text(message, parse_mode='HTML')
     
     except Exception as e:
@@ -170,18 +170,15 @@ async def student_homework(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     
     try:
-        db_user = User.objects.filter(telegram_id=user.id, role='student').first()
+        identity = await aresolve_identity(user.id)
         
-        if not db_user:
+        if not identity.has_role('student'):
             await update.message.reply_text("❌ Siz o'quvchi sifatida ro'yxatdan o'tmagansiz.")
             return
         
         # Topshirilmagan va deadline yaqinlashgan vazifalar
         today = timezone.now()
-        homeworks = Homework.objects.filter(
-            student=db_user,
-            is_submitted=False
-        ).select_related('lesson', 'lesson__group').order_by('deadline')[:5]
+        homeworks = await queries.pending_homeworks(identity.user_id)
         
         if not homeworks:
             await update.message.reply_text("✅ Barcha uy vazifalari topshirilgan!")
@@ -217,48 +214,50 @@ async def student_homework(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ Xatolik yuz berdi.")
 
 
+def render_exams(exams, now):
+    """Imtihonlar ro'yxati matni"""
+    if not exams:
+        return "📚 Hozircha imtihonlar yo'q."
+    
+    message = "📚 <b>Imtihonlar:</b>\n\n"
+    
+    for exam in exams:
+        date_str = exam.date.strftime('%d.%m.%Y %H:%M')
+        days_left = (exam.date - now).days
+        
+        message += f"📖 <b>{exam.title}</b>\n"
+        message += f"📅 {date_str}\n"
+        message += f"⏱️ {exam.duration_minutes} daqiqa\n"
+        
+        if days_left == 0:
+            message += "✅ <b>Bugun!</b>\n"
+        elif days_left == 1:
+            message += "⚠️ <b>Ertaga!</b>\n"
+        elif days_left <= 7:
+            message += f"⚠️ {days_left} kun qoldi\n"
+        
+        message += "\n"
+    
+    return message
+
+
 async def student_exams(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """O'quvchi uchun imtihonlar"""
     user = update.effective_user
     
     try:
-        db_user = User.objects.filter(telegram_id=user.id, role='student').first()
+        identity = await aresolve_identity(user.id)
         
-        if not db_user:
+        if not identity.has_role('student'):
             await update.message.reply_text("❌ Siz o'quvchi sifatida ro'yxatdan o'tmagansiz.")
             return
         
         # Kelgusi imtihonlar
-        now = timezone.now()
-        exams = Exam.objects.filter(
-            group__students=db_user,
-            date__gte=now,
-            is_active=True
-        ).select_related('course', 'group').order_by('date')[:5]
-        
-        if not exams:
-            await update.message.reply_text("📚 Hozircha imtihonlar yo'q.")
-            return
-        
-        message = "📚 <b>Imtihonlar:</b>\n\n"
-        
-        for exam in exams:
-            date_str = exam.date.strftime('%d.%m.%Y %H:%M')
-            days_left = (exam.date - now).days
-            
-            message += f"📖 <b>{exam.title}</b>\n"
-            message += f"📅 {date_str}\n"
-            message += f"⏱️ {exam.duration_minutes} daqiqa\n"
-            
-            if days_left == 0:
-                message += "✅ <b>Bugun!</b>\n"
-            elif days_left == 1:
-                message += "⚠️ <b>Ertaga!</b>\n"
-            elif days_left <= 7:
-                message += f"⚠️ {days_left} kun qoldi\n"
-            
-            message += "\n"
+        async def render():
+            exams = await queries.upcoming_exams(identity.group_ids)
+            return render_exams(exams, timezone.now())
         
+        message = await acached_response('exams', exams_scopes(identity.group_ids), render)
         await update.message.reply_text(message, parse_mode='HTML')
     
     except Exception as e:
@@ -266,47 +265,52 @@ async def student_exams(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ Xatolik yuz berdi.")
 
 
+def render_points(groups):
+    """
+    Guruhlar bo'yicha ballar matni
+    groups - name, points, rank atributli obyektlar (points=None - ball yozuvi yo'q)
+    """
+    if not groups:
+        return "❌ Siz hech qanday guruhga yozilmagansiz."
+    
+    message = "🏆 <b>Mening ballarim:</b>\n\n"
+    
+    for group in groups:
+        if group.points is not None:
+            message += f"📖 <b>{group.name}</b>\n"
+            message += f"🎯 {group.points} ball\n"
+            
+            if group.rank is not None:
+                message += f"🏅 {group.rank} o'rin\n"
+            
+            message += "\n"
+    
+    return message
+
+
 async def student_points(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """O'quvchi uchun ballar va reyting"""
     user = update.effective_user
     
     try:
-        db_user = User.objects.filter(telegram_id=user.id, role='student').first()
+        identity = await aresolve_identity(user.id)
         
-        if not db_user:
+        if not identity.has_role('student'):
             await update.message.reply_text("❌ Siz o'quvchi sifatida ro'yxatdan o'tmagansiz.")
             return
         
-        # Guruh bo'yicha ballar
-        groups = Group.objects.filter(students=db_user, is_active=True)
-        
-        if not groups:
-            await update.message.reply_text("❌ Siz hech qanday guruhga yozilmagansiz.")
-            return
-        
-        message = "🏆 <b>Mening ballarim:</b>\n\n"
-        
-        for group in groups:
-            student_points = StudentPoints.objects.filter(
-                student=db_user,
-                group=group
-            ).first()
-            
-            if student_points:
-                # Reyting
-                ranking = GroupRanking.objects.filter(
-                    student=db_user,
-                    group=group
-                ).first()
-                
-                message += f"📖 <b>{group.name}</b>\n"
-                message += f"🎯 {student_points.total_points} ball\n"
-                
-                if ranking:
-                    message += f"🏅 {ranking.rank} o'rin\n"
-                
-                message += "\n"
-        
+        # Guruh bo'yicha ballar (bitta so'rov) va o'rinlar (leaderboard)
+        async def render():
+            if not identity.group_ids:
+                return render_points([])
+            groups = await queries.student_group_points(identity.user_id, identity.group_ids)
+            ranks = await sync_to_async(group_ranks)(identity.user_id, identity.group_ids)
+            for group in groups:
+                group.rank = ranks.get(group.pk)
+            return render_points(groups)
+        
+        scopes = points_scopes(identity.user_id, identity.group_ids)
+        message = await acached_response('points', scopes, render)
         await update.message.reply_text(message, parse_mode='HTML')
     
     except Exception as e:
@@ -319,27 +323,24 @@ async def parent_children(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     
     try:
-        from accounts.models import StudentProfile
-        # Find students where parent_telegram_id matches
-        student_profiles = StudentProfile.objects.filter(parent_telegram_id=user.id)
+        # Farzandlar parent_telegram_id orqali topiladi (identifikatsiya keshida)
+        identity = await aresolve_identity(user.id)
         
-        if not student_profiles.exists():
+        if not identity.is_parent:
             await update.message.reply_text("❌ Sizning farzandlaringiz topilmadi yoki Telegram ID mos kelmaydi.")
             return
         
-        students = [profile.user for profile in student_profiles]
+        students = await queries.parent_students(identity.student_ids)
+        
+        # Bugungi davomat (barcha farzandlar uchun bitta so'rov)
+        today_attendance = await queries.todays_attendance(identity.student_ids)
         
         message = "👨‍👩‍👦 <b>Farzandlarim:</b>\n\n"
         
         for student in students:
             message += f"👤 <b>{student.get_full_name() or student.username}</b>\n"
             
-            # Bugungi davomat
-            today = timezone.now().date()
-            attendance = Attendance.objects.filter(
-                student=student,
-                lesson__date=today
-            ).first()
+            attendance = today_attendance.get(student.pk)
             
             if attendance:
                 status_emoji = {
@@ -360,44 +361,45 @@ async def parent_children(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ Xatolik yuz berdi.")
 
 
+def render_reports(reports):
+    """Oylik hisobotlar matni"""
+    if not reports:
+        return "📊 Hozircha oylik hisobotlar yo'q."
+    
+    message = "📊 <b>Oylik hisobotlar:</b>\n\n"
+    
+    for report in reports:
+        message += f"👤 {report.student.get_full_name() or report.student.username}\n"
+        message += f"📅 {report.year}-{report.month:02d}\n"
+        message += f"📖 {report.group.name}\n"
+        message += f"📈 Davomat: {report.attendance_percentage:.1f}%\n"
+        message += f"📝 Vazifalar: {report.homework_completion_rate:.1f}%\n"
+        
+        if report.average_exam_score > 0:
+            message += f"📚 Imtihon: {report.average_exam_score:.1f}%\n"
+        
+        message += "\n"
+    
+    return message
+
+
 async def parent_reports(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Ota-ona uchun oylik hisobotlar - StudentProfile orqali"""
     user = update.effective_user
     
     try:
-        from accounts.models import StudentProfile
-        # Find students where parent_telegram_id matches
-        student_profiles = StudentProfile.objects.filter(parent_telegram_id=user.id)
+        # Farzandlar parent_telegram_id orqali topiladi (identifikatsiya keshida)
+        identity = await aresolve_identity(user.id)
         
-        if not student_profiles.exists():
+        if not identity.is_parent:
             await update.message.reply_text("❌ Sizning farzandlaringiz topilmadi yoki Telegram ID mos kelmaydi.")
             return
         
-        students = [profile.user for profile in student_profiles]
-        
-        # Oxirgi 3 ta hisobot (har bir farzand uchun)
-        all_reports = MonthlyParentReport.objects.filter(
-            student__in=students
-        ).select_related('student', 'group').order_by('-year', '-month')[:3]
-        
-        if not all_reports:
-            await update.message.reply_text("📊 Hozircha oylik hisobotlar yo'q.")
-            return
-        
-        message = "📊 <b>Oylik hisobotlar:</b>\n\n"
-        
-        for report in all_reports:
-            message += f"👤 {report.student.get_full_name() or report.student.username}\n"
-            message += f"📅 {report.year}-{report.month:02d}\n"
-            message += f"📖 {report.group.name}\n"
-            message += f"📈 Davomat: {report.attendance_percentage:.1f}%\n"
-            message += f"📝 Vazifalar: {report.homework_completion_rate:.1f}%\n"
-            
-            if report.average_exam_score > 0:
-                message += f"📚 Imtihon: {report.average_exam_score:.1f}%\n"
-            
-            message += "\n"
+        # Oxirgi 3 ta hisobot
+        async def render():
+            return render_reports(await queries.children_reports(identity.student_ids))
         
+        message = await acached_response('reports', reports_scopes(identity.student_ids), render)
         await update.message.reply_text(message, parse_mode='HTML')
     
     except Exception as e:
@@ -410,18 +412,15 @@ async def mentor_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     
     try:
-        db_user = User.objects.filter(telegram_id=user.id, role='mentor').first()
+        identity = await aresolve_identity(user.id)
         
-        if not db_user:
+        if not identity.has_role('mentor'):
             await update.message.reply_text("❌ Siz mentor sifatida ro'yxatdan o'tmagansiz.")
             return
         
         # Bugungi va kelgusi darslar
-        today = timezone.now().date()
-        lessons = Lesson.objects.filter(
-            mentor=db_user,
-            date__gte=today
-        ).select_related('group', 'topic').order_by('date', 'start_time')[:5]
+        today = timezone.localdate()
+        lessons = await queries.mentor_lessons(identity.group_ids)
         
         if not lessons:
             await update.message.reply_text("📅 Hozircha darslar yo'q.")
@@ -456,20 +455,14 @@ async def mentor_homework_grade(update: Update, context: ContextTypes.DEFAULT_TY
     user = update.effective_user
     
     try:
-        db_user = User.objects.filter(telegram_id=user.id, role='mentor').first()
+        identity = await aresolve_identity(user.id)
         
-        if not db_user:
+        if not identity.has_role('mentor'):
             await update.message.reply_text("❌ Siz mentor sifatida ro'yxatdan o'tmagansiz.")
             return
         
         # Baholanmagan vazifalar
-        from homework.models import HomeworkGrade
-        homeworks = Homework.objects.filter(
-            lesson__mentor=db_user,
-            is_submitted=True
-        ).exclude(
-            id__in=HomeworkGrade.objects.values_list('homework_id', flat=True)
-        ).select_related('student', 'lesson', 'lesson__group').order_by('submitted_at')[:5]
+        homeworks = await queries.ungraded_homeworks(identity.group_ids)
         
         if not homeworks:
             await update.message.reply_text("✅ Barcha vazifalar baholangan!")
@@ -0,0 +1,259 @@
+"""
+Telegram foydalanuvchilari identifikatsiyasi keshi
+telegram_id → (user_id, rol, farzandlar id lari, guruhlar id lari).
+Ikki daraja: jarayon ichidagi LRU (qisqa TTL) va Redis (uzoqroq TTL).
+User, StudentProfile va guruh a'zoligi o'zgarganda signallar orqali tozalanadi.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+from accounts.models import StudentProfile, User
+from courses.models import Group
+
+logger = logging.getLogger(__name__)
+
+
+CACHE_PREFIX = 'bot_identity'
+CACHE_TIMEOUT = 600  # Redis, 10 daqiqa
+LOCAL_TIMEOUT = 30  # Boshqa jarayonlardagi o'zgarishlar shu vaqtgacha kechikishi mumkin
+LOCAL_MAX_SIZE = 5000
+
+STATS_KEY = f'{CACHE_PREFIX}:stats'
+STATS_FLUSH_EVERY = 100  # Har N ta murojaatda hisoblagichlar Redis ga yoziladi
+STATS_FIELDS = ('local_hits', 'redis_hits', 'misses')
+
+
+class BotIdentity:
+    """
+    Bot foydalanuvchisi haqida minimal ma'lumot
+    user_id/role - tizimdagi foydalanuvchi (bo'lmasa None),
+    student_ids - ota-ona sifatida bog'langan farzandlar,
+    group_ids - o'quvchi yoki mentorning faol guruhlari
+    """
+    def __init__(self, telegram_id, user_id=None, role=None, student_ids=(), group_ids=()):
+        self.telegram_id = telegram_id
+        self.user_id = user_id
+        self.role = role
+        self.student_ids = list(student_ids)
+        self.group_ids = list(group_ids)
+
+    @property
+    def is_registered(self):
+        return self.user_id is not None
+
+    @property
+    def is_parent(self):
+        return bool(self.student_ids)
+
+    def has_role(self, role):
+        return self.user_id is not None and self.role == role
+
+    def to_dict(self):
+        return {
+            'telegram_id': self.telegram_id,
+            'user_id': self.user_id,
+            'role': self.role,
+            'student_ids': self.student_ids,
+            'group_ids': self.group_ids,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+class LocalLRU:
+    """Jarayon ichidagi TTL li LRU kesh (thread-safe)"""
+    def __init__(self, max_size=LOCAL_MAX_SIZE, timeout=LOCAL_TIMEOUT):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.timeout, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_local = LocalLRU()
+_stats = dict.fromkeys(STATS_FIELDS, 0)
+_pending_stats = dict.fromkeys(STATS_FIELDS, 0)
+_stats_lock = threading.Lock()
+
+
+def _cache_key(telegram_id):
+    return f'{CACHE_PREFIX}:{telegram_id}'
+
+
+def _count(field, flush=True):
+    """
+    Hisoblagichni oshirish; har STATS_FLUSH_EVERY murojaatda Redis ga yig'ib yoziladi.
+    flush=False - event loop ichida (Redis ga yozish keyingi sinxron murojaatda bo'ladi)
+    """
+    with _stats_lock:
+        _stats[field] += 1
+        _pending_stats[field] += 1
+        if not flush or sum(_pending_stats.values()) < STATS_FLUSH_EVERY:
+            return
+        pending = dict(_pending_stats)
+        for name in STATS_FIELDS:
+            _pending_stats[name] = 0
+    _flush_stats(pending)
+
+
+def _flush_stats(pending):
+    try:
+        for name, value in pending.items():
+            if value:
+                key = f'{STATS_KEY}:{name}'
+                cache.add(key, 0, None)
+                cache.incr(key, value)
+    except Exception:
+        # Statistika ixtiyoriy - Redis xatosi bot javobini to'xtatmasligi kerak
+        pass
+
+
+def local_stats():
+    """Joriy jarayon hisoblagichlari va hit rate"""
+    with _stats_lock:
+        stats = dict(_stats)
+    return _with_rates(stats)
+
+
+def shared_stats():
+    """Barcha jarayonlarning Redis dagi umumiy hisoblagichlari"""
+    values = cache.get_many([f'{STATS_KEY}:{name}' for name in STATS_FIELDS])
+    stats = {name: values.get(f'{STATS_KEY}:{name}', 0) for name in STATS_FIELDS}
+    return _with_rates(stats)
+
+
+def _with_rates(stats):
+    total = sum(stats[name] for name in STATS_FIELDS)
+    stats['total'] = total
+    stats['local_hit_rate'] = stats['local_hits'] / total * 100 if total else 0.0
+    stats['hit_rate'] = (stats['local_hits'] + stats['redis_hits']) / total * 100 if total else 0.0
+    return stats
+
+
+def load_identity(telegram_id):
+    """Bazadan identifikatsiya (2-3 ta so'rov)"""
+    user = User.objects.filter(telegram_id=telegram_id).values('id', 'role').first()
+    student_ids = list(
+        StudentProfile.objects.filter(parent_telegram_id=telegram_id).values_list('user_id', flat=True).order_by('pk')
+    )
+
+    groups = Group.objects.none()
+    if user and user['role'] == 'student':
+        groups = Group.objects.filter(students=user['id'], is_active=True)
+    elif user and user['role'] == 'mentor':
+        groups = Group.objects.filter(mentor=user['id'], is_active=True)
+    group_ids = list(groups.values_list('id', flat=True).order_by('id'))
+
+    return BotIdentity(
+        telegram_id,
+        user_id=user['id'] if user else None,
+        role=user['role'] if user else None,
+        student_ids=student_ids,
+        group_ids=group_ids,
+    )
+
+
+def resolve_identity(telegram_id):
+    """
+    telegram_id bo'yicha identifikatsiya: LRU → Redis → baza.
+    Ro'yxatdan o'tmagan foydalanuvchilar ham (bo'sh identifikatsiya) keshlanadi.
+    """
+    identity = _local.get(telegram_id)
+    if identity is not None:
+        _count('local_hits')
+        return identity
+
+    try:
+        data = cache.get(_cache_key(telegram_id))
+    except Exception as e:
+        # Redis ishlamasa bazadan o'qiladi - bot buyruqlari to'xtamasligi kerak
+        logger.warning(f"Error reading bot identity cache: {e}")
+        data = None
+
+    if data is not None:
+        identity = BotIdentity.from_dict(data)
+        _count('redis_hits')
+    else:
+        identity = load_identity(telegram_id)
+        try:
+            cache.set(_cache_key(telegram_id), identity.to_dict(), CACHE_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"Error writing bot identity cache: {e}")
+        _count('misses')
+
+    _local.set(telegram_id, identity)
+    return identity
+
+
+async def aresolve_identity(telegram_id):
+    """resolve_identity ning async varianti (bot handlerlari uchun)"""
+    identity = _local.get(telegram_id)
+    if identity is not None:
+        # Event loop ichida Redis ga yozilmaydi - hisoblagichlar keyingi sinxron murojaatda yuboriladi
+        _count('local_hits', flush=False)
+        return identity
+    return await sync_to_async(resolve_identity)(telegram_id)
+
+
+def invalidate_identity(*telegram_ids):
+    """Berilgan telegram_id lar keshini tozalash (LRU va Redis)"""
+    telegram_ids = [telegram_id for telegram_id in telegram_ids if telegram_id]
+    if not telegram_ids:
+        return
+    for telegram_id in telegram_ids:
+        _local.delete(telegram_id)
+    try:
+        cache.delete_many([_cache_key(telegram_id) for telegram_id in telegram_ids])
+    except Exception as e:
+        # Redis ishlamasa ham foydalanuvchini saqlash to'xtamasligi kerak (TTL baribir tugaydi)
+        logger.warning(f"Error invalidating bot identity cache: {e}")
+
+
+def invalidate_users_identity(user_ids):
+    """Foydalanuvchilar (id bo'yicha) keshini tozalash"""
+    user_ids = [user_id for user_id in user_ids if user_id]
+    if not user_ids:
+        return
+    invalidate_identity(*User.objects.filter(
+        pk__in=user_ids, telegram_id__isnull=False
+    ).values_list('telegram_id', flat=True))
+
+
+def invalidate_group_identities(group_id, extra_user_ids=()):
+    """Guruh o'quvchilari va mentori keshini tozalash"""
+    user_ids = list(Group.students.through.objects.filter(group_id=group_id).values_list('user_id', flat=True))
+    user_ids += list(Group.objects.filter(pk=group_id).values_list('mentor_id', flat=True))
+    invalidate_users_identity(user_ids + list(extra_user_ids))
@@ -0,0 +1,28 @@
+"""
+Django management command: bot identifikatsiya keshi statistikasi
+Usage: python manage.py bot_identity_stats [--reset]
+"""
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from telegram_bot.identity import STATS_FIELDS, STATS_KEY, shared_stats
+
+
+class Command(BaseCommand):
+    help = 'Bot identifikatsiya keshining hit rate ko\'rsatkichlari (barcha jarayonlar bo\'yicha)'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Hisoblagichlarni nolga tushirish')
+    
+    def handle(self, *args, **options):
+        stats = shared_stats()
+        self.stdout.write(f"Jami murojaatlar: {stats['total']}")
+        self.stdout.write(f"  LRU (jarayon ichida): {stats['local_hits']}")
+        self.stdout.write(f"  Redis: {stats['redis_hits']}")
+        self.stdout.write(f"  Baza (miss): {stats['misses']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Hit rate: {stats['hit_rate']:.1f}% (LRU: {stats['local_hit_rate']:.1f}%)"
+        ))
+        
+        if options['reset']:
+            cache.delete_many([f'{STATS_KEY}:{name}' for name in STATS_FIELDS])
+            self.stdout.write('Hisoblagichlar tozalandi')
@@ -0,0 +1,100 @@
+"""
+Django management command: yozib olingan Telegram yangilanishlarini qayta yuborish (benchmark)
+Usage: python manage.py replay_updates updates.jsonl [--repeat 10] [--url http://.../telegram/webhook/]
+Fayl: har qatorda bitta yangilanish (runbotworker --capture bilan yoziladi).
+--url berilsa webhook ga POST qilinadi (javob vaqti o'lchanadi), aks holda to'g'ridan-to'g'ri navbatga.
+--wait navbat bo'shaguncha kutadi va worker o'tkazuvchanligini hisoblaydi.
+"""
+import asyncio
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from telegram_bot.updates import PROCESSING_KEY, QUEUE_KEY, async_redis
+from telegram_bot.views import SECRET_HEADER
+
+
+class Command(BaseCommand):
+    help = "Yozib olingan Telegram yangilanishlarini navbatga yoki webhook ga qayta yuborish"
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help='JSONL fayl')
+        parser.add_argument('--repeat', type=int, default=1, help='Fayl necha marta yuboriladi')
+        parser.add_argument('--url', help='Webhook URL (berilmasa Redis navbatiga yoziladi)')
+        parser.add_argument('--concurrency', type=int, default=50, help='Parallel HTTP so\'rovlar (--url)')
+        parser.add_argument('--wait', action='store_true', help='Worker navbatni bo\'shatguncha kutish')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['file'], encoding='utf-8') as f:
+                updates = [json.loads(line) for line in f if line.strip()]
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Faylni o\'qib bo\'lmadi: {e}')
+        if not updates:
+            raise CommandError("Faylda yangilanishlar yo'q")
+
+        # Har bir nusxa alohida update_id oladi
+        payloads = []
+        for i in range(options['repeat']):
+            for update in updates:
+                payloads.append(json.dumps(dict(update, update_id=len(payloads) + 1)))
+
+        asyncio.run(self._replay(payloads, options))
+
+    async def _replay(self, payloads, options):
+        client = async_redis()
+        try:
+            await self._send(client, payloads, options)
+        finally:
+            await client.aclose()
+
+    async def _send(self, client, payloads, options):
+        started = time.perf_counter()
+        if options['url']:
+            latencies = await self._post(payloads, options['url'], options['concurrency'])
+            latencies.sort()
+            self.stdout.write(
+                f"Webhook: {len(payloads)} ta, p50={latencies[len(latencies) // 2] * 1000:.1f}ms, "
+                f"p95={latencies[int(len(latencies) * 0.95)] * 1000:.1f}ms"
+            )
+        else:
+            for start in range(0, len(payloads), 1000):
+                await client.rpush(QUEUE_KEY, *payloads[start:start + 1000])
+        sent = time.perf_counter() - started
+        self.stdout.write(f"Yuborildi: {len(payloads)} ta, {len(payloads) / sent:.0f} ta/s")
+
+        if options['wait']:
+            while await client.llen(QUEUE_KEY) or await client.llen(PROCESSING_KEY):
+                await asyncio.sleep(0.05)
+            total = time.perf_counter() - started
+            self.stdout.write(self.style.SUCCESS(
+                f"Qayta ishlandi: {len(payloads)} ta, {total:.2f}s, {len(payloads) / total:.0f} ta/s"
+            ))
+
+    async def _post(self, payloads, url, concurrency):
+        import httpx
+
+        headers = {'Content-Type': 'application/json'}
+        if settings.TELEGRAM_WEBHOOK_SECRET:
+            headers[SECRET_HEADER] = settings.TELEGRAM_WEBHOOK_SECRET
+        slots = asyncio.Semaphore(concurrency)
+        latencies = []
+        errors = 0
+
+        async with httpx.AsyncClient(limits=httpx.Limits(max_connections=concurrency)) as client:
+            async def post(payload):
+                nonlocal errors
+                async with slots:
+                    started = time.perf_counter()
+                    response = await client.post(url, content=payload, headers=headers)
+                    latencies.append(time.perf_counter() - started)
+                    if response.status_code != 200:
+                        errors += 1
+
+            await asyncio.gather(*(post(payload) for payload in payloads))
+
+        if errors:
+            self.stdout.write(self.style.WARNING(f"Xatolar: {errors} ta"))
+        return latencies
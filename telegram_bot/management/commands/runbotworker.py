@@ -0,0 +1,51 @@
+"""
+Django management command: webhook yangilanishlarini qayta ishlovchi worker
+Usage: python manage.py runbotworker [--concurrency 32] [--capture updates.jsonl]
+"""
+import asyncio
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from telegram_bot.bot import create_bot
+from telegram_bot.updates import run_worker
+
+
+class Command(BaseCommand):
+    help = 'Webhook navbatidagi Telegram yangilanishlarini qayta ishlash (async worker)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=settings.TELEGRAM_WORKER_CONCURRENCY,
+            help='Bir vaqtda qayta ishlanadigan yangilanishlar soni',
+        )
+        parser.add_argument(
+            '--capture',
+            help='Yangilanishlarni JSONL faylga yozish (replay_updates uchun)',
+        )
+
+    def handle(self, *args, **options):
+        concurrency = options['concurrency']
+        application = create_bot(connection_pool_size=concurrency)
+        if not application:
+            raise CommandError('Bot yaratilmadi (TELEGRAM_BOT_TOKEN)')
+
+        self.stdout.write(self.style.SUCCESS(f'Bot worker ishga tushmoqda (concurrency={concurrency})...'))
+        capture = open(options['capture'], 'a', encoding='utf-8') if options['capture'] else None
+        try:
+            asyncio.run(self._run(application, concurrency, capture))
+        finally:
+            if capture:
+                capture.close()
+        self.stdout.write(self.style.SUCCESS("Bot worker to'xtadi"))
+
+    async def _run(self, application, concurrency, capture):
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            # Yangi yangilanishlar olinmaydi, boshlanganlari tugatiladi
+            loop.add_signal_handler(sig, stop_event.set)
+        await run_worker(application, concurrency, stop_event=stop_event, capture=capture)
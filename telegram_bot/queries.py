@@ -0,0 +1,119 @@
+"""
+Telegram bot uchun ma'lumotlarga kirish qatlami
+So'rovlar Django async ORM orqali bajariladi (async for) - bot event loopi bloklanmaydi.
+Foydalanuvchi, uning guruhlari va farzandlari identifikatsiya keshidan (identity) olinadi,
+shuning uchun har bir buyruq ma'lumotlari bitta so'rov bilan olinadi; qaytarilgan obyektlarda
+shablon uchun kerakli bog'lanishlar (select_related) oldindan yuklangan bo'ladi.
+"""
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from accounts.models import User
+from attendance.models import Attendance
+from courses.models import Group, Lesson
+from exams.models import Exam
+from gamification.models import StudentPoints
+from homework.models import Homework
+from parents.models import MonthlyParentReport
+
+
+LIST_LIMIT = 5
+REPORTS_LIMIT = 3
+
+
+async def _list(queryset):
+    return [obj async for obj in queryset]
+
+
+async def upcoming_lessons(group_ids, limit=LIST_LIMIT):
+    """O'quvchi guruhlarining bugungi va kelgusi darslari"""
+    return await _list(
+        Lesson.objects.filter(
+            group_id__in=group_ids,
+            date__gte=timezone.localdate(),
+        ).select_related('group', 'group__mentor', 'topic').order_by('date', 'start_time')[:limit]
+    )
+
+
+async def pending_homeworks(student_id, limit=LIST_LIMIT):
+    """Topshirilmagan uy vazifalari (deadline bo'yicha)"""
+    return await _list(
+        Homework.objects.filter(
+            student_id=student_id,
+            is_submitted=False,
+        ).select_related('lesson__group').order_by('deadline')[:limit]
+    )
+
+
+async def upcoming_exams(group_ids, limit=LIST_LIMIT):
+    """O'quvchi guruhlaridagi kelgusi faol imtihonlar"""
+    return await _list(
+        Exam.objects.filter(
+            group_id__in=group_ids,
+            date__gte=timezone.now(),
+            is_active=True,
+        ).select_related('course', 'group').order_by('date')[:limit]
+    )
+
+
+async def student_group_points(student_id, group_ids):
+    """
+    O'quvchining faol guruhlari va har biridagi ball (bitta so'rov).
+    Ball yozuvi bo'lmagan guruhlarda points=None. O'rin leaderboard dan (group_ranks).
+    """
+    points = StudentPoints.objects.filter(student_id=student_id, group=OuterRef('pk')).values('total_points')[:1]
+    return await _list(
+        Group.objects.filter(pk__in=group_ids).annotate(
+            points=Subquery(points),
+        ).order_by('course', 'name')
+    )
+
+
+async def parent_students(student_ids):
+    """Ota-onaning farzandlari (id lar identifikatsiya keshidan)"""
+    return await _list(User.objects.filter(pk__in=student_ids).order_by('pk'))
+
+
+async def todays_attendance(student_ids):
+    """
+    Farzandlarning bugungi davomati (bitta so'rov).
+    Qaytaradi: {student_id: Attendance} - bir nechta dars bo'lsa eng oxirgisi
+    """
+    attendance = {}
+    rows = Attendance.objects.filter(
+        student_id__in=student_ids,
+        lesson__date=timezone.localdate(),
+    ).order_by('student_id', '-lesson__start_time')
+    async for record in rows:
+        attendance.setdefault(record.student_id, record)
+    return attendance
+
+
+async def children_reports(student_ids, limit=REPORTS_LIMIT):
+    """Farzandlarning oxirgi oylik hisobotlari"""
+    return await _list(
+        MonthlyParentReport.objects.filter(
+            student_id__in=student_ids,
+        ).select_related('student', 'group').order_by('-year', '-month')[:limit]
+    )
+
+
+async def mentor_lessons(group_ids, limit=LIST_LIMIT):
+    """Mentor guruhlarining bugungi va kelgusi darslari"""
+    return await _list(
+        Lesson.objects.filter(
+            group_id__in=group_ids,
+            date__gte=timezone.localdate(),
+        ).select_related('group', 'topic').order_by('date', 'start_time')[:limit]
+    )
+
+
+async def ungraded_homeworks(group_ids, limit=LIST_LIMIT):
+    """Mentor guruhlarida topshirilgan, lekin baholanmagan vazifalar"""
+    return await _list(
+        Homework.objects.filter(
+            lesson__group_id__in=group_ids,
+            is_submitted=True,
+            grade__isnull=True,
+        ).select_related('student', 'lesson__group').order_by('submitted_at')[:limit]
+    )
@@ -0,0 +1,107 @@
+"""
+Bot javoblari keshi (tayyor matn)
+Kalit: (buyruq, sana, scope lar va ularning versiyalari). Scope - javob bog'liq bo'lgan guruh yoki
+o'quvchi; foydalanuvchi o'z scope lari orqali kalitga kiradi, shuning uchun bir xil guruhlardagi
+o'quvchilar /lessons, /exams javobini bo'lishadi. Dars, imtihon, ball, reyting yoki hisobot
+o'zgarganda signallar tegishli scope versiyasini yangilaydi va eski javoblar o'z-o'zidan eskiradi.
+"""
+import hashlib
+import logging
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.utils import timezone
+
+from geeks_crm.cache_versions import CacheVersions
+
+logger = logging.getLogger(__name__)
+
+
+CACHE_PREFIX = 'bot_response'
+RESPONSE_TIMEOUT = 600  # "N kun qoldi" kabi vaqtga bog'liq qatorlar shu muddatdan ko'p eskirmaydi
+
+
+def group_scope(group_id):
+    return f'group:{group_id}'
+
+
+def student_scope(student_id):
+    return f'student:{student_id}'
+
+
+def ranking_scope(group_id):
+    return f'ranking:{group_id}'
+
+
+def lessons_scopes(group_ids):
+    return [group_scope(group_id) for group_id in sorted(group_ids)]
+
+
+def exams_scopes(group_ids):
+    return [group_scope(group_id) for group_id in sorted(group_ids)]
+
+
+def points_scopes(student_id, group_ids):
+    # O'rin guruhdagi boshqa o'quvchilar ballariga ham bog'liq - ranking scope
+    group_ids = sorted(group_ids)
+    return (
+        [student_scope(student_id)]
+        + [group_scope(group_id) for group_id in group_ids]
+        + [ranking_scope(group_id) for group_id in group_ids]
+    )
+
+
+def reports_scopes(student_ids):
+    return [student_scope(student_id) for student_id in sorted(student_ids)]
+
+
+_versions = CacheVersions(CACHE_PREFIX)
+
+
+def get_versions(scopes):
+    """Scope versiyalari (yo'qlari yangi qiymat bilan yaratiladi)"""
+    return _versions.get_many(scopes)
+
+
+def bump_versions(*scopes):
+    """Scope larga bog'liq barcha javoblarni eskirtirish (javoblar RESPONSE_TIMEOUT dan ko'p eskirmaydi)"""
+    _versions.bump(*scopes)
+
+
+def response_key(command, scopes, versions=None):
+    versions = get_versions(scopes) if versions is None else versions
+    digest = hashlib.md5(':'.join(f'{scope}={version}' for scope, version in zip(scopes, versions)).encode())
+    return f'{CACHE_PREFIX}:{command}:{timezone.localdate():%Y%m%d}:{digest.hexdigest()}'
+
+
+def get_response(command, scopes):
+    """
+    Keshdagi javob.
+    Qaytaradi: (key, text) - text None bo'lsa render qilib set_response(key, text) chaqiriladi
+    """
+    key = response_key(command, scopes)
+    return key, cache.get(key)
+
+
+def set_response(key, text):
+    cache.set(key, text, RESPONSE_TIMEOUT)
+
+
+async def acached_response(command, scopes, render):
+    """
+    Keshdagi javob yoki render() natijasi (keshga yoziladi).
+    Kesh ishlamasa javob to'g'ridan-to'g'ri render qilinadi.
+    """
+    try:
+        key, text = await sync_to_async(get_response)(command, scopes)
+    except Exception as e:
+        logger.warning(f"Error reading bot response cache: {e}")
+        return await render()
+
+    if text is None:
+        text = await render()
+        try:
+            await sync_to_async(set_response)(key, text)
+        except Exception as e:
+            logger.warning(f"Error writing bot response cache: {e}")
+    return text
@@ -0,0 +1,118 @@
+"""
+Django signals for Telegram bot app
+Identifikatsiya keshini (telegram_id → foydalanuvchi) va tayyor javoblar versiyalarini yangilash
+"""
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from accounts.models import StudentProfile, User
+from courses.models import Group, Lesson
+from exams.models import Exam
+from gamification.models import StudentPoints
+from parents.models import MonthlyParentReport
+from .identity import invalidate_group_identities, invalidate_identity, invalidate_users_identity
+from .responses import bump_versions, group_scope, ranking_scope, student_scope
+
+
+@receiver(post_init, sender=User)
+def remember_user_telegram_id(sender, instance, **kwargs):
+    """Yuklangan telegram_id ni eslab qolish (o'zgarsa eskisini ham tozalash uchun)"""
+    instance._identity_telegram_id = instance.__dict__.get('telegram_id')
+
+
+IDENTITY_USER_FIELDS = {'telegram_id', 'role'}
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_identity(sender, instance, update_fields=None, **kwargs):
+    """Foydalanuvchi (rol, telegram_id) o'zgarganda"""
+    if update_fields and not IDENTITY_USER_FIELDS.intersection(update_fields):
+        # Masalan login paytidagi last_login yangilanishi
+        return
+    telegram_ids = {instance.telegram_id, getattr(instance, '_identity_telegram_id', None)}
+    transaction.on_commit(lambda: invalidate_identity(*telegram_ids))
+    instance._identity_telegram_id = instance.telegram_id
+
+
+@receiver(post_init, sender=StudentProfile)
+def remember_parent_telegram_id(sender, instance, **kwargs):
+    instance._identity_parent_telegram_id = instance.__dict__.get('parent_telegram_id')
+
+
+@receiver(post_save, sender=StudentProfile)
+@receiver(post_delete, sender=StudentProfile)
+def invalidate_parent_identity(sender, instance, **kwargs):
+    """Ota-ona telegram_id si o'zgarganda (eski va yangi ota-ona farzandlari ro'yxati)"""
+    telegram_ids = {instance.parent_telegram_id, getattr(instance, '_identity_parent_telegram_id', None)}
+    transaction.on_commit(lambda: invalidate_identity(*telegram_ids))
+    instance._identity_parent_telegram_id = instance.parent_telegram_id
+
+
+@receiver(m2m_changed, sender=Group.students.through)
+def invalidate_group_member_identity(sender, instance, action, reverse, pk_set, **kwargs):
+    """Guruhga o'quvchi qo'shilganda/olib tashlanganda"""
+    if action == 'pre_clear':
+        # post_clear da pk_set bo'lmaydi - kimlar ta'sirlanishini oldindan aniqlash
+        if reverse:
+            user_ids = [instance.pk]
+        else:
+            user_ids = list(instance.students.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        user_ids = [instance.pk] if reverse else list(pk_set or [])
+    else:
+        return
+    transaction.on_commit(lambda: invalidate_users_identity(user_ids))
+
+
+@receiver(post_init, sender=Group)
+def remember_group_state(sender, instance, **kwargs):
+    instance._identity_state = (instance.__dict__.get('is_active'), instance.__dict__.get('mentor_id'))
+
+
+@receiver(post_save, sender=Group)
+def invalidate_group_identity(sender, instance, created, **kwargs):
+    """Guruh faolligi yoki mentori o'zgarganda"""
+    old_state = getattr(instance, '_identity_state', (None, None))
+    if created or old_state == (instance.is_active, instance.mentor_id):
+        return
+    old_mentor_id = old_state[1]
+    group_id = instance.pk
+    transaction.on_commit(lambda: invalidate_group_identities(group_id, [old_mentor_id]))
+    instance._identity_state = (instance.is_active, instance.mentor_id)
+
+
+@receiver(pre_delete, sender=Group)
+def invalidate_deleted_group_identity(sender, instance, **kwargs):
+    user_ids = list(instance.students.values_list('pk', flat=True)) + [instance.mentor_id]
+    transaction.on_commit(lambda: invalidate_users_identity(user_ids))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+@receiver(post_save, sender=Exam)
+@receiver(post_delete, sender=Exam)
+def bump_group_responses(sender, instance, **kwargs):
+    """Guruh, dars yoki imtihon o'zgarganda /lessons, /exams, /points javoblari"""
+    group_id = instance.pk if sender is Group else instance.group_id
+    if group_id:
+        transaction.on_commit(lambda: bump_versions(group_scope(group_id)))
+
+
+@receiver(post_save, sender=StudentPoints)
+@receiver(post_delete, sender=StudentPoints)
+def bump_points_responses(sender, instance, **kwargs):
+    """Ball o'zgarganda /points javoblari - o'quvchining o'zi va guruhdagi o'rinlar"""
+    scopes = [student_scope(instance.student_id), ranking_scope(instance.group_id)]
+    transaction.on_commit(lambda: bump_versions(*scopes))
+
+
+@receiver(post_save, sender=MonthlyParentReport)
+@receiver(post_delete, sender=MonthlyParentReport)
+def bump_report_responses(sender, instance, **kwargs):
+    """Oylik hisobot o'zgarganda /reports javoblari"""
+    student_id = instance.student_id
+    transaction.on_commit(lambda: bump_versions(student_scope(student_id)))
@@ -11,10 +11,12 @@ from homework.models import Homework
 from attendance.models import Attendance
 import logging
 
+from geeks_crm.task_locks import SingletonTask
+
 logger = logging.getLogger(__name__)
 
 
-@shared_task
+@shared_task(base=SingletonTask)
 def send_lesson_reminder():
     """
     Dars boshlanishidan 2 soat oldin eslatma yuborish
@@ -709,3 +711,76 @@ def send_payment_reminder(reminder_id):
     except Exception as e:
         logger.error(f"Error in send_payment_reminder: {e}")
 
+
+
+@shared_task
+def prewarm_points_responses():
+    """
+    Reyting yangilangandan keyin /points javoblarini oldindan tayyorlash
+    (Telegram ID si bor, faol guruhlardagi o'quvchilar). Ma'lumotlar 2 ta so'rovda olinadi,
+    o'rinlar leaderboard bilan bir xil ("1224") tartibda shu ballardan hisoblanadi.
+    """
+    try:
+        from bisect import bisect_right
+        from types import SimpleNamespace
+        from django.core.cache import cache
+        from courses.models import Group
+        from gamification.models import StudentPoints
+        from .handlers import render_points
+        from .responses import RESPONSE_TIMEOUT, get_versions, points_scopes, response_key
+        
+        memberships = Group.students.through.objects.filter(
+            group__is_active=True,
+            user__role='student',
+            user__telegram_id__isnull=False,
+        ).values_list('user_id', 'group_id', 'group__course__name', 'group__name')
+        points = dict(
+            ((student_id, group_id), total)
+            for student_id, group_id, total in StudentPoints.objects.filter(
+                group__is_active=True
+            ).values_list('student_id', 'group_id', 'total_points')
+        )
+        group_totals = {}
+        for (student_id, group_id), total in points.items():
+            group_totals.setdefault(group_id, []).append(total)
+        for totals in group_totals.values():
+            totals.sort()
+        
+        def rank(student_id, group_id):
+            total = points.get((student_id, group_id))
+            if total is None:
+                return None
+            totals = group_totals[group_id]
+            return len(totals) - bisect_right(totals, total) + 1
+        
+        groups_by_student = {}
+        for student_id, group_id, course_name, name in memberships:
+            groups_by_student.setdefault(student_id, []).append(SimpleNamespace(
+                id=group_id,
+                course_name=course_name,
+                name=name,
+                points=points.get((student_id, group_id)),
+                rank=rank(student_id, group_id),
+            ))
+        
+        scopes_by_student = {
+            student_id: points_scopes(student_id, [group.id for group in groups])
+            for student_id, groups in groups_by_student.items()
+        }
+        all_scopes = sorted({scope for scopes in scopes_by_student.values() for scope in scopes})
+        versions = dict(zip(all_scopes, get_versions(all_scopes)))
+        
+        responses = {}
+        for student_id, groups in groups_by_student.items():
+            # Handler dagi tartib: kurs (nomi bo'yicha), guruh nomi
+            groups.sort(key=lambda group: (group.course_name, group.name))
+            scopes = scopes_by_student[student_id]
+            key = response_key('points', scopes, [versions[scope] for scope in scopes])
+            responses[key] = render_points(groups)
+        
+        cache.set_many(responses, RESPONSE_TIMEOUT)
+        logger.info(f"Prewarmed /points responses for {len(responses)} students")
+        return len(responses)
+    
+    except Exception as e:
+        logger.error(f"Error in prewarm_points_responses: {e}")
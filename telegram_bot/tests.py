@@ -1,3 +1,388 @@
-from django.test import TestCase
+import asyncio
+import json
+from datetime import time, timedelta
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from . import handlers, identity, queries
+from .tasks import prewarm_points_responses
+from .updates import UpdateDispatcher, parse_update, update_chat_key
+from accounts.models import Branch, StudentProfile
+from attendance.models import Attendance
+from courses.models import Course, Group, Lesson
+from exams.models import Exam
+from gamification.models import StudentPoints
+from homework.models import Homework
+
+User = get_user_model()
+
+
+class FakeMessage:
+    def __init__(self):
+        self.replies = []
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+
+
+def fake_update(telegram_id):
+    return SimpleNamespace(effective_user=SimpleNamespace(id=telegram_id), message=FakeMessage())
+
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+UNREACHABLE_REDIS_URL = 'redis://127.0.0.1:1/0'
+
+
+@override_settings(CACHES=LOCMEM_CACHE, LEADERBOARD_REDIS_URL=UNREACHABLE_REDIS_URL)
+class BotQueriesTestCase(TestCase):
+    """Test async data access used by bot command handlers"""
+
+    def setUp(self):
+        """Set up test data"""
+        cache.clear()
+        identity._local.clear()
+        branch = Branch.objects.create(name='Branch')
+        course = Course.objects.create(name='Python', branch=branch)
+        self.mentor = User.objects.create_user(
+            username='mentor', password='mentor123', role='mentor', telegram_id=100,
+            first_name='Ali', last_name='Valiyev',
+        )
+        self.student = User.objects.create_user(
+            username='student', password='student123', role='student', telegram_id=200,
+        )
+        StudentProfile.objects.create(user=self.student, parent_telegram_id=300)
+        self.group = Group.objects.create(
+            course=course, name='PY-1', mentor=self.mentor, start_time=time(10, 0), end_time=time(12, 0),
+        )
+        self.other_group = Group.objects.create(
+            course=course, name='PY-2', start_time=time(14, 0), end_time=time(16, 0),
+        )
+        self.group.students.add(self.student)
+        self.other_group.students.add(self.student)
+
+        today = timezone.localdate()
+        # Signallar (Celery) ishga tushmasligi uchun bulk_create
+        self.lesson = Lesson.objects.bulk_create([
+            Lesson(group=self.group, date=today, start_time=time(10, 0), end_time=time(12, 0)),
+        ])[0]
+        Attendance.objects.bulk_create([Attendance(lesson=self.lesson, student=self.student, status='late')])
+        Homework.objects.bulk_create([
+            Homework(lesson=self.lesson, student=self.student, title='Vazifa 1',
+                     deadline=timezone.now() + timedelta(days=2), is_submitted=True,
+                     submitted_at=timezone.now()),
+        ])
+        StudentPoints.objects.create(student=self.student, group=self.group, total_points=42)
+
+    def test_group_points_in_one_query(self):
+        """Points for every group come from one query"""
+        group_ids = [self.group.pk, self.other_group.pk]
+        with self.assertNumQueries(1):
+            groups = async_to_sync(queries.student_group_points)(self.student.pk, group_ids)
+        by_name = {group.name: group for group in groups}
+        self.assertEqual(by_name['PY-1'].points, 42)
+        self.assertIsNone(by_name['PY-2'].points)
+
+    def test_parent_children_in_two_queries(self):
+        """Children and today's attendance are loaded with two queries"""
+        with self.assertNumQueries(2):
+            students = async_to_sync(queries.parent_students)([self.student.pk])
+            attendance = async_to_sync(queries.todays_attendance)([self.student.pk])
+        self.assertEqual(students, [self.student])
+        self.assertEqual(attendance[self.student.pk].status, 'late')
+
+    async def test_student_lessons_handler(self):
+        """Lessons command shows the group mentor"""
+        update = fake_update(200)
+        await handlers.student_lessons(update, None)
+        self.assertEqual(len(update.message.replies), 1)
+        self.assertIn('PY-1', update.message.replies[0])
+        self.assertIn('Ali Valiyev', update.message.replies[0])
+
+    async def test_student_points_handler(self):
+        """Points command lists groups with points only"""
+        update = fake_update(200)
+        await handlers.student_points(update, None)
+        reply = update.message.replies[0]
+        self.assertIn('42 ball', reply)
+        self.assertIn("1 o'rin", reply)
+        self.assertNotIn('PY-2', reply)
+
+    async def test_parent_children_handler(self):
+        """Children command shows today's attendance"""
+        update = fake_update(300)
+        await handlers.parent_children(update, None)
+        self.assertIn('Kech qoldi', update.message.replies[0])
+
+    async def test_mentor_handlers(self):
+        """Mentor schedule and ungraded homework use group mentor"""
+        update = fake_update(100)
+        await handlers.mentor_schedule(update, None)
+        self.assertIn('PY-1', update.message.replies[0])
+
+        update = fake_update(100)
+        await handlers.mentor_homework_grade(update, None)
+        self.assertIn('Vazifa 1', update.message.replies[0])
+
+    async def test_unknown_user(self):
+        """Unregistered users get a registration hint"""
+        update = fake_update(999)
+        await handlers.start(update, None)
+        self.assertIn("ro'yxatdan o'tmagansiz", update.message.replies[0])
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class BotIdentityCacheTestCase(TestCase):
+    """Test telegram_id identity cache and its invalidation"""
+
+    def setUp(self):
+        """Set up test data"""
+        cache.clear()
+        identity._local.clear()
+        branch = Branch.objects.create(name='Branch')
+        self.course = Course.objects.create(name='Python', branch=branch)
+        self.student = User.objects.create_user(
+            username='student', password='student123', role='student', telegram_id=200,
+        )
+        self.profile = StudentProfile.objects.create(user=self.student, parent_telegram_id=300)
+        self.group = Group.objects.create(
+            course=self.course, name='PY-1', start_time=time(10, 0), end_time=time(12, 0),
+        )
+        self.group.students.add(self.student)
+
+    def test_resolves_student_and_parent(self):
+        """Student gets groups, parent gets linked children"""
+        student = identity.resolve_identity(200)
+        self.assertTrue(student.has_role('student'))
+        self.assertEqual(student.group_ids, [self.group.pk])
+
+        parent = identity.resolve_identity(300)
+        self.assertFalse(parent.is_registered)
+        self.assertEqual(parent.student_ids, [self.student.pk])
+
+        unknown = identity.resolve_identity(999)
+        self.assertFalse(unknown.is_registered)
+        self.assertFalse(unknown.is_parent)
+
+    def test_local_and_redis_hits_skip_database(self):
+        """Repeated lookups are served from the LRU, then from the shared cache"""
+        identity.resolve_identity(200)
+        before = identity.local_stats()
+        with self.assertNumQueries(0):
+            identity.resolve_identity(200)
+            identity._local.clear()
+            identity.resolve_identity(200)
+        after = identity.local_stats()
+        self.assertEqual(after['local_hits'] - before['local_hits'], 1)
+        self.assertEqual(after['redis_hits'] - before['redis_hits'], 1)
+
+    def test_async_local_hit_does_not_flush_stats(self):
+        """LRU hits inside the event loop never write counters to Redis"""
+        identity.resolve_identity(200)
+        with mock.patch.object(identity, 'STATS_FLUSH_EVERY', 1), \
+                mock.patch.object(identity, '_flush_stats') as flush:
+            async_to_sync(identity.aresolve_identity)(200)
+        flush.assert_not_called()
+
+    def test_cache_outage_falls_back_to_database(self):
+        """Cache errors are logged and the identity is loaded from the database"""
+        with mock.patch.object(identity.cache, 'get', side_effect=ConnectionError), \
+                mock.patch.object(identity.cache, 'set', side_effect=ConnectionError), \
+                self.assertLogs('telegram_bot.identity', level='WARNING'):
+            student = identity.resolve_identity(200)
+        self.assertTrue(student.has_role('student'))
+        self.assertEqual(student.group_ids, [self.group.pk])
+
+    def test_invalidated_by_user_and_profile_changes(self):
+        """Signals clear cached identities after commit"""
+        identity.resolve_identity(200)
+        identity.resolve_identity(300)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.student.telegram_id = 201
+            self.student.save()
+        self.assertFalse(identity.resolve_identity(200).is_registered)
+        self.assertTrue(identity.resolve_identity(201).has_role('student'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.profile.parent_telegram_id = 301
+            self.profile.save()
+        self.assertFalse(identity.resolve_identity(300).is_parent)
+        self.assertEqual(identity.resolve_identity(301).student_ids, [self.student.pk])
+
+    def test_invalidated_by_group_membership(self):
+        """Adding a student to a group refreshes their group ids"""
+        identity.resolve_identity(200)
+        new_group = Group.objects.create(
+            course=self.course, name='PY-2', start_time=time(14, 0), end_time=time(16, 0),
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            new_group.students.add(self.student)
+        self.assertEqual(identity.resolve_identity(200).group_ids, [self.group.pk, new_group.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            new_group.is_active = False
+            new_group.save()
+        self.assertEqual(identity.resolve_identity(200).group_ids, [self.group.pk])
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class BotResponseCacheTestCase(TestCase):
+    """Test cached rendered responses and their versioned invalidation"""
+
+    def setUp(self):
+        """Set up test data"""
+        cache.clear()
+        identity._local.clear()
+        branch = Branch.objects.create(name='Branch')
+        self.course = Course.objects.create(name='Python', branch=branch)
+        self.student = User.objects.create_user(
+            username='student', password='student123', role='student', telegram_id=200,
+        )
+        self.group = Group.objects.create(
+            course=self.course, name='PY-1', start_time=time(10, 0), end_time=time(12, 0),
+        )
+        self.group.students.add(self.student)
+        self.points = StudentPoints.objects.create(student=self.student, group=self.group, total_points=42)
+
+    def reply(self, handler):
+        update = fake_update(200)
+        async_to_sync(handler)(update, None)
+        return update.message.replies[0]
+
+    def test_repeated_command_served_from_cache(self):
+        """Second /points call renders from cache without queries"""
+        first = self.reply(handlers.student_points)
+        with self.assertNumQueries(0):
+            second = self.reply(handlers.student_points)
+        self.assertEqual(first, second)
+        self.assertIn('42 ball', second)
+
+    def test_points_change_invalidates_response(self):
+        """Saving StudentPoints bumps the student's version"""
+        self.reply(handlers.student_points)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.points.total_points = 50
+            self.points.save()
+        self.assertIn('50 ball', self.reply(handlers.student_points))
+
+    def test_exam_change_invalidates_group_response(self):
+        """Creating an exam bumps the group version"""
+        self.assertIn("imtihonlar yo'q", self.reply(handlers.student_exams))
+        with self.captureOnCommitCallbacks(execute=True):
+            Exam.objects.create(
+                course=self.course, group=self.group, title='Yakuniy',
+                date=timezone.now() + timedelta(days=3),
+            )
+        self.assertIn('Yakuniy', self.reply(handlers.student_exams))
+
+    def test_prewarm_matches_rendered_response(self):
+        """Prewarmed /points text is served as-is"""
+        expected = self.reply(handlers.student_points)
+        cache.clear()
+        identity.resolve_identity(200)
+
+        self.assertEqual(prewarm_points_responses(), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.reply(handlers.student_points), expected)
+
+
+def message_update(update_id, chat_id):
+    return {'update_id': update_id, 'message': {'message_id': update_id, 'chat': {'id': chat_id}, 'text': '/start'}}
+
+
+class WebhookUpdatesTestCase(TestCase):
+    """Test webhook validation and queued update dispatching"""
+
+    def test_chat_key(self):
+        """Updates are ordered by chat, falling back to sender and update id"""
+        self.assertEqual(update_chat_key(message_update(1, 42)), 42)
+        callback = {'update_id': 2, 'callback_query': {'from': {'id': 7}, 'message': {'chat': {'id': 43}}}}
+        self.assertEqual(update_chat_key(callback), 43)
+        self.assertEqual(update_chat_key({'update_id': 3, 'inline_query': {'from': {'id': 8}}}), 8)
+        self.assertEqual(update_chat_key({'update_id': 4, 'poll': {'id': 'x'}}), 'update:4')
+
+    def test_parse_update(self):
+        self.assertIsNone(parse_update(b'not json'))
+        self.assertIsNone(parse_update(b'[]'))
+        self.assertIsNone(parse_update(b'{"message": {}}'))
+        self.assertEqual(parse_update(b'{"update_id": 5}'), {'update_id': 5})
+
+    def test_dispatcher_orders_per_chat_and_bounds_concurrency(self):
+        """Same-chat updates run in order, different chats in parallel up to the limit"""
+        processed = []
+        running = 0
+        peak = 0
+
+        async def handle(data, raw):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01 if data['update_id'] % 2 else 0.001)
+            processed.append((update_chat_key(data), data['update_id']))
+            running -= 1
+
+        async def run():
+            dispatcher = UpdateDispatcher(handle, concurrency=3)
+            for update_id in range(1, 21):
+                await dispatcher.acquire()
+                dispatcher.submit(message_update(update_id, update_id % 4), None)
+            await dispatcher.drain()
+
+        asyncio.run(run())
+
+        self.assertEqual(len(processed), 20)
+        self.assertLessEqual(peak, 3)
+        self.assertGreater(peak, 1)
+        for chat_id in range(4):
+            ids = [update_id for chat, update_id in processed if chat == chat_id]
+            self.assertEqual(ids, sorted(ids))
+
+    def test_dispatcher_survives_handler_errors(self):
+        """A failing update releases its slot and later updates still run"""
+        processed = []
+
+        async def handle(data, raw):
+            if data['update_id'] == 1:
+                raise ValueError('boom')
+            processed.append(data['update_id'])
+
+        async def run():
+            dispatcher = UpdateDispatcher(handle, concurrency=1)
+            for update_id in (1, 2, 3):
+                await dispatcher.acquire()
+                dispatcher.submit(message_update(update_id, 1), None)
+            await dispatcher.drain()
+
+        asyncio.run(run())
+        self.assertEqual(processed, [2, 3])
+
+    @override_settings(TELEGRAM_WEBHOOK_SECRET='secret')
+    def test_webhook_rejects_invalid_requests(self):
+        """Webhook checks method, secret token and payload before queueing"""
+        url = '/telegram/webhook/'
+        body = json.dumps(message_update(1, 42))
+        self.assertEqual(self.client.get(url).status_code, 405)
+        self.assertEqual(self.client.post(url, body, content_type='application/json').status_code, 403)
+        response = self.client.post(
+            url, 'not json', content_type='application/json',
+            headers={'X-Telegram-Bot-Api-Secret-Token': 'secret'},
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_webhook_queues_with_shared_sync_client(self):
+        """Each webhook request pushes through the process-wide client, no per-loop pools"""
+        url = '/telegram/webhook/'
+        client = mock.Mock()
+        with mock.patch('telegram_bot.updates.get_redis', return_value=client) as get_redis:
+            for update_id in (1, 2):
+                body = json.dumps(message_update(update_id, 42))
+                self.assertEqual(self.client.post(url, body, content_type='application/json').status_code, 200)
+        get_redis.assert_called_with('telegram_updates')
+        self.assertEqual(client.rpush.call_count, 2)
+        self.assertEqual(client.rpush.call_args.args[0], 'telegram:updates')
@@ -0,0 +1,189 @@
+"""
+Telegram webhook yangilanishlari navbati
+Webhook yangilanishni Redis ro'yxatiga qo'yadi va Telegramga darhol javob qaytaradi.
+Uzoq ishlaydigan async worker (python manage.py runbotworker) navbatdan o'qiydi va
+yangilanishlarni cheklangan parallellik bilan, har bir chat ichida kelish tartibida qayta ishlaydi.
+Per-chat tartib bitta worker jarayoni ichida kafolatlanadi - parallellik --concurrency bilan oshiriladi.
+"""
+import asyncio
+import json
+import logging
+from collections import deque
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from geeks_crm.redis_clients import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+QUEUE_KEY = 'telegram:updates'
+PROCESSING_KEY = 'telegram:updates:processing'  # Qayta ishlanayotganlar (worker to'xtasa qaytariladi)
+DEFAULT_CONCURRENCY = 32
+POP_TIMEOUT = 1  # soniya - to'xtash signalini tekshirish oralig'i
+
+
+def async_redis():
+    """
+    Yangi redis.asyncio klienti - joriy event loopga bog'lanadi.
+    Faqat uzoq ishlaydigan loop lar uchun (worker, replay_updates); chaqiruvchi
+    loop tugashidan oldin await client.aclose() qiladi.
+    """
+    import redis.asyncio as redis
+
+    return redis.Redis.from_url(settings.TELEGRAM_UPDATES_REDIS_URL)
+
+
+def parse_update(raw):
+    """
+    Xom yangilanishni tekshirish.
+    Qaytaradi: dict yoki None (JSON emas yoki update_id yo'q)
+    """
+    try:
+        data = json.loads(raw)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(data, dict) or 'update_id' not in data:
+        return None
+    return data
+
+
+def update_chat_key(data):
+    """
+    Yangilanish qaysi chatga tegishli (tartib kaliti).
+    message, callback_query.message, my_chat_member va h.k. dan chat.id,
+    chat bo'lmasa (inline_query) - foydalanuvchi id si, umuman topilmasa update_id.
+    """
+    for field, payload in data.items():
+        if field == 'update_id' or not isinstance(payload, dict):
+            continue
+        chat = payload.get('chat') or (payload.get('message') or {}).get('chat')
+        if chat and 'id' in chat:
+            return chat['id']
+        sender = payload.get('from') or payload.get('user')
+        if sender and 'id' in sender:
+            return sender['id']
+    return f"update:{data['update_id']}"
+
+
+def push_update(raw):
+    """Yangilanishni navbat oxiriga qo'shish (jarayon bo'yicha umumiy sinxron klient)"""
+    get_redis('telegram_updates').rpush(QUEUE_KEY, raw)
+
+
+async def enqueue_update(raw):
+    """
+    push_update ning async varianti (webhook).
+    WSGI da har bir so'rov yangi event loopda ishlaydi - loopga bog'langan klient
+    har safar yangi ulanishlar puli ochardi, shu sabab sinxron klient thread da chaqiriladi.
+    """
+    await sync_to_async(push_update, thread_sensitive=False)(raw)
+
+
+async def restore_processing(client):
+    """
+    Oldingi worker tugatmagan yangilanishlarni navbat boshiga qaytarish (tartib saqlanadi).
+    Qaytaradi: qaytarilganlar soni
+    """
+    restored = 0
+    while await client.lmove(PROCESSING_KEY, QUEUE_KEY, 'RIGHT', 'LEFT'):
+        restored += 1
+    return restored
+
+
+class UpdateDispatcher:
+    """
+    Cheklangan parallellik va per-chat tartib.
+    Har bir yangilanish slot egallaydi (acquire) va qayta ishlangach bo'shatadi - worker
+    slot bo'lmasa navbatdan o'qimaydi. Bir chat yangilanishlari ketma-ket, turli chatlar parallel.
+    """
+    def __init__(self, handle, concurrency=DEFAULT_CONCURRENCY):
+        self._handle = handle
+        self._slots = asyncio.Semaphore(concurrency)
+        self._chats = {}
+        self._tasks = set()
+
+    async def acquire(self):
+        await self._slots.acquire()
+
+    def release(self):
+        self._slots.release()
+
+    def submit(self, data, raw):
+        """Slot egallangan yangilanishni chat navbatiga qo'shish"""
+        key = update_chat_key(data)
+        pending = self._chats.get(key)
+        if pending is not None:
+            pending.append((data, raw))
+            return
+        self._chats[key] = deque([(data, raw)])
+        task = asyncio.create_task(self._run_chat(key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_chat(self, key):
+        pending = self._chats[key]
+        try:
+            while pending:
+                data, raw = pending[0]
+                try:
+                    await self._handle(data, raw)
+                except Exception as e:
+                    logger.error(f"Error processing update {data.get('update_id')}: {e}")
+                finally:
+                    pending.popleft()
+                    self.release()
+        finally:
+            del self._chats[key]
+
+    async def drain(self):
+        """Barcha boshlangan yangilanishlar tugashini kutish"""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+
+async def run_worker(application, concurrency=DEFAULT_CONCURRENCY, stop_event=None, capture=None):
+    """
+    Navbatdan yangilanishlarni o'qib qayta ishlash (stop_event o'rnatilguncha).
+    capture - har bir xom yangilanish JSONL qatori sifatida yoziladigan fayl (replay uchun)
+    """
+    from telegram import Update
+
+    client = async_redis()
+    stop_event = stop_event or asyncio.Event()
+
+    async def handle(data, raw):
+        try:
+            await application.process_update(Update.de_json(data, application.bot))
+        finally:
+            await client.lrem(PROCESSING_KEY, 1, raw)
+
+    try:
+        restored = await restore_processing(client)
+        if restored:
+            logger.info(f"Restored {restored} unfinished updates")
+
+        dispatcher = UpdateDispatcher(handle, concurrency)
+        async with application:
+            while not stop_event.is_set():
+                await dispatcher.acquire()
+                raw = await client.blmove(QUEUE_KEY, PROCESSING_KEY, POP_TIMEOUT, 'LEFT', 'RIGHT')
+                if raw is None:
+                    dispatcher.release()
+                    continue
+
+                data = parse_update(raw)
+                if data is None:
+                    logger.warning("Skipping malformed update")
+                    await client.lrem(PROCESSING_KEY, 1, raw)
+                    dispatcher.release()
+                    continue
+
+                if capture is not None:
+                    capture.write(json.dumps(data, ensure_ascii=False) + '\n')
+                dispatcher.submit(data, raw)
+
+            await dispatcher.drain()
+    finally:
+        await client.aclose()
@@ -1,49 +1,41 @@
 """
 Telegram bot webhook views
 """
-from django.views.decorators.csrf import csrf_exempt
-from django.http import HttpResponse
-from django.conf import settings
-import json
+import hmac
 import logging
 
-logger = logging.getLogger(__name__)
+from django.conf import settings
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
 
-# Global application instance
-_application = None
+from .updates import enqueue_update, parse_update
 
+logger = logging.getLogger(__name__)
 
-def get_application():
-    """Application instance olish (singleton)"""
-    global _application
-    if _application is None:
-        from telegram_bot.bot import create_bot
-        _application = create_bot()
-    return _application
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
 
 
 @csrf_exempt
-def webhook(request):
+async def webhook(request):
     """
     Telegram webhook endpoint
+    Yangilanish navbatga qo'yiladi va darhol javob qaytariladi - qayta ishlash
+    runbotworker da. Navbatga yozib bo'lmasa 500 (Telegram qayta yuboradi).
     """
     if request.method != 'POST':
         return HttpResponse('Method not allowed', status=405)
-    
+
+    secret = settings.TELEGRAM_WEBHOOK_SECRET
+    if secret and not hmac.compare_digest(request.headers.get(SECRET_HEADER, ''), secret):
+        return HttpResponse('Forbidden', status=403)
+
+    if parse_update(request.body) is None:
+        return HttpResponse('Bad request', status=400)
+
     try:
-        from telegram import Update
-        
-        application = get_application()
-        
-        if not application:
-            return HttpResponse('Bot not configured', status=500)
-        
-        # Update ni qayta ishlash
-        update = Update.de_json(json.loads(request.body), application.bot)
-        application.process_update(update)
-        
-        return HttpResponse('OK')
-    
+        await enqueue_update(request.body)
     except Exception as e:
-        logger.error(f"Error processing webhook: {e}")
+        logger.error(f"Error queueing webhook update: {e}")
         return HttpResponse('Error', status=500)
+
+    return HttpResponse('OK')